@@ -0,0 +1,281 @@
+"""
+Fake Kubernetes API server for offline tests of the cluster state cache.
+
+Serves paginated LIST and streaming WATCH (with bookmarks and 410 Gone for
+resource versions older than its event window) for the kinds the cache
+watches, over a generated cluster of namespaces, deployments, replicasets,
+pods, nodes, services and events. A churn loop keeps restarting pods,
+flipping them into CrashLoopBackOff and emitting Warning events.
+
+Usage:
+    python bench/fake_kube_api_server.py --port 8913 --namespaces 10 --deployments 20 --churn 50
+    KUBE_API_URL=http://127.0.0.1:8913 chainlit run src/chat.py
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import random
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from aiohttp import web
+
+PATHS = {
+    "/api/v1/pods": "pods",
+    "/api/v1/nodes": "nodes",
+    "/api/v1/namespaces": "namespaces",
+    "/api/v1/services": "services",
+    "/api/v1/events": "events",
+    "/apis/apps/v1/deployments": "deployments",
+    "/apis/apps/v1/replicasets": "replicasets",
+    "/apis/apps/v1/statefulsets": "statefulsets",
+    "/apis/apps/v1/daemonsets": "daemonsets",
+    "/apis/batch/v1/jobs": "jobs",
+}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeCluster:
+    """Objects by kind plus a bounded window of watch events."""
+
+    def __init__(self, namespaces: int, deployments: int, replicas: int, nodes: int, window: int = 10000):
+        self.resource_version = 1
+        self.objects: Dict[str, Dict[str, Dict[str, Any]]] = {kind: {} for kind in PATHS.values()}
+        self.history: Deque[Tuple[int, str, str, Dict[str, Any]]] = deque(maxlen=window)
+        self._changed = asyncio.Condition()
+        self.watchers = 0
+        self._generate(namespaces, deployments, replicas, nodes)
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+    def _meta(self, name: str, namespace: Optional[str] = None, **extra: Any) -> Dict[str, Any]:
+        meta = {"name": name, "uid": str(uuid.uuid4()), "creationTimestamp": _now(),
+                # the noise the cache is expected to drop
+                "managedFields": [{"manager": "kube-controller-manager", "operation": "Update",
+                                   "fieldsV1": {"f:status": {"f:conditions": {}}}}],
+                "annotations": {"kubectl.kubernetes.io/last-applied-configuration": "{" + "x" * 400 + "}"}}
+        if namespace:
+            meta["namespace"] = namespace
+        meta.update(extra)
+        return meta
+
+    def _store(self, kind: str, obj: Dict[str, Any], event: Optional[str]) -> None:
+        self.resource_version += 1
+        obj["metadata"]["resourceVersion"] = str(self.resource_version)
+        meta = obj["metadata"]
+        key = f"{meta.get('namespace', '')}/{meta['name']}"
+        if event == "DELETED":
+            self.objects[kind].pop(key, None)
+        else:
+            self.objects[kind][key] = obj
+        if event:
+            self.history.append((self.resource_version, kind, event, copy.deepcopy(obj)))
+
+    def _generate(self, namespaces: int, deployments: int, replicas: int, nodes: int) -> None:
+        node_names = [f"node-{i}" for i in range(nodes)]
+        for name in node_names:
+            self._store("nodes", {
+                "metadata": self._meta(name, labels={"kubernetes.io/hostname": name}),
+                "spec": {"podCIDR": "10.244.0.0/24"},
+                "status": {
+                    "conditions": [{"type": "Ready", "status": "True"}, {"type": "MemoryPressure", "status": "False"}],
+                    "capacity": {"cpu": "8", "memory": "32Gi", "pods": "110"},
+                    "allocatable": {"cpu": "7800m", "memory": "30Gi", "pods": "110"},
+                    "nodeInfo": {"kubeletVersion": "v1.30.4", "osImage": "Ubuntu 22.04"},
+                },
+            }, None)
+        for n in range(namespaces):
+            namespace = f"team-{n}"
+            self._store("namespaces", {"metadata": self._meta(namespace), "status": {"phase": "Active"}}, None)
+            for d in range(deployments):
+                app = f"api-{d}"
+                labels = {"app": app, "tier": "backend" if d % 2 else "frontend"}
+                deployment = {
+                    "metadata": self._meta(app, namespace, labels=labels),
+                    "spec": {"replicas": replicas, "selector": {"matchLabels": {"app": app}},
+                             "template": {"metadata": {"labels": labels}, "spec": {"containers": [
+                                 {"name": "app", "image": f"registry.local/{app}:1.0",
+                                  "env": [{"name": f"VAR_{i}", "value": "x" * 20} for i in range(20)]}]}}},
+                    "status": {"replicas": replicas, "readyReplicas": replicas, "updatedReplicas": replicas,
+                               "availableReplicas": replicas,
+                               "conditions": [{"type": "Available", "status": "True"}]},
+                }
+                self._store("deployments", deployment, None)
+                rs_name = f"{app}-{uuid.uuid4().hex[:10]}"
+                owner = {"apiVersion": "apps/v1", "kind": "Deployment", "name": app,
+                         "uid": deployment["metadata"]["uid"], "controller": True}
+                replicaset = {
+                    "metadata": self._meta(rs_name, namespace, labels=labels, ownerReferences=[owner]),
+                    "spec": {"replicas": replicas, "template": deployment["spec"]["template"]},
+                    "status": {"replicas": replicas, "readyReplicas": replicas, "availableReplicas": replicas},
+                }
+                self._store("replicasets", replicaset, None)
+                rs_owner = {"apiVersion": "apps/v1", "kind": "ReplicaSet", "name": rs_name,
+                            "uid": replicaset["metadata"]["uid"], "controller": True}
+                for r in range(replicas):
+                    self._store("pods", self._pod(f"{rs_name}-{uuid.uuid4().hex[:5]}", namespace, labels,
+                                                  rs_owner, random.choice(node_names)), None)
+                self._store("services", {
+                    "metadata": self._meta(app, namespace, labels=labels),
+                    "spec": {"type": "ClusterIP", "clusterIP": f"10.96.{n}.{d}", "selector": {"app": app},
+                             "ports": [{"port": 80, "targetPort": 8080, "protocol": "TCP"}]},
+                    "status": {"loadBalancer": {}},
+                }, None)
+
+    def _pod(self, name: str, namespace: str, labels: Dict[str, str], owner: Dict[str, Any], node: str) -> Dict[str, Any]:
+        return {
+            "metadata": self._meta(name, namespace, labels=dict(labels), ownerReferences=[owner]),
+            "spec": {"nodeName": node, "containers": [
+                {"name": "app", "image": "registry.local/app:1.0",
+                 "env": [{"name": f"VAR_{i}", "value": "x" * 20} for i in range(20)],
+                 "volumeMounts": [{"name": "token", "mountPath": "/var/run/secrets"}]}],
+                "volumes": [{"name": "token", "projected": {"sources": [{"serviceAccountToken": {"path": "token"}}]}}]},
+            "status": {
+                "phase": "Running", "podIP": "10.244.0.10", "hostIP": "192.168.0.10", "startTime": _now(),
+                "conditions": [{"type": "Ready", "status": "True"}, {"type": "ContainersReady", "status": "True"}],
+                "containerStatuses": [{"name": "app", "ready": True, "restartCount": 0,
+                                       "image": "registry.local/app:1.0",
+                                       "state": {"running": {"startedAt": _now()}}}],
+            },
+        }
+
+    async def churn(self, per_second: float) -> None:
+        """Restart random pods, some into CrashLoopBackOff, recording a Warning event each time."""
+        if per_second <= 0:
+            return
+        while True:
+            await asyncio.sleep(1.0 / per_second)
+            pods = self.objects["pods"]
+            if not pods:
+                continue
+            pod = copy.deepcopy(random.choice(list(pods.values())))
+            container = pod["status"]["containerStatuses"][0]
+            container["restartCount"] += 1
+            crashing = random.random() < 0.3
+            container["ready"] = not crashing
+            container["lastState"] = {"terminated": {"reason": "Error", "exitCode": 1, "finishedAt": _now()}}
+            container["state"] = ({"waiting": {"reason": "CrashLoopBackOff", "message": "back-off restarting"}}
+                                  if crashing else {"running": {"startedAt": _now()}})
+            self._store("pods", pod, "MODIFIED")
+            meta = pod["metadata"]
+            self._store("events", {
+                "metadata": self._meta(f"{meta['name']}.{uuid.uuid4().hex[:16]}", meta["namespace"]),
+                "involvedObject": {"kind": "Pod", "name": meta["name"], "namespace": meta["namespace"],
+                                   "uid": meta["uid"]},
+                "reason": "BackOff" if crashing else "Started",
+                "message": "Back-off restarting failed container app" if crashing else "Started container app",
+                "type": "Warning" if crashing else "Normal",
+                "count": container["restartCount"], "firstTimestamp": _now(), "lastTimestamp": _now(),
+                "source": {"component": "kubelet", "host": pod["spec"]["nodeName"]},
+            }, "ADDED")
+            async with self._changed:
+                self._changed.notify_all()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        kind = PATHS.get(request.path)
+        if kind is None:
+            return web.json_response({"kind": "Status", "code": 404, "message": "not found"}, status=404)
+        if request.query.get("watch") in ("1", "true"):
+            return await self._watch(request, kind)
+        return self._list(request, kind)
+
+    def _list(self, request: web.Request, kind: str) -> web.Response:
+        items = sorted(self.objects[kind].items())
+        limit = int(request.query.get("limit", "0") or 0)
+        start = int(request.query.get("continue", "0") or 0)
+        end = start + limit if limit else len(items)
+        body = {
+            "kind": "List",
+            "metadata": {"resourceVersion": str(self.resource_version)},
+            "items": [obj for _, obj in items[start:end]],
+        }
+        if end < len(items):
+            body["metadata"]["continue"] = str(end)
+        return web.json_response(body)
+
+    async def _watch(self, request: web.Request, kind: str) -> web.StreamResponse:
+        since = int(request.query.get("resourceVersion", "0") or 0)
+        timeout = float(request.query.get("timeoutSeconds", "300"))
+        bookmarks = request.query.get("allowWatchBookmarks") == "true"
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        if self.history and since < self.history[0][0] - 1:
+            await self._send(response, "ERROR", {"kind": "Status", "code": 410, "reason": "Expired",
+                                                 "message": f"too old resource version: {since}"})
+            return response
+        self.watchers += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            while loop.time() < deadline:
+                pending = [entry for entry in self.history if entry[0] > since]
+                if pending:
+                    for _, event_kind, event, obj in pending:
+                        if event_kind == kind:
+                            await self._send(response, event, obj)
+                    since = pending[-1][0]
+                    continue
+                try:
+                    async with self._changed:
+                        await asyncio.wait_for(self._changed.wait(), min(5.0, max(deadline - loop.time(), 0.01)))
+                except asyncio.TimeoutError:
+                    if bookmarks:
+                        await self._send(response, "BOOKMARK",
+                                         {"metadata": {"resourceVersion": str(self.resource_version)}})
+        except ConnectionResetError:
+            pass
+        finally:
+            self.watchers -= 1
+        return response
+
+    @staticmethod
+    async def _send(response: web.StreamResponse, event: str, obj: Dict[str, Any]) -> None:
+        await response.write(json.dumps({"type": event, "object": obj}).encode() + b"\n")
+
+
+def create_app(cluster: FakeCluster, churn: float = 0.0) -> web.Application:
+    app = web.Application()
+    app.router.add_get("/{path:.*}", cluster.handle)
+
+    async def start_churn(app: web.Application) -> None:
+        app["churn"] = asyncio.create_task(cluster.churn(churn))
+
+    async def stop_churn(app: web.Application) -> None:
+        app["churn"].cancel()
+
+    app.on_startup.append(start_churn)
+    app.on_cleanup.append(stop_churn)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8913)
+    parser.add_argument("--namespaces", type=int, default=10)
+    parser.add_argument("--deployments", type=int, default=20, help="deployments (and services) per namespace")
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--churn", type=float, default=10.0, help="pod restarts per second")
+    args = parser.parse_args()
+
+    async def build() -> web.Application:
+        cluster = FakeCluster(args.namespaces, args.deployments, args.replicas, args.nodes)
+        return create_app(cluster, args.churn)
+
+    web.run_app(build(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
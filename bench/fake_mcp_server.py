@@ -0,0 +1,141 @@
+"""
+Stub MCP stdio server for offline benchmarks.
+
+Serves tools named like the real kubernetes, prometheus and time servers,
+with configurable latency and payload size, so the agent pipeline can be
+exercised without a cluster.
+
+Usage:
+    python bench/fake_mcp_server.py --profile kubernetes --latency-ms 50 --payload-bytes 20000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict
+
+from mcp.server.fastmcp import FastMCP
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=["kubernetes", "prometheus", "time"], default="kubernetes")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean latency of every tool call")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="uniform +/- jitter added to the latency")
+    parser.add_argument("--payload-bytes", type=int, default=4096, help="approximate size of each tool output")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+RNG = random.Random(ARGS.seed)
+mcp = FastMCP(f"fake-{ARGS.profile}", log_level="WARNING")
+
+
+async def simulate_latency() -> None:
+    delay = ARGS.latency_ms + RNG.uniform(-ARGS.jitter_ms, ARGS.jitter_ms)
+    await asyncio.sleep(max(0.0, delay) / 1000.0)
+
+
+def text_payload(prefix: str) -> str:
+    """Build roughly ARGS.payload_bytes of line-oriented text."""
+    lines = []
+    size = 0
+    i = 0
+    while size < ARGS.payload_bytes:
+        line = f"{prefix} line={i} status={'Running' if i % 7 else 'CrashLoopBackOff'} restarts={i % 5}"
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+
+def log_payload(pod: str) -> str:
+    lines = []
+    size = 0
+    i = 0
+    while size < ARGS.payload_bytes:
+        # bursts of repeated lines, as in real crashlooping pods
+        message = "connection refused to db:5432" if (i // 20) % 2 else f"handled request id={i}"
+        line = f"2025-01-01T10:{(i // 60) % 60:02d}:{i % 60:02d}Z {pod} {message}"
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+
+def matrix_payload(query: str) -> str:
+    # each point serializes to roughly 24 bytes
+    points = max(2, ARGS.payload_bytes // 24)
+    now = int(time.time())
+    result = {
+        "resultType": "matrix",
+        "result": [
+            {
+                "metric": {"__name__": query, "pod": "api-0"},
+                "values": [[now - (points - i) * 15, f"{RNG.random():.4f}"] for i in range(points)],
+            }
+        ],
+    }
+    return json.dumps(result)
+
+
+if ARGS.profile == "kubernetes":
+
+    @mcp.tool()
+    async def kubectl_get(resourceType: str, namespace: str = "default", name: str = "") -> str:
+        """Get or list Kubernetes resources."""
+        await simulate_latency()
+        return text_payload(f"{resourceType}/{name or '*'} ns={namespace}")
+
+    @mcp.tool()
+    async def kubectl_describe(resourceType: str, name: str, namespace: str = "default") -> str:
+        """Describe a Kubernetes resource."""
+        await simulate_latency()
+        return text_payload(f"describe {resourceType}/{name} ns={namespace}")
+
+    @mcp.tool()
+    async def kubectl_logs(name: str, namespace: str = "default") -> str:
+        """Get the logs of a pod."""
+        await simulate_latency()
+        return log_payload(name)
+
+    @mcp.tool()
+    async def kubectl_delete(resourceType: str, name: str, namespace: str = "default") -> str:
+        """Delete a Kubernetes resource."""
+        await simulate_latency()
+        return f"{resourceType}/{name} deleted"
+
+elif ARGS.profile == "prometheus":
+
+    @mcp.tool()
+    async def execute_query(query: str) -> str:
+        """Execute an instant PromQL query."""
+        await simulate_latency()
+        return json.dumps({"resultType": "vector", "result": [{"metric": {"__name__": query}, "value": [time.time(), "1"]}]})
+
+    @mcp.tool()
+    async def execute_range_query(query: str, start: str = "", end: str = "", step: str = "15s") -> str:
+        """Execute a PromQL range query."""
+        await simulate_latency()
+        return matrix_payload(query)
+
+    @mcp.tool()
+    async def list_metrics() -> str:
+        """List available metric names."""
+        await simulate_latency()
+        return text_payload("metric")
+
+else:
+
+    @mcp.tool()
+    async def get_current_time(timezone: str = "UTC") -> Dict[str, Any]:
+        """Get the current time in a timezone."""
+        await simulate_latency()
+        return {"timezone": timezone, "datetime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,284 @@
+"""
+Fake OpenAI chat-completions endpoint for offline benchmarks.
+
+Plays a scripted investigation: for each scripted turn it answers with the
+listed tool calls (emitted in parallel within a turn), then streams a final
+answer token by token. Requests that do not set parallel_tool_calls get one
+call per turn, as a model chaining its calls would make. Latencies are configurable so model-side time can be
+held constant while the rest of the pipeline changes.
+
+Provider-side prompt caching is simulated: the longest request prefix (tool
+definitions, then messages) seen before, in 128-token blocks from 1024
+tokens on, is reported as prompt_tokens_details.cached_tokens and can
+shorten the time to first token.
+
+Like a model following the agent's instructions, it skips scripted calls of
+tools whose results the request lists as still fresh ("[ref …] tool(…)"
+lines of a system message).
+
+With --rate-limit-rps it throttles like a deployment over its quota:
+requests beyond the limit within one second get a 429 with Retry-After.
+
+Usage:
+    python bench/fake_openai_server.py --port 8911 \
+        --script "get_current_time;kubectl_get,kubectl_logs;execute_range_query"
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+DEFAULT_SCRIPT = "get_current_time;kubectl_get,kubectl_logs;execute_range_query"
+
+_FRESH_RESULT = re.compile(r"^\[ref [0-9a-f]+\] ([\w.-]+)\(", re.MULTILINE)
+
+
+def parse_script(script: str) -> List[List[str]]:
+    """Turn "a,b;c" into [["a", "b"], ["c"]]."""
+    return [[name.strip() for name in turn.split(",") if name.strip()] for turn in script.split(";") if turn.strip()]
+
+
+class PrefixCache:
+    """Block-wise prefix cache in the manner of provider prompt caching."""
+
+    def __init__(self, block_chars: int = 512, min_chars: int = 4096, max_blocks: int = 200_000):
+        self.block_chars = block_chars
+        self.min_chars = min_chars
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[str, None]" = OrderedDict()
+
+    def lookup_and_store(self, text: str) -> int:
+        """Return how many leading characters of text were cached, then cache all of its blocks."""
+        digest = hashlib.sha1()
+        cached, hit = 0, True
+        for end in range(self.block_chars, len(text) + 1, self.block_chars):
+            digest.update(text[end - self.block_chars:end].encode())
+            key = digest.hexdigest()
+            if hit and key in self._blocks:
+                self._blocks.move_to_end(key)
+                cached = end
+            else:
+                hit = False
+                self._blocks[key] = None
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+        return cached if cached >= self.min_chars else 0
+
+
+class FakeChatCompletions:
+    """Scripted chat-completions backend."""
+
+    def __init__(
+        self,
+        script: List[List[str]],
+        ttft_ms: float = 300.0,
+        token_ms: float = 5.0,
+        answer_tokens: int = 150,
+        usage_prompt_per_char: float = 0.25,
+        cache_ttft_saving: float = 0.0,
+        rate_limit_rps: int = 0,
+    ):
+        self.script = script
+        self.serial_script = [[name] for turn in script for name in turn]
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.answer_tokens = answer_tokens
+        self.usage_prompt_per_char = usage_prompt_per_char
+        self.cache_ttft_saving = cache_ttft_saving
+        self.prefix_cache = PrefixCache()
+        self.requests = 0
+        self.rate_limit_rps = rate_limit_rps
+        self.throttled = 0
+        self._admitted: deque = deque()
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        if self.rate_limit_rps:
+            now = time.monotonic()
+            while self._admitted and now - self._admitted[0] >= 1.0:
+                self._admitted.popleft()
+            if len(self._admitted) >= self.rate_limit_rps:
+                self.throttled += 1
+                retry_ms = max(1, int((1.0 - (now - self._admitted[0])) * 1000))
+                return web.json_response(
+                    {"error": {"code": "429", "message": "Rate limit exceeded"}},
+                    status=429,
+                    headers={"Retry-After": str(max(1, round(retry_ms / 1000))), "retry-after-ms": str(retry_ms)},
+                )
+            self._admitted.append(now)
+        messages = body.get("messages", [])
+        tools = {t["function"]["name"]: t["function"] for t in body.get("tools") or [] if t.get("type") == "function"}
+
+        turn = self._completed_tool_turns(messages)
+        script = self.script if body.get("parallel_tool_calls") else self.serial_script
+        fresh = self._fresh_tools(messages)
+        if fresh:
+            script = [kept for kept in ([name for name in turn if name not in fresh] for turn in script) if kept]
+        calls = self._tool_calls_for(script, turn, tools)
+        prompt = json.dumps(body.get("tools") or []) + json.dumps(messages)
+        prompt_tokens = int(len(prompt) * self.usage_prompt_per_char)
+        cached_tokens = int(self.prefix_cache.lookup_and_store(prompt) * self.usage_prompt_per_char)
+
+        cached_share = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+        await asyncio.sleep(self.ttft_ms * (1.0 - self.cache_ttft_saving * cached_share) / 1000.0)
+        if not body.get("stream"):
+            return web.json_response(self._completion(body, calls, prompt_tokens, cached_tokens))
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        async def send(delta: Dict[str, Any], finish: Optional[str] = None) -> None:
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        if calls:
+            await send({"role": "assistant", "content": None})
+            for index, call in enumerate(calls):
+                await send({"tool_calls": [{"index": index, **call}]})
+            await send({}, "tool_calls")
+            completion_tokens = 20 * len(calls)
+        else:
+            await send({"role": "assistant", "content": ""})
+            for i in range(self.answer_tokens):
+                await send({"content": f"token{i} "})
+                if self.token_ms:
+                    await asyncio.sleep(self.token_ms / 1000.0)
+            await send({}, "stop")
+            completion_tokens = self.answer_tokens
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        final = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": body.get("model", "fake"), "choices": [], "usage": usage}
+        await response.write(f"data: {json.dumps(final)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    @staticmethod
+    def _completed_tool_turns(messages: List[Dict[str, Any]]) -> int:
+        """Count assistant tool-call turns since the last user message."""
+        turns = 0
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                break
+            if message.get("role") == "assistant" and message.get("tool_calls"):
+                turns += 1
+        return turns
+
+    @staticmethod
+    def _fresh_tools(messages: List[Dict[str, Any]]) -> set:
+        """Names of the tools whose results a system message lists as still fresh."""
+        return {
+            name
+            for message in messages
+            if message.get("role") == "system" and isinstance(message.get("content"), str)
+            for name in _FRESH_RESULT.findall(message["content"])
+        }
+
+    def _tool_calls_for(
+        self, script: List[List[str]], turn: int, tools: Dict[str, Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        if turn >= len(script):
+            return []
+        calls = []
+        for name in script[turn]:
+            if name not in tools:
+                continue
+            calls.append({
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(self._arguments(tools[name]))},
+            })
+        return calls
+
+    @staticmethod
+    def _arguments(function: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill the required parameters of a tool schema with plausible values."""
+        schema = function.get("parameters") or {}
+        properties = schema.get("properties") or {}
+        args: Dict[str, Any] = {}
+        for name in schema.get("required") or []:
+            kind = (properties.get(name) or {}).get("type", "string")
+            if kind in ("integer", "number"):
+                args[name] = 1
+            elif kind == "boolean":
+                args[name] = False
+            elif name.lower() in ("resourcetype", "resource_type"):
+                args[name] = "pods"
+            elif name.lower() == "query":
+                args[name] = "rate(container_cpu_usage_seconds_total[5m])"
+            else:
+                args[name] = f"api-{random.randint(0, 2)}"
+        return args
+
+    def _completion(
+        self, body: Dict[str, Any], calls: List[Dict[str, Any]], prompt_tokens: int, cached_tokens: int
+    ) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"role": "assistant", "content": None if calls else "ok"}
+        if calls:
+            message["tool_calls"] = calls
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if calls else "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": 10,
+                "total_tokens": prompt_tokens + 10,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        }
+
+
+def create_app(backend: FakeChatCompletions) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", backend.handle)
+    app.router.add_post("/chat/completions", backend.handle)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="tool calls per turn: ';' between turns, ',' within")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="delay before the first chunk of every response")
+    parser.add_argument("--token-ms", type=float, default=5.0, help="delay between streamed answer tokens")
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--cache-ttft-saving", type=float, default=0.0,
+                        help="fraction of the TTFT saved for a fully cached prompt (scaled by the cached share)")
+    parser.add_argument("--rate-limit-rps", type=int, default=0, help="answer requests beyond this many per second with 429")
+    args = parser.parse_args()
+
+    backend = FakeChatCompletions(
+        parse_script(args.script), args.ttft_ms, args.token_ms, args.answer_tokens,
+        cache_ttft_saving=args.cache_ttft_saving, rate_limit_rps=args.rate_limit_rps,
+    )
+    web.run_app(create_app(backend), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Fake Prometheus HTTP API for offline benchmarks.
+
+Answers /api/v1/query_range (GET or POST) with deterministic values, so
+the same query over the same range always returns the same points and
+results can be compared point by point. Some series exist only in part of
+each hour, as pods come and go. Latency grows with the points returned;
+/stats reports the requests and points served.
+
+Usage:
+    python bench/fake_prometheus_server.py --port 9390 --series 5 --point-us 20
+"""
+
+import argparse
+import asyncio
+import math
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)")
+_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "y": 31536000}
+
+
+def seconds(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if "T" in value:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    parts = _DURATION.findall(value)
+    if not parts:
+        raise ValueError(f"invalid duration '{value}'")
+    return sum(float(n) * _SECONDS[u] for n, u in parts)
+
+
+def format_ts(ts: float) -> Any:
+    return int(ts) if ts == int(ts) else ts
+
+
+class FakePrometheus:
+    def __init__(self, series: int, latency_ms: float, point_us: float) -> None:
+        self.series = series
+        self.latency_ms = latency_ms
+        self.point_us = point_us
+        self.stats = {"requests": 0, "points": 0}
+
+    def value(self, i: int, ts: float) -> str:
+        return f"{math.sin(ts / 600 + i) * 100 + 100:.6f}"
+
+    def present(self, i: int, ts: float) -> bool:
+        # series 0 always exists; the others are missing in one quarter of the hours
+        return i == 0 or (int(ts // 3600) + i) % 4 != 0
+
+    async def query_range(self, request: web.Request) -> web.Response:
+        params: Dict[str, str] = dict(request.query)
+        if request.method == "POST":
+            params.update({k: str(v) for k, v in (await request.post()).items()})
+        try:
+            query = params["query"]
+            start, end, step = seconds(params["start"]), seconds(params["end"]), seconds(params["step"])
+        except (KeyError, ValueError) as exc:
+            return web.json_response({"status": "error", "errorType": "bad_data", "error": str(exc)}, status=400)
+        if "error(" in query:
+            return web.json_response({"status": "error", "errorType": "bad_data", "error": "parse error"}, status=400)
+        if (end - start) / step + 1 > 11000:
+            return web.json_response({"status": "error", "errorType": "bad_data",
+                                      "error": "exceeded maximum resolution of 11,000 points per timeseries"},
+                                     status=400)
+
+        now = time.time()
+        timestamps: List[float] = []
+        k = 0
+        while start + k * step <= min(end, now):
+            timestamps.append(round(start + k * step, 3))
+            k += 1
+        result = []
+        points = 0
+        for i in range(self.series):
+            values = [[format_ts(ts), self.value(i, ts)] for ts in timestamps if self.present(i, ts)]
+            if values:
+                result.append({"metric": {"__name__": "fake", "query": query[:40], "pod": f"pod-{i}"}, "values": values})
+                points += len(values)
+        self.stats["requests"] += 1
+        self.stats["points"] += points
+        await asyncio.sleep((self.latency_ms + points * self.point_us / 1000) / 1000)
+        return web.json_response({"status": "success", "data": {"resultType": "matrix", "result": result}})
+
+    async def query(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        now = time.time()
+        result = [{"metric": {"__name__": "fake", "pod": f"pod-{i}"}, "value": [format_ts(round(now, 3)), self.value(i, now)]}
+                  for i in range(self.series)]
+        return web.json_response({"status": "success", "data": {"resultType": "vector", "result": result}})
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+def create_app(backend: FakePrometheus) -> web.Application:
+    app = web.Application()
+    app.router.add_route("*", "/api/v1/query_range", backend.query_range)
+    app.router.add_route("*", "/api/v1/query", backend.query)
+    app.router.add_get("/stats", backend.get_stats)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9390)
+    parser.add_argument("--series", type=int, default=5, help="series returned by every query")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="fixed latency of every query")
+    parser.add_argument("--point-us", type=float, default=20.0, help="additional latency per point returned")
+    args = parser.parse_args()
+    backend = FakePrometheus(args.series, args.latency_ms, args.point_us)
+    web.run_app(create_app(backend), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
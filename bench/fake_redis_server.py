@@ -0,0 +1,184 @@
+"""
+In-memory Redis-protocol stand-in for offline tests of the session store.
+
+Implements the RESP2 commands used by RedisSessionStorage (strings, lists
+and key expiry) plus a few for inspection. Not a general Redis replacement.
+
+Usage:
+    python bench/fake_redis_server.py --port 6390
+    SESSION_STORE=redis SESSION_STORE_URL=redis://127.0.0.1:6390/0 chainlit run src/chat.py
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import time
+from typing import Any, Dict, List, Optional, Union
+
+Value = Union[bytes, List[bytes]]
+
+
+class FakeRedis:
+    """Keyspace with lazy expiry, shared by all connections (single database)."""
+
+    def __init__(self) -> None:
+        self.data: Dict[bytes, Value] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.commands = 0
+
+    def _alive(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _list(self, key: bytes) -> List[bytes]:
+        value = self.data.get(key) if self._alive(key) else None
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def execute(self, args: List[bytes]) -> Any:
+        self.commands += 1
+        name = args[0].upper().decode()
+        rest = args[1:]
+        if name in ("PING",):
+            return "PONG"
+        if name in ("AUTH", "SELECT", "CLIENT"):
+            return "OK"
+        if name == "GET":
+            value = self.data.get(rest[0]) if self._alive(rest[0]) else None
+            if isinstance(value, list):
+                raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+            return value
+        if name == "SET":
+            key, value = rest[0], rest[1]
+            self.data[key] = value
+            self.expires.pop(key, None)
+            options = [o.upper() for o in rest[2:]]
+            if b"EX" in options:
+                self.expires[key] = time.monotonic() + int(rest[2 + options.index(b"EX") + 1])
+            return "OK"
+        if name == "DEL":
+            removed = 0
+            for key in rest:
+                if self._alive(key):
+                    removed += 1
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if name == "EXISTS":
+            return sum(1 for key in rest if self._alive(key))
+        if name == "RPUSH":
+            items = self._list(rest[0])
+            items.extend(rest[1:])
+            self.data[rest[0]] = items
+            return len(items)
+        if name == "LRANGE":
+            items = self._list(rest[0])
+            start, stop = int(rest[1]), int(rest[2])
+            stop = len(items) if stop == -1 else stop + 1
+            return items[start:stop]
+        if name == "LTRIM":
+            items = self._list(rest[0])
+            start, stop = int(rest[1]), int(rest[2])
+            stop = len(items) if stop == -1 else stop + 1
+            del items[stop:]
+            del items[:start]
+            if not items:
+                self.data.pop(rest[0], None)
+            return "OK"
+        if name == "LLEN":
+            return len(self._list(rest[0]))
+        if name == "EXPIRE":
+            if not self._alive(rest[0]):
+                return 0
+            self.expires[rest[0]] = time.monotonic() + int(rest[1])
+            return 1
+        if name == "TTL":
+            if not self._alive(rest[0]):
+                return -2
+            deadline = self.expires.get(rest[0])
+            return -1 if deadline is None else int(deadline - time.monotonic())
+        if name == "KEYS":
+            pattern = rest[0].decode()
+            return [key for key in list(self.data) if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+        if name == "DBSIZE":
+            return sum(1 for key in list(self.data) if self._alive(key))
+        if name == "FLUSHDB":
+            self.data.clear()
+            self.expires.clear()
+            return "OK"
+        raise ValueError(f"ERR unknown command '{name}'")
+
+
+def encode(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()  # inline command, e.g. from telnet
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def serve(host: str, port: int, backend: Optional[FakeRedis] = None) -> asyncio.AbstractServer:
+    """Start the stand-in and return the asyncio server."""
+    backend = backend or FakeRedis()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                try:
+                    reply = backend.execute(args)
+                except Exception as exc:  # reported to the client, as Redis does
+                    reply = exc if str(exc).startswith(("ERR", "WRONGTYPE")) else Exception(f"ERR {exc}")
+                writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        server = await serve(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark of per-cluster MCP backends and the fan-out tool.
+
+Runs an MCPServerProviderImpl whose "kubernetes" server is a template over
+N clusters, each backed by bench/fake_mcp_server.py, plus one slow cluster.
+Reports how many server processes run after startup (only the default
+cluster's), the latency of one fan-out over every cluster while their
+servers are started lazily and once they are warm, against calling the
+clusters one by one, that a fan-out including the slow cluster returns at
+its deadline, and that idle clusters are reaped and come back on the next
+call.
+
+Usage:
+    python bench/fleet_bench.py --clusters 12 --latency-ms 100 --idle-timeout 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+from cluster_fleet_tools import ClusterFanout  # noqa: E402
+from mcp_server_provider_impl import MCPServerProviderImpl  # noqa: E402
+
+FAKE_SERVER = str(BENCH_DIR / "fake_mcp_server.py")
+TOOL = "kubectl_get"
+ARGUMENTS = {"resourceType": "pods", "namespace": "kube-system"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clusters", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--slow-ms", type=float, default=5000.0, help="latency of the slow cluster")
+    parser.add_argument("--deadline", type=float, default=1.5, help="fan-out deadline when the slow cluster is included")
+    parser.add_argument("--idle-timeout", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report to this file")
+    return parser.parse_args()
+
+
+def build_config(args: argparse.Namespace) -> Dict[str, Any]:
+    clusters: Dict[str, Any] = {f"cluster-{i:02d}": {"latencyMs": args.latency_ms} for i in range(args.clusters)}
+    clusters["slow-00"] = {"latencyMs": args.slow_ms}
+    return {
+        "mcpServers": {
+            "time": {"command": sys.executable, "args": [FAKE_SERVER, "--profile", "time", "--latency-ms", "1"]},
+        },
+        "clusters": clusters,
+        "clusterServers": {
+            "kubernetes": {
+                "command": sys.executable,
+                "args": [FAKE_SERVER, "--profile", "kubernetes", "--latency-ms", "${latencyMs}", "--jitter-ms", "0"],
+            },
+        },
+        "clusterIdleTimeout": args.idle_timeout,
+    }
+
+
+def kubernetes_processes() -> int:
+    out = subprocess.run(
+        ["pgrep", "-P", str(os.getpid()), "-f", "profile kubernetes"], capture_output=True, text=True
+    ).stdout
+    return len(out.split())
+
+
+def summary(text: str) -> str:
+    return text.splitlines()[0]
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+    started = time.perf_counter()
+    async with MCPServerProviderImpl(build_config(args), startup_timeout=30) as provider:
+        report["startup_seconds"] = round(time.perf_counter() - started, 2)
+        report["processes_after_startup"] = kubernetes_processes()
+        fleet = provider.get_cluster_fleet()
+        server = provider.get_server("kubernetes")
+        fanout = ClusterFanout(
+            fleet, {"kubernetes": server}, provider.get_tool_catalog(), concurrency=args.concurrency, timeout=60
+        )
+
+        for phase in ("cold", "warm"):
+            started = time.perf_counter()
+            text = await fanout.run(TOOL, ARGUMENTS, "cluster-*")
+            report[f"fanout_{phase}"] = {"seconds": round(time.perf_counter() - started, 3), "summary": summary(text)}
+        report["processes_after_fanout"] = kubernetes_processes()
+
+        started = time.perf_counter()
+        for cluster in fleet.select("cluster-*"):
+            await server.call_tool(TOOL, {**ARGUMENTS, "cluster": cluster})
+        report["sequential_warm_seconds"] = round(time.perf_counter() - started, 3)
+
+        await fleet.connect("slow-00", "kubernetes")
+        started = time.perf_counter()
+        text = await fanout.run(TOOL, ARGUMENTS, "", timeout=args.deadline)
+        report["fanout_with_slow_cluster"] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "deadline": args.deadline,
+            "summary": summary(text),
+        }
+
+        await asyncio.sleep(args.idle_timeout + max(0.5, args.idle_timeout / 4) + 0.5)
+        report["processes_after_idle"] = kubernetes_processes()
+        report["active_after_idle"] = fleet.get_status()["active"]
+
+        started = time.perf_counter()
+        result = await server.call_tool(TOOL, {**ARGUMENTS, "cluster": "cluster-03"})
+        report["respawn_call"] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "ok": not result.isError,
+            "starts": fleet.get_status()["clusters"]["cluster-03"]["kubernetes"]["starts"],
+        }
+    report["processes_after_exit"] = kubernetes_processes()
+    return report
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Offline load test for the Kubernetes AI Operations Agent.
+
+Starts the fake chat-completions server and the stub MCP servers, then
+drives N concurrent simulated chat sessions through run_message, the
+per-message run loop chat.py's on_message uses (session manager history,
+model routing and the routed run, coalesced token streaming into a
+simulated UI send)
+and reports throughput, TTFT and end-to-end latency percentiles per route,
+escalations, UI sends, event-loop lag and peak RSS. Needs no network access.
+
+Usage:
+    python bench/load_test.py --sessions 20 --messages 3
+    python bench/load_test.py --sessions 50 --mcp-latency-ms 100 --payload-bytes 50000 --json out.json
+    python bench/load_test.py --sessions 50 --llm-token-ms 2 --stream-interval-ms 0   # one send per delta
+    python bench/load_test.py --sessions 20 --serial-tools   # one tool call per model turn
+    AGENT_FAST_MODEL=small python bench/load_test.py --sessions 20   # route lookups to a fast model
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+QUESTIONS = [
+    "Why is my pod api-0 crashlooping?",
+    "What was its CPU usage over the last hour?",
+    "Are there other pods in the namespace with the same problem?",
+    "Summarize what you found.",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated chat sessions")
+    parser.add_argument("--messages", type=int, default=2, help="user messages per session")
+    parser.add_argument("--ramp-s", type=float, default=0.0, help="spread session starts over this many seconds")
+    parser.add_argument("--script", default=None, help="tool-call script for the fake model (see fake_openai_server.py)")
+    parser.add_argument("--llm-ttft-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-ms", type=float, default=5.0)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--cache-ttft-saving", type=float, default=0.0,
+                        help="TTFT fraction the fake model saves on a fully cached prompt")
+    parser.add_argument("--llm-rate-limit-rps", type=int, default=0,
+                        help="the fake model answers requests beyond this many per second with 429")
+    parser.add_argument("--serial-tools", action="store_true",
+                        help="disable parallel tool calls (AGENT_PARALLEL_TOOL_CALLS=false) for comparison")
+    parser.add_argument("--mcp-latency-ms", type=float, default=50.0)
+    parser.add_argument("--payload-bytes", type=int, default=4096)
+    parser.add_argument("--pool-size", type=int, default=None, help="overrides MCP_POOL_SIZE for the stub servers")
+    parser.add_argument("--stream-interval-ms", type=float, default=None,
+                        help="overrides STREAM_FLUSH_INTERVAL_MS; 0 sends every delta to the UI")
+    parser.add_argument("--ui-send-us", type=float, default=100.0,
+                        help="CPU time of one simulated UI send (websocket serialization and write)")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report to this file")
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"fake OpenAI server did not listen on port {port}")
+            await asyncio.sleep(0.05)
+
+
+def stub_mcp_config(args: argparse.Namespace) -> Dict[str, Any]:
+    def server(profile: str) -> Dict[str, Any]:
+        spec: Dict[str, Any] = {
+            "command": sys.executable,
+            "args": [
+                str(BENCH_DIR / "fake_mcp_server.py"),
+                "--profile", profile,
+                "--latency-ms", str(args.mcp_latency_ms),
+                "--payload-bytes", str(args.payload_bytes),
+            ],
+        }
+        if args.pool_size is not None:
+            spec["poolSize"] = args.pool_size
+        return spec
+
+    cache = {"defaultTtl": float(os.getenv("MCP_TOOL_CACHE_TTL", "10"))}
+    return {
+        "mcpServers": {
+            "kubernetes": {**server("kubernetes"), "cache": cache},
+            "prometheus": {**server("prometheus"), "cache": cache},
+            "time": server("time"),
+        }
+    }
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def probe_loop_lag(lags: List[float], interval: float = 0.005) -> None:
+    """Record how late a periodic sleep wakes up, i.e. how busy the event loop is."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+
+async def simulate_session(router: Any, session_id: int, args: argparse.Namespace, samples: List[Dict[str, Any]]) -> None:
+    """Drive one session through chat.py's per-message run loop, with a simulated UI send."""
+    from chainlit_session_manager import ChainlitSessionManager
+    from interfaces import SessionStorage
+    from message_run import run_message
+
+    class DictSessionStorage(SessionStorage[Any]):
+        def __init__(self) -> None:
+            self._data: Dict[str, Any] = {}
+
+        def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+            return self._data.get(key, default)
+
+        def set(self, key: str, value: Any) -> None:
+            self._data[key] = value
+
+    async def ui_send(text: str) -> None:
+        # stands in for msg.stream_token: a synchronous emit on the event loop
+        deadline = time.perf_counter() + args.ui_send_us / 1e6
+        while time.perf_counter() < deadline:
+            pass
+
+    session_manager = ChainlitSessionManager(DictSessionStorage())
+    stream_interval = None if args.stream_interval_ms is None else args.stream_interval_ms / 1000.0
+    await asyncio.sleep(args.ramp_s * session_id / max(1, args.sessions))
+
+    for i in range(args.messages):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        started = time.perf_counter()
+        result: Dict[str, Any] = {}
+        error: Optional[str] = None
+        try:
+            # recorded like chat.py's runs when RUN_TRACE_DIR is set, e.g. to try bench/replay.py
+            result = await run_message(
+                router, session_manager, question, ui_send,
+                session_id=f"load-{session_id}", stream_interval=stream_interval,
+            )
+        except Exception as exc:  # recorded, not raised – a load test keeps going
+            error = f"{type(exc).__name__}: {exc}"
+        finished = time.perf_counter()
+        usage = result.get("usage")
+        samples.append({
+            "session": session_id,
+            "message": i,
+            "ttft": result.get("ttft"),
+            "e2e": finished - started,
+            "tool_calls": result.get("tool_calls", 0),
+            "deltas": result.get("deltas", 0),
+            "ui_sends": result.get("sends", 0),
+            "route": result.get("route"),
+            "escalation": result.get("escalation"),
+            "llm_requests": getattr(usage, "requests", None),
+            "input_tokens": getattr(usage, "input_tokens", None),
+            "cached_tokens": getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", None),
+            "tool_output_refs": session_manager.get_tool_output_stats()["refs"],
+            "error": error,
+        })
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    port = free_port()
+    server_cmd = [
+        sys.executable, str(BENCH_DIR / "fake_openai_server.py"),
+        "--port", str(port),
+        "--ttft-ms", str(args.llm_ttft_ms),
+        "--token-ms", str(args.llm_token_ms),
+        "--answer-tokens", str(args.answer_tokens),
+        "--cache-ttft-saving", str(args.cache_ttft_saving),
+        "--rate-limit-rps", str(args.llm_rate_limit_rps),
+    ]
+    if args.script:
+        server_cmd += ["--script", args.script]
+    llm_server = subprocess.Popen(server_cmd)
+    try:
+        await wait_for_port(port)
+
+        # the agent provider configures the SDK from the environment when it starts
+        os.environ.update({
+            "OPENAI_PROVIDER": "openai",
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        })
+        if args.serial_tools:
+            os.environ["AGENT_PARALLEL_TOOL_CALLS"] = "false"
+        from kubernetes_ai_ops_agent_provider import KubernetesAIOpsAgentProvider
+        from metrics import LLM_HTTP_RETRIES, LLM_RATE_LIMIT_WAIT
+
+        provider = KubernetesAIOpsAgentProvider(mcp_config=stub_mcp_config(args))
+        startup_started = time.perf_counter()
+        async with provider:
+            startup_seconds = time.perf_counter() - startup_started
+            # after the provider enabled the SDK's verbose logging
+            logging.getLogger("openai.agents").setLevel(logging.WARNING)
+            samples: List[Dict[str, Any]] = []
+            lags: List[float] = []
+            probe = asyncio.create_task(probe_loop_lag(lags))
+            started = time.perf_counter()
+            await asyncio.gather(*(simulate_session(provider.get_router(), s, args, samples) for s in range(args.sessions)))
+            wall = time.perf_counter() - started
+            probe.cancel()
+            mcp_stats = provider.get_mcp_provider().get_stats()
+    finally:
+        llm_server.terminate()
+        llm_server.wait()
+
+    ok = [s for s in samples if s["error"] is None]
+    ttft = [s["ttft"] for s in ok if s["ttft"] is not None]
+    e2e = [s["e2e"] for s in ok]
+    followups = [s for s in ok if s["message"] > 0]
+    return {
+        "sessions": args.sessions,
+        "messages": len(samples),
+        "errors": len(samples) - len(ok),
+        "first_errors": sorted({s["error"] for s in samples if s["error"]})[:3],
+        "startup_seconds": startup_seconds,
+        "wall_seconds": wall,
+        "throughput_msgs_per_s": len(ok) / wall if wall else 0.0,
+        "ttft": {f"p{p}": percentile(ttft, p) for p in (50, 95, 99)},
+        "e2e": {f"p{p}": percentile(e2e, p) for p in (50, 95, 99)},
+        "routes": {
+            route: {
+                "messages": len(routed),
+                "e2e_p50": percentile([s["e2e"] for s in routed], 50),
+                "escalations": sum(1 for s in routed if s["escalation"]),
+            }
+            for route in sorted({s["route"] for s in ok})
+            for routed in [[s for s in ok if s["route"] == route]]
+        },
+        "mean_tool_calls": statistics.mean(s["tool_calls"] for s in ok) if ok else 0.0,
+        "mean_llm_requests": statistics.mean(s["llm_requests"] or 0 for s in ok) if ok else 0.0,
+        "mean_deltas": statistics.mean(s["deltas"] for s in ok) if ok else 0.0,
+        "mean_ui_sends": statistics.mean(s["ui_sends"] for s in ok) if ok else 0.0,
+        # follow-ups are where fresh tool results and output references apply
+        "mean_followup_input_tokens": (
+            statistics.mean(s["input_tokens"] or 0 for s in followups) if followups else None
+        ),
+        "tool_output_refs": sum(s["tool_output_refs"] for s in ok if s["message"] == args.messages - 1),
+        "prompt_cache_hit_rate": (
+            sum(s["cached_tokens"] or 0 for s in ok) / max(1, sum(s["input_tokens"] or 0 for s in ok))
+        ),
+        "loop_lag": {f"p{p}": percentile(lags, p) for p in (50, 99)},
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "llm_http_retries": _metric_total(LLM_HTTP_RETRIES),
+        "llm_rate_limit_wait_seconds": _metric_total(LLM_RATE_LIMIT_WAIT, "_sum"),
+        "mcp_pool_wait_seconds": {name: stats["wait_seconds"]["sum"] for name, stats in mcp_stats.items()},
+    }
+
+
+def _metric_total(metric: Any, suffix: str = "_total") -> float:
+    return sum(s.value for family in metric.collect() for s in family.samples if s.name.endswith(suffix))
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    def ms(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value * 1000:8.1f} ms"
+
+    print(f"sessions          {report['sessions']}")
+    print(f"messages          {report['messages']} ({report['errors']} errors)")
+    for error in report["first_errors"]:
+        print(f"  error: {error}")
+    print(f"startup           {report['startup_seconds']:.2f} s")
+    print(f"wall time         {report['wall_seconds']:.2f} s")
+    print(f"throughput        {report['throughput_msgs_per_s']:.2f} msg/s")
+    for metric in ("ttft", "e2e"):
+        values = report[metric]
+        print(f"{metric:<17} p50 {ms(values['p50'])}  p95 {ms(values['p95'])}  p99 {ms(values['p99'])}")
+    for route, stats in report["routes"].items():
+        print(f"route {route:<11} {stats['messages']} msgs, e2e p50 {ms(stats['e2e_p50'])}, {stats['escalations']} escalated to it")
+    print(f"tool calls / msg  {report['mean_tool_calls']:.2f}")
+    print(f"LLM calls / msg   {report['mean_llm_requests']:.2f}")
+    if report["mean_followup_input_tokens"] is not None:
+        print(f"follow-up input   {report['mean_followup_input_tokens']:.0f} tokens / msg, "
+              f"{report['tool_output_refs']} repeated tool outputs sent as refs")
+    print(f"prompt cache      {report['prompt_cache_hit_rate'] * 100:.1f}% of input tokens cached")
+    print(f"LLM HTTP retries  {report['llm_http_retries']:.0f}, "
+          f"{report['llm_rate_limit_wait_seconds']:.2f} s waited in the client-side rate limiter")
+    print(f"UI sends / msg    {report['mean_ui_sends']:.1f} ({report['mean_deltas']:.1f} deltas)")
+    print(f"event loop lag    p50 {ms(report['loop_lag']['p50'])}  p99 {ms(report['loop_lag']['p99'])}")
+    print(f"peak RSS          {report['peak_rss_mb']:.1f} MiB (largest child {report['peak_child_rss_mb']:.1f} MiB)")
+    for name, waited in report["mcp_pool_wait_seconds"].items():
+        print(f"pool wait         {name}: {waited:.3f} s total")
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
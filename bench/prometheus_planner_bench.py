@@ -0,0 +1,157 @@
+"""
+Benchmark of the Prometheus query planner against a fake Prometheus.
+
+Starts bench/fake_prometheus_server.py and a PrometheusQueryProxy in front
+of it, then plays rounds of overlapping range queries as an investigation
+would make them (the last hour, six hours, a day, each ending now). Every
+planner result is checked point by point against the same step-aligned
+query sent straight to the fake server, and the report compares the
+points fetched from Prometheus and the query latency with and without the
+planner.
+
+Usage:
+    python bench/prometheus_planner_bench.py --rounds 5 --interval 2
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from load_test import free_port  # noqa: E402
+from prometheus_query_planner import PrometheusQueryPlanner, PrometheusQueryProxy, RangeBlockCache  # noqa: E402
+
+# (range seconds, step seconds) of each query of a round
+WINDOWS: List[Tuple[int, int]] = [(3600, 15), (6 * 3600, 60), (24 * 3600, 300), (3600, 15)]
+QUERIES = [
+    'sum(rate(container_cpu_usage_seconds_total{namespace="prod"}[5m])) by (pod)',
+    'sum(container_memory_working_set_bytes{namespace="prod"}) by (pod)',
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between rounds")
+    parser.add_argument("--series", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--point-us", type=float, default=20.0)
+    parser.add_argument("--block-points", type=int, default=240)
+    parser.add_argument("--settle-seconds", type=float, default=60.0)
+    parser.add_argument("--cache-max-points", type=int, default=250_000)
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report to this file")
+    return parser.parse_args()
+
+
+async def query_range(session: aiohttp.ClientSession, base_url: str, query: str, start: float, end: float,
+                      step: int) -> Tuple[float, Dict[str, Any]]:
+    started = time.perf_counter()
+    params = {"query": query, "start": str(start), "end": str(end), "step": f"{step}s"}
+    async with session.get(f"{base_url}/api/v1/query_range", params=params) as response:
+        payload = await response.json()
+    return time.perf_counter() - started, payload
+
+
+def points(payload: Dict[str, Any]) -> int:
+    return sum(len(series["values"]) for series in payload.get("data", {}).get("result", []))
+
+
+def canonical(payload: Dict[str, Any]) -> List[Any]:
+    return sorted((json.dumps(s["metric"], sort_keys=True), s["values"]) for s in payload["data"]["result"])
+
+
+async def run(args: argparse.Namespace, upstream: str) -> Dict[str, Any]:
+    planner = PrometheusQueryPlanner(
+        upstream, cache=RangeBlockCache(args.cache_max_points), block_points=args.block_points, settle_seconds=args.settle_seconds,
+    )
+    planned: List[float] = []
+    direct: List[float] = []
+    direct_points = 0
+    mismatches = 0
+    async with PrometheusQueryProxy(planner) as proxy, aiohttp.ClientSession() as session:
+        for round_index in range(args.rounds):
+            if round_index:
+                await asyncio.sleep(args.interval)
+            for query in QUERIES:
+                for span, step in WINDOWS:
+                    end = time.time()
+                    start = end - span
+                    seconds, via_planner = await query_range(session, proxy.url, query, start, end, step)
+                    planned.append(seconds)
+                    # what the planner answers: the range aligned to the step
+                    aligned = (math.floor(start / step) * step, math.floor(end / step) * step)
+                    seconds, upstream_payload = await query_range(session, upstream, query, *aligned, step)
+                    direct.append(seconds)
+                    direct_points += points(upstream_payload)
+                    if canonical(via_planner) != canonical(upstream_payload):
+                        mismatches += 1
+
+        async with session.get(f"{proxy.url}/api/v1/query", params={"query": "up"}) as response:
+            passthrough_ok = response.status == 200 and (await response.json())["status"] == "success"
+        async with session.get(
+            f"{proxy.url}/api/v1/query_range", params={"query": "error(", "start": "0", "end": "60", "step": "15"}
+        ) as response:
+            error_passed = response.status == 400
+
+    stats = planner.get_stats()
+    return {
+        "queries": len(planned),
+        "mismatches": mismatches,
+        "passthrough_ok": passthrough_ok,
+        "error_passed_through": error_passed,
+        "upstream_points": {"direct": direct_points, "planner": stats["upstream_points"]},
+        "upstream_requests": {"direct": len(direct), "planner": stats["upstream_requests"]},
+        "latency_ms": {
+            "direct_p50": round(statistics.median(direct) * 1000, 1),
+            "planner_p50": round(statistics.median(planned) * 1000, 1),
+            "direct_total": round(sum(direct) * 1000, 1),
+            "planner_total": round(sum(planned) * 1000, 1),
+        },
+        "cache": {k: stats[k] for k in ("blocks", "points", "evictions")},
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, str(BENCH_DIR / "fake_prometheus_server.py"), "--port", str(port),
+         "--series", str(args.series), "--latency-ms", str(args.latency_ms), "--point-us", str(args.point_us)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    upstream = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                urllib.request.urlopen(f"{upstream}/stats", timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+        report = asyncio.run(run(args, upstream))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(json.dumps(report, indent=2))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
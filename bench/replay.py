@@ -0,0 +1,313 @@
+"""
+Replay recorded agent runs against stub model and MCP backends.
+
+Reads the traces written with RUN_TRACE_DIR and runs every recorded
+conversation again through the same steps as on_message in chat.py. The
+model answers with the recorded responses, streamed with their recorded
+timing, and each MCP server is a replay_mcp_server.py stub answering with
+the recorded outputs after the recorded latency. Everything in between
+(routing, history, tool caching and output processing, the model transport)
+is this build's code, so the replayed latencies of two builds show what the
+build changed. Run it with the environment the runs were recorded with
+(AGENT_FAST_MODEL, ROUTER_* ...), as requests are answered in recorded order.
+
+Usage:
+    python bench/replay.py traces/ --json build-a.json
+    python bench/replay.py traces/ --compare build-a.json
+    python bench/replay.py traces/ --pace recorded --time-scale 0.5
+"""
+
+import argparse
+import asyncio
+import base64
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+# replays are not recorded again
+os.environ.pop("RUN_TRACE_DIR", None)
+
+from load_test import percentile  # noqa: E402
+from run_recorder import read_traces  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("traces", nargs="+", help="trace files or directories")
+    parser.add_argument("--sessions", type=int, default=None, help="replay only the first N sessions")
+    parser.add_argument("--pace", choices=["burst", "recorded"], default="burst",
+                        help="start every session at once, or each run at its recorded offset")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="factor applied to recorded offsets (--pace recorded)")
+    parser.add_argument("--llm-latency-scale", type=float, default=1.0, help="factor applied to recorded model latency")
+    parser.add_argument("--tool-latency-scale", type=float, default=1.0, help="factor applied to recorded tool latency")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report to this file")
+    parser.add_argument("--compare", default=None, help="report of another build to compare against")
+    return parser.parse_args()
+
+
+class RecordedRun:
+    """The recorded model responses of one run, served in order."""
+
+    def __init__(self, run: Dict[str, Any]) -> None:
+        self.run = run
+        self.responses = [
+            event for event in run["events"] if event["type"] == "llm_response" and 200 <= event["status"] < 300
+        ]
+        self.served = 0
+
+    def next_response(self) -> Optional[Dict[str, Any]]:
+        # a run asking for more than was recorded gets the last (final) answer again
+        self.served += 1
+        if not self.responses:
+            return None
+        return self.responses[min(self.served, len(self.responses)) - 1]
+
+
+_replaying: contextvars.ContextVar[Optional[RecordedRun]] = contextvars.ContextVar("replaying", default=None)
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, event: Dict[str, Any], sent: float, scale: float) -> None:
+        self._event = event
+        self._sent = sent
+        self._scale = scale
+
+    async def __aiter__(self):
+        for ms, text in self._event.get("chunks", []):
+            delay = self._sent + ms / 1000 * self._scale - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield base64.b64decode(text) if self._event.get("base64") else text.encode("utf-8")
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Answer model requests with the recorded responses of the run being replayed."""
+
+    def __init__(self, latency_scale: float = 1.0) -> None:
+        self.latency_scale = latency_scale
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        run = _replaying.get()
+        event = run.next_response() if run is not None else None
+        if event is None:
+            return httpx.Response(500, json={"error": {"message": "no recorded response for this request"}})
+        sent = time.perf_counter()
+        await asyncio.sleep(event.get("ttfb", 0.0) / 1000 * self.latency_scale)
+        return httpx.Response(
+            event["status"], headers=event.get("headers", {}), stream=_ReplayStream(event, sent, self.latency_scale)
+        )
+
+
+def replay_mcp_config(servers: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    cache = {"defaultTtl": float(os.getenv("MCP_TOOL_CACHE_TTL", "10"))}
+    config: Dict[str, Any] = {"mcpServers": {}}
+    for name in servers:
+        spec: Dict[str, Any] = {
+            "command": sys.executable,
+            "args": [
+                str(BENCH_DIR / "replay_mcp_server.py"), "--server", name,
+                "--latency-scale", str(args.tool_latency_scale), "--traces", *args.traces,
+            ],
+        }
+        # as the built-in configuration: every server but the clock is cached
+        if name != "time":
+            spec["cache"] = cache
+        config["mcpServers"][name] = spec
+    return config
+
+
+def _first(run: Dict[str, Any], kind: str) -> Optional[float]:
+    return next((event["t"] / 1000 for event in run["events"] if event["type"] == kind), None)
+
+
+async def replay_session(
+    router: Any, runs: List[Dict[str, Any]], origin: float, first_started: float,
+    args: argparse.Namespace, samples: List[Dict[str, Any]],
+) -> None:
+    """Replay the runs of one conversation in order, as on_message in chat.py would handle them."""
+    from agents import ItemHelpers
+    from openai.types.responses import ResponseTextDeltaEvent
+
+    from chainlit_session_manager import ChainlitSessionManager
+    from interfaces import SessionStorage
+    from token_stream import TokenStreamBuffer
+
+    class DictSessionStorage(SessionStorage[Any]):
+        def __init__(self) -> None:
+            self._data: Dict[str, Any] = {}
+
+        def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+            return self._data.get(key, default)
+
+        def set(self, key: str, value: Any) -> None:
+            self._data[key] = value
+
+    async def ui_send(text: str) -> None:
+        pass
+
+    session_manager = ChainlitSessionManager(DictSessionStorage())
+    for recorded_run in runs:
+        if args.pace == "recorded":
+            delay = origin + (recorded_run["started"] - first_started) * args.time_scale - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        for message in recorded_run.get("history", []):
+            session_manager.add_message(message)
+        session_manager.add_message({"role": "user", "content": recorded_run["message"]})
+        replaying = RecordedRun(recorded_run)
+        _replaying.set(replaying)
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        tool_calls = 0
+        error: Optional[str] = None
+        stream = TokenStreamBuffer.from_env(ui_send)
+        try:
+            decision = await router.route(recorded_run["message"])
+            run = router.start(
+                decision,
+                session_manager.get_model_input(),
+                max_turns=10,
+                begin_run=lambda result: None,
+                input_filter=session_manager.get_input_filter(),
+            )
+            async for event in run.stream_events():
+                if event.type == "raw_response_event":
+                    if isinstance(event.data, ResponseTextDeltaEvent):
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                        await stream.add(event.data.delta)
+                    continue
+                if event.type == "agent_updated_stream_event":
+                    continue
+                if event.item.type == "tool_call_item":
+                    tool_calls += 1
+                    await stream.flush("tool_call")
+                elif event.item.type == "message_output_item":
+                    session_manager.add_message(
+                        {"role": "assistant", "content": ItemHelpers.text_message_output(event.item)}
+                    )
+            await stream.close()
+        except Exception as exc:  # recorded, not raised – the replay keeps going
+            error = f"{type(exc).__name__}: {exc}"
+        samples.append({
+            "run": recorded_run["id"],
+            "e2e": time.perf_counter() - started,
+            "ttft": None if first_token is None else first_token - started,
+            "recorded_e2e": recorded_run["ms"] / 1000,
+            "recorded_ttft": _first(recorded_run, "first_token"),
+            "tool_calls": tool_calls,
+            "recorded_tool_calls": sum(1 for event in recorded_run["events"] if event["type"] == "tool_call"),
+            "llm_requests": replaying.served,
+            "recorded_llm_requests": len(replaying.responses),
+            "error": error,
+        })
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {f"p{p}": percentile(values, p) for p in (50, 95, 99)}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    tools, runs = read_traces(args.traces)
+    if not runs:
+        raise SystemExit("no recorded runs found")
+    sessions: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    for recorded_run in runs:
+        # headless runs have no session; each is a conversation of its own
+        sessions.setdefault(recorded_run["session"] or recorded_run["id"], []).append(recorded_run)
+    selected = list(sessions.values())[: args.sessions]
+
+    os.environ.setdefault("OPENAI_PROVIDER", "openai")
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+    os.environ.setdefault("OPENAI_BASE_URL", "http://replay.invalid/v1")
+    # answered from the recorded responses: one attempt each, no client-side pacing
+    os.environ.update({"CLUSTER_CACHE": "off", "LLM_MAX_RETRIES": "0", "LLM_TPM": "0", "LLM_RPM": "0"})
+    from kubernetes_ai_ops_agent_provider import KubernetesAIOpsAgentProvider
+    from openai_client_factory_impl import OpenAIClientFactoryImpl
+
+    provider = KubernetesAIOpsAgentProvider(
+        mcp_config=replay_mcp_config(sorted(tools), args),
+        client_factory=OpenAIClientFactoryImpl(transport=ReplayTransport(args.llm_latency_scale)),
+    )
+    samples: List[Dict[str, Any]] = []
+    async with provider:
+        logging.getLogger("openai.agents").setLevel(logging.WARNING)
+        origin = time.perf_counter()
+        first_started = min(session_runs[0]["started"] for session_runs in selected)
+        await asyncio.gather(*(
+            replay_session(provider.get_router(), session_runs, origin, first_started, args, samples)
+            for session_runs in selected
+        ))
+        wall = time.perf_counter() - origin
+
+    ok = [s for s in samples if s["error"] is None]
+    return {
+        "sessions": len(selected),
+        "runs": len(samples),
+        "errors": len(samples) - len(ok),
+        "first_errors": sorted({s["error"] for s in samples if s["error"]})[:3],
+        # runs whose replay asked the model more or less often than recorded
+        "diverged": sum(1 for s in ok if s["llm_requests"] != s["recorded_llm_requests"]),
+        "wall_seconds": wall,
+        "recorded": {
+            "e2e": summarize([s["recorded_e2e"] for s in ok]),
+            "ttft": summarize([s["recorded_ttft"] for s in ok if s["recorded_ttft"] is not None]),
+            "tool_calls": sum(s["recorded_tool_calls"] for s in ok),
+        },
+        "replayed": {
+            "e2e": summarize([s["e2e"] for s in ok]),
+            "ttft": summarize([s["ttft"] for s in ok if s["ttft"] is not None]),
+            "tool_calls": sum(s["tool_calls"] for s in ok),
+        },
+        "samples": samples,
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    def ms(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value * 1000:8.1f} ms"
+
+    print(f"sessions          {report['sessions']}")
+    print(f"runs              {report['runs']} ({report['errors']} errors, {report['diverged']} diverged from the trace)")
+    for error in report["first_errors"]:
+        print(f"  error: {error}")
+    print(f"wall time         {report['wall_seconds']:.2f} s")
+    columns = [("recorded", report["recorded"]), ("replayed", report["replayed"])]
+    if baseline is not None:
+        columns.append(("baseline", baseline["replayed"]))
+    for metric in ("ttft", "e2e"):
+        for name, values in columns:
+            stats = values[metric]
+            print(f"{metric:<5} {name:<11} p50 {ms(stats['p50'])}  p95 {ms(stats['p95'])}  p99 {ms(stats['p99'])}")
+    for name, values in columns:
+        print(f"tool calls {name:<6} {values['tool_calls']}")
+    if baseline is not None:
+        for metric in ("ttft", "e2e"):
+            before, after = baseline["replayed"][metric]["p50"], report["replayed"][metric]["p50"]
+            if before and after is not None:
+                print(f"{metric} p50 change vs baseline  {(after - before) / before * 100:+.1f}%")
+
+
+def main() -> None:
+    args = parse_args()
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    report = asyncio.run(run(args))
+    print_report(report, baseline)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Stub MCP stdio server replaying the tool calls of recorded agent runs.
+
+Lists the tools one MCP server had when the runs were recorded (from trace
+files written with RUN_TRACE_DIR) and answers each call with a recorded
+output of the same tool and arguments, after the recorded latency. Calls
+repeating the same tool and arguments get the recorded outputs in order,
+the last one again once they are used up; calls never recorded get an
+error result. Started by bench/replay.py, one per MCP server.
+
+Usage:
+    python bench/replay_mcp_server.py --server kubernetes --traces traces/
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Tuple
+
+import mcp.types as types
+from mcp.server.lowlevel import Server
+from mcp.server.stdio import stdio_server
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from run_recorder import read_traces  # noqa: E402
+
+
+def call_key(tool_name: str, arguments: Any) -> str:
+    return f"{tool_name}({json.dumps(arguments or {}, sort_keys=True, separators=(',', ':'))})"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", required=True, help="logical name of the recorded MCP server")
+    parser.add_argument("--traces", nargs="+", required=True, help="trace files or directories")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="factor applied to recorded latencies")
+    args = parser.parse_args()
+
+    tools, runs = read_traces(args.traces)
+    recorded: Dict[str, Deque[Tuple[Dict[str, Any], float]]] = defaultdict(deque)
+    for run in runs:
+        for event in run["events"]:
+            if event["type"] != "tool" or event.get("server") != args.server:
+                continue
+            if "result" in event:
+                result = event["result"]
+            else:
+                result = {"content": [{"type": "text", "text": event.get("error", "failed")}], "isError": True}
+            recorded[call_key(event["tool"], event.get("arguments"))].append((result, event.get("ms", 0.0)))
+
+    server: Server = Server(f"replay-{args.server}")
+
+    @server.list_tools()
+    async def list_tools() -> list:
+        return [types.Tool.model_validate(tool) for tool in tools.get(args.server, [])]
+
+    @server.call_tool(validate_input=False)
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> types.CallToolResult:
+        key = call_key(name, arguments)
+        outputs = recorded.get(key)
+        if not outputs:
+            return types.CallToolResult(
+                content=[types.TextContent(type="text", text=f"No recorded output for {key}")], isError=True
+            )
+        result, ms = outputs.popleft() if len(outputs) > 1 else outputs[0]
+        await asyncio.sleep(ms / 1000 * args.latency_scale)
+        return types.CallToolResult.model_validate(result)
+
+    async def serve() -> None:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, server.create_initialization_options())
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
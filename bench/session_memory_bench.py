@@ -0,0 +1,150 @@
+"""
+Benchmark of per-session memory accounting and eviction.
+
+Opens N chat sessions with in-process storage, each with a conversation of
+M turns and a few tool steps whose output never arrives, the way sessions
+pile up when clients drop without a clean disconnect. Reports how close the
+sessions' estimated size is to the memory tracemalloc sees them allocate,
+then runs the SessionRegistry with a budget of a fraction of that and
+reports the memory left resident, the sessions spilled, the orphaned tool
+steps expired and that spilled conversations come back unchanged.
+
+Usage:
+    python bench/session_memory_bench.py --sessions 400 --turns 20 --budget-fraction 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+from chainlit_session_manager import ChainlitSessionManager  # noqa: E402
+from interfaces import SessionStorage  # noqa: E402
+from session_registry import SessionRegistry  # noqa: E402
+
+WORDS = "pod node deployment namespace restart crashloop memory cpu limit request event image pull".split()
+
+
+class DictSessionStorage(SessionStorage[Any]):
+    def __init__(self) -> None:
+        self._data: Dict[str, Any] = {}
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        return self._data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = value
+
+
+class FakeStep:
+    """Stands in for a cl.Step whose tool output never arrived."""
+
+    def __init__(self, arguments: str) -> None:
+        self.input = arguments
+        self.output = ""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=400)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--chars", type=int, default=1200, help="characters per assistant message")
+    parser.add_argument("--orphan-steps", type=int, default=3, help="unfinished tool steps per session")
+    parser.add_argument("--budget-fraction", type=float, default=0.25, help="budget as a share of the total")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report to this file")
+    return parser.parse_args()
+
+
+def text(rng: random.Random, chars: int) -> str:
+    words: List[str] = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS) + str(rng.randrange(1000))
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def open_sessions(args: argparse.Namespace) -> Dict[str, ChainlitSessionManager]:
+    rng = random.Random(7)
+    sessions: Dict[str, ChainlitSessionManager] = {}
+    for i in range(args.sessions):
+        manager = ChainlitSessionManager(DictSessionStorage())
+        for _ in range(args.turns):
+            manager.add_message({"role": "user", "content": text(rng, 120)})
+            manager.add_message({"role": "assistant", "content": text(rng, args.chars)})
+        steps = {f"call-{i}-{n}": FakeStep(json.dumps({"namespace": text(rng, 40)})) for n in range(args.orphan_steps)}
+        manager.save_tool_steps(steps)
+        sessions[f"session-{i:05d}"] = manager
+    return sessions
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = open_sessions(args)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    estimated = sum(manager.get_memory_bytes() for manager in sessions.values())
+    report["sessions"] = args.sessions
+    report["allocated_bytes"] = allocated
+    report["estimated_bytes"] = estimated
+    report["estimate_ratio"] = round(estimated / allocated, 2)
+    histories = {session_id: list(m.get_message_history()) for session_id, m in sessions.items()}
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        budget = int(estimated * args.budget_fraction)
+        registry = SessionRegistry(idle_timeout=0, memory_budget=budget, spill_dir=spill_dir, tool_step_ttl=60)
+        for session_id, manager in sessions.items():
+            registry.touch(session_id, manager)
+        report["budget_bytes"] = budget
+
+        started = time.perf_counter()
+        counts = await registry.sweep(now=time.monotonic() + 120)
+        stats = registry.get_stats(top=0)
+        report["sweep"] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            **counts,
+            "resident": stats["resident"],
+            "spilled": stats["spilled"],
+            "resident_bytes": stats["bytes"],
+            "spill_dir_bytes": sum(p.stat().st_size for p in Path(spill_dir).iterdir()),
+        }
+
+        started = time.perf_counter()
+        restored = 0
+        for session_id, manager in sessions.items():
+            if manager.is_unloaded:
+                recovered = await registry.activate(session_id, manager)
+                registry.done(session_id, manager)
+                restored += recovered and manager.get_message_history() == histories[session_id]
+        report["reload"] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "restored_unchanged": restored,
+            "of": stats["spilled"],
+            "spill_files_left": len(list(Path(spill_dir).iterdir())),
+        }
+    return report
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
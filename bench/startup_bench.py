@@ -0,0 +1,132 @@
+"""
+Cold-start benchmark for the Kubernetes AI Operations Agent.
+
+Launches the real app (uvicorn main:app) against the stub MCP servers and
+the fake chat-completions server, polls /readyz until the pod would be
+ready, and reports the time to readiness together with the app's own
+startup profile (/startupz/profile). Repeats the start to smooth out noise,
+optionally comparing the Chainlit mount modes.
+
+Usage:
+    python bench/startup_bench.py --runs 3
+    python bench/startup_bench.py --runs 3 --compare-mounts
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+sys.path.insert(0, str(BENCH_DIR))
+
+from load_test import free_port, stub_mcp_config  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per mode")
+    parser.add_argument("--pool-size", type=int, default=1)
+    parser.add_argument("--mcp-latency-ms", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=1024)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for readiness")
+    parser.add_argument("--compare-mounts", action="store_true",
+                        help="also start with CHAT_UI_MOUNT=import (Chainlit mounted at import time)")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report to this file")
+    return parser.parse_args()
+
+
+def get_json(url: str) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return None
+
+
+def cold_start(env: Dict[str, str], timeout: float) -> Dict[str, Any]:
+    port = free_port()
+    started = time.perf_counter()
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready = None
+        while time.perf_counter() - started < timeout and app.poll() is None:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=1) as response:
+                    if response.status == 200:
+                        ready = time.perf_counter() - started
+                        break
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            time.sleep(0.02)
+        if ready is None:
+            raise RuntimeError(f"app not ready after {timeout:.0f}s (exit code {app.poll()})")
+        profile = get_json(f"http://127.0.0.1:{port}/startupz/profile") or {}
+        return {"ready_seconds": ready, "profile": profile}
+    finally:
+        app.terminate()
+        try:
+            app.wait(10)
+        except subprocess.TimeoutExpired:
+            app.kill()
+
+
+def main() -> None:
+    args = parse_args()
+    llm_port = free_port()
+    llm_server = subprocess.Popen(
+        [sys.executable, str(BENCH_DIR / "fake_openai_server.py"), "--port", str(llm_port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as config_file:
+        json.dump(stub_mcp_config(args), config_file)
+    base_env = {
+        **os.environ,
+        "OPENAI_PROVIDER": "openai",
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "MCP_CONFIG_FILE": config_file.name,
+        "CLUSTER_CACHE": "off",
+        "SESSION_STORE": "memory",
+    }
+
+    report: Dict[str, Any] = {}
+    try:
+        modes = ["lazy", "import"] if args.compare_mounts else ["lazy"]
+        for mode in modes:
+            env = {**base_env, "CHAT_UI_MOUNT": mode}
+            runs: List[Dict[str, Any]] = [cold_start(env, args.timeout) for _ in range(args.runs)]
+            last = runs[-1]["profile"]
+            report[mode] = {
+                "ready_seconds": [run["ready_seconds"] for run in runs],
+                "ready_median_seconds": statistics.median(run["ready_seconds"] for run in runs),
+                "phases": {phase["phase"]: round(phase["seconds"], 3) for phase in last.get("phases", [])},
+                "slowest_imports": [
+                    {"module": entry["module"], "seconds": round(entry["seconds"], 3), "thread": entry["thread"]}
+                    for entry in sorted(last.get("imports", []), key=lambda e: e["seconds"], reverse=True)[:8]
+                ],
+            }
+    finally:
+        llm_server.terminate()
+        llm_server.wait()
+        os.unlink(config_file.name)
+
+    print(json.dumps(report, indent=2))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Per-turn tool resolution benchmark for the Kubernetes AI Operations Agent.
+
+Starts the stub MCP servers through MCPServerProviderImpl and times what the
+agents SDK does at the start of every turn to find the agent's tools
+(Agent.get_all_tools), once with a plain Agent that lists every MCP server
+and converts the schemas each time, and once with the CatalogAgent serving
+prebuilt tools. Reports per-turn latency and the saving over a 10-turn run.
+
+Usage:
+    python bench/tool_catalog_bench.py --turns 200
+    python bench/tool_catalog_bench.py --turns 200 --concurrency 8 --strict
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200, help="turns timed per variant")
+    parser.add_argument("--concurrency", type=int, default=1, help="runs resolving their tools at the same time")
+    parser.add_argument("--pool-size", type=int, default=1)
+    parser.add_argument("--strict", action="store_true", help="convert schemas to strict mode, as some models need")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report to this file")
+    return parser.parse_args()
+
+
+def stub_mcp_config(args: argparse.Namespace) -> Dict[str, Any]:
+    def server(profile: str) -> Dict[str, Any]:
+        return {
+            "command": sys.executable,
+            "args": [str(BENCH_DIR / "fake_mcp_server.py"), "--profile", profile],
+            "poolSize": args.pool_size,
+        }
+
+    return {"mcpServers": {name: server(name) for name in ("kubernetes", "prometheus", "time")}}
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+    }
+
+
+async def time_turns(agent: Any, args: argparse.Namespace) -> List[float]:
+    from agents import RunContextWrapper
+
+    samples: List[float] = []
+
+    async def worker(turns: int) -> None:
+        context = RunContextWrapper(context=None)
+        for _ in range(turns):
+            started = time.perf_counter()
+            await agent.get_all_tools(context)
+            samples.append(time.perf_counter() - started)
+
+    per_worker = max(1, args.turns // args.concurrency)
+    await asyncio.gather(*(worker(per_worker) for _ in range(args.concurrency)))
+    return samples
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from agents import Agent, RunContextWrapper
+
+    from mcp_server_provider_impl import MCPServerProviderImpl
+    from mcp_tool_catalog import CatalogAgent, MCPToolCatalog
+
+    catalog = MCPToolCatalog(convert_schemas_to_strict=args.strict)
+    async with MCPServerProviderImpl(stub_mcp_config(args), tool_catalog=catalog) as provider:
+        mcp_config = {"convert_schemas_to_strict": args.strict}
+        plain = Agent(name="plain", mcp_servers=provider.get_servers(), mcp_config=mcp_config)
+        cataloged = CatalogAgent(
+            name="cataloged", mcp_servers=provider.get_servers(), mcp_config=mcp_config, tool_catalog=catalog
+        )
+        tools = len(await cataloged.get_all_tools(RunContextWrapper(context=None)))
+
+        report: Dict[str, Any] = {"tools": tools, "concurrency": args.concurrency, "strict": args.strict}
+        for label, agent in (("per_turn_list_tools", plain), ("catalog", cataloged)):
+            await time_turns(agent, argparse.Namespace(turns=10, concurrency=1))  # warm up
+            report[label] = summarize(await time_turns(agent, args))
+        saved = report["per_turn_list_tools"]["mean_ms"] - report["catalog"]["mean_ms"]
+        report["saved_per_turn_ms"] = saved
+        report["saved_per_10_turn_run_ms"] = saved * 10
+        return report
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,58 @@
 Session Manager for Kubernetes Operations Agent.
 
 Provides a ChainlitSessionManager class that handles session-specific data,
-with application-level agent lifecycle.
+with application-level agent lifecycle, and an estimate of the memory that
+data holds.
 """
 
-from typing import Any, Dict, List, TypeVar
+import time
+from typing import Any, Dict, List, Optional, TypeVar
 from interfaces import SessionStorage
+from message_history_manager import MessageHistoryManager
+from persistent_session_storage import PersistentSessionStorage
+from run_control import ActiveRun
+from tool_output_store import ToolOutputStore
 
 T = TypeVar('T')
 
+# Keys an external store holds for a session, read when it is loaded
+PERSISTED_KEYS = ("message_history", "history_state", "tool_outputs")
+
+# Rough memory of a cl.Step besides its input and output
+STEP_OVERHEAD_BYTES = 2048
+
+
+def approx_size(value: Any) -> int:
+    """
+    Estimate the bytes held by a JSON-like value: the length of every string
+    plus a fixed cost per object, close to CPython's own sizes without the
+    cost of sys.getsizeof on every object.
+    
+    Args:
+        value: Strings, numbers, None and dicts or lists of them
+        
+    Returns:
+        The approximate size in bytes
+    """
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            size += 49 + len(item)
+        elif isinstance(item, dict):
+            size += 64 + 24 * len(item)
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            size += 56 + 8 * len(item)
+            stack.extend(item)
+        elif isinstance(item, (bytes, bytearray)):
+            size += 33 + len(item)
+        else:
+            size += 28
+    return size
+
 
 class ChainlitSessionManager:
     """
@@ -17,29 +61,113 @@ class ChainlitSessionManager:
     which is managed at the application level.
     """
     
-    def __init__(self, session_storage: SessionStorage[Any]):
+    def __init__(
+        self,
+        session_storage: SessionStorage[Any],
+        history_manager: Optional[MessageHistoryManager] = None,
+        tool_output_store: Optional[ToolOutputStore] = None,
+    ):
         """
         Initialize ChainlitSessionManager with session storage.
         Creates empty collections for session-specific data.
         
         Args:
             session_storage: Implementation of SessionStorage interface
+            history_manager: Token-budgeted history manager; configured from
+                the environment when omitted
+            tool_output_store: Store of the session's tool outputs; configured
+                from the environment when omitted
         """
         self._session_storage = session_storage
-        
-        # Initialize empty collections in storage for session-specific data
-        self._session_storage.set("message_history", [])
+        self._history = history_manager or MessageHistoryManager.from_env()
+        self._tool_outputs = tool_output_store or ToolOutputStore.from_env()
+        self._active_run: Optional[ActiveRun] = None
+        # When each open tool step was created, by tool call ID
+        self._tool_step_started: Dict[str, float] = {}
+        self._unloaded = False
+        self._load()
+    
+    def _load(self) -> None:
+        # Resume a conversation persisted by an external store (e.g. after a
+        # pod restart); otherwise initialize empty collections for session data
+        stored_history = self._session_storage.get("message_history")
+        if stored_history:
+            self._history.restore(stored_history, self._session_storage.get("history_state"))
+        self._session_storage.set("message_history", self._history.messages)
         self._session_storage.set("tool_steps", {})
+        self._tool_outputs.restore(self._session_storage.get("tool_outputs"))
+        self._saved_tool_outputs = self._tool_outputs.version
     
     def get_message_history(self) -> List[Dict[str, str]]:
         """
         Get the message history, guaranteed not to be None.
+        Only messages that have not been compacted are included.
         
         Returns:
             The message history list
         """
         return self._session_storage.get("message_history") or []
     
+    def add_message(self, message: Dict[str, str]) -> None:
+        """
+        Append a message to the history, compacting older turns into the
+        running summary once the token budget is exceeded.
+        
+        Args:
+            message: A chat message with "role" and "content"
+        """
+        compactions = self._history.get_stats()["compactions"]
+        self._history.append(message)
+        self._session_storage.set("message_history", self._history.messages)
+        if self._history.get_stats()["compactions"] != compactions:
+            self._session_storage.set("history_state", self._history.get_state())
+    
+    def get_model_input(self) -> List[Dict[str, Any]]:
+        """
+        Get the input to send to the model: the running summary of compacted
+        turns (if any) followed by the recent messages verbatim, with the note
+        of still fresh tool results ahead of the new user message.
+        
+        Returns:
+            The list of input messages
+        """
+        model_input = self._history.get_input()
+        note = self._tool_outputs.get_context_message()
+        if note is not None:
+            # after the earlier turns, so their cached prefix stays the same
+            at = len(model_input) - 1 if model_input and model_input[-1].get("role") == "user" else len(model_input)
+            model_input.insert(at, note)
+        return model_input
+    
+    def get_input_filter(self) -> Any:
+        """
+        Get the call_model_input_filter for the next run: it records the run's
+        tool outputs and sends repeated identical outputs as references.
+        Call after get_model_input(), whose note the references may point to.
+        
+        Returns:
+            The filter for the run's RunConfig
+        """
+        return self._tool_outputs.input_filter()
+    
+    def get_tool_output_stats(self) -> Dict[str, int]:
+        """
+        Get the size of the session's tool output store and the references sent.
+        
+        Returns:
+            A dictionary of counters
+        """
+        return self._tool_outputs.get_stats()
+    
+    def get_history_stats(self) -> Dict[str, int]:
+        """
+        Get token usage of the history, including tokens saved by compaction.
+        
+        Returns:
+            A dictionary of counters
+        """
+        return self._history.get_stats()
+    
     def get_tool_steps(self) -> Dict[str, Any]:
         """
         Get the tool steps dictionary, guaranteed not to be None.
@@ -49,6 +177,101 @@ class ChainlitSessionManager:
         """
         return self._session_storage.get("tool_steps") or {}
     
+    def expire_tool_steps(self, max_age: float, now: Optional[float] = None) -> List[Any]:
+        """
+        Drop tool steps whose output has not arrived within max_age seconds,
+        e.g. when the run that created them was torn down without cleanup.
+        
+        Args:
+            max_age: Seconds a tool step may stay open
+            now: The current time.monotonic(), if already known
+            
+        Returns:
+            The dropped steps
+        """
+        now = time.monotonic() if now is None else now
+        expired = [call_id for call_id, started in self._tool_step_started.items() if now - started > max_age]
+        if not expired:
+            return []
+        tool_steps = self.get_tool_steps()
+        dropped = [tool_steps.pop(call_id) for call_id in expired if call_id in tool_steps]
+        self.save_tool_steps(tool_steps)
+        return dropped
+    
+    def get_memory_bytes(self) -> int:
+        """
+        Estimate the memory held by the session: its history, tool outputs
+        and open tool steps.
+        
+        Returns:
+            The approximate size in bytes
+        """
+        tool_steps = self.get_tool_steps().values()
+        return (
+            approx_size(self._history.messages)
+            + approx_size(self._history.get_state())
+            + approx_size(self._tool_outputs.get_state())
+            + sum(
+                STEP_OVERHEAD_BYTES + approx_size(getattr(step, "input", None)) + approx_size(getattr(step, "output", None))
+                for step in tool_steps
+            )
+        )
+    
+    @property
+    def is_busy(self) -> bool:
+        """True while a run of the session is in progress."""
+        return self._active_run is not None
+    
+    @property
+    def is_persistent(self) -> bool:
+        """True when an external store keeps the conversation, also while unloaded."""
+        return isinstance(self._session_storage, PersistentSessionStorage)
+    
+    @property
+    def is_unloaded(self) -> bool:
+        """True between unload() and reload()."""
+        return self._unloaded
+    
+    def begin_run(self, result: Any, timeout: Optional[float] = None) -> ActiveRun:
+        """
+        Track a streamed agent run as the session's run in progress.
+        
+        Args:
+            result: The RunResultStreaming returned by Runner.run_streamed
+            timeout: Wall-clock deadline of the run in seconds, if any
+            
+        Returns:
+            The cancellable handle of the run
+        """
+        self._active_run = ActiveRun(result, timeout)
+        return self._active_run
+    
+    def cancel_run(self, reason: str) -> bool:
+        """
+        Cancel the session's run in progress, if any.
+        
+        Args:
+            reason: Why the run is cancelled
+            
+        Returns:
+            True if a run was cancelled
+        """
+        return self._active_run is not None and self._active_run.cancel(reason)
+    
+    def end_run(self, run: ActiveRun) -> None:
+        """
+        Stop tracking a run once its consumer is done with it.
+        
+        Args:
+            run: The handle returned by begin_run
+        """
+        run.close()
+        if self._active_run is run:
+            self._active_run = None
+        if self._tool_outputs.version != self._saved_tool_outputs:
+            self._session_storage.set("tool_outputs", self._tool_outputs.get_state())
+            self._saved_tool_outputs = self._tool_outputs.version
+    
     def save_message_history(self, message_history: List[Dict[str, str]]) -> None:
         """
         Save the updated message history to the session.
@@ -56,7 +279,9 @@ class ChainlitSessionManager:
         Args:
             message_history: The message history to save
         """
-        self._session_storage.set("message_history", message_history)
+        self._history.reset(message_history)
+        self._session_storage.set("message_history", self._history.messages)
+        self._session_storage.set("history_state", self._history.get_state())
     
     def save_tool_steps(self, tool_steps: Dict[str, Any]) -> None:
         """
@@ -66,6 +291,62 @@ class ChainlitSessionManager:
             tool_steps: The tool steps to save
         """
         self._session_storage.set("tool_steps", tool_steps)
+        now = time.monotonic()
+        self._tool_step_started = {
+            call_id: self._tool_step_started.get(call_id, now) for call_id in tool_steps
+        }
+    
+    def unload(self) -> Optional[Dict[str, Any]]:
+        """
+        Free the memory of an idle session's conversation, e.g. when it is
+        evicted; reload() brings it back before the session's next message.
+        Call only while no run is in progress.
+        
+        Returns:
+            The conversation to keep elsewhere when the session storage is
+            in-process, or None when an external store already holds it
+        """
+        state = None
+        if self.is_persistent:
+            # history is written through and tool outputs at the end of each run
+            self._session_storage.release()
+        else:
+            state = {
+                "message_history": self._history.messages,
+                "history_state": self._history.get_state(),
+                "tool_outputs": self._tool_outputs.get_state(),
+            }
+            self._session_storage.set("message_history", [])
+            self._session_storage.set("history_state", None)
+            self._session_storage.set("tool_outputs", None)
+            self._session_storage.set("tool_steps", {})
+        self._history.reset()
+        self._tool_outputs.reset()
+        self._tool_step_started.clear()
+        self._unloaded = True
+        return state
+    
+    async def preload(self) -> None:
+        """
+        Read the conversation from an external store without blocking the
+        event loop; call before reload() of a persistent session.
+        """
+        if self.is_persistent:
+            await self._session_storage.preload(PERSISTED_KEYS)
+    
+    def reload(self, state: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Bring back a conversation freed by unload().
+        
+        Args:
+            state: What unload() returned; None re-reads the external store,
+                or starts the conversation afresh when there is none
+        """
+        if state is not None:
+            for key in PERSISTED_KEYS:
+                self._session_storage.set(key, state.get(key))
+        self._load()
+        self._unloaded = False
     
     async def cleanup(self) -> None:
         """
@@ -73,6 +354,15 @@ class ChainlitSessionManager:
         Since agent and MCP servers are managed at application level,
         we only need to clear session data.
         """
-        # Clear session-specific resources
+        # Stop any run still in progress, then clear session-specific resources
+        self.cancel_run("disconnect")
+        self._tool_step_started.clear()
+        if isinstance(self._session_storage, PersistentSessionStorage):
+            # The conversation outlives the connection; the store evicts it by TTL
+            self._session_storage.release()
+            return
+        self._history.reset()
+        self._tool_outputs.reset()
         self._session_storage.set("message_history", [])
-        self._session_storage.set("tool_steps", {})
\ No newline at end of file
+        self._session_storage.set("tool_steps", {})
+        self._session_storage.set("tool_outputs", None)
\ No newline at end of file
@@ -1,17 +1,25 @@
 import chainlit as cl
-from agents import ItemHelpers, Runner
-from openai.types.responses import ResponseTextDeltaEvent
+from chainlit.utils import utc_now
 from agents.exceptions import MaxTurnsExceeded
-from chainlit_session_manager import ChainlitSessionManager
+from chainlit_session_manager import PERSISTED_KEYS, ChainlitSessionManager
 from chainlit_session_storage import ChainlitSessionStorage
-from openai_client_factory_impl import OpenAIClientFactoryImpl
+from message_run import run_message
+from metrics import ACTIVE_SESSIONS
+from run_control import cancel_on_new_message_from_env, run_timeout_from_env
+from run_scheduler import RunQueueFull
 
 # Import the agent_provider initialized in main.py
-from main import agent_provider
+from main import agent_provider, run_scheduler, session_registry, session_store
 
-# Create dependencies
-openai_client_factory = OpenAIClientFactoryImpl()
-openai_client_factory.configure_defaults()
+# The agent provider configures the OpenAI client defaults when it starts
+
+RUN_TIMEOUT = run_timeout_from_env()
+CANCEL_ON_NEW_MESSAGE = cancel_on_new_message_from_env()
+
+CANCEL_MESSAGES = {
+    "deadline": f"The request took longer than {RUN_TIMEOUT:g} seconds and was stopped. Please try a narrower question." if RUN_TIMEOUT else "",
+    "superseded": "Stopped this answer to work on your new message.",
+}
 
 async def get_or_create_session_manager(user_session):
     """Creates or retrieves a ChainlitSessionManager for the current user session"""
@@ -19,9 +27,19 @@ async def get_or_create_session_manager(user_session):
     if session_manager:
         return session_manager
 
-    session_storage = ChainlitSessionStorage(user_session)
+    if session_store is not None:
+        # Keyed by thread so the conversation resumes on any replica
+        session_storage = session_store.storage(cl.context.session.thread_id)
+        # read the stored conversation off the event loop
+        await session_storage.preload(PERSISTED_KEYS)
+        # on_chat_start and on_message may both get here for a new session
+        if user_session.get("session_manager"):
+            return user_session.get("session_manager")
+    else:
+        session_storage = ChainlitSessionStorage(user_session)
     session_manager = ChainlitSessionManager(session_storage=session_storage)
     user_session.set("session_manager", session_manager)
+    session_registry.touch(cl.context.session.id, session_manager)
     
     return session_manager
 
@@ -30,6 +48,7 @@ async def get_or_create_session_manager(user_session):
 async def on_chat_start():
     """Initialize session when a new chat starts"""
     await get_or_create_session_manager(cl.user_session)
+    ACTIVE_SESSIONS.inc()
 
 
 @cl.on_message
@@ -37,85 +56,145 @@ async def on_message(message: cl.Message):
     """Process incoming messages using the agent"""
     session_manager = await get_or_create_session_manager(cl.user_session)
     
-    # Extract message content and update history
-    message_content = message.content
-    message_history = session_manager.get_message_history()
-    message_history.append({"role": "user", "content": message_content})
+    # A new message replaces the answer still being worked on
+    if CANCEL_ON_NEW_MESSAGE:
+        session_manager.cancel_run("superseded")
     
+    # Wait for an admission slot, showing the queue position while waiting
+    queue_msg = None
+
+    async def show_queue_position(position: int):
+        nonlocal queue_msg
+        content = f"The agent is busy; your request is #{position} in the queue."
+        if queue_msg is None:
+            queue_msg = cl.Message(content=content)
+            await queue_msg.send()
+        else:
+            queue_msg.content = content
+            await queue_msg.update()
+
+    user = cl.user_session.get("user")
+    user_key = user.identifier if user else cl.user_session.get("id")
+    try:
+        ticket = await run_scheduler.acquire(user_key, on_position=show_queue_position)
+    except RunQueueFull as e:
+        await cl.Message(content=f"The agent is at capacity: {e}").send()
+        return
+    # Everything up to release() is covered, so a failure or Stop cannot leak the slot
+    activated = False
     try:
+        if queue_msg is not None:
+            await queue_msg.remove()
+
+        # Reload the conversation if the session was evicted while idle; held until done()
+        recovered = await session_registry.activate(cl.context.session.id, session_manager)
+        activated = True
+        if not recovered:
+            await cl.Message(content="This conversation was idle for a long time and its earlier messages were cleared; please restate any context I need.").send()
+
+        # Extract message content and update history
+        message_content = message.content
+        compactions = session_manager.get_history_stats()["compactions"]
         msg = cl.Message(content="")
 
-        # Run the agent with message history
-        result = Runner.run_streamed(
-            starting_agent=agent_provider.get_agent(),
-            input=message_history,
-            max_turns=10
-        )
-        
-        async for event in result.stream_events():
-            if event.type == "raw_response_event":
-                if isinstance(event.data, ResponseTextDeltaEvent):
-                    await msg.stream_token(event.data.delta)
-                continue
-
-            if event.type == "agent_updated_stream_event":
-                continue
-
-            if event.item.type == "tool_call_item":
-                print("-- Tool was called")
-                tool_name = event.item.raw_item.name
-                tool_args = event.item.raw_item.arguments
-                tool_call_id = event.item.raw_item.call_id
-                
-                # Create step for tool call
-                async with cl.Step(
-                    name=f"Tool: {tool_name}",
-                    type="tool_call",
-                    show_input=True
-                ) as step:
-                    step.input = tool_args
-                    await step.send()
-                
-                # Store step with call_id in session
-                tool_steps = session_manager.get_tool_steps()
-                tool_steps[tool_call_id] = step
-                session_manager.save_tool_steps(tool_steps)
-                continue
-                
-            if event.item.type == "tool_call_output_item":
-                tool_call_id = event.item.raw_item['call_id'] 
-
-                # Retrieve corresponding step from session
-                tool_steps = session_manager.get_tool_steps()
-                step = tool_steps.get(tool_call_id)
-                
-                if step:
-                    # Update step with output
-                    step.output = event.item.output
-                    await step.stream_token(event.item.output)
-                    
-                    # Release step after use
-                    if tool_call_id in tool_steps:
-                        del tool_steps[tool_call_id]
-                        session_manager.save_tool_steps(tool_steps)
-                        print(f"Released step for tool call ID: {tool_call_id}")
-                continue                                                   
-
-            if event.item.type == "message_output_item":
-                output = ItemHelpers.text_message_output(event.item)
-                message_history.append({"role": "assistant", "content": output})
-                continue
-
-        await msg.update()
-
-    except MaxTurnsExceeded:
-        await cl.Message(content="I've reached the maximum processing steps without finding a complete answer. Please try rephrasing your question.").send()
-    except Exception as e:
-        print(f"Exception type: {type(e).__name__}, Error: {str(e)}")
-        await cl.Message(content=f"Error occurred: {str(e)}, Type: {type(e).__name__}").send()
+        async def show_route(decision):
+            print(f"Routed to {decision.route} model ({decision.reason})")
+
+        async def show_tool_call(tool_call_id, tool_name, tool_args):
+            print(f"-- Tool was called: {tool_name}")
+            # Create step for tool call; it stays running until its output arrives, as
+            # parallel calls of one turn are all shown before any of them finishes
+            step = cl.Step(
+                name=f"Tool: {tool_name}",
+                type="tool_call",
+                show_input=True
+            )
+            step.start = utc_now()
+            step.input = tool_args
+            await step.send()
+
+            # Store step with call_id in session
+            tool_steps = session_manager.get_tool_steps()
+            tool_steps[tool_call_id] = step
+            session_manager.save_tool_steps(tool_steps)
+
+        async def show_tool_output(tool_call_id, output):
+            # Retrieve corresponding step from session
+            tool_steps = session_manager.get_tool_steps()
+            step = tool_steps.get(tool_call_id)
+
+            if step:
+                # Update step with the full output; the model only saw a reduced version
+                output_processor = agent_provider.get_mcp_provider().get_output_processor()
+                raw_output = output_processor.resolve_raw(output) if output_processor else output
+                step.output = raw_output
+                step.end = utc_now()
+                await step.update()
+
+                # Release step after use
+                if tool_call_id in tool_steps:
+                    del tool_steps[tool_call_id]
+                    session_manager.save_tool_steps(tool_steps)
+                    print(f"Released step for tool call ID: {tool_call_id}")
+
+        try:
+            result = await run_message(
+                agent_provider.get_router(),
+                session_manager,
+                message_content,
+                msg.stream_token,
+                session_id=cl.context.session.thread_id,
+                run_timeout=RUN_TIMEOUT,
+                on_route=show_route,
+                on_tool_call=show_tool_call,
+                on_tool_output=show_tool_output,
+            )
+            await msg.update()
+
+            if result["cancel_reason"]:
+                print(f"Run cancelled: {result['cancel_reason']}")
+                if CANCEL_MESSAGES.get(result["cancel_reason"]):
+                    await cl.Message(content=CANCEL_MESSAGES[result["cancel_reason"]]).send()
+
+        except MaxTurnsExceeded:
+            await cl.Message(content="I've reached the maximum processing steps without finding a complete answer. Please try rephrasing your question.").send()
+        except Exception as e:
+            print(f"Exception type: {type(e).__name__}, Error: {str(e)}")
+            await cl.Message(content=f"Error occurred: {str(e)}, Type: {type(e).__name__}").send()
+        finally:
+            await close_open_tool_steps(session_manager)
+    finally:
+        run_scheduler.release(ticket)
+        if activated:
+            session_registry.done(cl.context.session.id, session_manager)
     
-    # Save updated message history
-    session_manager.save_message_history(message_history)
+    history_stats = session_manager.get_history_stats()
+    if history_stats["compactions"] > compactions:
+        print(f"History compacted: {history_stats['input_tokens']} tokens in context, {history_stats['tokens_saved']} saved")
+
+
+async def close_open_tool_steps(session_manager):
+    """End the steps of tool calls whose output never arrived, e.g. when the run was cancelled"""
+    tool_steps = session_manager.get_tool_steps()
+    if not tool_steps:
+        return
+    for step in tool_steps.values():
+        step.end = utc_now()
+        step.is_error = True
+        step.output = step.output or "Not completed"
+        try:
+            await step.update()
+        except Exception as e:
+            print(f"Could not close tool step {step.name}: {e}")
+    session_manager.save_tool_steps({})
+
+
+@cl.on_stop
+async def on_stop():
+    """Cancel the run in progress when the user presses stop"""
+    session_manager = cl.user_session.get("session_manager")
+    if session_manager:
+        session_manager.cancel_run("stopped")
 
 
 @cl.on_chat_end
@@ -123,5 +202,7 @@ async def on_chat_end():
     """Clean up session resources when chat ends"""
     session_manager = cl.user_session.get("session_manager")
     if session_manager:
+        ACTIVE_SESSIONS.dec()
+        session_registry.remove(cl.context.session.id)
         await session_manager.cleanup()
         cl.user_session.set("session_manager", None)
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Cluster Fleet Tools for Kubernetes Operations Agent.
+
+Provides the fanout_query function tool, which runs one read-only MCP tool
+call on many clusters of a ClusterFleet concurrently, under a deadline, and
+merges the per-cluster results into one answer, so a fleet-wide question
+takes one model turn instead of one per cluster.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+from agents import FunctionTool, function_tool
+from agents.mcp import MCPServer
+
+from mcp_cluster_fleet import CLUSTER_ARGUMENT, ClusterFleet
+from mcp_tool_cache import is_read_only_tool
+from mcp_tool_catalog import MCPToolCatalog
+from mcp_tool_output import head_tail
+from metrics import FANOUT_CLUSTERS
+
+__all__ = ["ClusterFanout", "create_fleet_tools", "fleet_instructions"]
+
+# smallest share of the output budget a cluster gets, however many clusters are queried
+MIN_CLUSTER_CHARS = 400
+
+
+def fleet_instructions(fleet: ClusterFleet) -> str:
+    """Agent instructions naming the clusters; static for a given config, so the prompt prefix stays cacheable."""
+    return (
+        f"The {' and '.join(fleet.kinds)} tools take an optional `{CLUSTER_ARGUMENT}` argument naming one of these "
+        f"clusters: {', '.join(fleet.clusters)}; without it they run against {fleet.default_cluster}. "
+        "For a question about several clusters or the whole fleet, call fanout_query once to run the same read-only "
+        "tool on all of them concurrently instead of calling the tool cluster by cluster."
+    )
+
+
+def _result_text(result: Any) -> Tuple[str, bool]:
+    texts = [getattr(item, "text", None) for item in getattr(result, "content", None) or []]
+    text = "\n".join(t for t in texts if isinstance(t, str))
+    if not text and getattr(result, "structuredContent", None) is not None:
+        text = json.dumps(result.structuredContent, separators=(",", ":"))
+    return text, bool(getattr(result, "isError", False))
+
+
+class ClusterFanout:
+    """Run one read-only tool call on many clusters concurrently and merge the results.
+
+    Calls go through the same wrapped cluster servers as the agent's own
+    calls, so they are cached, shrunk and timed alike, at most
+    ``concurrency`` at a time.  Clusters without a result after ``timeout``
+    seconds are reported as timed out instead of holding up the answer, and
+    each cluster's output is cut to an equal share of ``max_chars``.
+    """
+
+    def __init__(
+        self,
+        fleet: ClusterFleet,
+        servers: Dict[str, MCPServer],
+        catalog: MCPToolCatalog,
+        concurrency: int = 8,
+        timeout: float = 30.0,
+        max_chars: int = 24000,
+    ) -> None:
+        """
+        Args:
+            fleet: The fleet whose clusters are queried
+            servers: The wrapped cluster server of every fleet kind, by name
+            catalog: Catalog telling which server exposes a tool
+            concurrency: Most calls running at once, across concurrent fan-outs
+            timeout: Deadline of a fan-out in seconds, also the most a caller may ask for
+            max_chars: Output budget shared by the clusters of one fan-out
+        """
+        self._fleet = fleet
+        self._servers = servers
+        self._catalog = catalog
+        self._timeout = timeout
+        self._max_chars = max_chars
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(self, tool: str, arguments: Dict[str, Any], clusters: str = "", timeout: float = 0) -> str:
+        """
+        Call *tool* with *arguments* on every cluster matching *clusters*.
+
+        Args:
+            tool: Name of a read-only tool of one of the fleet's servers
+            arguments: The tool's arguments; any cluster argument is ignored
+            clusters: Comma-separated cluster names or patterns; empty for all
+            timeout: Deadline in seconds, capped at the configured one; 0 for that
+
+        Returns:
+            A summary line followed by one section per cluster
+        """
+        server = self._catalog.server_of(tool)
+        if server not in self._servers:
+            return f"'{tool}' is not a tool of the cluster servers ({', '.join(self._servers)})."
+        if not is_read_only_tool(tool):
+            return f"fanout_query only runs read-only tools; call {tool} on one cluster at a time instead."
+        names = self._fleet.select(clusters)
+        if not names:
+            return f"No cluster matches '{clusters}'; clusters: {', '.join(self._fleet.clusters)}."
+        arguments = {key: value for key, value in arguments.items() if key != CLUSTER_ARGUMENT}
+        deadline = min(timeout, self._timeout) if timeout > 0 else self._timeout
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(self._call(server, tool, arguments, name), name=f"fanout-{name}") for name in names]
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=deadline)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+        budget = max(MIN_CLUSTER_CHARS, self._max_chars // len(names))
+        counts = {"ok": 0, "error": 0, "timeout": 0}
+        sections: List[str] = []
+        for name, task in zip(names, tasks):
+            if task in pending:
+                outcome, header, body = "timeout", f"no result within {deadline:g}s", ""
+            elif task.exception() is not None:
+                exc = task.exception()
+                outcome, header, body = "error", "failed", f"{type(exc).__name__}: {exc}"
+            else:
+                text, is_error = task.result()
+                outcome, header, body = ("error", "failed", text) if is_error else ("ok", "", text)
+            counts[outcome] += 1
+            FANOUT_CLUSTERS.labels(outcome).inc()
+            title = f"=== cluster: {name}{f' ({header})' if header else ''} ==="
+            sections.append(f"{title}\n{head_tail(body, budget)}" if body else title)
+        summary = (
+            f"{tool} on {len(names)} clusters in {elapsed:.1f}s: "
+            f"{counts['ok']} ok, {counts['error']} failed, {counts['timeout']} timed out"
+        )
+        return "\n\n".join([summary, *sections])
+
+    async def _call(self, server: str, tool: str, arguments: Dict[str, Any], cluster: str) -> Tuple[str, bool]:
+        async with self._semaphore:
+            result = await self._servers[server].call_tool(tool, {**arguments, CLUSTER_ARGUMENT: cluster})
+        return _result_text(result)
+
+
+def create_fleet_tools(fanout: ClusterFanout) -> List[FunctionTool]:
+    """
+    Create the agent tools querying the whole fleet.
+
+    Args:
+        fanout: The fan-out runner over the fleet's cluster servers
+
+    Returns:
+        The function tools to register on the agent
+    """
+
+    @function_tool
+    async def fanout_query(tool: str, arguments: str = "{}", clusters: str = "", timeout_seconds: float = 0) -> str:
+        """Run one read-only cluster tool call on many clusters at once and return the results of all of them.
+
+        Args:
+            tool: Name of a read-only tool taking a `cluster` argument, e.g. kubectl_get or execute_query.
+            arguments: The tool's arguments as a JSON object, without `cluster`.
+            clusters: Comma-separated cluster names or patterns such as "prod-*"; empty for every cluster.
+            timeout_seconds: Deadline for all clusters, 0 for the default; clusters still running then are reported as timed out.
+        """
+        try:
+            parsed = json.loads(arguments or "{}")
+        except json.JSONDecodeError as exc:
+            return f"arguments is not valid JSON: {exc}"
+        if not isinstance(parsed, dict):
+            return "arguments must be a JSON object."
+        return await fanout.run(tool, parsed, clusters, timeout_seconds)
+
+    return [fanout_query]
@@ -0,0 +1,811 @@
+"""
+Cluster State Cache for Kubernetes Operations Agent.
+
+Provides an informer-style cache of the core Kubernetes resources: each
+resource kind is listed once and then kept current through a watch, stored
+as compacted objects with indexes by namespace, label, owner, node and (for
+events) involved object. Read queries are answered from memory instead of a
+round trip through the Kubernetes MCP server and the API server.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import ssl
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import aiohttp
+
+__all__ = [
+    "KINDS",
+    "ClusterStateCache",
+    "KubernetesAPIClient",
+    "LabelSelector",
+    "ResourceStore",
+    "compact_object",
+]
+
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+
+
+class ResourceKind(NamedTuple):
+    name: str
+    path: str
+    namespaced: bool = True
+
+
+KINDS: Dict[str, ResourceKind] = {
+    kind.name: kind
+    for kind in (
+        ResourceKind("pods", "/api/v1/pods"),
+        ResourceKind("nodes", "/api/v1/nodes", namespaced=False),
+        ResourceKind("namespaces", "/api/v1/namespaces", namespaced=False),
+        ResourceKind("services", "/api/v1/services"),
+        ResourceKind("events", "/api/v1/events"),
+        ResourceKind("deployments", "/apis/apps/v1/deployments"),
+        ResourceKind("replicasets", "/apis/apps/v1/replicasets"),
+        ResourceKind("statefulsets", "/apis/apps/v1/statefulsets"),
+        ResourceKind("daemonsets", "/apis/apps/v1/daemonsets"),
+        ResourceKind("jobs", "/apis/batch/v1/jobs"),
+    )
+}
+
+KIND_ALIASES = {
+    "pod": "pods", "po": "pods",
+    "node": "nodes", "no": "nodes",
+    "namespace": "namespaces", "ns": "namespaces",
+    "service": "services", "svc": "services",
+    "event": "events", "ev": "events",
+    "deployment": "deployments", "deploy": "deployments",
+    "replicaset": "replicasets", "rs": "replicasets",
+    "statefulset": "statefulsets", "sts": "statefulsets",
+    "daemonset": "daemonsets", "ds": "daemonsets",
+    "job": "jobs",
+}
+
+
+def resolve_kind(kind: str) -> str:
+    """
+    Map a kind as a user or model might write it ("Pod", "deploy") to its plural name.
+
+    Args:
+        kind: Kind, singular, plural or short name
+
+    Returns:
+        The plural resource name
+
+    Raises:
+        ValueError: If the kind is not cached
+    """
+    name = kind.strip().lower()
+    name = KIND_ALIASES.get(name, name)
+    if name not in KINDS:
+        raise ValueError(f"'{kind}' is not cached; cached kinds are {', '.join(KINDS)}")
+    return name
+
+
+# ----------------------------------------------------------------------
+# Object compaction
+# ----------------------------------------------------------------------
+_META_FIELDS = ("name", "namespace", "uid", "labels", "creationTimestamp", "deletionTimestamp", "resourceVersion")
+
+
+def _pick(source: Optional[Dict[str, Any]], fields: Iterable[str]) -> Dict[str, Any]:
+    if not source:
+        return {}
+    return {field: source[field] for field in fields if source.get(field) not in (None, "", [], {})}
+
+
+def _container_state(state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # {"waiting": {"reason": ...}} keeps only the state name and why
+    for name, detail in (state or {}).items():
+        return {name: _pick(detail, ("reason", "exitCode", "startedAt", "finishedAt"))}
+    return {}
+
+
+def compact_object(kind: str, obj: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keep only the fields the agent reasons about, dropping managedFields,
+    last-applied annotations, pod specs' volumes and env, and so on.
+
+    Args:
+        kind: Plural resource name
+        obj: Object as returned by the API server
+
+    Returns:
+        The compacted object
+    """
+    meta = obj.get("metadata") or {}
+    compact_meta = _pick(meta, _META_FIELDS)
+    if meta.get("ownerReferences"):
+        compact_meta["ownerReferences"] = [
+            _pick(ref, ("kind", "name", "uid", "controller")) for ref in meta["ownerReferences"]
+        ]
+    result: Dict[str, Any] = {"metadata": compact_meta}
+    spec = obj.get("spec") or {}
+    status = obj.get("status") or {}
+
+    if kind == "pods":
+        result["spec"] = _pick(spec, ("nodeName", "serviceAccountName", "priorityClassName"))
+        result["spec"]["containers"] = [
+            _pick(c, ("name", "image", "resources")) for c in spec.get("containers") or []
+        ]
+        result["status"] = _pick(status, ("phase", "reason", "message", "podIP", "hostIP", "startTime", "qosClass"))
+        result["status"]["conditions"] = [_pick(c, ("type", "status", "reason")) for c in status.get("conditions") or []]
+        result["status"]["containerStatuses"] = [
+            {
+                **_pick(c, ("name", "ready", "restartCount", "image")),
+                "state": _container_state(c.get("state")),
+                "lastState": _container_state(c.get("lastState")),
+            }
+            for c in (status.get("initContainerStatuses") or []) + (status.get("containerStatuses") or [])
+        ]
+    elif kind == "nodes":
+        result["spec"] = _pick(spec, ("unschedulable", "taints", "podCIDR", "providerID"))
+        result["status"] = {
+            "conditions": [_pick(c, ("type", "status", "reason", "message")) for c in status.get("conditions") or []],
+            "capacity": status.get("capacity") or {},
+            "allocatable": status.get("allocatable") or {},
+            "nodeInfo": _pick(status.get("nodeInfo"), ("kubeletVersion", "osImage", "containerRuntimeVersion", "architecture")),
+            "addresses": status.get("addresses") or [],
+        }
+    elif kind == "events":
+        for field in ("reason", "message", "type", "count", "firstTimestamp", "lastTimestamp", "eventTime"):
+            if obj.get(field) not in (None, ""):
+                result[field] = obj[field]
+        result["involvedObject"] = _pick(obj.get("involvedObject"), ("kind", "name", "namespace", "uid", "fieldPath"))
+        result["source"] = _pick(obj.get("source"), ("component", "host"))
+    elif kind == "services":
+        result["spec"] = _pick(spec, ("type", "clusterIP", "externalIPs", "ports", "selector", "loadBalancerIP"))
+        result["status"] = status
+    elif kind == "namespaces":
+        result["status"] = _pick(status, ("phase",))
+    else:
+        # workloads: the pod template is large and rarely needed beyond its images
+        compact_spec = {key: value for key, value in spec.items() if key != "template"}
+        template_spec = (spec.get("template") or {}).get("spec") or {}
+        if template_spec:
+            compact_spec["containers"] = [_pick(c, ("name", "image")) for c in template_spec.get("containers") or []]
+        result["spec"] = compact_spec
+        result["status"] = {key: value for key, value in status.items() if key != "conditions"}
+        result["status"]["conditions"] = [
+            _pick(c, ("type", "status", "reason", "message")) for c in status.get("conditions") or []
+        ]
+    return result
+
+
+def object_key(obj: Dict[str, Any]) -> str:
+    meta = obj.get("metadata") or {}
+    namespace = meta.get("namespace")
+    return f"{namespace}/{meta.get('name')}" if namespace else str(meta.get("name"))
+
+
+# ----------------------------------------------------------------------
+# Label selectors
+# ----------------------------------------------------------------------
+_SET_TERM = re.compile(r"^\s*([\w./-]+)\s+(in|notin)\s+\(([^)]*)\)\s*$")
+_EQ_TERM = re.compile(r"^\s*([\w./-]+)\s*(==|=|!=)\s*([\w./-]*)\s*$")
+_EXISTS_TERM = re.compile(r"^\s*(!?)([\w./-]+)\s*$")
+
+
+class LabelSelector:
+    """
+    A parsed Kubernetes label selector ("app=web,tier!=db,env in (a,b),!canary").
+
+    Equality terms can be answered from the label index; the rest are
+    checked per object.
+    """
+
+    def __init__(self, selector: str = ""):
+        """
+        Parse a selector.
+
+        Args:
+            selector: Selector in kubectl syntax; empty matches everything
+
+        Raises:
+            ValueError: If the selector cannot be parsed
+        """
+        self.equal: List[Tuple[str, str]] = []
+        self._checks: List[Tuple[str, str, Set[str]]] = []
+        for term in self._split(selector):
+            match = _SET_TERM.match(term)
+            if match:
+                values = {v.strip() for v in match.group(3).split(",") if v.strip()}
+                self._checks.append((match.group(2), match.group(1), values))
+                continue
+            match = _EQ_TERM.match(term)
+            if match:
+                key, op, value = match.groups()
+                if op == "!=":
+                    self._checks.append(("notin", key, {value}))
+                else:
+                    self.equal.append((key, value))
+                continue
+            match = _EXISTS_TERM.match(term)
+            if match:
+                self._checks.append(("absent" if match.group(1) else "exists", match.group(2), set()))
+                continue
+            raise ValueError(f"Invalid label selector term '{term}'")
+
+    @staticmethod
+    def _split(selector: str) -> List[str]:
+        # commas inside "in (a,b)" do not separate terms
+        terms, depth, current = [], 0, ""
+        for char in selector:
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            if char == "," and depth == 0:
+                terms.append(current)
+                current = ""
+            else:
+                current += char
+        terms.append(current)
+        return [term for term in terms if term.strip()]
+
+    def matches(self, labels: Optional[Dict[str, str]]) -> bool:
+        labels = labels or {}
+        for key, value in self.equal:
+            if labels.get(key) != value:
+                return False
+        for op, key, values in self._checks:
+            if op == "in" and labels.get(key) not in values:
+                return False
+            if op == "notin" and key in labels and labels[key] in values:
+                return False
+            if op == "exists" and key not in labels:
+                return False
+            if op == "absent" and key in labels:
+                return False
+        return True
+
+
+# ----------------------------------------------------------------------
+# Indexed store
+# ----------------------------------------------------------------------
+class ResourceStore:
+    """Compacted objects of one kind with secondary indexes."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._objects: Dict[str, Dict[str, Any]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._index: Dict[Tuple[str, str], Set[str]] = {}
+        self._by_uid: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    @property
+    def bytes(self) -> int:
+        """Approximate memory held by the objects (their compact JSON size)."""
+        return self._bytes
+
+    @property
+    def index_entries(self) -> int:
+        return sum(len(keys) for keys in self._index.values())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._objects.get(key)
+
+    def get_by_uid(self, uid: str) -> Optional[Dict[str, Any]]:
+        key = self._by_uid.get(uid)
+        return self._objects.get(key) if key else None
+
+    def upsert(self, obj: Dict[str, Any]) -> None:
+        key = object_key(obj)
+        self.delete(key)
+        size = len(json.dumps(obj, separators=(",", ":")))
+        self._objects[key] = obj
+        self._sizes[key] = size
+        self._bytes += size
+        uid = (obj.get("metadata") or {}).get("uid")
+        if uid:
+            self._by_uid[uid] = key
+        for entry in self._index_entries(obj):
+            self._index.setdefault(entry, set()).add(key)
+
+    def delete(self, key: str) -> None:
+        obj = self._objects.pop(key, None)
+        if obj is None:
+            return
+        self._bytes -= self._sizes.pop(key, 0)
+        uid = (obj.get("metadata") or {}).get("uid")
+        if uid and self._by_uid.get(uid) == key:
+            del self._by_uid[uid]
+        for entry in self._index_entries(obj):
+            keys = self._index.get(entry)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[entry]
+
+    def replace(self, objects: Iterable[Dict[str, Any]]) -> None:
+        self._objects.clear()
+        self._sizes.clear()
+        self._bytes = 0
+        self._index.clear()
+        self._by_uid.clear()
+        for obj in objects:
+            self.upsert(obj)
+
+    def select(
+        self,
+        namespace: Optional[str] = None,
+        selector: Optional[LabelSelector] = None,
+        owner_uid: Optional[str] = None,
+        node: Optional[str] = None,
+        involved: Optional[Tuple[str, str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return objects matching every given filter, using the indexes.
+
+        Args:
+            namespace: Namespace of the objects
+            selector: Label selector
+            owner_uid: UID of an owner reference
+            node: Node the pod is scheduled on
+            involved: (kind, namespace, name) of an event's involved object
+
+        Returns:
+            Matching objects sorted by key
+        """
+        candidates: Optional[Set[str]] = None
+        entries: List[Tuple[str, str]] = []
+        if namespace:
+            entries.append(("ns", namespace))
+        if owner_uid:
+            entries.append(("owner", owner_uid))
+        if node:
+            entries.append(("node", node))
+        if involved:
+            entries.append(("involved", "/".join(part.lower() for part in involved)))
+        if selector is not None:
+            entries.extend(("label", f"{key}={value}") for key, value in selector.equal)
+        for entry in entries:
+            keys = self._index.get(entry, set())
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                return []
+        keys = sorted(candidates) if candidates is not None else sorted(self._objects)
+        objects = [self._objects[key] for key in keys]
+        if selector is not None:
+            objects = [obj for obj in objects if selector.matches((obj.get("metadata") or {}).get("labels"))]
+        return objects
+
+    def _index_entries(self, obj: Dict[str, Any]) -> List[Tuple[str, str]]:
+        meta = obj.get("metadata") or {}
+        entries: List[Tuple[str, str]] = []
+        if meta.get("namespace"):
+            entries.append(("ns", meta["namespace"]))
+        for label, value in (meta.get("labels") or {}).items():
+            entries.append(("label", f"{label}={value}"))
+        for ref in meta.get("ownerReferences") or []:
+            if ref.get("uid"):
+                entries.append(("owner", ref["uid"]))
+        node = (obj.get("spec") or {}).get("nodeName")
+        if node:
+            entries.append(("node", node))
+        involved = obj.get("involvedObject")
+        if involved:
+            entries.append((
+                "involved",
+                f"{involved.get('kind', '')}/{involved.get('namespace', '')}/{involved.get('name', '')}".lower(),
+            ))
+        return entries
+
+
+# ----------------------------------------------------------------------
+# API access
+# ----------------------------------------------------------------------
+class WatchExpired(Exception):
+    """The watch's resourceVersion is too old (HTTP 410); a relist is needed."""
+
+
+class KubernetesAPIClient:
+    """
+    Minimal async client for LIST and WATCH against the Kubernetes API.
+
+    Authenticates with a bearer token (re-read from the service account file
+    on every connection, as bound tokens rotate) and verifies the server
+    with the cluster CA.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: Optional[str] = None,
+        token_file: Optional[str] = None,
+        ca_file: Optional[str] = None,
+        verify: bool = True,
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: API server URL, e.g. https://kubernetes.default.svc
+            token: Static bearer token
+            token_file: File to read the bearer token from
+            ca_file: CA bundle for verifying the API server
+            verify: Whether to verify TLS certificates
+        """
+        self.base_url = base_url.rstrip("/")
+        self._token = token
+        self._token_file = token_file
+        self._ssl: Any = None
+        if self.base_url.startswith("https"):
+            if not verify:
+                self._ssl = False
+            elif ca_file:
+                self._ssl = ssl.create_default_context(cafile=ca_file)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["KubernetesAPIClient"]:
+        """
+        Configure from KUBE_API_URL (plus KUBE_TOKEN / KUBE_CA_FILE /
+        KUBE_INSECURE_SKIP_TLS_VERIFY), e.g. for `kubectl proxy` or a fake
+        API server, or from the in-cluster service account.
+
+        Returns:
+            A client, or None if no API server is configured
+        """
+        url = os.getenv("KUBE_API_URL")
+        if url:
+            return cls(
+                url,
+                token=os.getenv("KUBE_TOKEN"),
+                ca_file=os.getenv("KUBE_CA_FILE"),
+                verify=os.getenv("KUBE_INSECURE_SKIP_TLS_VERIFY", "false").lower() not in ("1", "true", "yes"),
+            )
+        host = os.getenv("KUBERNETES_SERVICE_HOST")
+        token_file = os.path.join(SERVICE_ACCOUNT_DIR, "token")
+        if host and os.path.exists(token_file):
+            port = os.getenv("KUBERNETES_SERVICE_PORT", "443")
+            host = f"[{host}]" if ":" in host else host
+            return cls(
+                f"https://{host}:{port}",
+                token_file=token_file,
+                ca_file=os.path.join(SERVICE_ACCOUNT_DIR, "ca.crt"),
+            )
+        return None
+
+    async def list(self, path: str, limit: int = 500) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        List every object under path, following pagination.
+
+        Args:
+            path: Collection path, e.g. /api/v1/pods
+            limit: Page size
+
+        Returns:
+            (items, resourceVersion of the list)
+        """
+        items: List[Dict[str, Any]] = []
+        params: Dict[str, Any] = {"limit": limit}
+        while True:
+            async with self._get(path, params, timeout=aiohttp.ClientTimeout(total=120)) as response:
+                if response.status == 410:
+                    # the continue token expired mid-list: start over
+                    items, params = [], {"limit": limit}
+                    continue
+                response.raise_for_status()
+                body = await response.json()
+            items.extend(body.get("items") or [])
+            metadata = body.get("metadata") or {}
+            if not metadata.get("continue"):
+                return items, metadata.get("resourceVersion", "")
+            params["continue"] = metadata["continue"]
+
+    async def watch(self, path: str, resource_version: str, timeout_seconds: int = 300) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream watch events after resource_version.
+
+        Args:
+            path: Collection path
+            resource_version: Resume point
+            timeout_seconds: Server-side duration of the watch
+
+        Yields:
+            Watch events ({"type": ..., "object": ...})
+
+        Raises:
+            WatchExpired: If resource_version is too old
+        """
+        params = {
+            "watch": "1",
+            "resourceVersion": resource_version,
+            "allowWatchBookmarks": "true",
+            "timeoutSeconds": str(timeout_seconds),
+        }
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=timeout_seconds + 30)
+        async with self._get(path, params, timeout=timeout) as response:
+            if response.status == 410:
+                raise WatchExpired(path)
+            response.raise_for_status()
+            buffer = b""
+            # objects can exceed aiohttp's line length limit, so split lines by hand
+            async for chunk in response.content.iter_any():
+                buffer += chunk
+                while True:
+                    newline = buffer.find(b"\n")
+                    if newline < 0:
+                        break
+                    line, buffer = buffer[:newline], buffer[newline + 1:]
+                    if line.strip():
+                        yield json.loads(line)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get(self, path: str, params: Dict[str, Any], timeout: aiohttp.ClientTimeout) -> Any:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        headers = {"Accept": "application/json"}
+        token = self._token
+        if self._token_file:
+            with open(self._token_file, encoding="utf-8") as f:
+                token = f.read().strip()
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return self._session.get(
+            f"{self.base_url}{path}", params=params, headers=headers, ssl=self._ssl, timeout=timeout
+        )
+
+
+# ----------------------------------------------------------------------
+# Informers
+# ----------------------------------------------------------------------
+class Informer:
+    """Keep one ResourceStore current: list, then watch, relisting when needed."""
+
+    def __init__(self, client: KubernetesAPIClient, kind: ResourceKind, watch_timeout: int = 300):
+        self.kind = kind
+        self.store = ResourceStore(kind.name)
+        self.synced = asyncio.Event()
+        self._client = client
+        self._watch_timeout = watch_timeout
+        self._resource_version: Optional[str] = None
+        self._last_heard: Optional[float] = None
+        self._stats = {"lists": 0, "events": 0, "bookmarks": 0, "errors": 0}
+        self._last_error: Optional[str] = None
+        self._list_seconds = 0.0
+
+    @property
+    def lag_seconds(self) -> Optional[float]:
+        """Seconds since the store was last confirmed current (list, event or bookmark)."""
+        if self._last_heard is None:
+            return None
+        return time.monotonic() - self._last_heard
+
+    async def run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                if self._resource_version is None:
+                    await self._list()
+                await self._watch()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except WatchExpired:
+                logging.info("Watch of %s expired; relisting", self.kind.name)
+                self._resource_version = None
+            except Exception as exc:
+                self._stats["errors"] += 1
+                self._last_error = f"{type(exc).__name__}: {exc}"
+                logging.warning("Cluster cache %s: %s; retrying in %.0fs", self.kind.name, self._last_error, backoff)
+                await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+                backoff = min(backoff * 2, 60.0)
+
+    async def _list(self) -> None:
+        started = time.perf_counter()
+        items, resource_version = await self._client.list(self.kind.path)
+        self.store.replace(compact_object(self.kind.name, item) for item in items)
+        self._resource_version = resource_version
+        self._list_seconds = time.perf_counter() - started
+        self._last_heard = time.monotonic()
+        self._stats["lists"] += 1
+        self.synced.set()
+
+    async def _watch(self) -> None:
+        async for event in self._client.watch(self.kind.path, self._resource_version or "", self._watch_timeout):
+            kind = event.get("type")
+            obj = event.get("object") or {}
+            if kind == "ERROR":
+                if obj.get("code") == 410:
+                    raise WatchExpired(self.kind.path)
+                raise RuntimeError(obj.get("message") or "watch error")
+            resource_version = (obj.get("metadata") or {}).get("resourceVersion")
+            if resource_version:
+                self._resource_version = resource_version
+            self._last_heard = time.monotonic()
+            if kind == "BOOKMARK":
+                self._stats["bookmarks"] += 1
+                continue
+            self._stats["events"] += 1
+            if kind == "DELETED":
+                self.store.delete(object_key(obj))
+            else:
+                self.store.upsert(compact_object(self.kind.name, obj))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "synced": self.synced.is_set(),
+            "objects": len(self.store),
+            "bytes": self.store.bytes,
+            "index_entries": self.store.index_entries,
+            "lag_seconds": self.lag_seconds,
+            "list_seconds": self._list_seconds,
+            "resource_version": self._resource_version,
+            "last_error": self._last_error,
+            **self._stats,
+        }
+
+
+class ClusterStateCache:
+    """
+    Watch-backed cache of the core cluster resources.
+
+    Usage::
+
+        async with ClusterStateCache(KubernetesAPIClient.from_env()) as cache:
+            await cache.wait_synced(timeout=10)
+            pods = cache.list("pods", namespace="default", label_selector="app=web")
+    """
+
+    def __init__(self, client: KubernetesAPIClient, kinds: Optional[Iterable[str]] = None, watch_timeout: int = 300):
+        """
+        Initialize the cache; informers start on entering the context.
+
+        Args:
+            client: API client
+            kinds: Resource kinds to cache (default: all of KINDS)
+            watch_timeout: Server-side duration of each watch request
+        """
+        self._client = client
+        self._informers = {
+            name: Informer(client, KINDS[name], watch_timeout)
+            for name in (resolve_kind(kind) for kind in (kinds or KINDS))
+        }
+        self._tasks: List[asyncio.Task[None]] = []
+
+    @classmethod
+    def from_env(cls) -> Optional["ClusterStateCache"]:
+        """
+        Create a cache as configured by CLUSTER_CACHE ("auto", "on" or "off")
+        and CLUSTER_CACHE_KINDS; "auto" enables it when an API server is configured.
+
+        Returns:
+            The cache, or None when disabled
+        """
+        mode = os.getenv("CLUSTER_CACHE", "auto").lower()
+        if mode in ("off", "false", "0"):
+            return None
+        client = KubernetesAPIClient.from_env()
+        if client is None:
+            if mode in ("on", "true", "1"):
+                raise RuntimeError("CLUSTER_CACHE is on but no Kubernetes API server is configured")
+            return None
+        kinds = [k for k in os.getenv("CLUSTER_CACHE_KINDS", "").split(",") if k.strip()]
+        return cls(client, kinds or None)
+
+    async def __aenter__(self) -> "ClusterStateCache":
+        self._tasks = [
+            asyncio.create_task(informer.run(), name=f"informer-{name}")
+            for name, informer in self._informers.items()
+        ]
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._client.close()
+
+    @property
+    def kinds(self) -> List[str]:
+        return list(self._informers)
+
+    def is_synced(self, kind: Optional[str] = None) -> bool:
+        if kind is not None:
+            return self._informers[resolve_kind(kind)].synced.is_set()
+        return all(informer.synced.is_set() for informer in self._informers.values())
+
+    async def wait_synced(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every informer completed its initial list.
+
+        Args:
+            timeout: Seconds to wait at most
+
+        Returns:
+            True if all kinds are synced
+        """
+        waits = [informer.synced.wait() for informer in self._informers.values()]
+        try:
+            await asyncio.wait_for(asyncio.gather(*waits), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def store(self, kind: str) -> ResourceStore:
+        """
+        Get the store of a kind, which must have completed its initial list.
+
+        Raises:
+            ValueError: If the kind is not cached
+            LookupError: If it is not synced yet
+        """
+        informer = self._informers.get(resolve_kind(kind))
+        if informer is None:
+            raise ValueError(f"'{kind}' is not cached; cached kinds are {', '.join(self._informers)}")
+        if not informer.synced.is_set():
+            raise LookupError(f"The cache of {informer.kind.name} is still loading")
+        return informer.store
+
+    def get(self, kind: str, name: str, namespace: str = "") -> Optional[Dict[str, Any]]:
+        kind = resolve_kind(kind)
+        key = f"{namespace}/{name}" if KINDS[kind].namespaced else name
+        return self.store(kind).get(key)
+
+    def list(
+        self,
+        kind: str,
+        namespace: str = "",
+        label_selector: str = "",
+        node: str = "",
+    ) -> List[Dict[str, Any]]:
+        return self.store(kind).select(
+            namespace=namespace or None,
+            selector=LabelSelector(label_selector) if label_selector else None,
+            node=node or None,
+        )
+
+    def pods_for(self, kind: str, name: str, namespace: str) -> List[Dict[str, Any]]:
+        """
+        Pods owned by a workload, following Deployment -> ReplicaSet -> Pod.
+
+        Args:
+            kind: deployments, replicasets, statefulsets, daemonsets or jobs
+            name: Workload name
+            namespace: Workload namespace
+
+        Returns:
+            The pods
+        """
+        owner = self.get(kind, name, namespace)
+        if owner is None:
+            return []
+        owner_uids = [owner["metadata"]["uid"]]
+        if resolve_kind(kind) == "deployments":
+            owner_uids = [rs["metadata"]["uid"] for rs in self.store("replicasets").select(owner_uid=owner_uids[0])]
+        pods = self.store("pods")
+        return [pod for uid in owner_uids for pod in pods.select(owner_uid=uid)]
+
+    def events_for(self, kind: str, name: str, namespace: str = "") -> List[Dict[str, Any]]:
+        """Events whose involved object is the given object, oldest first."""
+        plural = resolve_kind(kind)
+        if plural == "events":
+            raise ValueError("events have no events")
+        events = self.store("events").select(involved=(plural[:-1], namespace, name))
+        return sorted(events, key=event_time)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: informer.get_stats() for name, informer in self._informers.items()}
+
+
+def event_time(event: Dict[str, Any]) -> str:
+    return event.get("lastTimestamp") or event.get("eventTime") or event.get("firstTimestamp") or ""
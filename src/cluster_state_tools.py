@@ -0,0 +1,263 @@
+"""
+Cluster State Tools for Kubernetes Operations Agent.
+
+Provides native function tools that answer read-only questions about pods,
+workloads, nodes, services and events from the ClusterStateCache, in
+compact kubectl-like tables. Writes, logs and anything not cached still go
+through the Kubernetes MCP server.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from agents import FunctionTool, function_tool
+
+from cluster_state_cache import ClusterStateCache, event_time, resolve_kind
+
+__all__ = ["CLUSTER_STATE_INSTRUCTIONS", "create_cluster_state_tools", "format_objects"]
+
+CLUSTER_STATE_INSTRUCTIONS = (
+    "The cached_* tools read pods, workloads, nodes, services and events from an in-memory cache kept current "
+    "by watches; prefer them for listing and inspecting these resources and fall back to the Kubernetes tools "
+    "for logs, other resource kinds, changes, or when a cached_* tool reports the cache is unavailable."
+)
+
+MAX_ROWS = 200
+
+
+def _age(timestamp: str) -> str:
+    if not timestamp:
+        return "-"
+    try:
+        created = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return "-"
+    seconds = int((datetime.now(timezone.utc) - created).total_seconds())
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds // size}{unit}"
+    return f"{max(seconds, 0)}s"
+
+
+def pod_status(pod: Dict[str, Any]) -> str:
+    """Status as kubectl shows it: a container's waiting/terminated reason, else the phase."""
+    if (pod.get("metadata") or {}).get("deletionTimestamp"):
+        return "Terminating"
+    status = pod.get("status") or {}
+    for container in status.get("containerStatuses") or []:
+        for state, detail in (container.get("state") or {}).items():
+            if state != "running" and detail.get("reason") and detail.get("reason") != "Completed":
+                return detail["reason"]
+    return status.get("reason") or status.get("phase") or "Unknown"
+
+
+def _pod_row(pod: Dict[str, Any]) -> List[str]:
+    containers = (pod.get("status") or {}).get("containerStatuses") or []
+    ready = sum(1 for c in containers if c.get("ready"))
+    restarts = sum(c.get("restartCount", 0) for c in containers)
+    meta = pod["metadata"]
+    return [
+        meta.get("namespace", ""), meta["name"], f"{ready}/{len(containers)}", pod_status(pod),
+        str(restarts), (pod.get("spec") or {}).get("nodeName", "-"), _age(meta.get("creationTimestamp", "")),
+    ]
+
+
+def _workload_row(obj: Dict[str, Any]) -> List[str]:
+    spec, status, meta = obj.get("spec") or {}, obj.get("status") or {}, obj["metadata"]
+    desired = spec.get("replicas", status.get("desiredNumberScheduled", 0))
+    ready = status.get("readyReplicas", status.get("numberReady", 0))
+    updated = status.get("updatedReplicas", status.get("updatedNumberScheduled", 0))
+    available = status.get("availableReplicas", status.get("numberAvailable", 0))
+    return [meta.get("namespace", ""), meta["name"], f"{ready}/{desired}", str(updated), str(available),
+            _age(meta.get("creationTimestamp", ""))]
+
+
+def _job_row(job: Dict[str, Any]) -> List[str]:
+    spec, status, meta = job.get("spec") or {}, job.get("status") or {}, job["metadata"]
+    return [meta.get("namespace", ""), meta["name"], f"{status.get('succeeded', 0)}/{spec.get('completions', 1)}",
+            str(status.get("active", 0)), str(status.get("failed", 0)), _age(meta.get("creationTimestamp", ""))]
+
+
+def _node_row(node: Dict[str, Any]) -> List[str]:
+    status = node.get("status") or {}
+    conditions = {c.get("type"): c.get("status") for c in status.get("conditions") or []}
+    ready = "Ready" if conditions.get("Ready") == "True" else "NotReady"
+    if (node.get("spec") or {}).get("unschedulable"):
+        ready += ",SchedulingDisabled"
+    pressure = [name for name, value in conditions.items() if name != "Ready" and value == "True"]
+    allocatable = status.get("allocatable") or {}
+    return [node["metadata"]["name"], ready, ",".join(pressure) or "-",
+            f"cpu={allocatable.get('cpu', '?')},mem={allocatable.get('memory', '?')}",
+            (status.get("nodeInfo") or {}).get("kubeletVersion", "-"),
+            _age(node["metadata"].get("creationTimestamp", ""))]
+
+
+def _service_row(service: Dict[str, Any]) -> List[str]:
+    spec, meta = service.get("spec") or {}, service["metadata"]
+    ports = ",".join(f"{p.get('port')}/{p.get('protocol', 'TCP')}" for p in spec.get("ports") or [])
+    return [meta.get("namespace", ""), meta["name"], spec.get("type", "ClusterIP"), spec.get("clusterIP", "-"),
+            ports or "-", _age(meta.get("creationTimestamp", ""))]
+
+
+def _event_row(event: Dict[str, Any]) -> List[str]:
+    involved = event.get("involvedObject") or {}
+    count = event.get("count")
+    return [event["metadata"].get("namespace", ""), _age(event_time(event)), event.get("type", ""),
+            event.get("reason", ""), f"{involved.get('kind', '')}/{involved.get('name', '')}",
+            (event.get("message") or "").strip().replace("\n", " ") + (f" (x{count})" if count and count > 1 else "")]
+
+
+def _namespace_row(namespace: Dict[str, Any]) -> List[str]:
+    meta = namespace["metadata"]
+    return [meta["name"], (namespace.get("status") or {}).get("phase", "-"), _age(meta.get("creationTimestamp", ""))]
+
+
+_TABLES: Dict[str, tuple[List[str], Callable[[Dict[str, Any]], List[str]]]] = {
+    "pods": (["NAMESPACE", "NAME", "READY", "STATUS", "RESTARTS", "NODE", "AGE"], _pod_row),
+    "deployments": (["NAMESPACE", "NAME", "READY", "UP-TO-DATE", "AVAILABLE", "AGE"], _workload_row),
+    "replicasets": (["NAMESPACE", "NAME", "READY", "UP-TO-DATE", "AVAILABLE", "AGE"], _workload_row),
+    "statefulsets": (["NAMESPACE", "NAME", "READY", "UP-TO-DATE", "AVAILABLE", "AGE"], _workload_row),
+    "daemonsets": (["NAMESPACE", "NAME", "READY", "UP-TO-DATE", "AVAILABLE", "AGE"], _workload_row),
+    "jobs": (["NAMESPACE", "NAME", "COMPLETIONS", "ACTIVE", "FAILED", "AGE"], _job_row),
+    "nodes": (["NAME", "STATUS", "CONDITIONS", "ALLOCATABLE", "VERSION", "AGE"], _node_row),
+    "services": (["NAMESPACE", "NAME", "TYPE", "CLUSTER-IP", "PORTS", "AGE"], _service_row),
+    "events": (["NAMESPACE", "LAST SEEN", "TYPE", "REASON", "OBJECT", "MESSAGE"], _event_row),
+    "namespaces": (["NAME", "STATUS", "AGE"], _namespace_row),
+}
+
+
+def format_objects(kind: str, objects: List[Dict[str, Any]], limit: int = MAX_ROWS) -> str:
+    """
+    Render objects as a tab-separated table, truncated to limit rows.
+
+    Args:
+        kind: Plural resource name
+        objects: Compacted objects
+        limit: Maximum rows
+
+    Returns:
+        The table, or a note that nothing matched
+    """
+    if not objects:
+        return f"No {kind} found."
+    header, row = _TABLES[kind]
+    lines = ["\t".join(header)]
+    lines.extend("\t".join(row(obj)) for obj in objects[:limit])
+    if len(objects) > limit:
+        lines.append(f"... {len(objects) - limit} more {kind} not shown; narrow the query.")
+    return "\n".join(lines)
+
+
+def _cache_error(exc: Exception) -> str:
+    return f"Cluster cache unavailable: {exc}. Use the Kubernetes tools instead."
+
+
+def create_cluster_state_tools(cache: ClusterStateCache) -> List[FunctionTool]:
+    """
+    Create the agent tools reading from a cache.
+
+    Args:
+        cache: A started ClusterStateCache
+
+    Returns:
+        The function tools to register on the agent
+    """
+
+    @function_tool
+    def cached_list_resources(kind: str, namespace: str = "", label_selector: str = "", node: str = "") -> str:
+        """List cached Kubernetes resources as a table, like `kubectl get <kind>`.
+
+        Args:
+            kind: pods, deployments, replicasets, statefulsets, daemonsets, jobs, nodes, services, events or namespaces.
+            namespace: Namespace to list; empty for all namespaces.
+            label_selector: Label selector such as "app=web,tier!=db"; empty for all.
+            node: For pods, only those scheduled on this node.
+        """
+        try:
+            kind = resolve_kind(kind)
+            return format_objects(kind, cache.list(kind, namespace, label_selector, node))
+        except (ValueError, LookupError) as exc:
+            return _cache_error(exc)
+
+    @function_tool
+    def cached_get_resource(kind: str, name: str, namespace: str = "") -> str:
+        """Get one cached resource as JSON (status, conditions, owners, container states) plus its recent events.
+
+        Args:
+            kind: Resource kind, e.g. pod, deployment or node.
+            name: Resource name.
+            namespace: Namespace; empty for cluster-scoped kinds such as nodes.
+        """
+        try:
+            obj = cache.get(kind, name, namespace)
+            if obj is None:
+                return f"{kind} {namespace + '/' if namespace else ''}{name} not found in the cache."
+            events = cache.events_for(kind, name, namespace) if cache.is_synced("events") else []
+        except (ValueError, LookupError) as exc:
+            return _cache_error(exc)
+        text = json.dumps(obj, separators=(",", ":"))
+        if events:
+            text += "\n\nEvents:\n" + format_objects("events", events[-20:])
+        return text
+
+    @function_tool
+    def cached_workload_pods(kind: str, name: str, namespace: str) -> str:
+        """List the pods of a deployment, replicaset, statefulset, daemonset or job.
+
+        Args:
+            kind: Workload kind, e.g. deployment.
+            name: Workload name.
+            namespace: Workload namespace.
+        """
+        try:
+            return format_objects("pods", cache.pods_for(kind, name, namespace))
+        except (ValueError, LookupError) as exc:
+            return _cache_error(exc)
+
+    @function_tool
+    def cached_unhealthy_pods(namespace: str = "") -> str:
+        """List pods that are not ready, not running/succeeded, or restarting; a fast first step for troubleshooting.
+
+        Args:
+            namespace: Namespace to check; empty for all namespaces.
+        """
+        try:
+            pods = cache.list("pods", namespace)
+        except (ValueError, LookupError) as exc:
+            return _cache_error(exc)
+        unhealthy = []
+        for pod in pods:
+            status = pod_status(pod)
+            containers = (pod.get("status") or {}).get("containerStatuses") or []
+            if status == "Succeeded":
+                continue
+            if (status != "Running" or not all(c.get("ready") for c in containers)
+                    or any(c.get("restartCount", 0) for c in containers)):
+                unhealthy.append(pod)
+        if not unhealthy:
+            return f"All {len(pods)} pods are healthy."
+        return format_objects("pods", unhealthy)
+
+    @function_tool
+    def cached_events(namespace: str = "", kind: str = "", name: str = "", warnings_only: bool = False) -> str:
+        """List cached events, most recent last, optionally for one object or only warnings.
+
+        Args:
+            namespace: Namespace of the events; empty for all namespaces.
+            kind: Kind of the involved object, e.g. Pod; requires name.
+            name: Name of the involved object.
+            warnings_only: Only return events of type Warning.
+        """
+        try:
+            if name:
+                events = cache.events_for(kind or "pod", name, namespace)
+            else:
+                events = sorted(cache.list("events", namespace), key=event_time)
+        except (ValueError, LookupError) as exc:
+            return _cache_error(exc)
+        if warnings_only:
+            events = [event for event in events if event.get("type") == "Warning"]
+        return format_objects("events", events[-MAX_ROWS:])
+
+    return [cached_list_resources, cached_get_resource, cached_workload_pods, cached_unhealthy_pods, cached_events]
@@ -0,0 +1,344 @@
+"""
+Headless API for Kubernetes Operations Agent.
+
+Provides /v1/ask, which answers one question without the Chainlit UI and
+streams the answer tokens and tool events as Server-Sent Events (or returns
+a single JSON result), and /v1/ask/batch, which triages many alerts with
+bounded concurrency while the runs of a batch share read-only tool results.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from agents.exceptions import MaxTurnsExceeded
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+
+from mcp_tool_cache import shared_tool_results
+from message_run import StatelessSession, run_message
+from run_control import run_timeout_from_env
+from run_scheduler import RunQueueFull, RunScheduler
+
+EmitCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class AskRequest(BaseModel):
+    """Body of POST /v1/ask."""
+
+    question: str = Field(..., min_length=1)
+    history: List[Dict[str, str]] = Field(default_factory=list, description="Earlier role/content messages")
+    user: Optional[str] = Field(None, description="Caller identity for fair queuing; defaults to 'api'")
+    max_turns: int = Field(10, ge=1, le=50)
+    include_tool_outputs: bool = True
+    stream: bool = True
+
+
+class BatchAlert(BaseModel):
+    """One alert of a batch."""
+
+    id: Optional[str] = None
+    question: str = Field(..., min_length=1)
+
+
+class BatchRequest(BaseModel):
+    """Body of POST /v1/ask/batch."""
+
+    alerts: List[BatchAlert] = Field(..., min_length=1)
+    user: Optional[str] = None
+    concurrency: Optional[int] = Field(None, ge=1)
+    max_turns: int = Field(10, ge=1, le=50)
+    include_tool_outputs: bool = False
+    stream: bool = True
+
+
+def sse_frame(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _discard(event: str, data: Dict[str, Any]) -> None:
+    return None
+
+
+class HeadlessAgentAPI:
+    """
+    REST/SSE entry point to the agent for automation such as alert triage.
+
+    Runs go through the same run scheduler, model router, deadline and
+    metrics as chat messages, without a Chainlit session or UI steps.
+    SSE events are "route", "token" (coalesced text), "tool_call",
+    "tool_output", "message", "error" and "done"; batch streams tag each of
+    them with the alert id and add "result" per alert and "batch_done".
+    """
+
+    def __init__(
+        self,
+        agent_provider: Any,
+        run_scheduler: RunScheduler,
+        *,
+        run_timeout: Optional[float] = None,
+        batch_concurrency: int = 4,
+        batch_max_concurrency: int = 16,
+        batch_max_alerts: int = 100,
+        batch_tool_result_ttl: float = 300.0,
+    ):
+        """
+        Initialize the HeadlessAgentAPI.
+
+        Args:
+            agent_provider: The KubernetesAIOpsAgentProvider serving the agent
+            run_scheduler: Admission control shared with the chat UI
+            run_timeout: Wall-clock deadline of one run in seconds, if any
+            batch_concurrency: Alerts of a batch run at once unless the request asks otherwise
+            batch_max_concurrency: Upper bound of a batch's requested concurrency
+            batch_max_alerts: Largest batch accepted
+            batch_tool_result_ttl: Seconds read-only tool results are shared within a batch
+        """
+        self._provider = agent_provider
+        self._scheduler = run_scheduler
+        self.run_timeout = run_timeout
+        self.batch_concurrency = batch_concurrency
+        self.batch_max_concurrency = batch_max_concurrency
+        self.batch_max_alerts = batch_max_alerts
+        self.batch_tool_result_ttl = batch_tool_result_ttl
+
+    @classmethod
+    def from_env(cls, agent_provider: Any, run_scheduler: RunScheduler) -> "HeadlessAgentAPI":
+        """
+        Create the API configured from AGENT_RUN_TIMEOUT and API_BATCH_* variables.
+
+        Args:
+            agent_provider: The KubernetesAIOpsAgentProvider serving the agent
+            run_scheduler: Admission control shared with the chat UI
+
+        Returns:
+            A new HeadlessAgentAPI
+        """
+        return cls(
+            agent_provider,
+            run_scheduler,
+            run_timeout=run_timeout_from_env(),
+            batch_concurrency=int(os.getenv("API_BATCH_CONCURRENCY", "4")),
+            batch_max_concurrency=int(os.getenv("API_BATCH_MAX_CONCURRENCY", "16")),
+            batch_max_alerts=int(os.getenv("API_BATCH_MAX_ALERTS", "100")),
+            batch_tool_result_ttl=float(os.getenv("API_BATCH_TOOL_RESULT_TTL", "300")),
+        )
+
+    def create_router(self) -> APIRouter:
+        """Routes to include in the FastAPI app."""
+        router = APIRouter(prefix="/v1", tags=["headless"])
+        router.add_api_route("/ask", self.ask, methods=["POST"])
+        router.add_api_route("/ask/batch", self.ask_batch, methods=["POST"])
+        return router
+
+    async def ask(self, request: AskRequest) -> Response:
+        """Answer one question, streamed as Server-Sent Events unless stream is false."""
+        user_key = request.user or "api"
+
+        async def produce(emit: EmitCallback) -> Dict[str, Any]:
+            return await self.run_question(
+                request.question,
+                emit,
+                user_key=user_key,
+                history=request.history,
+                max_turns=request.max_turns,
+                include_tool_outputs=request.include_tool_outputs,
+            )
+
+        if request.stream:
+            return self._event_stream(produce)
+        result = await produce(_discard)
+        return JSONResponse(result, status_code=429 if result["outcome"] == "rejected" else 200)
+
+    async def ask_batch(self, request: BatchRequest) -> Response:
+        """Triage many alerts with bounded concurrency, sharing tool results among them."""
+        if len(request.alerts) > self.batch_max_alerts:
+            return JSONResponse(
+                {"error": f"{len(request.alerts)} alerts exceed the limit of {self.batch_max_alerts} per batch"},
+                status_code=413,
+            )
+        concurrency = min(request.concurrency or self.batch_concurrency, self.batch_max_concurrency, len(request.alerts))
+        user = request.user or "api"
+
+        async def produce(emit: EmitCallback) -> Dict[str, Any]:
+            started = time.perf_counter()
+            pending: Deque[Tuple[int, BatchAlert]] = deque(enumerate(request.alerts))
+            results: List[Dict[str, Any]] = [{} for _ in request.alerts]
+
+            async def lane(number: int) -> None:
+                # each lane queues as its own user, so a batch is served
+                # fairly alongside chat users and within the global run limit
+                while pending:
+                    index, alert = pending.popleft()
+                    alert_id = alert.id or str(index)
+
+                    async def emit_alert(event: str, data: Dict[str, Any]) -> None:
+                        await emit(event, {"id": alert_id, **data})
+
+                    result = await self.run_question(
+                        alert.question,
+                        emit_alert,
+                        user_key=f"{user}#batch{number}",
+                        max_turns=request.max_turns,
+                        include_tool_outputs=request.include_tool_outputs,
+                    )
+                    results[index] = {"id": alert_id, **result}
+                    await emit("result", results[index])
+
+            with shared_tool_results(self.batch_tool_result_ttl):
+                await asyncio.gather(*(lane(number) for number in range(concurrency)))
+            summary = {
+                "alerts": len(results),
+                "ok": sum(1 for r in results if r["outcome"] == "ok"),
+                "tool_calls": sum(r["tool_calls"] for r in results),
+                "concurrency": concurrency,
+                "seconds": time.perf_counter() - started,
+            }
+            await emit("batch_done", summary)
+            return {"results": results, **summary}
+
+        if request.stream:
+            return self._event_stream(produce)
+        return JSONResponse(await produce(_discard))
+
+    async def run_question(
+        self,
+        question: str,
+        emit: EmitCallback,
+        *,
+        user_key: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        max_turns: int = 10,
+        include_tool_outputs: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Run the agent on one question, reporting progress through emit.
+
+        Args:
+            question: The question or alert text
+            emit: Awaited with (event, data) for every SSE event
+            user_key: Key for the scheduler's per-user limits and fairness
+            history: Earlier messages of the conversation, if any
+            max_turns: Turn limit of the run
+            include_tool_outputs: Whether to emit the full output of every tool call
+
+        Returns:
+            The answer, route, tool call count, usage and outcome ("ok",
+            "max_turns", "cancelled", "rejected" or "error")
+        """
+        result: Dict[str, Any] = {
+            "answer": "", "route": None, "escalation": None, "tool_calls": 0,
+            "usage": None, "outcome": "ok", "error": None, "seconds": 0.0,
+        }
+        started = time.perf_counter()
+        try:
+            ticket = await self._scheduler.acquire(user_key)
+        except RunQueueFull as e:
+            result.update(outcome="rejected", error=str(e))
+            await emit("error", {"type": "RunQueueFull", "message": str(e)})
+            return result
+
+        answer: List[str] = []
+
+        async def on_route(decision: Any) -> None:
+            result["route"] = decision.route
+            await emit("route", {"route": decision.route, "reason": decision.reason})
+
+        async def on_tool_call(call_id: str, name: str, arguments: str) -> None:
+            result["tool_calls"] += 1
+            await emit("tool_call", {"call_id": call_id, "name": name, "arguments": arguments})
+
+        async def on_tool_output(call_id: str, output: Any) -> None:
+            await emit("tool_output", {"call_id": call_id, "output": self._resolve_output(output)})
+
+        async def on_message(text: str) -> None:
+            answer.append(text)
+            await emit("message", {"text": text})
+
+        try:
+            run = await run_message(
+                self._provider.get_router(),
+                StatelessSession(history),
+                question,
+                lambda text: emit("token", {"text": text}),
+                run_timeout=self.run_timeout,
+                max_turns=max_turns,
+                on_route=on_route,
+                on_tool_call=on_tool_call,
+                on_tool_output=on_tool_output if include_tool_outputs else None,
+                on_message=on_message,
+                stop_reason="disconnect",
+                trace_fields={"history": history or []},
+            )
+            result.update(
+                answer="\n\n".join(answer), route=run["route"], escalation=run["escalation"],
+                usage=_usage(run["usage"]),
+            )
+            if run["cancel_reason"]:
+                result.update(outcome="cancelled", error=run["cancel_reason"])
+        except MaxTurnsExceeded as e:
+            result.update(outcome="max_turns", error=str(e))
+        except Exception as e:
+            result.update(outcome="error", error=f"{type(e).__name__}: {e}")
+        finally:
+            self._scheduler.release(ticket)
+            result["seconds"] = time.perf_counter() - started
+
+        if result["outcome"] != "ok":
+            await emit("error", {"type": result["outcome"], "message": result["error"]})
+        await emit("done", {k: v for k, v in result.items() if k != "answer"})
+        return result
+
+    def _resolve_output(self, output: Any) -> Any:
+        # the full output rather than the reduced one the model saw
+        processor = self._provider.get_mcp_provider().get_output_processor()
+        return processor.resolve_raw(output) if processor else output
+
+    @staticmethod
+    def _event_stream(produce: Callable[[EmitCallback], Awaitable[Any]]) -> StreamingResponse:
+        queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+        async def emit(event: str, data: Dict[str, Any]) -> None:
+            queue.put_nowait(sse_frame(event, data))
+
+        async def producer() -> None:
+            try:
+                await produce(emit)
+            except Exception as e:
+                queue.put_nowait(sse_frame("error", {"type": type(e).__name__, "message": str(e)}))
+            finally:
+                queue.put_nowait(None)
+
+        async def frames():
+            # the runs execute in their own task; leaving early (client
+            # disconnect) cancels them
+            task = asyncio.create_task(producer())
+            try:
+                while (frame := await queue.get()) is not None:
+                    yield frame
+            finally:
+                if not task.done():
+                    task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+
+        return StreamingResponse(
+            frames(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
+def _usage(usage: Any) -> Dict[str, int]:
+    return {
+        "requests": usage.requests,
+        "input_tokens": usage.input_tokens,
+        "cached_input_tokens": getattr(usage.input_tokens_details, "cached_tokens", 0) or 0,
+        "output_tokens": usage.output_tokens,
+    }
@@ -54,7 +54,7 @@ class OpenAIClientFactory(ABC):
     """Interface for creating OpenAI clients."""
     
     @abstractmethod
-    def create_client(self) -> Any:
+    def create_client(self, deployment: Optional[str] = None) -> Any:
         """Create and configure an OpenAI client."""
         pass
 
@@ -1,52 +1,135 @@
 from contextlib import AsyncExitStack
+import dataclasses
+import json
+import logging
 import os
+import shutil
+import sys
 from typing import Any, Dict, List, Optional
 
-from agents import Agent
+from agents import Agent, RunConfig, RunContextWrapper, Tool, ToolExecutionConfig
 from agents.model_settings import ModelSettings
 
+from cluster_fleet_tools import ClusterFanout, create_fleet_tools, fleet_instructions
+from cluster_state_cache import ClusterStateCache
+from cluster_state_tools import CLUSTER_STATE_INSTRUCTIONS, create_cluster_state_tools
 from mcp_server_provider_impl import MCPServerProviderImpl
+from mcp_tool_cache import MCPToolCache
+from mcp_tool_catalog import CatalogAgent, MCPToolCatalog
+from mcp_tool_output import ToolOutputProcessor
+from metrics import PROMPT_PREFIX
+from model_router import ModelRouter
+from openai_client_factory_impl import OpenAIClientFactoryImpl
+from prometheus_query_planner import PrometheusQueryProxy
+from prompt_cache import prefix_fingerprint, prompt_cache_key_from_env, with_prompt_cache_key
+from startup_profile import startup_profiler
 
-DEFAULT_MODEL_SETTINGS = ModelSettings(temperature=1.0)
+DEFAULT_MODEL_SETTINGS = ModelSettings(temperature=1.0, parallel_tool_calls=True)
 
 __all__ = ["KubernetesAIOpsAgentProvider"]
 
 
 class KubernetesAIOpsAgentProvider:
-    """Async CM that yields a ready‑to‑use :class:`Agent`."""
+    """Async CM that yields a ready‑to‑use :class:`Agent`.
 
-    def __init__(self) -> None:
+    ``mcp_config`` replaces the built‑in kubernetes/prometheus/time server
+    specs (same ``{"mcpServers": {...}}`` layout as
+    :class:`MCPServerProviderImpl`), e.g. to run against stub servers; so
+    does a JSON file named by ``MCP_CONFIG_FILE``.  A config with
+    ``clusters`` and ``clusterServers`` serves many clusters from one
+    replica and adds the ``fanout_query`` tool querying them all at once.
+    ``client_factory`` creates the models of the fast and large routes
+    when model routing is configured (``AGENT_FAST_MODEL``).
+    """
+
+    def __init__(
+        self,
+        mcp_config: Optional[Dict[str, Any]] = None,
+        client_factory: Optional[OpenAIClientFactoryImpl] = None,
+    ) -> None:
+        self._mcp_config = mcp_config
+        self._client_factory = client_factory or OpenAIClientFactoryImpl()
         self._stack: AsyncExitStack | None = None
         self._agent: Agent | None = None
+        self._mcp_provider: MCPServerProviderImpl | None = None
+        self._cluster_cache: ClusterStateCache | None = None
+        self._prometheus_proxy: PrometheusQueryProxy | None = None
+        self._prompt_fingerprint: str | None = None
+        self._router: ModelRouter | None = None
+        self._run_config: Optional[RunConfig] = None
 
     # ------------------------------------------------------------------
     # Async CM
     # ------------------------------------------------------------------
     async def __aenter__(self) -> Agent:  # noqa: D401 – public API
         self._stack = AsyncExitStack()
+        with startup_profiler.phase("openai_client"):
+            self._client_factory.configure_defaults()
+            self._stack.push_async_callback(self._client_factory.aclose)
+        # after configure_defaults: the SDK's model provider captures the default API on creation
+        self._run_config = self._create_run_config()
 
-        provider = await self._stack.enter_async_context(
-            MCPServerProviderImpl(
-                {
-                    "mcpServers": {
-                        "kubernetes": {
-                            "command": "npx",
-                            "args": ["mcp-server-kubernetes"],
-                        },
-                        "prometheus": {
-                            "command": "prometheus-mcp-server",
-                            "env": self._get_prometheus_env()
-                        },
-                        "time": {
-                            "command": "python",
-                            "args": ["-m", "mcp_server_time"]
-                        }
-                    }
-                }
+        # Informers list the cluster while the MCP servers start
+        cache = ClusterStateCache.from_env()
+        if cache is not None:
+            with startup_profiler.phase("cluster_cache_start"):
+                self._cluster_cache = await self._stack.enter_async_context(cache)
+
+        # The Prometheus MCP server queries through the planner's local endpoint
+        proxy = PrometheusQueryProxy.from_env()
+        if proxy is not None:
+            with startup_profiler.phase("prometheus_query_planner"):
+                self._prometheus_proxy = await self._stack.enter_async_context(proxy)
+
+        with startup_profiler.phase("mcp_servers"):
+            self._mcp_provider = provider = await self._stack.enter_async_context(
+                MCPServerProviderImpl(
+                    self._mcp_config or self._mcp_config_from_file() or self._default_mcp_config(),
+                    pool_size=int(os.getenv("MCP_POOL_SIZE", "1")),
+                    max_in_flight=int(os.getenv("MCP_POOL_MAX_IN_FLIGHT", "1")),
+                    startup_timeout=float(os.getenv("MCP_STARTUP_TIMEOUT", "60")),
+                    call_timeout=float(os.getenv("MCP_CALL_TIMEOUT", "60")),
+                    health_check_interval=float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "15")),
+                    breaker_threshold=int(os.getenv("MCP_CIRCUIT_FAILURE_THRESHOLD", "3")),
+                    breaker_reset_timeout=float(os.getenv("MCP_CIRCUIT_RESET_TIMEOUT", "30")),
+                    tool_cache=MCPToolCache(
+                        max_entries=int(os.getenv("MCP_TOOL_CACHE_MAX_ENTRIES", "1024")),
+                    ),
+                    output_processor=ToolOutputProcessor(
+                        max_chars=int(os.getenv("TOOL_OUTPUT_MAX_CHARS", "16000")),
+                        target_points=int(os.getenv("TOOL_OUTPUT_TARGET_POINTS", "120")),
+                    ),
+                )
             )
-        )
 
-        self._agent = await self._create_agent(provider.get_servers())
+        tools: List[Tool] = []
+        if self._cluster_cache is not None:
+            with startup_profiler.phase("cluster_cache_sync"):
+                if not await self._cluster_cache.wait_synced(float(os.getenv("CLUSTER_CACHE_SYNC_TIMEOUT", "10"))):
+                    logging.warning("Cluster cache not fully synced at startup; cached tools report kinds still loading")
+            tools = create_cluster_state_tools(self._cluster_cache)
+
+        fleet = provider.get_cluster_fleet()
+        if fleet is not None:
+            fanout = ClusterFanout(
+                fleet,
+                {kind: provider.get_server(kind) for kind in fleet.kinds},
+                provider.get_tool_catalog(),
+                concurrency=int(os.getenv("FANOUT_CONCURRENCY", "8")),
+                timeout=float(os.getenv("FANOUT_TIMEOUT", "30")),
+                max_chars=int(os.getenv("FANOUT_MAX_CHARS", "24000")),
+            )
+            tools += create_fleet_tools(fanout)
+
+        with startup_profiler.phase("agent"):
+            self._agent = await self._create_agent(
+                provider.get_servers(), tools=tools, tool_catalog=provider.get_tool_catalog()
+            )
+            self._router = ModelRouter.from_env(self._agent, self._client_factory, run_config=self._run_config)
+        # a server still starting lists its tools later, which changes the prefix
+        provider.get_tool_catalog().on_change(
+            lambda mcp_tools: self._update_prefix(self._agent, [*mcp_tools, *self._agent.tools])
+        )
         return self._agent
 
     async def __aexit__(self, et, ev, tb):
@@ -61,6 +144,32 @@ class KubernetesAIOpsAgentProvider:
         assert self._agent is not None, "agent not initialized – use 'async with' first"
         return self._agent
 
+    def get_mcp_provider(self) -> MCPServerProviderImpl:
+        assert self._mcp_provider is not None, "MCP servers not initialized – use 'async with' first"
+        return self._mcp_provider
+
+    def get_cluster_cache(self) -> Optional[ClusterStateCache]:
+        """The watch-based cluster cache, or None when disabled."""
+        return self._cluster_cache
+
+    def get_prometheus_proxy(self) -> Optional[PrometheusQueryProxy]:
+        """The Prometheus query planner's local endpoint, or None when disabled."""
+        return self._prometheus_proxy
+
+    def get_router(self) -> ModelRouter:
+        """Router picking the fast or the large model per request; routes everything to the agent when off."""
+        assert self._router is not None, "agent not initialized – use 'async with' first"
+        return self._router
+
+    def get_run_config(self) -> RunConfig:
+        """Run settings shared by every agent run, e.g. the per-turn tool call limit."""
+        assert self._run_config is not None, "agent not initialized – use 'async with' first"
+        return self._run_config
+
+    def get_prompt_fingerprint(self) -> Optional[str]:
+        """Hash of the instructions and tool definitions every request starts with."""
+        return self._prompt_fingerprint
+
     # ------------------------------------------------------------------
     # Internals
     # ------------------------------------------------------------------
@@ -68,25 +177,126 @@ class KubernetesAIOpsAgentProvider:
         self,
         mcp_servers: List[Any],
         model_settings: Optional[ModelSettings] = None,
+        tools: Optional[List[Tool]] = None,
+        tool_catalog: Optional[MCPToolCatalog] = None,
     ) -> Agent:
         settings = model_settings or DEFAULT_MODEL_SETTINGS
-        return Agent(
+        if os.getenv("AGENT_PARALLEL_TOOL_CALLS", "true").lower() in ("0", "false", "no", "off"):
+            settings = dataclasses.replace(settings, parallel_tool_calls=False)
+        # Everything before the conversation is static, so providers can cache it:
+        # no timestamps, user or session data in the instructions
+        instructions = (
+            "You have access to multiple tool functions for querying different aspects of the Kubernetes cluster, "
+            "Prometheus monitoring system, and time-related operations. "
+            "Before providing a final answer, please use as many appropriate tools as possible to gather all relevant information. "
+            "Do not stop after a single call – chain multiple tool actions if needed to ensure a thorough response. "
+            "When several calls do not depend on each other's results, such as getting a pod, its events, its logs "
+            "and its metrics, request them together in one turn so they run in parallel. "
+            "When using tools that require time parameters, always use the time server to get the precise current time."
+        )
+        if self._cluster_cache is not None:
+            instructions += " " + CLUSTER_STATE_INSTRUCTIONS
+        fleet = self._mcp_provider.get_cluster_fleet() if self._mcp_provider is not None else None
+        if fleet is not None:
+            instructions += " " + fleet_instructions(fleet)
+        # MCP tools come prebuilt from the catalog instead of list_tools on every turn
+        agent = CatalogAgent(
             name="KubernetesAIOpsAgent",
-            instructions=(
-                "You have access to multiple tool functions for querying different aspects of the Kubernetes cluster, "
-                "Prometheus monitoring system, and time-related operations. "
-                "Before providing a final answer, please use as many appropriate tools as possible to gather all relevant information. "
-                "Do not stop after a single call – chain multiple tool actions if needed to ensure a thorough response. "
-                "When using tools that require time parameters, always use the time server to get the precise current time."
-            ),
+            instructions=instructions,
+            tools=tools or [],
             mcp_servers=mcp_servers,
             model_settings=settings,
+            tool_catalog=tool_catalog,
         )
 
+        self._update_prefix(agent, await agent.get_all_tools(RunContextWrapper(context=None)))
+        return agent
+
+    def _update_prefix(self, agent: Agent, all_tools: List[Tool]) -> None:
+        # Fingerprint the prefix the agent sends (MCP tools first, as the SDK orders them)
+        # and derive the prompt_cache_key of every route from it
+        fingerprint = prefix_fingerprint(agent.instructions, all_tools)
+        if fingerprint == self._prompt_fingerprint:
+            return
+        if self._prompt_fingerprint is not None:
+            PROMPT_PREFIX.remove(self._prompt_fingerprint)
+        self._prompt_fingerprint = fingerprint
+        PROMPT_PREFIX.labels(fingerprint).set(1)
+        logging.info("Prompt prefix fingerprint %s (%d tools)", fingerprint, len(all_tools))
+        cache_key = prompt_cache_key_from_env(fingerprint)
+        if cache_key is None:
+            return
+        # one key for all sessions sharing the prefix, rather than the SDK's key per run
+        agent.model_settings = with_prompt_cache_key(agent.model_settings, cache_key)
+        if self._router is not None and self._router.fast_agent is not None:
+            # a different prefix, so a separate cache group
+            fast_agent = self._router.fast_agent
+            fast_agent.model_settings = with_prompt_cache_key(fast_agent.model_settings, f"{cache_key}:fast")
+
+    @staticmethod
+    def _create_run_config() -> RunConfig:
+        # Tool calls of one turn are dispatched concurrently, across and within MCP servers
+        limit = int(os.getenv("AGENT_MAX_PARALLEL_TOOL_CALLS", "4"))
+        return RunConfig(tool_execution=ToolExecutionConfig(max_function_tool_concurrency=limit if limit > 0 else None))
+
+    @staticmethod
+    def _mcp_config_from_file() -> Optional[Dict[str, Any]]:
+        path = os.getenv("MCP_CONFIG_FILE")
+        if not path:
+            return None
+        with open(path, encoding="utf-8") as config_file:
+            return json.load(config_file)
+
+    def _default_mcp_config(self) -> Dict[str, Any]:
+        tool_cache_spec = {"defaultTtl": float(os.getenv("MCP_TOOL_CACHE_TTL", "10"))}
+        config = {
+            "mcpServers": {
+                "kubernetes": {
+                    **self._entry_point("mcp-server-kubernetes", ["npx", "--no-install", "mcp-server-kubernetes"]),
+                    "cache": tool_cache_spec,
+                },
+                "prometheus": {
+                    **self._entry_point("prometheus-mcp-server", ["prometheus-mcp-server"]),
+                    "env": self._get_prometheus_env(),
+                    "critical": False,
+                    "cache": tool_cache_spec,
+                },
+                "time": {
+                    # this interpreter, not whatever "python" (or a pyenv shim) is on PATH
+                    "command": sys.executable,
+                    "args": ["-m", "mcp_server_time"],
+                    "poolSize": 1,
+                }
+            }
+        }
+        self._apply_tool_filters(config["mcpServers"])
+        return config
+
+    @staticmethod
+    def _entry_point(executable: str, fallback: List[str]) -> Dict[str, Any]:
+        """Launch the installed entry point directly; ``npx`` costs a node start and may resolve packages."""
+        path = shutil.which(executable)
+        if path:
+            return {"command": path, "args": []}
+        logging.warning("MCP server entry point '%s' not on PATH; falling back to '%s'", executable, " ".join(fallback))
+        return {"command": fallback[0], "args": fallback[1:]}
+
+    @staticmethod
+    def _apply_tool_filters(servers: Dict[str, Dict[str, Any]]) -> None:
+        """Apply MCP_ALLOWED_TOOLS / MCP_BLOCKED_TOOLS, comma-separated ``server:pattern`` entries."""
+        for env, key in (("MCP_ALLOWED_TOOLS", "allowedTools"), ("MCP_BLOCKED_TOOLS", "blockedTools")):
+            for item in filter(None, (part.strip() for part in os.getenv(env, "").split(","))):
+                server, sep, pattern = item.partition(":")
+                if not sep or server not in servers:
+                    raise ValueError(f"{env}: expected '<server>:<tool pattern>' with a server in {list(servers)}, got '{item}'")
+                servers[server].setdefault(key, []).append(pattern)
+
     def _get_prometheus_env(self) -> Dict[str, str]:
         prom_env = {
             "PROMETHEUS_URL": os.getenv("PROMETHEUS_URL", "http://localhost:9090"),
         }
+        if self._prometheus_proxy is not None:
+            prom_env["PROMETHEUS_URL"] = self._prometheus_proxy.url
         
         if os.getenv("PROMETHEUS_USERNAME"):
             prom_env["PROMETHEUS_USERNAME"] = os.getenv("PROMETHEUS_USERNAME")
@@ -0,0 +1,402 @@
+"""
+LLM Transport for Kubernetes Operations Agent.
+
+Provides the HTTP layer shared by every OpenAI client the agent creates: a
+RateLimiter of token buckets matched to a deployment's TPM/RPM quota,
+LLMBackend entries for spreading requests over several Azure deployments or
+endpoints, and a RateLimitedTransport that admits each request through the
+limiter of the backend it picks and retries throttled or failed requests
+with jittered exponential backoff, honoring Retry-After.
+"""
+
+import asyncio
+import email.utils
+import json
+import logging
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from metrics import LLM_HTTP_REQUESTS, LLM_HTTP_RETRIES, LLM_RATE_LIMIT_WAIT
+
+# Statuses worth another attempt: throttling, timeouts and transient server errors
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Connection-level failures that happen before the request reached the model
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+_AZURE_DEPLOYMENT = re.compile(r"/openai/deployments/([^/]+)/")
+
+
+class TokenBucket:
+    """
+    A bucket refilled continuously at rate per second up to capacity.
+
+    reserve() takes what a request needs right away and returns how long the
+    request must wait for it; the level may go negative, so requests are
+    served in arrival order and a large prompt is not starved by small ones.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize the TokenBucket, full.
+
+        Args:
+            rate: Units added per second
+            capacity: Most units the bucket holds, i.e. the largest burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+
+    @property
+    def level(self) -> float:
+        """Units available now; negative while requests wait for the refill."""
+        self._refill()
+        return self._level
+
+    def delay(self, amount: float) -> float:
+        """Seconds a reservation of amount would wait, without reserving."""
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take amount units.
+
+        Args:
+            amount: Units the request needs
+
+        Returns:
+            Seconds to wait before using them
+        """
+        wait = self.delay(amount)
+        self._level -= amount
+        return wait
+
+    def refund(self, amount: float) -> None:
+        """Return units of a reservation that was not used."""
+        self._refill()
+        self._level = min(self.capacity, self._level + amount)
+
+    def sync(self, remaining: float) -> None:
+        """Lower the level to what the server reports as remaining."""
+        self._refill()
+        self._level = min(self._level, remaining)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """
+    Client-side admission matched to a deployment's quota.
+
+    Requests take one unit of the request bucket and their estimated tokens
+    of the token bucket; each bucket holds burst_seconds of quota, like the
+    short windows Azure OpenAI enforces quotas over. Remaining-quota headers
+    of responses keep the buckets in line with the server, and a 429 pauses
+    the limiter for its Retry-After, so waiting requests do not all retry
+    into the same throttled deployment.
+    """
+
+    def __init__(self, tpm: int = 0, rpm: int = 0, burst_seconds: float = 10.0):
+        """
+        Initialize the RateLimiter.
+
+        Args:
+            tpm: Tokens per minute; 0 for no token limit
+            rpm: Requests per minute; 0 for no request limit
+            burst_seconds: Seconds of quota that can be used at once
+        """
+        self.tpm = tpm
+        self.rpm = rpm
+        self._tokens = TokenBucket(tpm / 60.0, tpm / 60.0 * burst_seconds) if tpm > 0 else None
+        self._requests = TokenBucket(rpm / 60.0, max(1.0, rpm / 60.0 * burst_seconds)) if rpm > 0 else None
+        self._paused_until = 0.0
+
+    def delay(self, tokens: int) -> float:
+        """Seconds a request of tokens would wait now."""
+        delays = [self._paused_until - time.monotonic()]
+        if self._requests is not None:
+            delays.append(self._requests.delay(1))
+        if self._tokens is not None:
+            delays.append(self._tokens.delay(tokens))
+        return max(0.0, *delays)
+
+    async def acquire(self, tokens: int) -> float:
+        """
+        Wait until a request of tokens may be sent.
+
+        Args:
+            tokens: Estimated tokens of the request, prompt and completion
+
+        Returns:
+            Seconds waited
+        """
+        pause = self._paused_until - time.monotonic()
+        wait = max(0.0, pause)
+        if pause > 0:
+            # requests held by the same pause should not all resume at once
+            wait += random.uniform(0.0, min(1.0, 0.2 * pause))
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._refund(tokens)
+                raise
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request for seconds, e.g. after a 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def observe(self, headers: httpx.Headers) -> None:
+        """Align the buckets with the x-ratelimit-remaining-* headers of a response."""
+        for bucket, header in ((self._requests, "x-ratelimit-remaining-requests"),
+                               (self._tokens, "x-ratelimit-remaining-tokens")):
+            value = headers.get(header)
+            if bucket is not None and value is not None:
+                try:
+                    bucket.sync(float(value))
+                except ValueError:
+                    pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "tpm": self.tpm,
+            "rpm": self.rpm,
+            "tokens_available": None if self._tokens is None else self._tokens.level,
+            "requests_available": None if self._requests is None else self._requests.level,
+            "paused_seconds": max(0.0, self._paused_until - time.monotonic()),
+        }
+
+    def _refund(self, tokens: int) -> None:
+        if self._requests is not None:
+            self._requests.refund(1)
+        if self._tokens is not None:
+            self._tokens.refund(tokens)
+
+
+class LLMBackend:
+    """
+    One deployment requests can be sent to, with its own quota.
+
+    A backend with an endpoint receives requests addressed to the
+    deployment it serves, rewritten to its endpoint, deployment and key;
+    without one requests go out as addressed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limiter: RateLimiter,
+        *,
+        serves: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        deployment: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        """
+        Initialize the LLMBackend.
+
+        Args:
+            name: Name in metrics and logs
+            limiter: Admission for the backend's quota
+            serves: Deployment (Azure) or model name the app addresses
+                requests to; defaults to deployment
+            endpoint: Base URL, e.g. https://eastus.openai.azure.com
+            deployment: Azure deployment on that endpoint
+            api_key: Key for that endpoint, sent as the api-key header
+        """
+        self.name = name
+        self.limiter = limiter
+        self.serves = serves or deployment or name
+        self.endpoint = httpx.URL(endpoint) if endpoint else None
+        self.deployment = deployment
+        self.api_key = api_key
+        self.in_flight = 0
+
+    def rewrite(self, request: httpx.Request, target: str) -> httpx.Request:
+        """The request as sent to this backend."""
+        if self.endpoint is None and self.deployment is None and self.api_key is None:
+            return request
+        url = request.url
+        if self.endpoint is not None:
+            url = url.copy_with(scheme=self.endpoint.scheme, host=self.endpoint.host, port=self.endpoint.port)
+        if self.deployment is not None and self.deployment != target:
+            url = url.copy_with(
+                path=url.path.replace(f"/deployments/{target}/", f"/deployments/{self.deployment}/", 1)
+            )
+        headers = request.headers.copy()
+        headers.pop("host", None)
+        if self.api_key is not None:
+            headers["api-key"] = self.api_key
+        return httpx.Request(request.method, url, headers=headers, content=request.content,
+                             extensions=request.extensions)
+
+
+def retry_after_seconds(headers: httpx.Headers) -> Optional[float]:
+    """
+    The wait a response asks for, from retry-after-ms or Retry-After
+    (seconds or an HTTP date).
+
+    Args:
+        headers: Response headers
+
+    Returns:
+        Seconds, or None when the response does not say
+    """
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Send model API requests through rate-limited backends, retrying.
+
+    Requests are grouped by the deployment (Azure) or model they address.
+    Each attempt goes to the backend of the group that can take it soonest
+    (then the one with the fewest requests in flight); a 429 pauses that
+    backend for its Retry-After, so the retry goes to another backend when
+    there is one. Other retryable failures back off exponentially with full
+    jitter. Targets without configured backends get a limiter of their own
+    with the default quota.
+    """
+
+    def __init__(
+        self,
+        inner: httpx.AsyncBaseTransport,
+        backends: Sequence[LLMBackend] = (),
+        *,
+        default_tpm: int = 0,
+        default_rpm: int = 0,
+        burst_seconds: float = 10.0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        completion_tokens: int = 1000,
+    ):
+        """
+        Initialize the RateLimitedTransport.
+
+        Args:
+            inner: Transport that sends the requests (connection pool, HTTP/2)
+            backends: Configured backends; several serving the same target
+                share its load
+            default_tpm: Token quota of targets without configured backends
+            default_rpm: Request quota of targets without configured backends
+            burst_seconds: Seconds of quota the default limiters allow at once
+            max_retries: Attempts after the first one
+            backoff_base: First backoff in seconds, doubled per attempt
+            backoff_max: Longest backoff in seconds
+            completion_tokens: Completion tokens counted for requests that do
+                not set max_tokens
+        """
+        self._inner = inner
+        self._groups: Dict[str, List[LLMBackend]] = {}
+        for backend in backends:
+            self._groups.setdefault(backend.serves, []).append(backend)
+        self._default_tpm = default_tpm
+        self._default_rpm = default_rpm
+        self._burst_seconds = burst_seconds
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.completion_tokens = completion_tokens
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        target, tokens = self._inspect(request)
+        backends = self._backends_for(target)
+        attempt = 0
+        while True:
+            backend = min(backends, key=lambda b: (b.limiter.delay(tokens), b.in_flight))
+            waited = await backend.limiter.acquire(tokens)
+            LLM_RATE_LIMIT_WAIT.labels(backend.name).observe(waited)
+            backend.in_flight += 1
+            try:
+                response = await self._inner.handle_async_request(backend.rewrite(request, target))
+            except RETRY_EXCEPTIONS as exc:
+                LLM_HTTP_REQUESTS.labels(backend.name, type(exc).__name__).inc()
+                if attempt >= self.max_retries:
+                    raise
+                reason, retry_after = type(exc).__name__, None
+            else:
+                LLM_HTTP_REQUESTS.labels(backend.name, str(response.status_code)).inc()
+                backend.limiter.observe(response.headers)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                reason, retry_after = str(response.status_code), retry_after_seconds(response.headers)
+                await response.aclose()
+            finally:
+                backend.in_flight -= 1
+
+            LLM_HTTP_RETRIES.labels(backend.name, reason).inc()
+            backoff = random.uniform(0.0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            attempt += 1
+            if reason == "429":
+                # the limiter holds this backend's requests; the loop picks another one if any is free
+                backend.limiter.pause(retry_after if retry_after is not None else backoff)
+                logging.warning("Model backend %s throttled; retry %d after %.2fs", backend.name, attempt,
+                                retry_after if retry_after is not None else backoff)
+            else:
+                logging.warning("Model request to %s failed (%s); retry %d", backend.name, reason, attempt)
+                await asyncio.sleep(retry_after if retry_after is not None else backoff)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Quota state and requests in flight of every backend."""
+        return {
+            backend.name: {"serves": target, "in_flight": backend.in_flight, **backend.limiter.get_stats()}
+            for target, backends in self._groups.items()
+            for backend in backends
+        }
+
+    def _backends_for(self, target: str) -> List[LLMBackend]:
+        backends = self._groups.get(target)
+        if backends is None:
+            limiter = RateLimiter(self._default_tpm, self._default_rpm, self._burst_seconds)
+            backends = self._groups[target] = [LLMBackend(target, limiter)]
+        return backends
+
+    def _inspect(self, request: httpx.Request) -> Tuple[str, int]:
+        # the target is the Azure deployment in the path or the model in the body;
+        # tokens are estimated at ~4 bytes of request body each plus the completion
+        body: Dict[str, Any] = {}
+        try:
+            parsed = json.loads(request.content or b"{}")
+            if isinstance(parsed, dict):
+                body = parsed
+        except ValueError:
+            pass
+        match = _AZURE_DEPLOYMENT.search(request.url.path)
+        target = match.group(1) if match else str(body.get("model") or request.url.host)
+        completion = body.get("max_completion_tokens") or body.get("max_tokens") or self.completion_tokens
+        return target, len(request.content or b"") // 4 + int(completion)
@@ -1,33 +1,182 @@
 from __future__ import annotations
 
+import os
+
+# Time everything imported from here on; startup_profile itself is stdlib-only
+from startup_profile import startup_profiler
+
+if os.getenv("STARTUP_PROFILE", "on").lower() not in ("0", "false", "no", "off"):
+    startup_profiler.install_import_hook()
+
+import asyncio
 import logging
 from contextlib import asynccontextmanager
+from typing import Any
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+import metrics
+from headless_api import HeadlessAgentAPI
 from kubernetes_ai_ops_agent_provider import KubernetesAIOpsAgentProvider
+from persistent_session_storage import session_store_from_env
+from run_recorder import run_recorder
+from run_scheduler import RunScheduler
+from session_registry import SessionRegistry
 
 logging.basicConfig(level=logging.INFO)
 
 agent_provider = KubernetesAIOpsAgentProvider()
+run_scheduler = RunScheduler.from_env()
+session_store = session_store_from_env()
+session_registry = SessionRegistry.from_env()
+
+# Seconds a critical MCP server may stay down before /healthz fails
+LIVENESS_GRACE = float(os.getenv("MCP_LIVENESS_GRACE", "300"))
+
+# "lazy" loads the Chainlit UI in the background once the agent is ready (or on
+# the first /chat request, whichever comes first), "import" while this module is imported
+CHAT_UI_MOUNT = os.getenv("CHAT_UI_MOUNT", "lazy").lower()
+
+
+def load_chat_ui() -> Any:
+    """Import Chainlit and load chat.py; returns the Chainlit ASGI app."""
+    with startup_profiler.phase("chat_ui"):
+        from chainlit.utils import mount_chainlit
+
+        # mount_chainlit mounts on the app it is given; the UI is served through LazyChatUI instead
+        mount_chainlit(app=FastAPI(), target="chat.py", path="/chat")
+        from chainlit.server import app as chainlit_app
+        return chainlit_app
+
+
+class LazyChatUI:
+    """ASGI app at /chat that loads Chainlit off the event loop, then hands every request to it."""
+
+    def __init__(self) -> None:
+        self._app: Any = None
+        self._loading: asyncio.Future | None = None
+
+    def start(self) -> asyncio.Future:
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(asyncio.to_thread(load_chat_ui))
+        return self._loading
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if self._app is None:
+            self._app = await asyncio.shield(self.start())
+        await self._app(scope, receive, send)
+
+
+chat_ui = LazyChatUI() if CHAT_UI_MOUNT == "lazy" else None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with agent_provider:  # AgentProvider handles its own stack
+        metrics.register_mcp_collector(agent_provider.get_mcp_provider())
+        if agent_provider.get_cluster_cache() is not None:
+            metrics.register_cluster_cache_collector(agent_provider.get_cluster_cache())
+        metrics.register_session_collector(session_registry)
+        session_registry.start()
+        startup_profiler.mark_ready()
+        metrics.observe_startup(startup_profiler.report())
         logging.info("Kubernetes AI‑Ops agent ready")
+        if chat_ui is not None:
+            chat_ui.start()
         yield  # application is live
+        await session_registry.stop()
         # teardown handled by provider
+    # traces of the last runs and queued session writes are written before the process exits
+    run_recorder.close()
+    if session_store is not None:
+        session_store.close()
 
 
 app = FastAPI(lifespan=lifespan)
 
+# /v1/ask and /v1/ask/batch for automation, without the Chainlit session and UI
+app.include_router(HeadlessAgentAPI.from_env(agent_provider, run_scheduler).create_router())
+
 
 @app.get("/healthz")
-async def health() -> dict[str, str]:
-    return {"status": "ok"}
+async def health() -> JSONResponse:
+    """Liveness: fails only once a critical MCP server has stayed down past the grace period,
+    i.e. when in-process restarts have not helped and restarting the pod might."""
+    report = agent_provider.get_mcp_provider().get_health()
+    stuck = [
+        name for name, entry in report["servers"].items()
+        if entry["critical"] and (entry["down_seconds"] or 0) > LIVENESS_GRACE
+    ]
+    return JSONResponse(report, status_code=503 if stuck else 200)
+
+
+@app.get("/readyz")
+async def ready() -> JSONResponse:
+    """Readiness: fails while a critical MCP server is down, so traffic goes to other replicas."""
+    report = agent_provider.get_mcp_provider().get_health()
+    return JSONResponse(report, status_code=503 if report["status"] == "down" else 200)
+
+
+@app.get("/startupz")
+async def startup_report() -> dict[str, Any]:
+    """Per MCP server startup status and phase timings."""
+    return agent_provider.get_mcp_provider().get_startup_report()
+
+
+@app.get("/startupz/profile")
+async def startup_profile() -> dict[str, Any]:
+    """Time from process start to readiness, per startup phase and per import."""
+    return startup_profiler.report()
+
+
+@app.get("/toolz")
+async def tool_catalog_report() -> dict[str, Any]:
+    """Per MCP server listed and exposed tools and catalog refresh statistics."""
+    return agent_provider.get_mcp_provider().get_tool_catalog().get_stats()
+
+
+@app.post("/toolz/refresh")
+async def refresh_tools(server: str | None = None) -> JSONResponse:
+    """Re-list the tools of one MCP server (all when omitted), e.g. after upgrading it."""
+    try:
+        return JSONResponse(await agent_provider.get_mcp_provider().refresh_tools(server))
+    except KeyError as exc:
+        return JSONResponse({"error": str(exc.args[0])}, status_code=404)
+
+
+@app.get("/cachez")
+async def cluster_cache_report() -> dict[str, Any]:
+    """Per kind object count, memory, lag and watch statistics of the cluster cache."""
+    cache = agent_provider.get_cluster_cache()
+    return {"enabled": cache is not None, "kinds": cache.get_stats() if cache is not None else {}}
+
+
+@app.get("/clusterz")
+async def cluster_fleet_report() -> dict[str, Any]:
+    """Per cluster state and usage of the per-cluster MCP servers, when the config defines clusters."""
+    fleet = agent_provider.get_mcp_provider().get_cluster_fleet()
+    return {"enabled": fleet is not None, **(fleet.get_status() if fleet is not None else {})}
+
+
+@app.get("/sessionz")
+async def session_report() -> dict[str, Any]:
+    """Memory of the chat sessions held by this process, evictions and the largest sessions."""
+    return session_registry.get_stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> Response:
+    """Prometheus scrape endpoint."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
-# Mount Chainlit after app creation (lazy import avoids heavy deps during cold start)
-from chainlit.utils import mount_chainlit
+# Mount Chainlit after app creation
+if chat_ui is not None:
+    app.mount("/chat", chat_ui)
+else:
+    with startup_profiler.phase("chat_ui"):
+        from chainlit.utils import mount_chainlit
 
-mount_chainlit(app=app, target="chat.py", path="/chat")
+        mount_chainlit(app=app, target="chat.py", path="/chat")
@@ -0,0 +1,433 @@
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+import logging
+import time
+from contextlib import asynccontextmanager
+from string import Template
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+from agents.mcp import MCPServer
+from mcp import types
+
+from mcp_server_pool import MCPServerPool
+from mcp_server_supervisor import CircuitBreaker, MCPServerUnavailable, SupervisedMCPServer
+from metrics import CLUSTER_BACKEND_STARTS, CLUSTER_BACKEND_STOPS
+
+__all__ = ["CLUSTER_ARGUMENT", "ClusterFleet", "ClusterRoutedMCPServer", "render_cluster_spec"]
+
+# argument added to every tool of a cluster server and popped before the call is routed
+CLUSTER_ARGUMENT = "cluster"
+
+
+def render_cluster_spec(template: Dict[str, Any], cluster: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill the ``${field}`` placeholders of a server *template* for one cluster.
+
+    ``command``, ``args`` and ``env`` values are substituted with the cluster's
+    scalar settings plus ``${cluster}``, its name; the cluster's own ``env`` is
+    laid over the template's.  Raises :class:`ValueError` naming the cluster
+    when a placeholder has no value.
+    """
+    values = {key: str(value) for key, value in fields.items() if isinstance(value, (str, int, float))}
+    values["cluster"] = cluster
+
+    def fill(text: Any) -> str:
+        try:
+            return Template(str(text)).substitute(values)
+        except KeyError as exc:
+            raise ValueError(f"cluster '{cluster}' has no '{exc.args[0]}' setting, used in '{text}'") from None
+
+    spec = dict(template)
+    spec["command"] = fill(template["command"])
+    spec["args"] = [fill(arg) for arg in template.get("args", [])]
+    env = {key: fill(value) for key, value in (template.get("env") or {}).items()}
+    env.update({key: str(value) for key, value in (fields.get("env") or {}).items()})
+    if env:
+        spec["env"] = env
+    return spec
+
+
+class _Backend:
+    """The MCP server pool of one (cluster, kind) pair plus its usage bookkeeping."""
+
+    __slots__ = (
+        "cluster", "kind", "label", "pool", "breaker", "server", "starting",
+        "in_flight", "calls", "starts", "stops", "last_used", "last_error",
+    )
+
+    def __init__(self, cluster: str, kind: str, pool: MCPServerPool, breaker: CircuitBreaker, call_timeout: float) -> None:
+        self.cluster = cluster
+        self.kind = kind
+        self.label = f"{kind}@{cluster}"
+        self.pool = pool
+        self.breaker = breaker
+        # no supervisor: an idle backend is reaped instead of pinged, a broken one restarted on use
+        self.server = SupervisedMCPServer(pool, self.label, breaker, call_timeout=call_timeout)
+        self.starting: asyncio.Task[None] | None = None
+        self.in_flight = 0
+        self.calls = 0
+        self.starts = 0
+        self.stops = 0
+        self.last_used = time.monotonic()
+        self.last_error: str | None = None
+
+    @property
+    def state(self) -> str:
+        if self.starting is not None:
+            return "starting"
+        if self.breaker.state != "closed":
+            return "down"
+        return "ready" if self.pool.is_ready else "idle"
+
+
+class ClusterFleet:
+    """Per‑cluster MCP backends, started on first use and reaped once idle.
+
+    ``clusters`` maps cluster names to their settings (``kubeconfig``,
+    ``prometheusUrl``, ``env`` …) and ``templates`` maps server kinds such as
+    ``kubernetes`` to a server spec whose ``${setting}`` placeholders are
+    filled per cluster (see :func:`render_cluster_spec`).  Every (cluster,
+    kind) pair gets its own :class:`MCPServerPool` from ``create_pool`` and
+    its own :class:`CircuitBreaker`; the pool is connected by the first call
+    that needs it, in a task of its own so a caller giving up does not abort
+    the start for the next one.
+
+    A reaper closes backends that had no call for ``idle_timeout`` seconds
+    (never, when 0), except those of ``default_cluster``.  With ``max_active``
+    set, starting a backend beyond that many first closes the least recently
+    used idle one.  A backend that failed to start, or whose breaker opened on
+    transport failures, fails calls fast until ``breaker_reset_timeout`` has
+    passed and is then started afresh by the next call.
+    """
+
+    def __init__(
+        self,
+        clusters: Dict[str, Dict[str, Any]],
+        templates: Dict[str, Dict[str, Any]],
+        create_pool: Callable[[str, Dict[str, Any]], MCPServerPool],
+        *,
+        default_cluster: str | None = None,
+        idle_timeout: float = 600.0,
+        max_active: int = 0,
+        startup_timeout: float = 60.0,
+        call_timeout: float = 60.0,
+        breaker_threshold: int = 3,
+        breaker_reset_timeout: float = 30.0,
+    ) -> None:
+        if not isinstance(clusters, dict) or not clusters:
+            raise ValueError("'clusters' must map cluster names to their settings")
+        if not isinstance(templates, dict) or not templates:
+            raise ValueError("'clusterServers' must map server names to server specs")
+        self._clusters = clusters
+        self._default = default_cluster or next(iter(clusters))
+        if self._default not in clusters:
+            raise ValueError(f"default cluster '{self._default}' is not one of {list(clusters)}")
+        # rendered up front, so a template missing a cluster setting fails at startup rather than on first use
+        self._specs = {
+            (cluster, kind): render_cluster_spec(template, cluster, fields or {})
+            for cluster, fields in clusters.items()
+            for kind, template in templates.items()
+        }
+        self._kinds = list(templates)
+        self._create_pool = create_pool
+        self._idle_timeout = idle_timeout
+        self._max_active = max_active
+        self._startup_timeout = startup_timeout
+        self._call_timeout = call_timeout
+        self._breaker_threshold = breaker_threshold
+        self._breaker_reset_timeout = breaker_reset_timeout
+        self._backends: Dict[tuple[str, str], _Backend] = {}
+        self._reaper: asyncio.Task[None] | None = None
+
+    @property
+    def clusters(self) -> List[str]:
+        return list(self._clusters)
+
+    @property
+    def default_cluster(self) -> str:
+        return self._default
+
+    @property
+    def kinds(self) -> List[str]:
+        """Names of the per‑cluster servers, e.g. ``["kubernetes", "prometheus"]``."""
+        return list(self._kinds)
+
+    def select(self, patterns: str = "") -> List[str]:
+        """Clusters matching any of the comma‑separated names or ``fnmatch`` *patterns*; all when empty."""
+        wanted = [part.strip() for part in patterns.split(",") if part.strip()]
+        if not wanted:
+            return self.clusters
+        return [name for name in self._clusters if any(fnmatch.fnmatchcase(name, p) for p in wanted)]
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """Start reaping idle backends."""
+        if self._idle_timeout > 0 and self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop(), name="cluster-fleet-reaper")
+
+    async def close(self) -> None:
+        """Stop the reaper and close every backend."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+        for kind in self._kinds:
+            await self.close_kind(kind)
+
+    async def close_kind(self, kind: str) -> None:
+        """Close the backends of every cluster for server *kind*."""
+        for backend in [b for b in self._backends.values() if b.kind == kind]:
+            if backend.starting is not None:
+                backend.starting.cancel()
+                await asyncio.gather(backend.starting, return_exceptions=True)
+            if backend.pool.is_ready:
+                await self._stop(backend, "shutdown")
+
+    async def connect(self, cluster: str, kind: str) -> None:
+        """Start the backend of *cluster* for *kind* unless it is up; raises if it cannot be started."""
+        await self._ensure_started(self._backend(cluster, kind))
+
+    @asynccontextmanager
+    async def use(self, cluster: str, kind: str) -> AsyncIterator[MCPServer]:
+        """Borrow the started backend of *cluster* for *kind*; it is not reaped while borrowed."""
+        backend = self._backend(cluster, kind)
+        backend.in_flight += 1
+        try:
+            await self._ensure_started(backend)
+            backend.calls += 1
+            yield backend.server
+        finally:
+            backend.in_flight -= 1
+            backend.last_used = time.monotonic()
+
+    async def reap_idle(self) -> int:
+        """Close the backends idle for longer than ``idle_timeout``; returns how many were closed."""
+        now = time.monotonic()
+        idle = [
+            backend for backend in self._backends.values()
+            if backend.cluster != self._default and self._is_idle(backend) and now - backend.last_used >= self._idle_timeout
+        ]
+        for backend in idle:
+            await self._stop(backend, "idle")
+        return len(idle)
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+    def get_pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Pool statistics of every backend used so far, keyed ``<kind>@<cluster>``."""
+        return {backend.label: backend.pool.get_stats() for backend in self._backends.values()}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Return the state and usage of every cluster's backends, as served by ``/clusterz``."""
+        now = time.monotonic()
+        clusters: Dict[str, Dict[str, Any]] = {}
+        for cluster in self._clusters:
+            entry: Dict[str, Any] = {}
+            for kind in self._kinds:
+                backend = self._backends.get((cluster, kind))
+                if backend is None:
+                    entry[kind] = {"state": "idle", "calls": 0, "starts": 0}
+                    continue
+                entry[kind] = {
+                    "state": backend.state,
+                    "in_flight": backend.in_flight,
+                    "calls": backend.calls,
+                    "starts": backend.starts,
+                    "stops": backend.stops,
+                    "circuit": backend.breaker.state,
+                    "idle_seconds": now - backend.last_used,
+                    "last_error": backend.last_error,
+                }
+            clusters[cluster] = entry
+        return {
+            "default_cluster": self._default,
+            "idle_timeout": self._idle_timeout,
+            "active": sum(1 for b in self._backends.values() if b.pool.is_ready),
+            "clusters": clusters,
+        }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _backend(self, cluster: str, kind: str) -> _Backend:
+        backend = self._backends.get((cluster, kind))
+        if backend is not None:
+            return backend
+        if cluster not in self._clusters:
+            raise ValueError(f"unknown cluster '{cluster}'; clusters: {', '.join(self._clusters)}")
+        spec = self._specs[(cluster, kind)]
+        backend = _Backend(
+            cluster,
+            kind,
+            self._create_pool(f"{kind}@{cluster}", spec),
+            CircuitBreaker(self._breaker_threshold, self._breaker_reset_timeout),
+            float(spec.get("callTimeout", self._call_timeout)),
+        )
+        self._backends[(cluster, kind)] = backend
+        return backend
+
+    @staticmethod
+    def _is_idle(backend: _Backend) -> bool:
+        return backend.pool.is_ready and backend.in_flight == 0 and backend.starting is None
+
+    async def _ensure_started(self, backend: _Backend) -> None:
+        if backend.starting is None:
+            breaker = backend.breaker
+            if backend.pool.is_ready:
+                # up, or down but not yet due for a retry (SupervisedMCPServer fails the call fast)
+                if breaker.state != "open" or breaker.retry_after > 0:
+                    return
+                logging.warning("MCP server '%s' kept failing; restarting it", backend.label)
+                await self._stop(backend, "failed")
+            elif breaker.state == "open" and breaker.retry_after > 0:
+                raise MCPServerUnavailable(
+                    f"MCP server '{backend.label}' failed to start ({backend.last_error}); "
+                    f"retry in about {max(1, round(breaker.retry_after))}s or answer with other tools"
+                )
+            backend.starting = asyncio.create_task(self._start(backend), name=f"start-{backend.label}")
+        # shielded: callers giving up (e.g. a fan‑out deadline) leave the start running for the next call
+        await asyncio.shield(backend.starting)
+        if not backend.pool.is_ready:
+            raise MCPServerUnavailable(f"MCP server '{backend.label}' failed to start: {backend.last_error}")
+
+    async def _start(self, backend: _Backend) -> None:
+        spec = self._specs[(backend.cluster, backend.kind)]
+        timeout = float(spec.get("startupTimeout", self._startup_timeout))
+        started = time.perf_counter()
+        try:
+            await self._make_room(backend)
+            try:
+                await asyncio.wait_for(backend.pool.connect(), timeout)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"did not start within {timeout:g}s") from None
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            backend.last_error = f"{type(exc).__name__}: {exc}"
+            backend.breaker.trip()
+            CLUSTER_BACKEND_STARTS.labels(backend.kind, "failed").inc()
+            logging.error("MCP server '%s' failed to start: %s", backend.label, backend.last_error)
+        else:
+            backend.breaker.reset()
+            backend.starts += 1
+            backend.last_error = None
+            backend.last_used = time.monotonic()
+            CLUSTER_BACKEND_STARTS.labels(backend.kind, "ok").inc()
+            logging.info("Started MCP server '%s' in %.2fs", backend.label, time.perf_counter() - started)
+        finally:
+            backend.starting = None
+
+    async def _make_room(self, backend: _Backend) -> None:
+        if self._max_active <= 0:
+            return
+        active = [b for b in self._backends.values() if b is not backend and (b.pool.is_ready or b.starting)]
+        if len(active) < self._max_active:
+            return
+        idle = [b for b in active if self._is_idle(b)]
+        if not idle:
+            logging.warning("%d cluster MCP servers busy; starting '%s' beyond the limit", len(active), backend.label)
+            return
+        await self._stop(min(idle, key=lambda b: b.last_used), "evicted")
+
+    async def _stop(self, backend: _Backend, reason: str) -> None:
+        try:
+            await backend.pool.cleanup()
+        except Exception as exc:  # a dead process may not shut down cleanly
+            logging.warning("Cleanup of MCP server '%s' failed: %s", backend.label, exc)
+        backend.stops += 1
+        CLUSTER_BACKEND_STOPS.labels(backend.kind, reason).inc()
+        logging.info("Stopped MCP server '%s' (%s)", backend.label, reason)
+
+    async def _reap_loop(self) -> None:
+        interval = min(60.0, max(0.5, self._idle_timeout / 4))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reap_idle()
+            except Exception:  # never let one bad pass end reaping
+                logging.exception("Reaping idle cluster MCP servers failed")
+
+
+class ClusterRoutedMCPServer(MCPServer):
+    """One logical MCP server sending each call to one cluster's backend of *kind*.
+
+    Tools are listed from the default cluster's backend, each with an extra
+    optional ``cluster`` argument; a call goes to the backend of the cluster
+    it names, or of the default cluster without one.  It is wrapped like a
+    pool, so caching, output processing and metrics apply to every cluster.
+    """
+
+    def __init__(self, fleet: ClusterFleet, kind: str) -> None:
+        super().__init__()
+        self._fleet = fleet
+        self._kind = kind
+        self._last_tools: List[Any] = []
+
+    @property
+    def name(self) -> str:
+        return f"{self._kind} server"
+
+    async def connect(self) -> None:
+        await self._fleet.connect(self._fleet.default_cluster, self._kind)
+
+    async def cleanup(self) -> None:
+        await self._fleet.close_kind(self._kind)
+
+    async def list_tools(self, run_context: Any = None, agent: Any = None) -> List[Any]:
+        async with self._fleet.use(self._fleet.default_cluster, self._kind) as server:
+            tools = await server.list_tools(run_context, agent)
+        if tools:
+            self._last_tools = [self._with_cluster_argument(tool) for tool in tools]
+        return list(self._last_tools)
+
+    @property
+    def last_tools(self) -> List[Any]:
+        return self._last_tools
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any] | None,
+        meta: Dict[str, Any] | None = None,
+    ) -> Any:
+        arguments = dict(arguments or {})
+        cluster = arguments.pop(CLUSTER_ARGUMENT, None) or self._fleet.default_cluster
+        if cluster not in self._fleet.clusters:
+            # a tool result rather than an exception, so the model sees which names are valid
+            text = f"Unknown cluster '{cluster}'; clusters: {', '.join(self._fleet.clusters)}"
+            return types.CallToolResult(content=[types.TextContent(type="text", text=text)], isError=True)
+        async with self._fleet.use(str(cluster), self._kind) as server:
+            return await server.call_tool(tool_name, arguments, meta)
+
+    async def list_prompts(self) -> Any:
+        async with self._fleet.use(self._fleet.default_cluster, self._kind) as server:
+            return await server.list_prompts()
+
+    async def get_prompt(self, name: str, arguments: Dict[str, Any] | None = None) -> Any:
+        async with self._fleet.use(self._fleet.default_cluster, self._kind) as server:
+            return await server.get_prompt(name, arguments)
+
+    @property
+    def cached_tools(self) -> List[Any] | None:
+        return self._last_tools or None
+
+    def invalidate_tools_cache(self) -> None:
+        pass
+
+    def _with_cluster_argument(self, tool: Any) -> Any:
+        schema = dict(tool.inputSchema or {"type": "object"})
+        properties = dict(schema.get("properties") or {})
+        if CLUSTER_ARGUMENT in properties:
+            logging.warning(
+                "Tool '%s' of MCP server '%s' has its own '%s' argument; it is replaced by the cluster to route to",
+                tool.name, self._kind, CLUSTER_ARGUMENT,
+            )
+        properties[CLUSTER_ARGUMENT] = {
+            "type": "string",
+            "description": f"Name of the cluster to run against; defaults to {self._fleet.default_cluster}.",
+        }
+        return tool.model_copy(update={"inputSchema": {**schema, "properties": properties}})
@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+from agents.mcp import MCPServer
+from mcp import types
+
+__all__ = ["MCPServerPool"]
+
+# Upper bounds (seconds) of the queue‑wait histogram buckets; the last bucket is +Inf.
+WAIT_BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Worker:
+    """One MCP server process plus its in‑flight bookkeeping."""
+
+    __slots__ = ("index", "server", "in_flight", "calls", "healthy")
+
+    def __init__(self, index: int, server: MCPServer) -> None:
+        self.index = index
+        self.server = server
+        self.in_flight = 0
+        self.calls = 0
+        # unhealthy workers get no new calls until restarted
+        self.healthy = True
+
+
+class MCPServerPool(MCPServer):
+    """Spread calls for **one** logical MCP server over *N* identical workers.
+
+    Each worker is an independent :class:`MCPServer` (typically an
+    :class:`MCPServerStdio` subprocess) created by ``factory``.  Calls are routed
+    to the least‑busy worker; once every worker has ``max_in_flight`` calls
+    outstanding, further callers wait in FIFO order.  The pool itself is an
+    :class:`MCPServer`, so it can be handed to an :class:`Agent` unchanged.
+
+    Usage::
+
+        pool = MCPServerPool("kubernetes", lambda i: MCPServerStdio(params), size=4)
+        async with pool:
+            await pool.call_tool("pods_list", {"namespace": "default"})
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[int], MCPServer],
+        *,
+        size: int = 1,
+        max_in_flight: int = 1,
+    ) -> None:
+        super().__init__()
+        if size < 1:
+            raise ValueError(f"pool size for '{name}' must be >= 1, got {size}")
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight for '{name}' must be >= 1, got {max_in_flight}")
+
+        self._name = name
+        self._factory = factory
+        self._size = size
+        self._max_in_flight = max_in_flight
+        self._workers: List[_Worker] = []
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._last_tools: List[Any] = []
+
+        # Queue‑wait metrics
+        self._wait_count = 0
+        self._wait_sum = 0.0
+        self._wait_max = 0.0
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    # ------------------------------------------------------------------
+    # MCPServer lifecycle
+    # ------------------------------------------------------------------
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def is_ready(self) -> bool:
+        """``True`` once every worker has connected."""
+        return bool(self._workers)
+
+    @property
+    def size(self) -> int:
+        """Configured number of workers."""
+        return self._size
+
+    @property
+    def healthy_workers(self) -> int:
+        return sum(1 for worker in self._workers if worker.healthy)
+
+    async def connect(self) -> None:
+        """Start all workers concurrently; on any failure the started ones are cleaned up."""
+        servers = [self._factory(index) for index in range(self._size)]
+        try:
+            results = await asyncio.gather(
+                *(server.connect() for server in servers), return_exceptions=True
+            )
+        except BaseException:  # cancelled, e.g. by a startup timeout
+            await self._cleanup_servers(servers)
+            raise
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            await self._cleanup_servers(servers)
+            raise errors[0]
+        self._workers = [_Worker(index, server) for index, server in enumerate(servers)]
+
+    @staticmethod
+    async def _cleanup_servers(servers: List[MCPServer]) -> None:
+        for server in reversed(servers):
+            try:
+                await server.cleanup()
+            except Exception:  # best effort – the original failure matters more
+                pass
+
+    async def cleanup(self) -> None:
+        workers, self._workers = self._workers, []
+        for worker in reversed(workers):
+            await worker.server.cleanup()
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_exception(RuntimeError(f"MCP server pool '{self._name}' closed"))
+
+    async def __aenter__(self) -> "MCPServerPool":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, et, ev, tb) -> None:
+        await self.cleanup()
+
+    # ------------------------------------------------------------------
+    # MCPServer operations – each one runs on a checked‑out worker
+    # ------------------------------------------------------------------
+    async def list_tools(self, run_context: Any = None, agent: Any = None) -> List[Any]:
+        if not self.is_ready:
+            # still warming up (or failed to start) – expose no tools for now
+            return []
+        async with self.checkout() as server:
+            tools = await server.list_tools(run_context, agent)
+        if tools:
+            self._last_tools = list(tools)
+        return tools
+
+    @property
+    def last_tools(self) -> List[Any]:
+        """Tools from the last successful ``list_tools``, served while the server is down."""
+        return self._last_tools
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any] | None,
+        meta: Dict[str, Any] | None = None,
+    ) -> Any:
+        async with self.checkout() as server:
+            session = getattr(server, "session", None)
+            first_request_id = getattr(session, "_request_id", None)
+            try:
+                if meta is None:
+                    return await server.call_tool(tool_name, arguments)
+                return await server.call_tool(tool_name, arguments, meta=meta)
+            except asyncio.CancelledError:
+                await self._notify_cancelled(server, session, first_request_id, tool_name)
+                raise
+
+    async def list_prompts(self) -> Any:
+        async with self.checkout() as server:
+            return await server.list_prompts()
+
+    async def get_prompt(self, name: str, arguments: Dict[str, Any] | None = None) -> Any:
+        async with self.checkout() as server:
+            return await server.get_prompt(name, arguments)
+
+    @property
+    def cached_tools(self) -> List[Any] | None:
+        return self._workers[0].server.cached_tools if self._workers else None
+
+    def invalidate_tools_cache(self) -> None:
+        for worker in self._workers:
+            invalidate = getattr(worker.server, "invalidate_tools_cache", None)
+            if invalidate is not None:
+                invalidate()
+
+    # ------------------------------------------------------------------
+    # Supervision
+    # ------------------------------------------------------------------
+    async def ping_worker(self, index: int, timeout: float) -> None:
+        """Check that worker *index* answers within *timeout*; raises if it does not.
+
+        Uses the MCP ``ping`` request when the worker exposes its client
+        session, otherwise a ``list_tools`` round trip.
+        """
+        server = self._workers[index].server
+        session = getattr(server, "session", None)
+        if session is not None:
+            await asyncio.wait_for(session.send_ping(), timeout)
+        else:
+            await asyncio.wait_for(server.list_tools(), timeout)
+
+    def mark_unhealthy(self, index: int) -> None:
+        """Stop routing new calls to worker *index*."""
+        self._workers[index].healthy = False
+
+    async def restart_worker(self, index: int, timeout: float) -> None:
+        """Replace worker *index* by a freshly started process.
+
+        Calls still running on the old process fail with it; queued callers
+        are woken once the new one is connected.
+        """
+        old = self._workers[index]
+        old.healthy = False
+        try:
+            await asyncio.wait_for(old.server.cleanup(), timeout)
+        except Exception as exc:  # a hung or dead process may not shut down cleanly
+            logging.warning("Cleanup of worker #%d of MCP server '%s' failed: %s", index, self._name, exc)
+        server = self._factory(index)
+        try:
+            await asyncio.wait_for(server.connect(), timeout)
+        except BaseException:
+            await self._cleanup_servers([server])
+            raise
+        worker = _Worker(index, server)
+        worker.calls = old.calls
+        self._workers[index] = worker
+        for _ in range(self._max_in_flight):
+            self._wake_next()
+
+    # ------------------------------------------------------------------
+    # Checkout
+    # ------------------------------------------------------------------
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[MCPServer]:
+        """Borrow the least‑busy worker, waiting while all of them are saturated."""
+        if not self._workers:
+            raise RuntimeError(f"MCP server pool '{self._name}' is not ready (still starting or failed to start)")
+        started = time.perf_counter()
+        # Newcomers queue behind existing waiters so checkout stays FIFO.
+        worker = None if self._waiters else self._least_busy()
+        while worker is None:
+            waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                self._waiters.remove(waiter)
+                if waiter.done() and not waiter.cancelled():
+                    # we were woken but won't use the slot – hand it on
+                    self._wake_next()
+                raise
+            self._waiters.remove(waiter)
+            worker = self._least_busy()
+        self._record_wait(time.perf_counter() - started)
+
+        worker.in_flight += 1
+        worker.calls += 1
+        try:
+            yield worker.server
+        finally:
+            worker.in_flight -= 1
+            self._wake_next()
+
+    async def _notify_cancelled(self, server: MCPServer, session: Any, first_request_id: Any, tool_name: str) -> None:
+        """Tell the server to stop working on requests this call abandoned.
+
+        The MCP client forgets a request when its caller is cancelled but never
+        tells the server, which keeps executing it.  Request ids are sequential
+        per session, so the ids issued since the call began are ours as long as
+        no other call shares the worker; otherwise nothing is sent and the
+        server's late response is simply dropped.
+        """
+        if session is None or not isinstance(first_request_id, int):
+            return
+        worker = next((w for w in self._workers if w.server is server), None)
+        if worker is None or worker.in_flight != 1:
+            return
+        for request_id in range(first_request_id, getattr(session, "_request_id", first_request_id)):
+            try:
+                await session.send_notification(
+                    types.ClientNotification(
+                        types.CancelledNotification(
+                            params=types.CancelledNotificationParams(
+                                requestId=request_id, reason=f"{tool_name} call cancelled by client"
+                            )
+                        )
+                    )
+                )
+            except Exception as exc:  # the worker may be shutting down
+                logging.debug("Could not send cancellation to MCP server '%s': %s", self._name, exc)
+                return
+
+    def _least_busy(self) -> _Worker | None:
+        best: _Worker | None = None
+        for worker in self._workers:
+            if not worker.healthy or worker.in_flight >= self._max_in_flight:
+                continue
+            if best is None or worker.in_flight < best.in_flight:
+                best = worker
+        return best
+
+    def _wake_next(self) -> None:
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def _record_wait(self, seconds: float) -> None:
+        self._wait_count += 1
+        self._wait_sum += seconds
+        if seconds > self._wait_max:
+            self._wait_max = seconds
+        self._wait_buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return a snapshot of worker load and queue‑wait metrics."""
+        return {
+            "size": len(self._workers),
+            "healthy": self.healthy_workers,
+            "max_in_flight": self._max_in_flight,
+            "in_flight": [w.in_flight for w in self._workers],
+            "calls": [w.calls for w in self._workers],
+            "waiting": sum(1 for w in self._waiters if not w.done()),
+            "wait_seconds": {
+                "count": self._wait_count,
+                "sum": self._wait_sum,
+                "max": self._wait_max,
+                "buckets": dict(zip((*WAIT_BUCKETS, float("inf")), self._wait_buckets)),
+            },
+        }
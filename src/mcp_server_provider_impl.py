@@ -1,14 +1,25 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
 import os
 import shutil
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Awaitable, Dict, List
 from contextlib import AsyncExitStack
 
 from interfaces import MCPServerProvider
-from agents.mcp import MCPServerStdio
+from agents.mcp import MCPServer, MCPServerStdio
+from mcp_cluster_fleet import ClusterFleet, ClusterRoutedMCPServer
+from mcp_server_pool import MCPServerPool
+from mcp_server_supervisor import CircuitBreaker, MCPServerSupervisor, SupervisedMCPServer
+from mcp_tool_cache import CachingMCPServer, MCPToolCache
+from mcp_tool_catalog import MCPToolCatalog
+from mcp_tool_output import ProcessingMCPServer, ToolOutputProcessor
+from metrics import InstrumentedMCPServer
+from run_recorder import RecordingMCPServer, run_recorder
 
 __all__ = ["MCPServerProviderImpl"]
 
@@ -16,6 +27,52 @@ __all__ = ["MCPServerProviderImpl"]
 class MCPServerProviderImpl(MCPServerProvider):
     """Manage *multiple* :class:`MCPServerStdio` instances as **one** async CM.
 
+    Every logical server is backed by an :class:`MCPServerPool` of ``poolSize``
+    worker processes (default ``pool_size``), each allowed ``maxInFlight``
+    concurrent calls (default ``max_in_flight``)::
+
+        {"mcpServers": {"kubernetes": {"command": "npx", "args": [...], "poolSize": 4}}}
+
+    All servers start concurrently, each bounded by ``startupTimeout`` seconds
+    (default ``startup_timeout``).  Entering the provider waits only for
+    servers marked ``"critical": true`` (the default); non‑critical ones keep
+    warming in the background and expose no tools until they are ready.  Per
+    server phase timings are available from :meth:`get_startup_report`.
+
+    A ``"cache"`` entry puts the server behind a shared :class:`MCPToolCache`
+    so repeated read‑only tool calls are answered without a round trip::
+
+        "cache": {"defaultTtl": 10, "ttl": {"get_current_time": 0}}
+
+    With an ``output_processor`` every tool result is shrunk (log dedupe,
+    head/tail truncation, Prometheus downsampling) before the model sees it.
+
+    Once started, an :class:`MCPServerSupervisor` pings every worker each
+    ``health_check_interval`` seconds and restarts the ones that crashed or
+    hang; every call is bounded by ``callTimeout`` (default ``call_timeout``)
+    and fails fast through a per‑server :class:`CircuitBreaker` while its
+    server is down.  :meth:`get_health` reports the result.
+
+    Tool schemas are listed once per server into an :class:`MCPToolCatalog`
+    (see :meth:`get_tool_catalog`) and only re‑listed after a restart or
+    :meth:`refresh_tools`.  ``allowedTools``/``blockedTools`` (names or
+    ``fnmatch`` patterns) limit which of a server's tools the agent sees::
+
+        "blockedTools": ["kubectl_delete", "*_rollout_*"]
+
+    ``clusterServers`` are templates of servers run once per entry of
+    ``clusters``, with ``${setting}`` placeholders filled from that cluster's
+    settings.  Each template is exposed as one logical server whose tools take
+    a ``cluster`` argument; a :class:`ClusterFleet` starts a cluster's
+    processes on the first call for it and reaps them after
+    ``clusterIdleTimeout`` seconds without calls (default 600, 0 to keep them),
+    at most ``clusterMaxActive`` at a time (0 for no limit).  Only
+    ``defaultCluster`` (the first cluster by default) starts with the
+    provider; see :meth:`get_cluster_fleet`::
+
+        "clusters": {"prod-eu": {"kubeconfig": "/etc/kube/prod-eu", "prometheusUrl": "http://prom.eu:9090"}},
+        "clusterServers": {"kubernetes": {"command": "mcp-server-kubernetes", "env": {"KUBECONFIG": "${kubeconfig}"}}}
+
     Usage::
 
         async with MCPServerProviderImpl.from_file("config.json") as provider:
@@ -25,10 +82,43 @@ class MCPServerProviderImpl(MCPServerProvider):
     # ------------------------------------------------------------------
     # Construction helpers
     # ------------------------------------------------------------------
-    def __init__(self, config: Dict[str, Any], *, include_system_env: bool = True) -> None:
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        *,
+        include_system_env: bool = True,
+        pool_size: int = 1,
+        max_in_flight: int = 1,
+        startup_timeout: float = 60.0,
+        tool_cache: MCPToolCache | None = None,
+        output_processor: ToolOutputProcessor | None = None,
+        tool_catalog: MCPToolCatalog | None = None,
+        call_timeout: float = 60.0,
+        health_check_interval: float = 15.0,
+        breaker_threshold: int = 3,
+        breaker_reset_timeout: float = 30.0,
+    ) -> None:
         self._cfg = config
         self._include_system_env = include_system_env
-        self._servers: dict[str, Any] = {}
+        self._pool_size = pool_size
+        self._max_in_flight = max_in_flight
+        self._startup_timeout = startup_timeout
+        self._tool_cache = tool_cache
+        self._output_processor = output_processor
+        self._tool_catalog = tool_catalog or MCPToolCatalog()
+        self._call_timeout = call_timeout
+        self._health_check_interval = health_check_interval
+        self._breaker_threshold = breaker_threshold
+        self._breaker_reset_timeout = breaker_reset_timeout
+        self._pools: dict[str, MCPServerPool] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._supervised: list[SupervisedMCPServer] = []
+        self._supervisor: MCPServerSupervisor | None = None
+        self._servers: dict[str, MCPServer] = {}
+        self._fleet: ClusterFleet | None = None
+        self._startup: dict[str, dict[str, Any]] = {}
+        self._ready_seconds: float | None = None
+        self._warmup_tasks: list[asyncio.Task[None]] = []
         self._stack: AsyncExitStack | None = None
         self._validate()
 
@@ -43,7 +133,11 @@ class MCPServerProviderImpl(MCPServerProvider):
     # ------------------------------------------------------------------
     async def __aenter__(self) -> "MCPServerProviderImpl":
         self._stack = AsyncExitStack()
-        await self._enter_servers()
+        try:
+            await self._enter_servers()
+        except BaseException:
+            await self._stack.aclose()
+            raise
         return self
 
     async def __aexit__(self, et, ev, tb):
@@ -75,6 +169,64 @@ class MCPServerProviderImpl(MCPServerProvider):
     # Alias for convenience – allows ``provider["kubernetes"]``
     __getitem__ = get_server
 
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return pool load and queue‑wait metrics keyed by logical server name.
+
+        Per‑cluster servers are keyed ``<server>@<cluster>`` once used.
+        """
+        stats = {name: pool.get_stats() for name, pool in self._pools.items()}
+        if self._fleet is not None:
+            stats.update(self._fleet.get_pool_stats())
+        return stats
+
+    def get_cluster_fleet(self) -> ClusterFleet | None:
+        """Return the per‑cluster servers of ``clusterServers``, or ``None`` without any."""
+        return self._fleet
+
+    def get_tool_cache(self) -> MCPToolCache | None:
+        """Return the tool‑result cache shared by servers configured with ``"cache"``."""
+        return self._tool_cache
+
+    def get_output_processor(self) -> ToolOutputProcessor | None:
+        """Return the processor shrinking tool outputs, which also keeps their raw text."""
+        return self._output_processor
+
+    def get_tool_catalog(self) -> MCPToolCatalog:
+        """Return the catalog of prebuilt tool schemas the agent reads its MCP tools from."""
+        return self._tool_catalog
+
+    async def refresh_tools(self, name: str | None = None) -> Dict[str, Dict[str, Any]]:
+        """Re‑list the tools of *name* (every server when ``None``) and return the catalog stats."""
+        await self._tool_catalog.refresh(name)
+        return self._tool_catalog.get_stats()
+
+    def get_startup_report(self) -> Dict[str, Any]:
+        """Return per‑server startup status and phase timings.
+
+        ``ready_seconds`` is how long entering the provider took, i.e. until all
+        critical servers were up.
+        """
+        return {
+            "ready_seconds": self._ready_seconds,
+            "servers": {name: dict(entry) for name, entry in self._startup.items()},
+        }
+
+    def get_health(self) -> Dict[str, Any]:
+        """Return overall and per‑server health as tracked by the supervisor.
+
+        ``status`` is ``down`` when a critical server is down (no healthy
+        worker or circuit open), ``degraded`` when any server is not fully
+        healthy, otherwise ``ok``.
+        """
+        servers = self._supervisor.get_status() if self._supervisor is not None else {}
+        if any(entry["critical"] and entry["state"] == "down" for entry in servers.values()):
+            status = "down"
+        elif any(entry["state"] != "healthy" for entry in servers.values()):
+            status = "degraded"
+        else:
+            status = "ok"
+        return {"status": status, "servers": servers}
+
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
@@ -83,26 +235,199 @@ class MCPServerProviderImpl(MCPServerProvider):
             raise ValueError("config must be a mapping with key 'mcpServers'")
         if not isinstance(self._cfg["mcpServers"], dict):
             raise ValueError("'mcpServers' must map names to server specs")
+        if clash := set(self._cfg.get("clusterServers") or {}) & set(self._cfg["mcpServers"]):
+            raise ValueError(f"servers {sorted(clash)} are in both 'mcpServers' and 'clusterServers'")
 
     async def _enter_servers(self) -> None:
         assert self._stack is not None  # for type checkers
+        started = time.perf_counter()
+        critical: list[Awaitable[None]] = []
+
+        entries: list[tuple[str, Dict[str, Any], MCPServer]] = []
         for name, spec in self._cfg["mcpServers"].items():
+            pool = self._create_pool(name, spec)
+            self._pools[name] = pool
+            entries.append((name, spec, self._supervise(name, spec, pool)))
+        if self._cfg.get("clusterServers"):
+            self._fleet = self._create_fleet()
+            for name, spec in self._cfg["clusterServers"].items():
+                # the fleet supervises every cluster's pool on its own
+                entries.append((name, spec, ClusterRoutedMCPServer(self._fleet, name)))
+
+        for name, spec, inner in entries:
+            pool = inner.inner if isinstance(inner, SupervisedMCPServer) else inner
+            self._servers[name] = self._wrap_server(name, spec, inner)
+            self._tool_catalog.add_server(
+                name, self._servers[name], allowed=spec.get("allowedTools"), blocked=spec.get("blockedTools")
+            )
+            self._stack.push_async_callback(pool.cleanup)
+
+            is_critical = bool(spec.get("critical", True))
+            timeout = float(spec.get("startupTimeout", self._startup_timeout))
+            self._startup[name] = {"critical": is_critical, "status": "starting"}
+            start = self._start_server(name, spec, pool, timeout, is_critical)
+            if is_critical:
+                critical.append(start)
+            else:
+                self._warmup_tasks.append(asyncio.create_task(start, name=f"warmup-{name}"))
+
+        # registered last so it runs first on exit, before the pools are torn down
+        self._stack.push_async_callback(self._cancel_warmup)
+
+        results = await asyncio.gather(*critical, return_exceptions=True)
+        self._ready_seconds = time.perf_counter() - started
+        logging.info(
+            "MCP servers ready in %.2fs: %s",
+            self._ready_seconds,
+            ", ".join(f"{name}={entry['status']}" for name, entry in self._startup.items()),
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        self._supervisor = MCPServerSupervisor(
+            self._pools,
+            self._breakers,
+            self._startup,
+            interval=self._health_check_interval,
+            on_recovered=self._tool_catalog.invalidate,
+        )
+        for server in self._supervised:
+            server.attach(self._supervisor)
+        self._supervisor.start()
+        self._stack.push_async_callback(self._supervisor.stop)
+        if self._fleet is not None:
+            self._fleet.start()
+            self._stack.push_async_callback(self._fleet.close)
+
+    def _create_pool(self, name: str, spec: Dict[str, Any]) -> MCPServerPool:
+        params: dict[str, Any] = {"command": spec["command"], "args": spec.get("args", [])}
+        
+        final_env: dict[str, str] = {}
+        if self._include_system_env:
+            final_env.update(os.environ)
+        
+        if spec_env := spec.get("env"):
+            final_env.update(spec_env)
+        
+        if final_env:
+            params["env"] = final_env
+
+        # the session timeout would otherwise cut every call at the SDK's 5s default
+        call_timeout = float(spec.get("callTimeout", self._call_timeout)) or None
+
+        def create_worker(index: int) -> MCPServer:
+            worker = MCPServerStdio(
+                name=f"{name} server #{index}", params=params, client_session_timeout_seconds=call_timeout
+            )
+            # per worker, so traces time the server itself rather than the wait for a free worker
+            return RecordingMCPServer(worker, name, run_recorder) if run_recorder.enabled else worker
+
+        return MCPServerPool(
+            f"{name} server",
+            create_worker,
+            size=int(spec.get("poolSize", self._pool_size)),
+            max_in_flight=int(spec.get("maxInFlight", self._max_in_flight)),
+        )
+
+    def _create_fleet(self) -> ClusterFleet:
+        return ClusterFleet(
+            self._cfg.get("clusters") or {},
+            self._cfg["clusterServers"],
+            self._create_pool,
+            default_cluster=self._cfg.get("defaultCluster"),
+            idle_timeout=float(self._cfg.get("clusterIdleTimeout", 600.0)),
+            max_active=int(self._cfg.get("clusterMaxActive", 0)),
+            startup_timeout=self._startup_timeout,
+            call_timeout=self._call_timeout,
+            breaker_threshold=self._breaker_threshold,
+            breaker_reset_timeout=self._breaker_reset_timeout,
+        )
+
+    def _supervise(self, name: str, spec: Dict[str, Any], pool: MCPServerPool) -> SupervisedMCPServer:
+        self._breakers[name] = CircuitBreaker(self._breaker_threshold, self._breaker_reset_timeout)
+        supervised = SupervisedMCPServer(
+            pool,
+            name,
+            self._breakers[name],
+            call_timeout=float(spec.get("callTimeout", self._call_timeout)),
+        )
+        self._supervised.append(supervised)
+        return supervised
+
+    def _wrap_server(self, name: str, spec: Dict[str, Any], server: MCPServer) -> MCPServer:
+        if cache_spec := spec.get("cache"):
+            cache_spec = cache_spec if isinstance(cache_spec, dict) else {}
+            if self._tool_cache is None:
+                self._tool_cache = MCPToolCache()
+            server = CachingMCPServer(
+                server,
+                self._tool_cache,
+                default_ttl=float(cache_spec.get("defaultTtl", 10.0)),
+                ttl=cache_spec.get("ttl"),
+            )
+        if self._output_processor is not None:
+            server = ProcessingMCPServer(server, self._output_processor)
+        # outermost, so latency is what the agent observes (cache hits included)
+        return InstrumentedMCPServer(server, name)
+
+    async def _start_server(
+        self,
+        name: str,
+        spec: Dict[str, Any],
+        pool: MCPServer,
+        timeout: float,
+        critical: bool,
+    ) -> None:
+        """Connect *pool* (or a cluster server's default cluster) and warm its tool list within *timeout*, recording phase timings."""
+        report = self._startup[name]
+        started = time.perf_counter()
+
+        async def warm() -> None:
+            await pool.connect()
+            report["connect_seconds"] = time.perf_counter() - started
+            listed = time.perf_counter()
+            # lists through the wrappers, so the tools the agent calls are the cataloged ones
+            await self._tool_catalog.refresh(name)
+            if self._tool_catalog.is_stale(name):
+                raise RuntimeError(f"MCP server '{name}' listed no tools")
+            report["tools"] = self._tool_catalog.get_tool_count(name)
+            report["list_tools_seconds"] = time.perf_counter() - listed
+
+        try:
             cmd = spec["command"]
             if shutil.which(cmd) is None:
                 raise RuntimeError(f"Executable '{cmd}' for '{name}' not found on PATH")
+            try:
+                await asyncio.wait_for(warm(), timeout)
+            except asyncio.TimeoutError:
+                await pool.cleanup()
+                report["status"] = "timeout"
+                raise RuntimeError(f"MCP server '{name}' did not start within {timeout:g}s") from None
+            report["status"] = "ready"
+        except asyncio.CancelledError:
+            report["status"] = "cancelled"
+            raise
+        except Exception as exc:
+            if report["status"] == "starting":
+                report["status"] = "failed"
+            report["error"] = str(exc)
+            if critical:
+                raise
+            logging.error("Non-critical MCP server '%s' unavailable: %s", name, exc)
+        finally:
+            report["total_seconds"] = time.perf_counter() - started
+            logging.info(
+                "MCP server '%s' %s after %.2fs (connect %.2fs, list_tools %.2fs)",
+                name,
+                report["status"],
+                report["total_seconds"],
+                report.get("connect_seconds", 0.0),
+                report.get("list_tools_seconds", 0.0),
+            )
 
-            params: dict[str, Any] = {"command": cmd, "args": spec.get("args", [])}
-            
-            final_env: dict[str, str] = {}
-            if self._include_system_env:
-                final_env.update(os.environ)
-            
-            if spec_env := spec.get("env"):
-                final_env.update(spec_env)
-            
-            if final_env:
-                params["env"] = final_env
-
-            server_cm = MCPServerStdio(name=f"{name} server", params=params)
-            server = await self._stack.enter_async_context(server_cm)
-            self._servers[name] = server
\ No newline at end of file
+    async def _cancel_warmup(self) -> None:
+        for task in self._warmup_tasks:
+            task.cancel()
+        await asyncio.gather(*self._warmup_tasks, return_exceptions=True)
+        self._warmup_tasks.clear()
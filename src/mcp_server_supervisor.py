@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from agents.exceptions import UserError
+from agents.mcp import MCPServer
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+from mcp_server_pool import MCPServerPool
+from mcp_server_wrapper import MCPServerWrapper
+
+__all__ = ["CircuitBreaker", "MCPServerSupervisor", "MCPServerUnavailable", "SupervisedMCPServer"]
+
+# McpError codes meaning the server did not answer, as opposed to a tool error:
+# connection lost, and the client session's read timeout (HTTP 408)
+_TRANSPORT_ERROR_CODES = (CONNECTION_CLOSED, 408)
+
+
+class MCPServerUnavailable(RuntimeError):
+    """Raised instead of calling a server whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fail fast after repeated transport failures of one server.
+
+    ``failure_threshold`` consecutive failures open the breaker; calls are then
+    rejected until ``reset_timeout`` seconds have passed, after which one trial
+    call is let through (half‑open) and its outcome closes or re‑opens it.  The
+    supervisor also closes it as soon as a health check passes.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next trial call is allowed (0 when closed)."""
+        if self.state == "closed":
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() >= self._opened_at + self.reset_timeout:
+            self.state = "half_open"
+            self._trial = False
+        if self.state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.reset()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            self.trip()
+
+    def trip(self) -> None:
+        if self.state != "open":
+            self.opened += 1
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._trial = False
+
+    def reset(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._trial = False
+
+
+class SupervisedMCPServer(MCPServerWrapper):
+    """Bound every call by ``call_timeout`` and route it through a :class:`CircuitBreaker`.
+
+    Transport failures (timeouts, a closed connection, a pool with no worker)
+    count against the breaker and ask the supervisor for an immediate health
+    check; tool‑level errors do not, since the server answered.  While the
+    breaker is open calls raise :class:`MCPServerUnavailable` at once, which
+    the agent sees as the tool's error, and ``list_tools`` serves the last
+    known list so the agent's turns are never held up by a restarting server.
+    """
+
+    def __init__(
+        self,
+        inner: MCPServer,
+        server_label: str,
+        breaker: CircuitBreaker,
+        *,
+        call_timeout: float | None = 60.0,
+        supervisor: "MCPServerSupervisor | None" = None,
+    ) -> None:
+        super().__init__(inner)
+        self._server_label = server_label
+        self._breaker = breaker
+        self._call_timeout = call_timeout or None
+        self._supervisor = supervisor
+
+    def attach(self, supervisor: "MCPServerSupervisor") -> None:
+        self._supervisor = supervisor
+
+    async def list_tools(self, run_context: Any = None, agent: Any = None) -> List[Any]:
+        if self._breaker.state == "open":
+            return self._fallback_tools()
+        try:
+            async with asyncio.timeout(self._call_timeout):
+                return await super().list_tools(run_context, agent)
+        except (TimeoutError, McpError, RuntimeError) as exc:
+            logging.warning("list_tools of MCP server '%s' failed: %r", self._server_label, exc)
+            self._failed()
+            return self._fallback_tools()
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any] | None,
+        meta: Dict[str, Any] | None = None,
+    ) -> Any:
+        if not self._breaker.allow():
+            raise MCPServerUnavailable(
+                f"MCP server '{self._server_label}' is unavailable and being restarted; "
+                f"retry in about {max(1, round(self._breaker.retry_after))}s or answer with other tools"
+            )
+        try:
+            async with asyncio.timeout(self._call_timeout):
+                result = await super().call_tool(tool_name, arguments, meta)
+        except TimeoutError:
+            self._failed()
+            raise TimeoutError(
+                f"{tool_name} on MCP server '{self._server_label}' did not answer within {self._call_timeout:g}s"
+            ) from None
+        except McpError as exc:
+            if exc.error.code in _TRANSPORT_ERROR_CODES:
+                self._failed()
+            else:
+                self._breaker.record_success()
+            raise
+        except UserError:
+            # rejected before reaching the server (e.g. missing arguments)
+            raise
+        except Exception:
+            self._failed()
+            raise
+        self._breaker.record_success()
+        return result
+
+    def _fallback_tools(self) -> List[Any]:
+        # the pool remembers its last listing; calls to those tools then fail fast
+        return list(getattr(self._inner, "last_tools", None) or [])
+
+    def _failed(self) -> None:
+        self._breaker.record_failure()
+        if self._supervisor is not None:
+            self._supervisor.request_check(self._server_label)
+
+
+class _ServerState:
+    """Supervision bookkeeping of one logical server."""
+
+    __slots__ = ("restarts", "consecutive_failures", "last_error", "last_check", "down_since", "wake")
+
+    def __init__(self) -> None:
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_error: str | None = None
+        self.last_check: float | None = None
+        self.down_since: float | None = None
+        self.wake = asyncio.Event()
+
+
+class MCPServerSupervisor:
+    """Health‑check every worker of every pool and restart the ones that fail.
+
+    Each server is checked every ``interval`` seconds, and at once when a call
+    reports a transport failure: every worker must answer an MCP ``ping``
+    within ``ping_timeout``.  A worker that does not is taken out of rotation
+    and restarted, with exponential backoff (``backoff_base`` doubling up to
+    ``backoff_max``, jittered) while restarts keep failing.  Pools that never
+    came up (non‑critical servers that failed to start) are retried the same
+    way.  A failed restart opens the server's circuit breaker only when no
+    healthy worker is left, and a check that finds one closes it again.
+    ``on_recovered`` is called with the server's name after every successful
+    (re)start, e.g. to re‑list its tools.
+    """
+
+    def __init__(
+        self,
+        pools: Dict[str, MCPServerPool],
+        breakers: Dict[str, CircuitBreaker],
+        startup: Dict[str, Dict[str, Any]],
+        *,
+        interval: float = 15.0,
+        ping_timeout: float = 5.0,
+        restart_timeout: float = 60.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        on_recovered: Callable[[str], None] | None = None,
+    ) -> None:
+        self._pools = pools
+        self._breakers = breakers
+        self._startup = startup
+        self._interval = interval
+        self._ping_timeout = ping_timeout
+        self._restart_timeout = restart_timeout
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._on_recovered = on_recovered
+        self._states = {name: _ServerState() for name in pools}
+        self._tasks: list[asyncio.Task[None]] = []
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._supervise(name), name=f"supervise-{name}") for name in self._pools
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def request_check(self, name: str) -> None:
+        """Check *name* now instead of at its next interval."""
+        state = self._states.get(name)
+        if state is not None:
+            state.wake.set()
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """Return the health of every server, as served by ``/healthz`` and ``/readyz``."""
+        now = time.monotonic()
+        status: Dict[str, Dict[str, Any]] = {}
+        for name, pool in self._pools.items():
+            state = self._states[name]
+            breaker = self._breakers[name]
+            status[name] = {
+                "state": self._server_state(name),
+                "critical": bool(self._startup.get(name, {}).get("critical", True)),
+                "workers": pool.size,
+                "healthy_workers": pool.healthy_workers,
+                "circuit": breaker.state,
+                "circuit_opened": breaker.opened,
+                "restarts": state.restarts,
+                "consecutive_failures": state.consecutive_failures,
+                "last_error": state.last_error,
+                "seconds_since_check": None if state.last_check is None else now - state.last_check,
+                "down_seconds": None if state.down_since is None else now - state.down_since,
+            }
+        return status
+
+    def _server_state(self, name: str) -> str:
+        pool = self._pools[name]
+        if not pool.is_ready:
+            return "starting" if self._startup.get(name, {}).get("status") == "starting" else "down"
+        if pool.healthy_workers == 0 or self._breakers[name].state == "open":
+            return "down"
+        if pool.healthy_workers < pool.size:
+            return "degraded"
+        return "healthy"
+
+    # ------------------------------------------------------------------
+    # Supervision loop
+    # ------------------------------------------------------------------
+    async def _supervise(self, name: str) -> None:
+        state = self._states[name]
+        while True:
+            # asyncio.timeout rather than wait_for: cancelling wait_for while its
+            # inner Event.wait is being woken can leave this task stuck on 3.11
+            try:
+                async with asyncio.timeout(self._interval):
+                    await state.wake.wait()
+            except TimeoutError:
+                pass
+            state.wake.clear()
+            try:
+                await self._check(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # never let one bad check end supervision
+                logging.exception("Health check of MCP server '%s' failed", name)
+            state.last_check = time.monotonic()
+            if self._server_state(name) in ("healthy", "starting"):
+                state.down_since = None
+            elif state.down_since is None:
+                state.down_since = time.monotonic()
+
+    async def _check(self, name: str) -> None:
+        pool = self._pools[name]
+        if not pool.is_ready:
+            if self._startup.get(name, {}).get("status") != "starting":
+                await self._with_backoff(name, "start", pool.connect)
+                if pool.is_ready:
+                    self._startup[name]["status"] = "ready"
+            return
+        for index in range(pool.size):
+            try:
+                await pool.ping_worker(index, self._ping_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logging.warning("MCP server '%s' worker #%d failed its health check: %r", name, index, exc)
+                pool.mark_unhealthy(index)
+                await self._with_backoff(
+                    name, f"restart worker #{index}", lambda: pool.restart_worker(index, self._restart_timeout)
+                )
+        if pool.healthy_workers:
+            self._breakers[name].reset()
+
+    async def _with_backoff(self, name: str, action: str, operation: Callable[[], Awaitable[None]]) -> None:
+        state = self._states[name]
+        if state.consecutive_failures:
+            delay = min(self._backoff_max, self._backoff_base * 2 ** (state.consecutive_failures - 1))
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        try:
+            await asyncio.wait_for(operation(), self._restart_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            state.consecutive_failures += 1
+            state.last_error = f"{type(exc).__name__}: {exc}"
+            pool = self._pools[name]
+            # a worker that failed to restart just stays out of rotation while others serve
+            if not pool.is_ready or pool.healthy_workers == 0:
+                self._breakers[name].trip()
+            logging.error("MCP server '%s': %s failed (%d in a row): %s", name, action, state.consecutive_failures, exc)
+            # retry without waiting for the next interval; the backoff paces it
+            state.wake.set()
+            return
+        state.restarts += 1
+        state.consecutive_failures = 0
+        logging.info("MCP server '%s': %s succeeded", name, action)
+        if self._on_recovered is not None:
+            self._on_recovered(name)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from agents.mcp import MCPServer
+
+__all__ = ["MCPServerWrapper"]
+
+
+class MCPServerWrapper(MCPServer):
+    """Transparent :class:`MCPServer` decorator.
+
+    Forwards every operation to ``inner``; subclasses override the calls they
+    want to intercept.  Server‑level settings the agents SDK reads (approval
+    policy, structured content, guardrails …) resolve against ``inner`` too,
+    so wrapping never changes how tools are exposed.
+    """
+
+    def __init__(self, inner: MCPServer) -> None:
+        # MCPServer.__init__ is deliberately not called: its defaults would
+        # shadow the wrapped server's settings (see __getattr__).
+        self._inner = inner
+
+    def __getattr__(self, item: str) -> Any:
+        # only reached for attributes not defined on the wrapper itself
+        if item == "_inner":
+            raise AttributeError(item)
+        return getattr(self._inner, item)
+
+    @property
+    def inner(self) -> MCPServer:
+        return self._inner
+
+    # ------------------------------------------------------------------
+    # MCPServer protocol
+    # ------------------------------------------------------------------
+    @property
+    def name(self) -> str:
+        return self._inner.name
+
+    async def connect(self) -> None:
+        await self._inner.connect()
+
+    async def cleanup(self) -> None:
+        await self._inner.cleanup()
+
+    async def list_tools(self, run_context: Any = None, agent: Any = None) -> List[Any]:
+        return await self._inner.list_tools(run_context, agent)
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any] | None,
+        meta: Dict[str, Any] | None = None,
+    ) -> Any:
+        if meta is None:
+            return await self._inner.call_tool(tool_name, arguments)
+        return await self._inner.call_tool(tool_name, arguments, meta=meta)
+
+    async def list_prompts(self) -> Any:
+        return await self._inner.list_prompts()
+
+    async def get_prompt(self, name: str, arguments: Dict[str, Any] | None = None) -> Any:
+        return await self._inner.get_prompt(name, arguments)
+
+    @property
+    def cached_tools(self) -> List[Any] | None:
+        return self._inner.cached_tools
+
+    def invalidate_tools_cache(self) -> None:
+        invalidate = getattr(self._inner, "invalidate_tools_cache", None)
+        if invalidate is not None:
+            invalidate()
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Tuple
+
+from agents.mcp import MCPServer
+
+from mcp_server_wrapper import MCPServerWrapper
+
+__all__ = ["MCPToolCache", "CachingMCPServer", "is_mutating_tool", "is_read_only_tool", "shared_tool_results"]
+
+# Name tokens that mark a tool as a read‑only lookup …
+READ_ONLY_TOKENS = frozenset(
+    {"get", "list", "describe", "logs", "log", "events", "query", "explain", "top", "metadata", "targets", "metrics"}
+)
+# … and tokens that mark it as (possibly) mutating.  Mutating always wins.
+MUTATING_TOKENS = frozenset(
+    {
+        "apply", "annotate", "cleanup", "cordon", "create", "delete", "drain", "edit", "exec",
+        "forward", "install", "label", "patch", "restart", "rollout", "run", "scale", "set",
+        "stop", "taint", "uncordon", "uninstall", "update", "upgrade",
+    }
+)
+
+_TOKEN_SPLIT = re.compile(r"[^a-z0-9]+")
+
+CacheKey = Tuple[str, str, str]
+
+# (private cache, ttl) of the shared_tool_results block the current run was started in
+_SHARED_SCOPE: ContextVar[Tuple["MCPToolCache", float] | None] = ContextVar(
+    "mcp_tool_cache_shared_scope", default=None
+)
+
+
+@contextmanager
+def shared_tool_results(ttl: float) -> Iterator["MCPToolCache"]:
+    """Let the agent runs started inside the block share read‑only tool results.
+
+    Runs inherit the scope through their context.  Within it, results of
+    cacheable tools are kept for at least *ttl* seconds in a cache private to
+    the scope, so e.g. the alerts of one batch reuse each other's lookups for
+    the whole batch without other callers seeing results older than the
+    regular TTL, and without the batch evicting the regular cache's entries.
+    The private cache is dropped when the block exits.
+    """
+    cache = MCPToolCache()
+    token = _SHARED_SCOPE.set((cache, ttl))
+    try:
+        yield cache
+    finally:
+        _SHARED_SCOPE.reset(token)
+        cache.clear()
+
+
+def is_mutating_tool(tool_name: str) -> bool:
+    """Whether *tool_name* contains a mutating verb (``delete``, ``apply``, ``scale`` …)."""
+    return bool(set(_TOKEN_SPLIT.split(tool_name.lower())) & MUTATING_TOKENS)
+
+
+def is_read_only_tool(tool_name: str) -> bool:
+    """Whether *tool_name* looks like a read‑only lookup and contains no mutating verb."""
+    tokens = set(_TOKEN_SPLIT.split(tool_name.lower()))
+    return bool(tokens & READ_ONLY_TOKENS) and not tokens & MUTATING_TOKENS
+
+
+def _normalize(value: Any) -> Any:
+    """Drop ``None`` values and trim strings so equivalent calls share a key."""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _result_size(result: Any) -> int:
+    """Approximate the memory footprint of a ``CallToolResult`` by its text content."""
+    size = 0
+    for item in getattr(result, "content", None) or ():
+        text = getattr(item, "text", None)
+        size += len(text) if isinstance(text, str) else 256
+    return size or 256
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "size")
+
+    def __init__(self, value: Any, expires: float, size: int) -> None:
+        self.value = value
+        self.expires = expires
+        self.size = size
+
+
+class MCPToolCache:
+    """Size‑bounded TTL cache with in‑flight de‑duplication (singleflight).
+
+    Entries are evicted least‑recently‑used once ``max_entries`` or
+    ``max_bytes`` is exceeded.  Concurrent lookups for the same key while a
+    fetch is running share that fetch instead of starting their own.  One
+    instance can be shared by several :class:`CachingMCPServer` wrappers.
+    """
+
+    def __init__(self, *, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[CacheKey, _Entry] = OrderedDict()
+        self._inflight: dict[CacheKey, asyncio.Task[Any]] = {}
+        self._waiters: dict[CacheKey, int] = {}
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(server: str, tool_name: str, arguments: Dict[str, Any] | None) -> CacheKey:
+        args = json.dumps(_normalize(arguments or {}), sort_keys=True, separators=(",", ":"), default=str)
+        return server, tool_name, args
+
+    async def get_or_fetch(
+        self,
+        key: CacheKey,
+        ttl: float,
+        fetch: Callable[[], Awaitable[Any]],
+        *,
+        cacheable: Callable[[Any], bool] = lambda _: True,
+    ) -> Any:
+        """Return the cached value for *key*, or run *fetch* once and cache it for *ttl* seconds."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry.value
+            self._drop(key)
+            self._stats["expired"] += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+        else:
+            self._stats["misses"] += 1
+            task = asyncio.create_task(self._fetch(key, ttl, fetch, cacheable))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        # shielded so one caller giving up doesn't cancel the fetch for the others;
+        # once the last interested caller is cancelled the fetch is cancelled too
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1:
+                task.cancel()
+            raise
+        finally:
+            remaining = self._waiters.pop(key, 1) - 1
+            if remaining > 0:
+                self._waiters[key] = remaining
+
+    def record_bypass(self) -> None:
+        self._stats["bypassed"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "entries": len(self._entries), "bytes": self._bytes}
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    async def _fetch(
+        self,
+        key: CacheKey,
+        ttl: float,
+        fetch: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool],
+    ) -> Any:
+        try:
+            value = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+        if cacheable(value):
+            self._store(key, _Entry(value, time.monotonic() + ttl, _result_size(value)))
+        return value
+
+    def _store(self, key: CacheKey, entry: _Entry) -> None:
+        if entry.size > self._max_bytes:
+            return
+        self._drop(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def _drop(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+
+class CachingMCPServer(MCPServerWrapper):
+    """Serve repeated read‑only tool calls from an :class:`MCPToolCache`.
+
+    A tool is cached when ``ttl`` names it explicitly, or when its name looks
+    like a read‑only lookup (``kubectl_get``, ``list_pods``, ``execute_query``)
+    in which case ``default_ttl`` applies.  Tools whose name contains a
+    mutating verb (``delete``, ``apply``, ``scale`` …) always bypass the cache,
+    as does any tool with a TTL of ``0``.  Error results are never cached.
+    Inside :func:`shared_tool_results` cacheable tools use the scope's private
+    cache and TTL instead.
+    """
+
+    def __init__(
+        self,
+        inner: MCPServer,
+        cache: MCPToolCache,
+        *,
+        default_ttl: float = 10.0,
+        ttl: Dict[str, float] | None = None,
+    ) -> None:
+        super().__init__(inner)
+        self._cache = cache
+        self._default_ttl = default_ttl
+        self._ttl = dict(ttl or {})
+
+    def ttl_for(self, tool_name: str) -> float:
+        """Return the TTL in seconds for *tool_name*; ``0`` means never cache."""
+        if is_mutating_tool(tool_name):
+            return 0.0
+        if tool_name in self._ttl:
+            return float(self._ttl[tool_name])
+        return self._default_ttl if is_read_only_tool(tool_name) else 0.0
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any] | None,
+        meta: Dict[str, Any] | None = None,
+    ) -> Any:
+        ttl = self.ttl_for(tool_name)
+        if ttl <= 0 or meta is not None:
+            self._cache.record_bypass()
+            return await super().call_tool(tool_name, arguments, meta)
+
+        cache = self._cache
+        shared = _SHARED_SCOPE.get()
+        if shared is not None:
+            cache, ttl = shared[0], max(ttl, shared[1])
+        key = cache.make_key(self.name, tool_name, arguments)
+        return await cache.get_or_fetch(
+            key,
+            ttl,
+            lambda: super(CachingMCPServer, self).call_tool(tool_name, arguments),
+            cacheable=lambda result: not getattr(result, "isError", False),
+        )
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence
+
+from agents import Agent, RunContextWrapper, Tool
+from agents.mcp import MCPServer, MCPUtil
+from agents.tool import default_tool_error_function
+
+__all__ = ["CatalogAgent", "MCPToolCatalog"]
+
+
+class _Entry:
+    """Listed tools and their prebuilt function tools for one logical server."""
+
+    __slots__ = (
+        "server", "allowed", "blocked", "listed", "function_tools", "stale",
+        "refreshes", "refreshed_at", "refresh_seconds", "last_error", "lock",
+    )
+
+    def __init__(self, server: MCPServer, allowed: Sequence[str] | None, blocked: Sequence[str] | None) -> None:
+        self.server = server
+        self.allowed = list(allowed) if allowed is not None else None
+        self.blocked = list(blocked or [])
+        self.listed = 0
+        self.function_tools: List[Tool] = []
+        # nothing listed yet, or invalidated since
+        self.stale = True
+        self.refreshes = 0
+        self.refreshed_at: float | None = None
+        self.refresh_seconds: float | None = None
+        self.last_error: str | None = None
+        self.lock = asyncio.Lock()
+
+    def exposes(self, tool_name: str) -> bool:
+        if self.allowed is not None and not any(fnmatch.fnmatchcase(tool_name, p) for p in self.allowed):
+            return False
+        return not any(fnmatch.fnmatchcase(tool_name, p) for p in self.blocked)
+
+
+class MCPToolCatalog:
+    """Tool schemas of every MCP server, fetched once and prebuilt for the agent.
+
+    Without it the agents SDK calls ``list_tools`` on every server and converts
+    each schema into a :class:`FunctionTool` on every turn.  The catalog does
+    both once per server and serves the result to :class:`CatalogAgent` until
+    the server is invalidated (after a restart) or refreshed explicitly.
+    ``allowed``/``blocked`` take tool names or ``fnmatch`` patterns and limit
+    which of a server's tools the model sees.
+
+    A server that is not ready yet lists no tools and stays stale, so it is
+    asked again on the next turn and shows up as soon as it has started.
+
+    Tools are served in a fixed order, servers as added and each server's
+    tools by name, so the tool definitions at the head of every request stay
+    byte‑identical (and provider‑side prompt caching effective) no matter in
+    which order a server lists them or whether it was restarted.  Callbacks
+    registered with :meth:`on_change` see every rebuilt tool list before it
+    is served, e.g. once a server that was still starting lists its tools.
+    """
+
+    def __init__(
+        self,
+        *,
+        convert_schemas_to_strict: bool = False,
+        failure_error_function: Any = default_tool_error_function,
+    ) -> None:
+        self._convert_schemas_to_strict = convert_schemas_to_strict
+        self._failure_error_function = failure_error_function
+        self._entries: Dict[str, _Entry] = {}
+        self._tools: List[Tool] = []
+        self._dirty = False
+        self._listeners: List[Callable[[List[Tool]], None]] = []
+
+    def add_server(
+        self,
+        name: str,
+        server: MCPServer,
+        *,
+        allowed: Sequence[str] | None = None,
+        blocked: Sequence[str] | None = None,
+    ) -> None:
+        """Register *server*; its tools are fetched on the first refresh or turn."""
+        self._entries[name] = _Entry(server, allowed, blocked)
+
+    def on_change(self, callback: Callable[[List[Tool]], None]) -> None:
+        """Call *callback* with the merged tools whenever they are rebuilt."""
+        self._listeners.append(callback)
+
+    def invalidate(self, name: str | None = None) -> None:
+        """Re-list *name* (every server when ``None``) before the next turn."""
+        for _, entry in self._select(name):
+            entry.stale = True
+
+    async def refresh(self, name: str | None = None) -> None:
+        """List and rebuild the tools of *name* (every server when ``None``) now."""
+        selected = self._select(name)
+        for _, entry in selected:
+            entry.stale = True
+        await asyncio.gather(*(self._refresh_entry(n, entry) for n, entry in selected))
+
+    async def get_function_tools(self) -> List[Tool]:
+        """Return the prebuilt tools of all servers, re-listing stale servers first."""
+        stale = [(name, entry) for name, entry in self._entries.items() if entry.stale]
+        if stale:
+            await asyncio.gather(*(self._refresh_entry(name, entry) for name, entry in stale))
+        if self._dirty:
+            self._tools = self._merge()
+            self._dirty = False
+            for callback in self._listeners:
+                try:
+                    callback(self._tools)
+                except Exception:
+                    logging.exception("Tool catalog change callback failed")
+        return self._tools
+
+    def is_stale(self, name: str) -> bool:
+        """Whether *name* has not been listed since it was added or invalidated."""
+        return self._entries[name].stale
+
+    def get_tool_count(self, name: str) -> int:
+        """Number of tools of *name* exposed to the model."""
+        return len(self._entries[name].function_tools)
+
+    def server_of(self, tool_name: str) -> str | None:
+        """Name of the server whose exposed tools include *tool_name*, or ``None``."""
+        for name, entry in self._entries.items():
+            if any(tool.name == tool_name for tool in entry.function_tools):
+                return name
+        return None
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per‑server listed/exposed tool counts and refresh statistics."""
+        now = time.monotonic()
+        return {
+            name: {
+                "listed": entry.listed,
+                "exposed": len(entry.function_tools),
+                "tools": [tool.name for tool in entry.function_tools],
+                "stale": entry.stale,
+                "refreshes": entry.refreshes,
+                "refresh_seconds": entry.refresh_seconds,
+                "seconds_since_refresh": None if entry.refreshed_at is None else now - entry.refreshed_at,
+                "last_error": entry.last_error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _select(self, name: str | None) -> List[tuple[str, _Entry]]:
+        if name is None:
+            return list(self._entries.items())
+        try:
+            return [(name, self._entries[name])]
+        except KeyError:
+            raise KeyError(f"server '{name}' not found; available: {list(self._entries)}") from None
+
+    async def _refresh_entry(self, name: str, entry: _Entry) -> None:
+        async with entry.lock:
+            if not entry.stale:
+                return  # refreshed by a concurrent turn while we waited
+            started = time.perf_counter()
+            try:
+                listed = await entry.server.list_tools()
+            except Exception as exc:
+                # keep serving the previous tools; the next turn tries again
+                entry.last_error = f"{type(exc).__name__}: {exc}"
+                logging.warning("Listing tools of MCP server '%s' failed: %s", name, exc)
+                return
+            if not listed:
+                return  # not started yet
+            entry.function_tools = [
+                MCPUtil.to_function_tool(
+                    tool,
+                    entry.server,
+                    self._convert_schemas_to_strict,
+                    failure_error_function=self._failure_error_function,
+                )
+                for tool in sorted(listed, key=lambda t: t.name)
+                if entry.exposes(tool.name)
+            ]
+            entry.listed = len(listed)
+            entry.stale = False
+            entry.last_error = None
+            entry.refreshes += 1
+            entry.refreshed_at = time.monotonic()
+            entry.refresh_seconds = time.perf_counter() - started
+            self._dirty = True
+            logging.info(
+                "Cataloged %d of %d tools of MCP server '%s' in %.3fs",
+                len(entry.function_tools), entry.listed, name, entry.refresh_seconds,
+            )
+
+    def _merge(self) -> List[Tool]:
+        tools: List[Tool] = []
+        seen: Dict[str, str] = {}
+        for name, entry in self._entries.items():
+            for tool in entry.function_tools:
+                if tool.name in seen:
+                    logging.warning(
+                        "Tool '%s' of MCP server '%s' hidden by the one of '%s'", tool.name, name, seen[tool.name]
+                    )
+                    continue
+                seen[tool.name] = name
+                tools.append(tool)
+        return tools
+
+
+@dataclass
+class CatalogAgent(Agent[Any]):
+    """:class:`Agent` taking its MCP tools from an :class:`MCPToolCatalog`.
+
+    ``mcp_servers`` is kept for introspection only; with a catalog set the
+    servers are not asked for their tools on each turn.
+    """
+
+    tool_catalog: MCPToolCatalog | None = None
+
+    async def get_mcp_tools(self, run_context: RunContextWrapper[Any]) -> list[Tool]:
+        if self.tool_catalog is None:
+            return await super().get_mcp_tools(run_context)
+        return list(await self.tool_catalog.get_function_tools())
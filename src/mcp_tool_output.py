@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from agents.mcp import MCPServer
+
+from mcp_server_wrapper import MCPServerWrapper
+
+__all__ = ["ToolOutputProcessor", "ProcessingMCPServer"]
+
+# "log" or "logs" as a word of the tool name (kubectl_logs, pods_log, get-logs, getPodLogs), not catalog or login
+_LOG_TOOL = re.compile(r"(?:^|[_.-])[Ll]ogs?(?:$|[_.-])|(?<=[a-z])Logs?(?:$|[A-Z_.-])")
+# Leading timestamp of a log line, e.g. "2025-01-01T10:00:00.123Z " or "[2025-01-01 10:00:00,123] "
+_LOG_TIMESTAMP = re.compile(r"^\[?\d{4}-\d{2}-\d{2}[T ][\d:.,]+(?:Z|[+-]\d{2}:?\d{2})?\]?\s*")
+_RAW_REF = re.compile(r"; raw output ref ([0-9a-f]{16})\]$")
+
+
+def dedupe_lines(text: str) -> str:
+    """Collapse runs of identical lines (ignoring leading timestamps) into one line with a count."""
+    out: List[str] = []
+    previous_key: str | None = None
+    repeats = 0
+    for line in text.splitlines():
+        key = _LOG_TIMESTAMP.sub("", line)
+        if key == previous_key:
+            repeats += 1
+            continue
+        if repeats:
+            out[-1] += f"  [repeated {repeats + 1}x]"
+        out.append(line)
+        previous_key, repeats = key, 0
+    if repeats:
+        out[-1] += f"  [repeated {repeats + 1}x]"
+    return "\n".join(out)
+
+
+def head_tail(text: str, limit: int, head_ratio: float = 0.5) -> str:
+    """Keep the first and last lines of *text* so that roughly *limit* characters remain."""
+    if len(text) <= limit:
+        return text
+    head_budget = int(limit * head_ratio)
+    tail_budget = limit - head_budget
+
+    head = text[:head_budget]
+    tail = text[len(text) - tail_budget:]
+    # cut on line boundaries where possible
+    if "\n" in head:
+        head = head[: head.rfind("\n")]
+    if "\n" in tail:
+        tail = tail[tail.find("\n") + 1:]
+
+    omitted = text[len(head): len(text) - len(tail)]
+    marker = f"\n… [{len(omitted)} chars / {omitted.count(chr(10))} lines omitted] …\n"
+    return head + marker + tail
+
+
+def downsample_series(values: List[Any], target_points: int) -> List[Any]:
+    """Reduce ``[[ts, "value"], …]`` to about *target_points*, keeping each bucket's min and max."""
+    if len(values) <= target_points or target_points < 4:
+        return values
+    buckets = target_points // 2
+    size = len(values) / buckets
+    out: List[Any] = []
+    for b in range(buckets):
+        bucket = values[int(b * size): int((b + 1) * size)]
+        if not bucket:
+            continue
+        try:
+            low = min(bucket, key=lambda p: float(p[1]))
+            high = max(bucket, key=lambda p: float(p[1]))
+        except (TypeError, ValueError, IndexError):
+            out.append(bucket[0])
+            continue
+        out.extend(sorted({id(low): low, id(high): high}.values(), key=lambda p: p[0]))
+    if out[-1] is not values[-1]:
+        out.append(values[-1])
+    return out
+
+
+def downsample_matrix(text: str, target_points: int) -> str:
+    """Downsample a Prometheus range‑query (``resultType: matrix``) JSON payload."""
+    stripped = text.lstrip()
+    if not stripped.startswith("{") or "matrix" not in text:
+        return text
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return text
+    data = payload.get("data", payload) if isinstance(payload, dict) else None
+    if not isinstance(data, dict) or data.get("resultType") != "matrix":
+        return text
+    changed = False
+    for series in data.get("result") or []:
+        if isinstance(series, dict) and isinstance(series.get("values"), list):
+            values = series["values"]
+            series["values"] = downsample_series(values, target_points)
+            changed |= series["values"] is not values
+    return json.dumps(payload, separators=(",", ":")) if changed else text
+
+
+class ToolOutputProcessor:
+    """Shrink tool outputs before they enter the model context.
+
+    Prometheus matrix results are downsampled to ``target_points`` per series,
+    log tools get repeated lines collapsed, and anything still longer than the
+    tool's character cap keeps only its head and tail (logs favour the tail).
+    Whenever an output is reduced, the raw text is kept in a bounded store and
+    a ``[raw output ref …]`` marker is appended so the UI can show it in full.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_chars: int = 16000,
+        per_tool_max_chars: Dict[str, int] | None = None,
+        target_points: int = 120,
+        raw_store_bytes: int = 32 * 1024 * 1024,
+    ) -> None:
+        self._max_chars = max_chars
+        self._per_tool = dict(per_tool_max_chars or {})
+        self._target_points = target_points
+        self._raw_store_bytes = raw_store_bytes
+        self._raw: OrderedDict[str, str] = OrderedDict()
+        self._raw_bytes = 0
+        self._stats = {"outputs": 0, "reduced": 0, "chars_in": 0, "chars_out": 0}
+
+    def process(self, tool_name: str, text: str) -> str:
+        """Return the model‑facing version of one text output of *tool_name*."""
+        self._stats["outputs"] += 1
+        self._stats["chars_in"] += len(text)
+
+        is_log = bool(_LOG_TOOL.search(tool_name))
+        reduced = downsample_matrix(text, self._target_points)
+        if is_log:
+            reduced = dedupe_lines(reduced)
+        limit = self._per_tool.get(tool_name, self._max_chars)
+        reduced = head_tail(reduced, limit, head_ratio=0.2 if is_log else 0.5)
+
+        if reduced != text:
+            ref = self._remember(text)
+            reduced += f"\n[{len(text)} chars reduced to {len(reduced)}; raw output ref {ref}]"
+            self._stats["reduced"] += 1
+        self._stats["chars_out"] += len(reduced)
+        return reduced
+
+    def resolve_raw(self, output: Any) -> str:
+        """Return the raw output behind a processed *output*, or *output* as text if unknown."""
+        if isinstance(output, dict) and isinstance(output.get("text"), str):
+            output = output["text"]
+        text = output if isinstance(output, str) else str(output)
+        match = _RAW_REF.search(text)
+        if match is None:
+            return text
+        return self._raw.get(match.group(1), text)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "raw_entries": len(self._raw), "raw_bytes": self._raw_bytes}
+
+    def _remember(self, raw: str) -> str:
+        ref = hashlib.blake2b(raw.encode("utf-8", "replace"), digest_size=8).hexdigest()
+        if ref in self._raw:
+            self._raw.move_to_end(ref)
+            return ref
+        self._raw[ref] = raw
+        self._raw_bytes += len(raw)
+        while self._raw_bytes > self._raw_store_bytes and len(self._raw) > 1:
+            _, evicted = self._raw.popitem(last=False)
+            self._raw_bytes -= len(evicted)
+        return ref
+
+
+class ProcessingMCPServer(MCPServerWrapper):
+    """Run every text item of a tool result through a :class:`ToolOutputProcessor`."""
+
+    def __init__(self, inner: MCPServer, processor: ToolOutputProcessor) -> None:
+        super().__init__(inner)
+        self._processor = processor
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any] | None,
+        meta: Dict[str, Any] | None = None,
+    ) -> Any:
+        result = await super().call_tool(tool_name, arguments, meta)
+        content = getattr(result, "content", None)
+        if not content:
+            return result
+
+        changed = False
+        new_content = []
+        for item in content:
+            text = getattr(item, "text", None)
+            if isinstance(text, str):
+                processed = self._processor.process(tool_name, text)
+                if processed != text:
+                    item = item.model_copy(update={"text": processed})
+                    changed = True
+            new_content.append(item)
+        if not changed:
+            return result
+        # the reduced text replaces any structured copy of the same payload
+        return result.model_copy(update={"content": new_content, "structuredContent": None})
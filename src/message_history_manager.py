@@ -0,0 +1,267 @@
+"""
+Message History Manager for Kubernetes Operations Agent.
+
+Provides a MessageHistoryManager class that keeps the conversation sent to
+the model within a token budget by folding older turns into a running summary.
+"""
+
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+try:  # exact counts when tiktoken is installed, a cheap estimate otherwise
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # pragma: no cover - optional dependency
+    _ENCODING = None
+
+SUMMARY_HEADER = "Summary of the earlier conversation (older turns were compacted):"
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Compaction folds down to this fraction of the budget, so it runs in batches
+# rather than on every turn once the budget is first reached
+COMPACTION_LOW_WATER = 0.75
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in a piece of text.
+
+    Uses tiktoken when available and falls back to ~4 characters per token.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        The (approximate) number of tokens
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def summarize_turns(messages: List[Dict[str, str]], max_chars_per_turn: int = 240) -> List[str]:
+    """
+    Turn messages into short extractive summary lines.
+
+    Args:
+        messages: The messages to summarize
+        max_chars_per_turn: Maximum characters kept from each message
+
+    Returns:
+        One summary line per message
+    """
+    lines = []
+    for message in messages:
+        content = _WHITESPACE.sub(" ", str(message.get("content", ""))).strip()
+        if len(content) > max_chars_per_turn:
+            content = content[:max_chars_per_turn].rstrip() + "…"
+        lines.append(f"- {message.get('role', 'unknown')}: {content}")
+    return lines
+
+
+class MessageHistoryManager:
+    """
+    Keeps the model input for a conversation within a token budget.
+
+    The most recent messages are always kept verbatim. Once the total exceeds
+    the budget, the oldest messages outside that window are folded into a
+    running summary that is sent as a single system message ahead of them.
+    Token counts are tracked per message, so appending is O(1) amortized.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 12000,
+        keep_recent: int = 6,
+        summary_max_tokens: int = 1500,
+        summarize: Callable[[List[Dict[str, str]]], List[str]] = summarize_turns,
+    ):
+        """
+        Initialize the MessageHistoryManager.
+
+        Args:
+            token_budget: Target maximum tokens of the model input
+            keep_recent: Number of most recent messages never compacted
+            summary_max_tokens: Maximum tokens of the running summary, capped at
+                a quarter of token_budget
+            summarize: Function turning folded messages into summary lines
+        """
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        # A summary near the budget would leave compaction nothing to fold down to
+        self.summary_max_tokens = min(summary_max_tokens, token_budget // 4)
+        self._summarize = summarize
+        self._clear()
+
+    def _clear(self) -> None:
+        self._messages: List[Dict[str, str]] = []
+        self._message_tokens: List[int] = []
+        self._window_tokens = 0
+        self._summary_lines: List[str] = []
+        self._summary_line_tokens: List[int] = []
+        self._summary_tokens = 0
+
+        self._raw_tokens = 0
+        self._compacted_messages = 0
+        self._compactions = 0
+
+    @classmethod
+    def from_env(cls) -> "MessageHistoryManager":
+        """
+        Create a manager configured from HISTORY_* environment variables.
+
+        Returns:
+            A new MessageHistoryManager
+        """
+        return cls(
+            token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "12000")),
+            keep_recent=int(os.getenv("HISTORY_KEEP_RECENT", "6")),
+            summary_max_tokens=int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "1500")),
+        )
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        """The messages still kept verbatim."""
+        return self._messages
+
+    @property
+    def summary(self) -> Optional[str]:
+        """The running summary of compacted messages, if any."""
+        if not self._summary_lines:
+            return None
+        return "\n".join([SUMMARY_HEADER, *self._summary_lines])
+
+    def append(self, message: Dict[str, str]) -> None:
+        """
+        Append a message and compact the history if it exceeds the budget.
+
+        Args:
+            message: A chat message with "role" and "content"
+        """
+        tokens = self._count(message)
+        self._messages.append(message)
+        self._message_tokens.append(tokens)
+        self._window_tokens += tokens
+        self._raw_tokens += tokens
+        if self.total_tokens > self.token_budget:
+            self._compact()
+
+    def reset(self, messages: Optional[List[Dict[str, str]]] = None) -> None:
+        """
+        Drop all state, optionally re-seeding with verbatim messages.
+
+        Args:
+            messages: Messages to start from
+        """
+        self._clear()
+        for message in messages or []:
+            self.append(message)
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Export what is needed, besides the verbatim messages, to rebuild this
+        manager in another process: the summary lines and the counters.
+
+        Returns:
+            A JSON-serializable dictionary
+        """
+        return {
+            "summary": list(self._summary_lines),
+            "raw_tokens": self._raw_tokens,
+            "compacted_messages": self._compacted_messages,
+            "compactions": self._compactions,
+        }
+
+    def restore(self, messages: List[Dict[str, str]], state: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Rebuild the manager from persisted messages and get_state() output.
+
+        Args:
+            messages: The verbatim messages
+            state: The exported summary and counters, if any
+        """
+        self._clear()
+        for line in (state or {}).get("summary", []):
+            line_tokens = count_tokens(line) + 1
+            self._summary_lines.append(line)
+            self._summary_line_tokens.append(line_tokens)
+            self._summary_tokens += line_tokens
+        for message in messages:
+            self.append(message)
+        if state:
+            self._raw_tokens = max(self._raw_tokens, state.get("raw_tokens", 0))
+            self._compacted_messages += state.get("compacted_messages", 0)
+            self._compactions += state.get("compactions", 0)
+
+    def get_input(self) -> List[Dict[str, Any]]:
+        """
+        Build the model input: the summary (if any) followed by verbatim messages.
+
+        Returns:
+            The list of input messages
+        """
+        summary = self.summary
+        if summary is None:
+            return list(self._messages)
+        return [{"role": "system", "content": summary}, *self._messages]
+
+    @property
+    def total_tokens(self) -> int:
+        """Tokens of the current model input."""
+        summary_tokens = self._summary_tokens + MESSAGE_OVERHEAD_TOKENS if self._summary_lines else 0
+        return self._window_tokens + summary_tokens
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Report token usage and compaction savings.
+
+        Returns:
+            A dictionary of counters
+        """
+        return {
+            "input_tokens": self.total_tokens,
+            "raw_tokens": self._raw_tokens,
+            "tokens_saved": max(0, self._raw_tokens - self.total_tokens),
+            "verbatim_messages": len(self._messages),
+            "compacted_messages": self._compacted_messages,
+            "compactions": self._compactions,
+        }
+
+    def _count(self, message: Dict[str, str]) -> int:
+        return count_tokens(str(message.get("content", ""))) + MESSAGE_OVERHEAD_TOKENS
+
+    def _compact(self) -> None:
+        # Fold the oldest messages outside the recent window until below the low-water mark
+        fold = 0
+        excess = self.total_tokens - int(self.token_budget * COMPACTION_LOW_WATER)
+        foldable = len(self._messages) - self.keep_recent
+        while fold < foldable and excess > 0:
+            excess -= self._message_tokens[fold]
+            fold += 1
+        if fold == 0:
+            return
+
+        folded = self._messages[:fold]
+        del self._messages[:fold]
+        self._window_tokens -= sum(self._message_tokens[:fold])
+        del self._message_tokens[:fold]
+
+        for line in self._summarize(folded):
+            line_tokens = count_tokens(line) + 1
+            self._summary_lines.append(line)
+            self._summary_line_tokens.append(line_tokens)
+            self._summary_tokens += line_tokens
+
+        # Keep the summary itself bounded: the oldest lines go first
+        while self._summary_tokens > self.summary_max_tokens and len(self._summary_lines) > 1:
+            self._summary_lines.pop(0)
+            self._summary_tokens -= self._summary_line_tokens.pop(0)
+
+        self._compacted_messages += fold
+        self._compactions += 1
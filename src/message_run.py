@@ -0,0 +1,222 @@
+"""
+Message Run for Kubernetes Operations Agent.
+
+Provides run_message, the per-message run loop of a chat session: it adds
+the message to the session's history, routes it, streams the routed run
+under the session's run handle and deadline, coalesces the answer's text
+deltas, and records the answer, metrics and run trace. Showing tool calls
+and answers is left to callbacks, so the chat UI, the headless API and
+bench/load_test.py run the same loop; StatelessSession stands in for the
+session of a request that has none.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agents import ItemHelpers
+from agents.exceptions import MaxTurnsExceeded
+from openai.types.responses import ResponseTextDeltaEvent
+
+from metrics import RunMetrics
+from run_control import ActiveRun
+from run_recorder import run_recorder
+from token_stream import SendCallback, TokenStreamBuffer
+
+RouteCallback = Callable[[Any], Awaitable[None]]
+ToolCallCallback = Callable[[str, str, str], Awaitable[None]]
+ToolOutputCallback = Callable[[str, Any], Awaitable[None]]
+MessageCallback = Callable[[str], Awaitable[None]]
+
+
+class StatelessSession:
+    """
+    Session of a single request, e.g. from the headless API: the caller
+    supplies the earlier history and nothing outlives the run.
+    """
+
+    def __init__(self, history: Optional[List[Dict[str, Any]]] = None):
+        """
+        Initialize the StatelessSession.
+
+        Args:
+            history: Earlier role/content messages of the conversation, if any
+        """
+        self._messages: List[Dict[str, Any]] = list(history or [])
+
+    def add_message(self, message: Dict[str, Any]) -> None:
+        """Append a message to the conversation."""
+        self._messages.append(message)
+
+    def get_model_input(self) -> List[Dict[str, Any]]:
+        """The conversation as model input."""
+        return list(self._messages)
+
+    def get_input_filter(self) -> None:
+        """No tool output references are kept across requests."""
+        return None
+
+    def begin_run(self, result: Any, timeout: Optional[float] = None) -> ActiveRun:
+        """Wrap a streamed agent run in a cancellable handle."""
+        return ActiveRun(result, timeout)
+
+    def end_run(self, run: ActiveRun) -> None:
+        """Release a run returned by begin_run."""
+        run.close()
+
+
+async def run_message(
+    router: Any,
+    session_manager: Any,
+    content: str,
+    send: SendCallback,
+    *,
+    session_id: Optional[str] = None,
+    run_timeout: Optional[float] = None,
+    max_turns: int = 10,
+    stream_interval: Optional[float] = None,
+    on_route: Optional[RouteCallback] = None,
+    on_tool_call: Optional[ToolCallCallback] = None,
+    on_tool_output: Optional[ToolOutputCallback] = None,
+    on_message: Optional[MessageCallback] = None,
+    stop_reason: str = "stopped",
+    trace_fields: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Answer one user message of a session with the routed agent.
+
+    Failures are counted in the run metrics and re-raised for the caller to
+    report; a run cancelled through the session's run handle (deadline, new
+    message) returns normally with its cancel reason.
+
+    Args:
+        router: The ModelRouter of the agent provider
+        session_manager: The ChainlitSessionManager of the session, or a StatelessSession
+        content: The user's message
+        send: Coroutine function delivering coalesced answer text, e.g. msg.stream_token
+        session_id: Session the run trace is recorded under, if any
+        run_timeout: Wall-clock deadline of the run in seconds, if any
+        max_turns: Turn limit of the run
+        stream_interval: Overrides STREAM_FLUSH_INTERVAL_MS, in seconds
+        on_route: Awaited with the RouteDecision before the run starts
+        on_tool_call: Awaited with (call_id, name, arguments) of every tool call
+        on_tool_output: Awaited with (call_id, output) of every tool result, as the model saw it
+        on_message: Awaited with the text of every answer message, after the text streamed so far
+        stop_reason: Cancel reason recorded when the calling task itself is cancelled
+        trace_fields: Further data stored with the run trace, e.g. the history of a StatelessSession
+
+    Returns:
+        The route, escalation, usage, tool call count, time to first token,
+        text deltas and sends of the run, and the reason it was cancelled
+    """
+    result: Dict[str, Any] = {
+        "route": None, "escalation": None, "usage": None, "tool_calls": 0,
+        "ttft": None, "deltas": 0, "sends": 0, "cancel_reason": None,
+    }
+    session_manager.add_message({"role": "user", "content": content})
+
+    # Opt-in trace of the run for offline replay (RUN_TRACE_DIR)
+    trace = run_recorder.start(session_id, content, **(trace_fields or {}))
+    run_metrics = RunMetrics().start()
+    started = time.perf_counter()
+    active_run = None
+    # Deltas are sent in batches rather than one websocket message each
+    stream = TokenStreamBuffer.from_env(send)
+    if stream_interval is not None:
+        stream.interval = stream_interval
+    deadline = time.monotonic() + run_timeout if run_timeout else None
+
+    def begin_run(run_result: Any) -> Any:
+        # an escalated request starts a second run within the same deadline
+        nonlocal active_run
+        if active_run is not None:
+            session_manager.end_run(active_run)
+        remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+        active_run = session_manager.begin_run(run_result, remaining)
+        return active_run
+
+    try:
+        # Lookups go to the fast model, diagnoses to the large one
+        decision = await router.route(content)
+        result["route"] = decision.route
+        run_recorder.event("route", route=decision.route, reason=decision.reason)
+        if on_route is not None:
+            await on_route(decision)
+        run = router.start(
+            decision,
+            session_manager.get_model_input(),
+            max_turns=max_turns,
+            begin_run=begin_run,
+            input_filter=session_manager.get_input_filter(),
+        )
+
+        async for event in run.stream_events():
+            if event.type == "raw_response_event":
+                if isinstance(event.data, ResponseTextDeltaEvent):
+                    if result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - started
+                    run_metrics.mark_first_token()
+                    run_recorder.mark("first_token")
+                    await stream.add(event.data.delta)
+                continue
+
+            if event.type == "agent_updated_stream_event":
+                continue
+
+            if event.item.type == "tool_call_item":
+                # show the text so far before the tool step
+                await stream.flush("tool_call")
+                raw = event.item.raw_item
+                result["tool_calls"] += 1
+                run_recorder.event("tool_call", name=raw.name, call_id=raw.call_id)
+                if on_tool_call is not None:
+                    await on_tool_call(raw.call_id, raw.name, raw.arguments)
+                continue
+
+            if event.item.type == "tool_call_output_item":
+                # outputs of parallel calls arrive in completion order, matched by call_id
+                call_id = event.item.raw_item["call_id"]
+                run_recorder.event("tool_output", call_id=call_id)
+                if on_tool_output is not None:
+                    await on_tool_output(call_id, event.item.output)
+                continue
+
+            if event.item.type == "message_output_item":
+                output = ItemHelpers.text_message_output(event.item)
+                session_manager.add_message({"role": "assistant", "content": output})
+                run_recorder.event("message", chars=len(output))
+                if on_message is not None:
+                    await stream.flush("message")
+                    await on_message(output)
+                continue
+
+        await stream.close()
+        run_metrics.observe_usage(run.usage)
+        result.update(route=run.route, escalation=run.escalation, usage=run.usage)
+
+        if active_run is not None and active_run.cancel_reason:
+            run_metrics.cancel(active_run.cancel_reason)
+            result["cancel_reason"] = active_run.cancel_reason
+
+    except asyncio.CancelledError:
+        # the calling task itself was cancelled (e.g. the stop button, a client disconnect)
+        reason = active_run.cancel_reason if active_run and active_run.cancel_reason else stop_reason
+        if active_run is not None:
+            active_run.cancel(reason)
+        run_metrics.cancel(reason)
+        raise
+    except MaxTurnsExceeded as e:
+        run_metrics.fail(e, outcome="max_turns")
+        raise
+    except Exception as e:
+        run_metrics.fail(e)
+        raise
+    finally:
+        stream.discard()
+        if active_run is not None:
+            session_manager.end_run(active_run)
+        run_metrics.finish()
+        run_recorder.finish(trace, run_metrics.outcome)
+        result.update(deltas=stream.deltas, sends=stream.sends)
+
+    return result
@@ -0,0 +1,452 @@
+"""
+Prometheus metrics for the Kubernetes AI Operations Agent.
+
+Defines the process-wide metrics, an MCP server wrapper that times every
+tool call, a helper that instruments one agent run, and collectors that
+export the MCP provider's pool, cache, output and startup statistics, the
+cluster state cache's size and lag and the memory of chat sessions.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Iterator, List
+
+from agents.mcp import MCPServer
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+from mcp_server_wrapper import MCPServerWrapper
+
+__all__ = [
+    "ACTIVE_SESSIONS",
+    "RUN_QUEUE_DEPTH",
+    "RUN_QUEUE_WAIT",
+    "RUNS_IN_FLIGHT",
+    "RUNS_REJECTED",
+    "InstrumentedMCPServer",
+    "RunMetrics",
+    "register_cluster_cache_collector",
+    "register_mcp_collector",
+    "register_session_collector",
+]
+
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0, 34.0, 55.0, 90.0)
+_TOOL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+_SESSION_BYTES_BUCKETS = (16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+TIME_TO_FIRST_TOKEN = Histogram(
+    "agent_time_to_first_token_seconds",
+    "Time from the start of an agent run to the first streamed text token",
+    buckets=_LATENCY_BUCKETS,
+)
+RUN_DURATION = Histogram(
+    "agent_run_duration_seconds",
+    "Total wall-clock time of an agent run",
+    ["outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TURNS = Histogram(
+    "agent_llm_turns_per_run",
+    "LLM requests made during one agent run",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20),
+)
+RUN_TOKENS = Histogram(
+    "agent_run_tokens",
+    "Tokens consumed by one agent run",
+    ["direction"],
+    buckets=_TOKEN_BUCKETS,
+)
+TOOL_CALL_DURATION = Histogram(
+    "mcp_tool_call_duration_seconds",
+    "Latency of MCP tool calls as seen by the agent",
+    ["server", "tool", "status"],
+    buckets=_TOOL_BUCKETS,
+)
+ACTIVE_SESSIONS = Gauge("agent_active_sessions", "Chat sessions currently open")
+RUNS_IN_FLIGHT = Gauge("agent_runs_in_flight", "Agent runs currently executing")
+RUN_ERRORS = Counter("agent_run_errors_total", "Agent runs that ended with an error", ["type"])
+RUNS_CANCELLED = Counter("agent_runs_cancelled_total", "Agent runs cancelled before completion", ["reason"])
+RUN_QUEUE_DEPTH = Gauge("agent_run_queue_depth", "Agent runs waiting for an admission slot")
+RUN_QUEUE_WAIT = Histogram(
+    "agent_run_queue_wait_seconds",
+    "Time an admitted agent run waited for a slot",
+    buckets=_LATENCY_BUCKETS,
+)
+RUNS_REJECTED = Counter("agent_runs_rejected_total", "Agent runs shed because the admission queue was full")
+LLM_INPUT_TOKENS = Counter(
+    "agent_llm_input_tokens_total",
+    "Input tokens sent to the model, by whether the provider served them from its prompt cache",
+    ["cache"],
+)
+PROMPT_PREFIX = Gauge(
+    "agent_prompt_prefix_info",
+    "Fingerprint of the instructions and tool definitions every request starts with",
+    ["fingerprint"],
+)
+STREAM_DELTAS = Counter("agent_stream_deltas_total", "Text deltas received from the model for the UI")
+STREAM_FLUSHES = Counter("agent_stream_flushes_total", "Coalesced text sends to the UI", ["reason"])
+STARTUP_SECONDS = Gauge(
+    "agent_startup_seconds", "Duration of each startup phase of this process, and of startup overall", ["phase"]
+)
+ROUTE_REQUESTS = Counter(
+    "agent_model_route_total", "Requests by the model route picked and the reason", ["route", "reason"]
+)
+ROUTE_ESCALATIONS = Counter(
+    "agent_route_escalations_total", "Requests re-run on the large model after the fast model gave up", ["reason"]
+)
+ROUTE_DURATION = Histogram(
+    "agent_route_duration_seconds",
+    "Wall-clock time of each model attempt of a run, by route and outcome",
+    ["route", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+ROUTE_TOKENS = Counter("agent_route_tokens_total", "Tokens used by each model route", ["route", "direction"])
+ROUTE_COST = Counter("agent_route_cost_usd_total", "Estimated model cost by route, from the configured prices", ["route"])
+LLM_HTTP_REQUESTS = Counter(
+    "agent_llm_http_requests_total", "HTTP attempts sent to the model API by backend and status", ["backend", "status"]
+)
+LLM_HTTP_RETRIES = Counter(
+    "agent_llm_http_retries_total", "Model API requests retried, by backend and reason", ["backend", "reason"]
+)
+LLM_RATE_LIMIT_WAIT = Histogram(
+    "agent_llm_rate_limit_wait_seconds",
+    "Time a model API request waited for the client-side TPM/RPM limiter",
+    ["backend"],
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+TOOL_OUTPUT_REFETCHES = Counter(
+    "agent_tool_output_refetches_total",
+    "Tool calls repeating a call of the same session whose result was still fresh",
+    ["output"],
+)
+TOOL_OUTPUT_REFS = Counter(
+    "agent_tool_output_refs_total", "Repeated identical tool outputs sent to the model as a short reference"
+)
+TOOL_OUTPUT_REF_CHARS_SAVED = Counter(
+    "agent_tool_output_ref_chars_saved_total", "Tool output characters not re-sent to the model thanks to references"
+)
+PROMETHEUS_BLOCKS = Counter(
+    "agent_prometheus_blocks_total",
+    "Step-aligned range query blocks looked up by the Prometheus query planner",
+    ["result"],
+)
+PROMETHEUS_UPSTREAM_POINTS = Counter(
+    "agent_prometheus_upstream_points_total", "Range query points the query planner fetched from Prometheus"
+)
+RUN_TRACE_BYTES = Counter("agent_run_trace_bytes_total", "Bytes of run traces written (before compression)")
+CLUSTER_BACKEND_STARTS = Counter(
+    "agent_cluster_backend_starts_total", "Per-cluster MCP servers started on first use", ["server", "outcome"]
+)
+CLUSTER_BACKEND_STOPS = Counter(
+    "agent_cluster_backend_stops_total", "Per-cluster MCP servers closed, by reason", ["server", "reason"]
+)
+FANOUT_CLUSTERS = Counter(
+    "agent_fanout_clusters_total", "Per-cluster results of fan-out queries", ["outcome"]
+)
+SESSION_EVICTIONS = Counter(
+    "agent_session_evictions_total",
+    "Chat sessions unloaded from memory, by reason (idle, memory) and what became of the conversation",
+    ["reason", "action"],
+)
+TOOL_STEPS_EXPIRED = Counter(
+    "agent_tool_steps_expired_total", "Tool steps dropped because their output never arrived"
+)
+
+
+class InstrumentedMCPServer(MCPServerWrapper):
+    """Record the latency of every tool call under the server's logical name."""
+
+    def __init__(self, inner: MCPServer, server_label: str) -> None:
+        super().__init__(inner)
+        self._server_label = server_label
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any] | None,
+        meta: Dict[str, Any] | None = None,
+    ) -> Any:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await super().call_tool(tool_name, arguments, meta)
+            status = "error" if getattr(result, "isError", False) else "ok"
+            return result
+        finally:
+            TOOL_CALL_DURATION.labels(self._server_label, tool_name, status).observe(
+                time.perf_counter() - started
+            )
+
+
+class RunMetrics:
+    """
+    Instrument one agent run.
+
+    Usage::
+
+        run = RunMetrics().start()
+        try:
+            async for event in result.stream_events():
+                run.mark_first_token()   # on every text delta – only the first counts
+            run.observe_usage(result.context_wrapper.usage)
+        except Exception as exc:
+            run.fail(exc)
+        finally:
+            run.finish()
+    """
+
+    __slots__ = ("_started", "_first_token", "outcome")
+
+    def __init__(self) -> None:
+        self._started = 0.0
+        self._first_token = False
+        self.outcome = "ok"
+
+    def start(self) -> "RunMetrics":
+        self._started = time.perf_counter()
+        RUNS_IN_FLIGHT.inc()
+        return self
+
+    def finish(self) -> None:
+        RUNS_IN_FLIGHT.dec()
+        RUN_DURATION.labels(self.outcome).observe(time.perf_counter() - self._started)
+
+    def fail(self, exc: BaseException, outcome: str = "error") -> None:
+        self.outcome = outcome
+        RUN_ERRORS.labels(type(exc).__name__).inc()
+
+    def cancel(self, reason: str) -> None:
+        self.outcome = "cancelled"
+        RUNS_CANCELLED.labels(reason).inc()
+
+    def mark_first_token(self) -> None:
+        if not self._first_token:
+            self._first_token = True
+            TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - self._started)
+
+    def observe_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+        LLM_TURNS.observe(getattr(usage, "requests", 0))
+        RUN_TOKENS.labels("input").observe(getattr(usage, "input_tokens", 0))
+        RUN_TOKENS.labels("output").observe(getattr(usage, "output_tokens", 0))
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        cached = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0
+        RUN_TOKENS.labels("cached_input").observe(cached)
+        LLM_INPUT_TOKENS.labels("hit").inc(cached)
+        LLM_INPUT_TOKENS.labels("miss").inc(max(0, input_tokens - cached))
+
+
+def observe_route(route: str, outcome: str, seconds: float, usage: Any, cost: float) -> None:
+    """Record one model attempt of a routed run: latency, tokens and cost of its route."""
+    ROUTE_DURATION.labels(route, outcome).observe(seconds)
+    ROUTE_TOKENS.labels(route, "input").inc(getattr(usage, "input_tokens", 0) or 0)
+    ROUTE_TOKENS.labels(route, "output").inc(getattr(usage, "output_tokens", 0) or 0)
+    ROUTE_COST.labels(route).inc(cost)
+
+
+def observe_startup(report: Dict[str, Any]) -> None:
+    """Export a StartupProfiler report: seconds to readiness and per phase."""
+    if report.get("seconds_to_ready") is not None:
+        STARTUP_SECONDS.labels("ready").set(report["seconds_to_ready"])
+    for phase in report.get("phases", []):
+        STARTUP_SECONDS.labels(phase["phase"]).set(phase["seconds"])
+
+
+class _MCPProviderCollector:
+    """Export MCP provider statistics, read lazily at scrape time."""
+
+    def __init__(self, provider: Any) -> None:
+        self._provider = provider
+
+    def collect(self) -> Iterator[Any]:
+        yield from self._pool_metrics(self._provider.get_stats())
+
+        cache = self._provider.get_tool_cache()
+        if cache is not None:
+            stats = cache.get_stats()
+            events = CounterMetricFamily(
+                "mcp_tool_cache_events", "Tool cache lookups by outcome", labels=["event"]
+            )
+            for event in ("hits", "misses", "coalesced", "bypassed", "evictions", "expired"):
+                events.add_metric([event], stats[event])
+            yield events
+            yield GaugeMetricFamily("mcp_tool_cache_entries", "Cached tool results", value=stats["entries"])
+            yield GaugeMetricFamily("mcp_tool_cache_bytes", "Approximate size of cached tool results", value=stats["bytes"])
+
+        processor = self._provider.get_output_processor()
+        if processor is not None:
+            stats = processor.get_stats()
+            chars = CounterMetricFamily(
+                "tool_output_chars", "Tool output characters before and after reduction", labels=["stage"]
+            )
+            chars.add_metric(["in"], stats["chars_in"])
+            chars.add_metric(["out"], stats["chars_out"])
+            yield chars
+            yield CounterMetricFamily("tool_outputs_reduced", "Tool outputs that were reduced", value=stats["reduced"])
+
+        report = self._provider.get_startup_report()
+        startup = GaugeMetricFamily(
+            "mcp_server_startup_seconds", "MCP server startup time by phase", labels=["server", "phase"]
+        )
+        ready = GaugeMetricFamily("mcp_server_ready", "1 if the MCP server started successfully", labels=["server"])
+        for name, entry in report["servers"].items():
+            for phase in ("connect", "list_tools", "total"):
+                if f"{phase}_seconds" in entry:
+                    startup.add_metric([name, phase], entry[f"{phase}_seconds"])
+            ready.add_metric([name], 1.0 if entry.get("status") == "ready" else 0.0)
+        yield startup
+        yield ready
+
+        health = self._provider.get_health()["servers"]
+        healthy = GaugeMetricFamily(
+            "mcp_server_healthy_workers", "MCP worker processes passing health checks", labels=["server"]
+        )
+        circuit = GaugeMetricFamily("mcp_server_circuit_open", "1 while calls to the MCP server fail fast", labels=["server"])
+        restarts = CounterMetricFamily(
+            "mcp_server_restarts", "MCP worker processes restarted by the supervisor", labels=["server"]
+        )
+        for name, entry in health.items():
+            healthy.add_metric([name], entry["healthy_workers"])
+            circuit.add_metric([name], 1.0 if entry["circuit"] == "open" else 0.0)
+            restarts.add_metric([name], entry["restarts"])
+        yield from (healthy, circuit, restarts)
+
+        catalog = self._provider.get_tool_catalog().get_stats()
+        exposed = GaugeMetricFamily("mcp_server_tools", "MCP tools exposed to the agent", labels=["server"])
+        refreshes = CounterMetricFamily(
+            "mcp_tool_catalog_refreshes", "Times an MCP server's tool list was fetched and rebuilt", labels=["server"]
+        )
+        for name, entry in catalog.items():
+            exposed.add_metric([name], entry["exposed"])
+            refreshes.add_metric([name], entry["refreshes"])
+        yield from (exposed, refreshes)
+
+    @staticmethod
+    def _pool_metrics(pools: Dict[str, Dict[str, Any]]) -> Iterator[Any]:
+        wait = HistogramMetricFamily(
+            "mcp_pool_queue_wait_seconds", "Time tool calls waited for a free MCP worker", labels=["server"]
+        )
+        in_flight = GaugeMetricFamily("mcp_pool_in_flight", "MCP calls currently executing", labels=["server"])
+        waiting = GaugeMetricFamily("mcp_pool_waiting", "MCP calls waiting for a worker", labels=["server"])
+        workers = GaugeMetricFamily("mcp_pool_workers", "Connected MCP worker processes", labels=["server"])
+        for name, stats in pools.items():
+            buckets: List[Any] = []
+            cumulative = 0
+            for bound, count in stats["wait_seconds"]["buckets"].items():
+                cumulative += count
+                buckets.append(("+Inf" if bound == float("inf") else str(bound), cumulative))
+            wait.add_metric([name], buckets, stats["wait_seconds"]["sum"])
+            in_flight.add_metric([name], sum(stats["in_flight"]))
+            waiting.add_metric([name], stats["waiting"])
+            workers.add_metric([name], stats["size"])
+        yield from (wait, in_flight, waiting, workers)
+
+
+_registered_collector: _MCPProviderCollector | None = None
+
+
+def register_mcp_collector(provider: Any) -> None:
+    """Export *provider*'s statistics on ``/metrics``, replacing any earlier provider."""
+    global _registered_collector
+    if _registered_collector is not None:
+        REGISTRY.unregister(_registered_collector)
+    _registered_collector = _MCPProviderCollector(provider)
+    REGISTRY.register(_registered_collector)
+
+
+class _ClusterCacheCollector:
+    """Export per-kind size, memory and lag of the cluster state cache."""
+
+    def __init__(self, cache: Any) -> None:
+        self._cache = cache
+
+    def collect(self) -> Iterator[Any]:
+        objects = GaugeMetricFamily("cluster_cache_objects", "Objects held by the cluster cache", labels=["kind"])
+        size = GaugeMetricFamily(
+            "cluster_cache_bytes", "Approximate memory of the cluster cache's compacted objects", labels=["kind"]
+        )
+        lag = GaugeMetricFamily(
+            "cluster_cache_lag_seconds",
+            "Seconds since the cluster cache last heard from the API server (list, event or bookmark)",
+            labels=["kind"],
+        )
+        synced = GaugeMetricFamily("cluster_cache_synced", "1 once the initial list completed", labels=["kind"])
+        events = CounterMetricFamily(
+            "cluster_cache_watch_events", "Watch events applied to the cluster cache", labels=["kind"]
+        )
+        lists = CounterMetricFamily("cluster_cache_lists", "Full lists (initial and relists)", labels=["kind"])
+        errors = CounterMetricFamily("cluster_cache_errors", "List or watch failures", labels=["kind"])
+        for kind, stats in self._cache.get_stats().items():
+            objects.add_metric([kind], stats["objects"])
+            size.add_metric([kind], stats["bytes"])
+            if stats["lag_seconds"] is not None:
+                lag.add_metric([kind], stats["lag_seconds"])
+            synced.add_metric([kind], 1.0 if stats["synced"] else 0.0)
+            events.add_metric([kind], stats["events"])
+            lists.add_metric([kind], stats["lists"])
+            errors.add_metric([kind], stats["errors"])
+        yield from (objects, size, lag, synced, events, lists, errors)
+
+
+_registered_cache_collector: _ClusterCacheCollector | None = None
+
+
+def register_cluster_cache_collector(cache: Any) -> None:
+    """Export *cache*'s statistics on ``/metrics``, replacing any earlier cache."""
+    global _registered_cache_collector
+    if _registered_cache_collector is not None:
+        REGISTRY.unregister(_registered_cache_collector)
+    _registered_cache_collector = _ClusterCacheCollector(cache)
+    REGISTRY.register(_registered_cache_collector)
+
+
+class _SessionCollector:
+    """Export the memory of resident chat sessions, in total and as a distribution."""
+
+    def __init__(self, registry: Any) -> None:
+        self._registry = registry
+
+    def collect(self) -> Iterator[Any]:
+        stats = self._registry.get_stats(top=0)
+        sizes = self._registry.get_session_bytes()
+        yield GaugeMetricFamily(
+            "agent_session_memory_bytes", "Approximate memory of all resident chat sessions", value=stats["bytes"]
+        )
+        yield GaugeMetricFamily(
+            "agent_session_memory_budget_bytes",
+            "Session memory above which the least recently used sessions are evicted; 0 unbounded",
+            value=stats["memory_budget"],
+        )
+        yield GaugeMetricFamily(
+            "agent_session_memory_max_bytes", "Approximate memory of the largest resident chat session",
+            value=max(sizes, default=0),
+        )
+        # a distribution rather than a per-session label, whose series would grow without bound
+        buckets: List[Any] = [
+            (str(bound), sum(1 for size in sizes if size <= bound)) for bound in _SESSION_BYTES_BUCKETS
+        ]
+        buckets.append(("+Inf", len(sizes)))
+        per_session = HistogramMetricFamily("agent_session_bytes", "Approximate memory per resident chat session")
+        per_session.add_metric([], buckets, sum(sizes))
+        yield per_session
+        sessions = GaugeMetricFamily(
+            "agent_sessions", "Chat sessions by where their conversation is kept", labels=["state"]
+        )
+        sessions.add_metric(["resident"], stats["resident"])
+        sessions.add_metric(["spilled"], stats["spilled"])
+        yield sessions
+
+
+_registered_session_collector: _SessionCollector | None = None
+
+
+def register_session_collector(registry: Any) -> None:
+    """Export *registry*'s session memory on ``/metrics``, replacing any earlier registry."""
+    global _registered_session_collector
+    if _registered_session_collector is not None:
+        REGISTRY.unregister(_registered_session_collector)
+    _registered_session_collector = _SessionCollector(registry)
+    REGISTRY.register(_registered_session_collector)
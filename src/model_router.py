@@ -0,0 +1,356 @@
+"""
+Model Router for Kubernetes Operations Agent.
+
+Provides a ModelRouter that sends simple lookups ("what time is it", "list
+pods in namespace X") to a fast, small model and multi-step diagnoses to the
+large model, and a RoutedRun that streams one request on its route and
+re-runs it on the large model when the fast model gives up: it calls the
+escalation tool because it is not confident, or runs out of turns.
+"""
+
+import asyncio
+import dataclasses
+import logging
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from agents import Agent, RunConfig, Runner, function_tool
+from agents.agent import StopAtTools
+from agents.exceptions import MaxTurnsExceeded
+from agents.usage import Usage
+
+from metrics import ROUTE_ESCALATIONS, ROUTE_REQUESTS, observe_route
+
+FAST = "fast"
+LARGE = "large"
+
+ESCALATE_TOOL_NAME = "escalate_to_expert"
+
+FAST_INSTRUCTIONS = (
+    "You answer simple lookups quickly. If the request needs multi-step diagnosis, root-cause analysis or "
+    f"correlating several sources, or you are not confident in your answer, call {ESCALATE_TOOL_NAME} "
+    "right away instead of answering."
+)
+
+_DIAGNOSTIC = re.compile(
+    r"\b(why|root[- ]?cause|diagnos\w*|troubleshoot\w*|investigat\w*|debug\w*|crash\w*|fail\w*|error\w*|"
+    r"slow\w*|latency|oom\w*|outage|incident|correlat\w*|compar\w*|explain\w*|analy[sz]\w*|fix\w*|"
+    r"recommend\w*|should|summari[sz]\w*)\b",
+    re.IGNORECASE,
+)
+_LOOKUP = re.compile(
+    r"^\s*(list|show|get|what|which|how many|count|describe|display|is|are|does|do|when|where)\b", re.IGNORECASE
+)
+
+CLASSIFIER_PROMPT = (
+    "Classify the Kubernetes operations request. Reply with one word: LOOKUP if it can be answered with one or "
+    "two direct queries (listing, getting or counting resources, the time, a single metric), otherwise DIAGNOSIS."
+)
+
+
+class RouteDecision(NamedTuple):
+    """The route picked for a request and why."""
+
+    route: str
+    reason: str
+
+
+def classify_request(text: str, fast_max_words: int = 25) -> Optional[RouteDecision]:
+    """
+    Route a request by cheap heuristics.
+
+    Args:
+        text: The user's message
+        fast_max_words: Longer messages always go to the large model
+
+    Returns:
+        The decision, or None when the heuristics cannot tell
+    """
+    if _DIAGNOSTIC.search(text):
+        return RouteDecision(LARGE, "diagnostic")
+    if len(text.split()) > fast_max_words or text.count("?") > 1:
+        return RouteDecision(LARGE, "complex")
+    if _LOOKUP.match(text):
+        return RouteDecision(FAST, "lookup")
+    return None
+
+
+@function_tool(name_override=ESCALATE_TOOL_NAME)
+def escalate_to_expert(reason: str) -> str:
+    """Hand the request to the expert model instead of answering it yourself.
+
+    Args:
+        reason: Why the request needs the expert, e.g. it needs a multi-step diagnosis.
+    """
+    return reason
+
+
+class ModelRouter:
+    """
+    Pick the fast or the large model for each request.
+
+    Heuristics decide first; requests they cannot place go to the small-model
+    classifier when one is configured, else to default_route. Without a fast
+    agent every request goes to the large model.
+    """
+
+    def __init__(
+        self,
+        large_agent: Agent,
+        fast_agent: Optional[Agent] = None,
+        *,
+        fast_max_turns: int = 4,
+        default_route: str = LARGE,
+        classifier: Optional[Tuple[Any, str]] = None,
+        classifier_timeout: float = 2.0,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        run_config: Optional[RunConfig] = None,
+    ):
+        """
+        Initialize the ModelRouter.
+
+        Args:
+            large_agent: The agent on the large model
+            fast_agent: The same agent on the fast model, with the escalation tool
+            fast_max_turns: Turns the fast model gets before the request escalates
+            default_route: Route of requests the heuristics cannot place
+            classifier: (AsyncOpenAI client, model) asked to place such requests
+            classifier_timeout: Seconds to wait for the classifier
+            prices: USD per million (input, output) tokens of each route, for
+                agent_route_cost_usd_total
+            run_config: Run settings passed to every run, on either route
+        """
+        self.large_agent = large_agent
+        self.fast_agent = fast_agent
+        self.fast_max_turns = fast_max_turns
+        self.default_route = default_route
+        self._classifier = classifier
+        self._classifier_timeout = classifier_timeout
+        self.prices = prices or {}
+        self.run_config = run_config
+
+    @classmethod
+    def from_env(cls, agent: Agent, client_factory: Any, run_config: Optional[RunConfig] = None) -> "ModelRouter":
+        """
+        Create a router from AGENT_FAST_MODEL, AGENT_LARGE_MODEL, ROUTER_* variables.
+
+        Args:
+            agent: The fully configured agent; it becomes the large-model agent
+            client_factory: OpenAIClientFactoryImpl creating a model per deployment
+            run_config: Run settings passed to every run
+
+        Returns:
+            A new ModelRouter; routing is off when AGENT_FAST_MODEL is unset
+        """
+        prices = {
+            route: _parse_price(os.getenv(env))
+            for route, env in ((FAST, "AGENT_FAST_MODEL_PRICE"), (LARGE, "AGENT_LARGE_MODEL_PRICE"))
+            if os.getenv(env)
+        }
+        large_model = os.getenv("AGENT_LARGE_MODEL")
+        if large_model:
+            agent.model = client_factory.create_model(large_model)
+        fast_model = os.getenv("AGENT_FAST_MODEL")
+        if not fast_model:
+            return cls(agent, prices=prices, run_config=run_config)
+
+        settings = agent.model_settings
+        if settings.extra_args and "prompt_cache_key" in settings.extra_args:
+            # a different prefix, so a separate cache group
+            settings = dataclasses.replace(
+                settings, extra_args={**settings.extra_args, "prompt_cache_key": settings.extra_args["prompt_cache_key"] + ":fast"}
+            )
+        fast_agent = agent.clone(
+            name=f"{agent.name}Fast",
+            model=client_factory.create_model(fast_model),
+            model_settings=settings,
+            instructions=f"{agent.instructions} {FAST_INSTRUCTIONS}",
+            tools=[*agent.tools, escalate_to_expert],
+            tool_use_behavior=StopAtTools(stop_at_tool_names=[ESCALATE_TOOL_NAME]),
+        )
+        classifier = None
+        if os.getenv("ROUTER_CLASSIFIER", "off").lower() in ("1", "true", "yes", "on"):
+            classifier = (client_factory.create_client(deployment=fast_model), fast_model)
+        logging.info("Model routing on: fast=%s large=%s", fast_model, large_model or "default")
+        return cls(
+            agent,
+            fast_agent,
+            fast_max_turns=int(os.getenv("ROUTER_FAST_MAX_TURNS", "4")),
+            default_route=os.getenv("ROUTER_DEFAULT_ROUTE", LARGE).lower(),
+            classifier=classifier,
+            classifier_timeout=float(os.getenv("ROUTER_CLASSIFIER_TIMEOUT", "2")),
+            prices=prices,
+            run_config=run_config,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether requests can go to the fast model at all."""
+        return self.fast_agent is not None
+
+    def cost(self, route: str, usage: Usage) -> float:
+        """USD cost of the tokens a route used; 0 without a configured price."""
+        price_in, price_out = self.prices.get(route, (0.0, 0.0))
+        return (usage.input_tokens * price_in + usage.output_tokens * price_out) / 1_000_000
+
+    def agent_for(self, route: str) -> Agent:
+        """The agent serving a route."""
+        if route == FAST and self.fast_agent is not None:
+            return self.fast_agent
+        return self.large_agent
+
+    async def route(self, text: str) -> RouteDecision:
+        """
+        Decide which model serves a request.
+
+        Args:
+            text: The user's message
+
+        Returns:
+            The route and the reason for it
+        """
+        if not self.enabled:
+            decision = RouteDecision(LARGE, "single_model")
+        else:
+            decision = classify_request(text) or await self._classify_with_model(text)
+        ROUTE_REQUESTS.labels(decision.route, decision.reason).inc()
+        return decision
+
+    def start(
+        self,
+        decision: RouteDecision,
+        model_input: List[Dict[str, Any]],
+        max_turns: int,
+        begin_run: Callable[[Any], Any],
+        input_filter: Optional[Callable[[Any], Any]] = None,
+    ) -> "RoutedRun":
+        """
+        Create the run of one request on its route.
+
+        Args:
+            decision: The route from route()
+            model_input: Input messages for the model
+            max_turns: Turn limit of the large model
+            begin_run: Called with every RunResultStreaming started (the retry
+                on the large model included); returns its ActiveRun
+            input_filter: call_model_input_filter of this request's runs, e.g.
+                the session's tool output references
+
+        Returns:
+            The RoutedRun to stream events from
+        """
+        return RoutedRun(self, decision, model_input, max_turns, begin_run, input_filter)
+
+    async def _classify_with_model(self, text: str) -> RouteDecision:
+        if self._classifier is None:
+            return RouteDecision(self.default_route, "default")
+        client, model = self._classifier
+        try:
+            response = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "system", "content": CLASSIFIER_PROMPT}, {"role": "user", "content": text}],
+                    max_tokens=3,
+                    temperature=0,
+                ),
+                self._classifier_timeout,
+            )
+            answer = (response.choices[0].message.content or "").strip().upper()
+        except Exception as exc:  # the classifier is an optimization, never a failure
+            logging.warning("Route classifier failed, using the default route: %s", exc)
+            return RouteDecision(self.default_route, "default")
+        return RouteDecision(FAST, "classifier") if answer.startswith("LOOKUP") else RouteDecision(LARGE, "classifier")
+
+
+class RoutedRun:
+    """
+    Stream one request on its routed model, escalating to the large model once.
+
+    Events of the escalation tool are not passed on. When the fast model
+    escalates or exceeds its turns, the request is run again from the same
+    input on the large model and its events follow. usage sums both runs;
+    result and route are those of the last run.
+    """
+
+    def __init__(
+        self,
+        router: ModelRouter,
+        decision: RouteDecision,
+        model_input: List[Dict[str, Any]],
+        max_turns: int,
+        begin_run: Callable[[Any], Any],
+        input_filter: Optional[Callable[[Any], Any]] = None,
+    ):
+        self._router = router
+        self._run_config = router.run_config
+        if input_filter is not None:
+            self._run_config = dataclasses.replace(router.run_config or RunConfig(), call_model_input_filter=input_filter)
+        self._input = model_input
+        self._max_turns = max_turns
+        self._begin_run = begin_run
+        self.decision = decision
+        self.route = decision.route
+        self.result: Any = None
+        self.usage = Usage()
+        self.escalation: Optional[str] = None
+
+    async def stream_events(self) -> AsyncIterator[Any]:
+        """Yield the stream events of the run, continuing on the large model after an escalation."""
+        route = self.route
+        while True:
+            agent = self._router.agent_for(route)
+            max_turns = min(self._max_turns, self._router.fast_max_turns) if route == FAST else self._max_turns
+            self.route = route
+            self.result = result = Runner.run_streamed(
+                starting_agent=agent, input=self._input, max_turns=max_turns, run_config=self._run_config
+            )
+            active_run = self._begin_run(result)
+            started = time.perf_counter()
+            escalation: Optional[str] = None
+            outcome = "error"
+            escalate_calls: Set[str] = set()
+            try:
+                async for event in result.stream_events():
+                    if route == FAST and _is_escalation(event, escalate_calls):
+                        escalation = "low_confidence"
+                        continue
+                    yield event
+                outcome = "escalated" if escalation else "ok"
+            except MaxTurnsExceeded:
+                if route != FAST:
+                    outcome = "max_turns"
+                    raise
+                escalation, outcome = "max_turns", "escalated"
+            finally:
+                if getattr(active_run, "cancel_reason", None):
+                    outcome = "cancelled"
+                usage = result.context_wrapper.usage
+                self.usage.add(usage)
+                observe_route(route, outcome, time.perf_counter() - started, usage, self._router.cost(route, usage))
+
+            if escalation is None or outcome == "cancelled":
+                return
+            logging.info("Escalating request from the fast model: %s", escalation)
+            ROUTE_ESCALATIONS.labels(escalation).inc()
+            self.escalation = escalation
+            route = LARGE
+
+
+def _parse_price(value: str) -> Tuple[float, float]:
+    price_in, _, price_out = value.partition(",")
+    return float(price_in), float(price_out or price_in)
+
+
+def _is_escalation(event: Any, escalate_calls: Set[str]) -> bool:
+    if event.type != "run_item_stream_event":
+        return False
+    raw = event.item.raw_item
+    if event.item.type == "tool_call_item" and getattr(raw, "name", None) == ESCALATE_TOOL_NAME:
+        escalate_calls.add(raw.call_id)
+        return True
+    if event.item.type == "tool_call_output_item":
+        call_id = raw.get("call_id") if isinstance(raw, dict) else getattr(raw, "call_id", None)
+        return call_id in escalate_calls
+    return False
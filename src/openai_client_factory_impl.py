@@ -1,38 +1,121 @@
+import json
+import logging
 import os
 import dotenv
+import httpx
 from openai import AsyncAzureOpenAI, AsyncOpenAI
+from agents import OpenAIChatCompletionsModel
 from agents import set_default_openai_client
 from agents import set_default_openai_api
 from agents import set_tracing_disabled
 from agents import enable_verbose_stdout_logging
 from interfaces import OpenAIClientFactory
+from llm_transport import LLMBackend, RateLimitedTransport, RateLimiter
+from run_recorder import RecordingTransport, run_recorder
 
 
 class OpenAIClientFactoryImpl(OpenAIClientFactory):
     """
     Factory class for creating and configuring OpenAI clients.
     Supports both Azure OpenAI and standard OpenAI.
+    
+    All clients share one HTTP client: a sized, keep-alive connection pool
+    (HTTP/2 when the h2 package is installed) behind a RateLimitedTransport
+    that paces requests to the TPM/RPM quota, retries 429s and transient
+    errors with jittered backoff honoring Retry-After, and spreads requests
+    over the Azure deployments listed in AZURE_OPENAI_BACKENDS.
     """
     
-    def __init__(self, env_file_path: str = ".env", override_env: bool = False):
+    def __init__(
+        self,
+        env_file_path: str = ".env",
+        override_env: bool = False,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
         """
         Initialize the OpenAI client factory.
         
         Args:
             env_file_path: Path to the .env file for environment variables
             override_env: Whether to override existing environment variables
+            transport: Transport sending the requests under the rate limiter,
+                e.g. a stub replaying recorded runs; defaults to a pooled
+                HTTP transport
         """
         self.env_file_path = env_file_path
         self.override_env = override_env
+        self._network_transport = transport
+        self._http_client: httpx.AsyncClient | None = None
+        self._transport: RateLimitedTransport | None = None
         
     def _load_environment(self) -> None:
         """Load environment variables from .env file if it exists."""
         dotenv.load_dotenv(dotenv_path=self.env_file_path, override=self.override_env)
     
-    def create_client(self) -> AsyncAzureOpenAI | AsyncOpenAI:
+    def get_http_client(self) -> httpx.AsyncClient:
+        """
+        Get the HTTP client shared by every OpenAI client of this factory,
+        creating it from LLM_* environment variables on first use.
+        
+        Returns:
+            The shared httpx.AsyncClient
+        """
+        if self._http_client is None:
+            self._load_environment()
+            http2 = os.getenv("LLM_HTTP2", "on").lower() in ("1", "true", "yes", "on")
+            if http2:
+                try:
+                    import h2  # noqa: F401 - httpx needs it for HTTP/2
+                except ImportError:
+                    logging.warning("LLM_HTTP2 is on but the h2 package is not installed; using HTTP/1.1")
+                    http2 = False
+            pool = self._network_transport or httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+                    max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+                ),
+            )
+            if run_recorder.enabled:
+                pool = RecordingTransport(pool)
+            self._transport = RateLimitedTransport(
+                pool,
+                self._backends_from_env(),
+                default_tpm=int(os.getenv("LLM_TPM", "0")),
+                default_rpm=int(os.getenv("LLM_RPM", "0")),
+                burst_seconds=float(os.getenv("LLM_RATE_LIMIT_BURST_SECONDS", "10")),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+                backoff_base=float(os.getenv("LLM_RETRY_BACKOFF_BASE", "0.5")),
+                backoff_max=float(os.getenv("LLM_RETRY_BACKOFF_MAX", "20")),
+                completion_tokens=int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "1000")),
+            )
+            self._http_client = httpx.AsyncClient(transport=self._transport, timeout=self._timeout())
+        return self._http_client
+    
+    def get_transport_stats(self) -> dict:
+        """
+        Get the quota state and requests in flight of every model backend.
+        
+        Returns:
+            A dictionary keyed by backend name; empty before the first client
+        """
+        return self._transport.get_stats() if self._transport is not None else {}
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its connections."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+            self._transport = None
+    
+    def create_client(self, deployment: str | None = None) -> AsyncAzureOpenAI | AsyncOpenAI:
         """
         Create an OpenAI client based on the environment configuration.
         
+        Args:
+            deployment: Azure deployment to send requests to; defaults to AZURE_OPENAI_MODEL
+        
         Returns:
             AsyncAzureOpenAI or AsyncOpenAI client instance
         """
@@ -47,16 +130,64 @@ class OpenAIClientFactoryImpl(OpenAIClientFactory):
                 api_key=os.getenv("AZURE_OPENAI_API_KEY"),
                 api_version=os.getenv("OPENAI_API_VERSION"),
                 azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-                azure_deployment=os.getenv("AZURE_OPENAI_MODEL")
+                azure_deployment=deployment or os.getenv("AZURE_OPENAI_MODEL"),
+                http_client=self.get_http_client(),
+                timeout=self._timeout(),
+                # the shared transport retries, with the limiter's view of the quota
+                max_retries=0,
             )
         else:  # openai
             # Create standard OpenAI client
             return AsyncOpenAI(
                 api_key=os.getenv("OPENAI_API_KEY"),
                 organization=os.getenv("OPENAI_ORGANIZATION", None),
-                base_url=os.getenv("OPENAI_BASE_URL", None)
+                base_url=os.getenv("OPENAI_BASE_URL", None),
+                http_client=self.get_http_client(),
+                timeout=self._timeout(),
+                max_retries=0,
             )
     
+    def create_model(self, name: str) -> OpenAIChatCompletionsModel:
+        """
+        Create a chat completions model for a model name, e.g. for model routing.
+        
+        Args:
+            name: Model name, or the deployment name on Azure
+            
+        Returns:
+            The model, with its own client
+        """
+        return OpenAIChatCompletionsModel(model=name, openai_client=self.create_client(deployment=name))
+    
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        return httpx.Timeout(
+            float(os.getenv("LLM_READ_TIMEOUT", "120")),
+            connect=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+            pool=float(os.getenv("LLM_POOL_TIMEOUT", "30")),
+        )
+    
+    @staticmethod
+    def _backends_from_env() -> list:
+        # AZURE_OPENAI_BACKENDS='[{"endpoint": "https://eastus.openai.azure.com", "deployment": "gpt-4o",
+        #   "apiKeyEnv": "EASTUS_KEY", "serves": "gpt-4o", "tpm": 150000, "rpm": 900}, ...]'
+        backends = []
+        burst = float(os.getenv("LLM_RATE_LIMIT_BURST_SECONDS", "10"))
+        for index, spec in enumerate(json.loads(os.getenv("AZURE_OPENAI_BACKENDS") or "[]")):
+            endpoint = spec.get("endpoint")
+            name = spec.get("name") or f"{httpx.URL(endpoint).host if endpoint else 'default'}/{spec.get('deployment', index)}"
+            backends.append(LLMBackend(
+                name,
+                RateLimiter(int(spec.get("tpm", 0)), int(spec.get("rpm", 0)), burst),
+                serves=spec.get("serves") or os.getenv("AZURE_OPENAI_MODEL"),
+                endpoint=endpoint,
+                deployment=spec.get("deployment"),
+                api_key=os.getenv(spec["apiKeyEnv"]) if spec.get("apiKeyEnv") else spec.get("apiKey"),
+            ))
+        if backends:
+            logging.info("Spreading model requests over %d backends", len(backends))
+        return backends
+    
     def configure_defaults(self) -> None:
         """Configure default settings for the OpenAI client globally."""
         client = self.create_client()
@@ -73,9 +204,8 @@ default_client_factory = OpenAIClientFactoryImpl()
 def initialize_global_agent_settings():
     """
     Sets up the global agent settings for the OpenAI agents SDK.
-    This function is kept for backwards compatibility.
+    This function is kept for backwards compatibility; the agent provider
+    configures the defaults when it starts, so importing this module has no
+    side effects.
     """
-    default_client_factory.configure_defaults()
-
-# Initialize global agent settings when the module is imported, for backwards compatibility
-initialize_global_agent_settings()
\ No newline at end of file
+    default_client_factory.configure_defaults()
\ No newline at end of file
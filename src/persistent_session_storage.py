@@ -0,0 +1,356 @@
+"""
+Persistent Session Storage for Kubernetes Operations Agent.
+
+Provides the shared base of the external SessionStorage implementations
+(SQLite and Redis), so conversations survive pod restarts and any replica
+can serve any session. Values are serialized as compact JSON (compressed
+when large), list values such as the message history are written as deltas
+(appended and dropped items only), and keys holding process-local objects
+(e.g. Chainlit steps) never leave memory. Backend I/O runs on a worker thread
+of the store, never on the event loop.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from interfaces import SessionStorage
+
+T = TypeVar('T')
+
+# Keys whose values are live objects of this process and are never persisted
+DEFAULT_LOCAL_KEYS = ("tool_steps",)
+
+# Encoded values above this size are zlib-compressed
+COMPRESS_THRESHOLD = 512
+
+_PLAIN = b"j"
+_ZLIB = b"z"
+
+
+def encode_value(value: Any) -> bytes:
+    """
+    Serialize a JSON-compatible value compactly.
+
+    Args:
+        value: The value to encode
+
+    Returns:
+        A one-byte format tag followed by the (possibly compressed) JSON
+    """
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(data) > COMPRESS_THRESHOLD:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return _ZLIB + compressed
+    return _PLAIN + data
+
+
+def decode_value(data: bytes) -> Any:
+    """
+    Deserialize a value written by encode_value.
+
+    Args:
+        data: The encoded bytes
+
+    Returns:
+        The decoded value
+    """
+    tag, payload = data[:1], data[1:]
+    if tag == _ZLIB:
+        payload = zlib.decompress(payload)
+    elif tag != _PLAIN:
+        raise ValueError(f"Unknown session value encoding {tag!r}")
+    return json.loads(payload.decode("utf-8"))
+
+
+def list_delta(old: List[Any], new: List[Any]) -> Optional[Tuple[int, List[Any]]]:
+    """
+    Express new as old with items dropped from the front and appended at the end.
+
+    This matches how the message history changes: turns are appended and
+    compaction folds the oldest ones into the summary.
+
+    Args:
+        old: The list as last persisted
+        new: The list to persist
+
+    Returns:
+        (items to drop from the front, items to append), or None if new is
+        not of that shape and must be rewritten
+    """
+    for dropped in range(len(old) + 1):
+        kept = len(old) - dropped
+        if kept > len(new):
+            continue
+        if new[:kept] == old[dropped:]:
+            return dropped, new[kept:]
+    return None
+
+
+class PersistentSessionStorage(SessionStorage[T]):
+    """
+    Write-through SessionStorage for one session, backed by an external store.
+
+    Values read or written are cached for the life of the object, so reads
+    normally never leave the process. Every set() is queued on the store's
+    I/O thread at once without waiting for it, so a slow or unreachable
+    backend delays persistence, not the event loop. Call preload() before
+    reading a session, so get() does not have to wait for the backend.
+    Subclasses implement the backend primitives below; they only ever run on
+    the I/O thread.
+    """
+
+    def __init__(self, store: "SessionStore", session_id: str, local_keys: Iterable[str] = DEFAULT_LOCAL_KEYS):
+        """
+        Initialize the storage for one session.
+
+        Args:
+            store: The store running this storage's backend I/O
+            session_id: Identifier of the session, stable across reconnects
+            local_keys: Keys kept in process memory only
+        """
+        self.session_id = session_id
+        self._io_store = store
+        self._local_keys = frozenset(local_keys)
+        self._local: Dict[str, Any] = {}
+        self._cache: Dict[str, Any] = {}
+        # Keys known to be absent from the backend
+        self._missing: set = set()
+        # Copy of each list as last persisted, to compute deltas against
+        self._persisted_lists: Dict[str, List[Any]] = {}
+        self._bytes_written = 0
+        # Set by a failed write (on the I/O thread): lists are rewritten whole next time
+        self._resync = False
+
+    def get(self, key: str, default: Optional[T] = None) -> Optional[T]:
+        """
+        Get a value from the session storage.
+
+        Args:
+            key: The key to retrieve
+            default: Default value if key doesn't exist
+
+        Returns:
+            The stored value or the default
+        """
+        if key in self._local_keys:
+            return self._local.get(key, default)
+        if key not in self._cache and key not in self._missing:
+            # not preloaded: wait for the backend (and the writes queued before the read)
+            self._apply(self._io_store.call(self._read, [key]))
+        return self._cache.get(key, default)
+
+    async def preload(self, keys: Iterable[str]) -> None:
+        """
+        Read the given keys from the backend without blocking the event loop,
+        so that get() serves them from memory.
+
+        Args:
+            keys: The keys about to be read
+        """
+        wanted = [k for k in keys if k not in self._local_keys and k not in self._cache and k not in self._missing]
+        if wanted:
+            self._apply(await self._io_store.call_async(self._read, wanted))
+
+    def _read(self, keys: List[str]) -> Dict[str, Any]:
+        # on the I/O thread: returns key -> (value, is_list), or None when absent
+        self._touch()
+        loaded: Dict[str, Any] = {}
+        for key in keys:
+            data = self._load_value(key)
+            if data is not None:
+                loaded[key] = (decode_value(data), False)
+                continue
+            items = self._load_items(key)
+            loaded[key] = ([decode_value(item) for item in items], True) if items else None
+        return loaded
+
+    def _apply(self, loaded: Dict[str, Any]) -> None:
+        for key, entry in loaded.items():
+            if key in self._cache:
+                # set() while the read was in flight; the newer value wins
+                continue
+            if entry is None:
+                self._missing.add(key)
+                continue
+            value, is_list = entry
+            self._cache[key] = value
+            if is_list:
+                self._persisted_lists[key] = list(value)
+
+    def set(self, key: str, value: T) -> None:
+        """
+        Set a value in the session storage.
+
+        Args:
+            key: The key to set
+            value: The value to store
+        """
+        if key in self._local_keys:
+            self._local[key] = value
+            return
+        self._cache[key] = value
+        self._missing.discard(key)
+        if self._resync:
+            self._resync = False
+            self._persisted_lists.clear()
+
+        if isinstance(value, list):
+            old = self._persisted_lists.get(key)
+            delta = list_delta(old, value) if old is not None else None
+            if delta is None:
+                items = [encode_value(item) for item in value]
+                self._write(self._write_items, key, 0, items, True)
+            else:
+                dropped, appended = delta
+                if not dropped and not appended:
+                    self._write(self._touch)
+                    return
+                items = [encode_value(item) for item in appended]
+                self._write(self._write_items, key, dropped, items, False)
+            self._bytes_written += sum(len(item) for item in items)
+            self._persisted_lists[key] = list(value)
+        else:
+            data = encode_value(value)
+            self._write(self._write_value, key, data)
+            self._bytes_written += len(data)
+            self._persisted_lists.pop(key, None)
+        self._write(self._touch)
+
+    def _write(self, fn: Callable[..., None], *args: Any) -> None:
+        self._io_store.submit(fn, *args).add_done_callback(self._write_done)
+
+    def _write_done(self, future: "Future[None]") -> None:
+        if not future.cancelled() and future.exception() is not None:
+            # the backend may now lack items the next delta would build on
+            self._resync = True
+
+    def release(self) -> None:
+        """
+        Forget the in-process copy of the session; the persisted data stays
+        until the store evicts it after its TTL.
+        """
+        self._local.clear()
+        self._cache.clear()
+        self._missing.clear()
+        self._persisted_lists.clear()
+
+    @property
+    def bytes_written(self) -> int:
+        """Encoded bytes persisted by this object, for measuring delta writes."""
+        return self._bytes_written
+
+    @abstractmethod
+    def _load_value(self, key: str) -> Optional[bytes]:
+        """Return the encoded scalar stored under key, or None."""
+
+    @abstractmethod
+    def _load_items(self, key: str) -> List[bytes]:
+        """Return the encoded items of the list stored under key, or []."""
+
+    @abstractmethod
+    def _write_value(self, key: str, data: bytes) -> None:
+        """Store an encoded scalar, replacing any list under the same key."""
+
+    @abstractmethod
+    def _write_items(self, key: str, drop_front: int, items: List[bytes], replace: bool) -> None:
+        """Drop items from the front of a list and append new ones (or replace it)."""
+
+    @abstractmethod
+    def _touch(self) -> None:
+        """Mark the session as recently used, postponing its eviction."""
+
+
+class SessionStore(ABC):
+    """
+    Interface for stores handing out per-session PersistentSessionStorage.
+
+    Backend I/O of every session runs on one worker thread of the store, in
+    the order it was queued: the connection is never used concurrently, and
+    a read sees the writes queued before it.
+    """
+
+    def __init__(self) -> None:
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-store")
+        self.write_errors = 0
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> "Future[Any]":
+        """
+        Queue a write on the I/O thread without waiting for it; failures are
+        logged and counted.
+
+        Args:
+            fn: The backend call
+            args: Its arguments
+
+        Returns:
+            The call's future
+        """
+        future = self._io.submit(fn, *args)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a backend call on the I/O thread and wait for its result, blocking."""
+        return self._io.submit(fn, *args).result()
+
+    async def call_async(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a backend call on the I/O thread and await its result."""
+        return await asyncio.wrap_future(self._io.submit(fn, *args))
+
+    def flush(self) -> None:
+        """Wait until the writes queued so far are done."""
+        self._io.submit(lambda: None).result()
+
+    def _shutdown_io(self) -> None:
+        # finishes the queued writes first
+        self._io.shutdown(wait=True)
+
+    def _log_failure(self, future: "Future[Any]") -> None:
+        if not future.cancelled() and future.exception() is not None:
+            self.write_errors += 1
+            logging.warning("Session store write failed: %s", future.exception())
+
+    @abstractmethod
+    def storage(self, session_id: str) -> PersistentSessionStorage:
+        """Get the storage of one session."""
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """Finish queued writes and release connections held by the store."""
+        pass
+
+
+def session_store_from_env() -> Optional[SessionStore]:
+    """
+    Create the external session store selected by SESSION_STORE.
+
+    SESSION_STORE is "memory" (default: Chainlit's in-process user_session,
+    no store), "sqlite" or "redis"; SESSION_STORE_URL is the SQLite file path
+    or the redis:// URL, and SESSION_TTL the idle seconds before a session is
+    evicted.
+
+    Returns:
+        The configured store, or None for in-process storage
+    """
+    kind = os.getenv("SESSION_STORE", "memory").lower()
+    ttl = float(os.getenv("SESSION_TTL", "86400"))
+    if kind == "memory":
+        return None
+    if kind == "sqlite":
+        from sqlite_session_storage import SQLiteSessionStore
+
+        return SQLiteSessionStore(os.getenv("SESSION_STORE_URL", "sessions.db"), ttl=ttl)
+    if kind == "redis":
+        from redis_session_storage import RedisSessionStore
+
+        return RedisSessionStore(os.getenv("SESSION_STORE_URL", "redis://localhost:6379/0"), ttl=ttl)
+    raise ValueError(f"Unknown SESSION_STORE '{kind}' (expected memory, sqlite or redis)")
+
@@ -0,0 +1,462 @@
+"""
+Prometheus Query Planner for Kubernetes Operations Agent.
+
+Provides a PrometheusQueryPlanner that answers range queries from fixed,
+step-aligned blocks: start and end are aligned to the step, the range is
+split into blocks of block_points steps, blocks already fetched are served
+from a bounded in-memory cache, only the missing parts (typically the tail
+up to now) are fetched, and the pieces are merged into one matrix result.
+A PrometheusQueryProxy serves it as a local Prometheus HTTP API in front of
+the real one, so the Prometheus MCP server uses it without changes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from metrics import PROMETHEUS_BLOCKS, PROMETHEUS_UPSTREAM_POINTS
+
+__all__ = ["PrometheusQueryPlanner", "PrometheusQueryProxy", "RangeBlockCache", "parse_duration", "parse_time"]
+
+# Prometheus refuses range queries of more than 11,000 points per series
+MAX_POINTS_PER_REQUEST = 11000
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "y": 31536000}
+_WHITESPACE = re.compile(r"\s+")
+
+# Hop-by-hop and recomputed headers not forwarded by the proxy
+_SKIP_HEADERS = frozenset({"host", "content-length", "transfer-encoding", "connection", "keep-alive", "content-encoding"})
+
+Interval = Tuple[int, int]
+
+
+def parse_duration(value: str) -> float:
+    """
+    Parse a Prometheus duration ("15s", "1m30s", "500ms") or a number of seconds.
+
+    Args:
+        value: The duration
+
+    Returns:
+        Seconds
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        raise ValueError(f"invalid duration '{value}'")
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+
+def parse_time(value: str) -> float:
+    """
+    Parse a Prometheus timestamp: Unix seconds or RFC 3339.
+
+    Args:
+        value: The timestamp
+
+    Returns:
+        Unix seconds
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _format_ts(ts_ms: int) -> float | int:
+    # as Prometheus writes them: whole seconds without a fraction
+    return ts_ms // 1000 if ts_ms % 1000 == 0 else ts_ms / 1000
+
+
+class _Block:
+    """Points of one query and step within one block, over one contiguous covered range."""
+
+    __slots__ = ("covered", "series", "points")
+
+    def __init__(self) -> None:
+        self.covered: Interval | None = None
+        # label key -> (labels, {timestamp ms: value})
+        self.series: Dict[str, Tuple[Dict[str, str], Dict[int, str]]] = {}
+        self.points = 0
+
+
+class RangeBlockCache:
+    """LRU cache of range query blocks, bounded by the number of points kept."""
+
+    def __init__(self, max_points: int = 250_000) -> None:
+        self.max_points = max_points
+        self._blocks: OrderedDict[Tuple[str, int, int], _Block] = OrderedDict()
+        self._points = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, int, int]) -> _Block | None:
+        block = self._blocks.get(key)
+        if block is not None:
+            self._blocks.move_to_end(key)
+        return block
+
+    def get_or_create(self, key: Tuple[str, int, int]) -> _Block:
+        block = self.get(key)
+        if block is None:
+            block = self._blocks[key] = _Block()
+        return block
+
+    def resize(self, key: Tuple[str, int, int], block: _Block, added_points: int) -> None:
+        """Account for points added to a block and evict least recently used blocks."""
+        block.points += added_points
+        if self._blocks.get(key) is not block:
+            # evicted while its query was still running
+            return
+        self._points += added_points
+        while self._points > self.max_points and len(self._blocks) > 1:
+            _, evicted = self._blocks.popitem(last=False)
+            self._points -= evicted.points
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._blocks.clear()
+        self._points = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"blocks": len(self._blocks), "points": self._points, "evictions": self.evictions}
+
+
+class PrometheusQueryPlanner:
+    """Serve range queries from step-aligned cached blocks, fetching only what is missing.
+
+    A block covers ``block_points`` steps starting at a multiple of its span,
+    so the same query and step always map to the same blocks whatever range
+    was asked for; a block keeps one contiguous covered range that grows as
+    queries touch more of it. Points newer than ``settle_seconds`` may still
+    change (late samples, rule evaluation) and are fetched on every query
+    but never cached. Missing ranges of adjacent blocks are fetched in one
+    request of at most ``MAX_POINTS_PER_REQUEST`` steps.
+
+    Every point of a range query is evaluated on its own, so a result
+    assembled from blocks equals the result of one query over the aligned
+    range. Error responses are returned as they are and nothing is cached.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        cache: RangeBlockCache | None = None,
+        block_points: int = 240,
+        settle_seconds: float = 60.0,
+        timeout: float = 60.0,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache or RangeBlockCache()
+        self.block_points = block_points
+        self.settle_seconds = settle_seconds
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: aiohttp.ClientSession | None = None
+        self._stats = {"queries": 0, "upstream_requests": 0, "upstream_points": 0, "served_points": 0, "errors": 0}
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=self._timeout)
+        return self._session
+
+    async def query_range(
+        self,
+        query: str,
+        start: float,
+        end: float,
+        step: float,
+        headers: Dict[str, str] | None = None,
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Run a range query through the block cache.
+
+        Returns the HTTP status and the Prometheus API response body.
+        """
+        self._stats["queries"] += 1
+        step_ms = max(1, round(step * 1000))
+        start_ms = math.floor(start * 1000 / step_ms) * step_ms
+        end_ms = max(start_ms, math.floor(end * 1000 / step_ms) * step_ms)
+        horizon_ms = math.floor((time.time() - self.settle_seconds) * 1000 / step_ms) * step_ms
+        span_ms = step_ms * self.block_points
+        key = _WHITESPACE.sub(" ", query.strip())
+
+        # what each block still lacks of [start, end]; the query keeps its blocks even if evicted meanwhile
+        blocks: Dict[int, _Block] = {}
+        missing: List[Interval] = []
+        for index in range(start_ms // span_ms, end_ms // span_ms + 1):
+            need = (max(start_ms, index * span_ms), min(end_ms, (index + 1) * span_ms - step_ms))
+            block = self.cache.get((key, step_ms, index))
+            if block is not None:
+                blocks[index] = block
+            gaps = _gaps(need, block.covered if block else None, step_ms)
+            PROMETHEUS_BLOCKS.labels("hit" if not gaps else "partial" if block and block.covered else "miss").inc()
+            missing.extend(gaps)
+
+        volatile: Dict[str, Tuple[Dict[str, str], Dict[int, str]]] = {}
+        warnings: List[str] = []
+        requests = _coalesce(missing, step_ms)
+        responses = await asyncio.gather(
+            *(self._fetch(query, interval, step_ms, headers) for interval in requests)
+        )
+        for interval, (status, payload) in zip(requests, responses):
+            if status != 200 or payload.get("status") != "success":
+                self._stats["errors"] += 1
+                return status, payload
+            warnings.extend(payload.get("warnings") or [])
+            self._store(key, step_ms, span_ms, interval, horizon_ms, payload, blocks, volatile)
+
+        result = self._assemble(blocks, (start_ms, end_ms), volatile)
+        body: Dict[str, Any] = {"status": "success", "data": {"resultType": "matrix", "result": result}}
+        if warnings:
+            body["warnings"] = sorted(set(warnings))
+        return 200, body
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, **self.cache.get_stats()}
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    async def _fetch(
+        self, query: str, interval: Interval, step_ms: int, headers: Dict[str, str] | None
+    ) -> Tuple[int, Dict[str, Any]]:
+        params = {
+            "query": query,
+            "start": str(_format_ts(interval[0])),
+            "end": str(_format_ts(interval[1])),
+            "step": str(step_ms / 1000),
+        }
+        self._stats["upstream_requests"] += 1
+        async with self.session().post(
+            f"{self.base_url}/api/v1/query_range", data=params, headers=headers
+        ) as response:
+            text = await response.text()
+            try:
+                payload = json.loads(text)
+            except ValueError:
+                payload = {"status": "error", "errorType": "bad_response", "error": text[:500]}
+            return response.status, payload
+
+    def _store(
+        self,
+        key: str,
+        step_ms: int,
+        span_ms: int,
+        interval: Interval,
+        horizon_ms: int,
+        payload: Dict[str, Any],
+        blocks: Dict[int, _Block],
+        volatile: Dict[str, Tuple[Dict[str, str], Dict[int, str]]],
+    ) -> None:
+        added: Dict[int, int] = {}
+        for series in (payload.get("data") or {}).get("result") or []:
+            labels = series.get("metric") or {}
+            label_key = json.dumps(labels, sort_keys=True)
+            for ts, value in series.get("values") or []:
+                ts_ms = round(float(ts) * 1000)
+                self._stats["upstream_points"] += 1
+                PROMETHEUS_UPSTREAM_POINTS.inc()
+                if ts_ms > horizon_ms:
+                    volatile.setdefault(label_key, (labels, {}))[1][ts_ms] = value
+                    continue
+                index = ts_ms // span_ms
+                block = blocks.get(index) or blocks.setdefault(index, self.cache.get_or_create((key, step_ms, index)))
+                points = block.series.setdefault(label_key, (labels, {}))[1]
+                if ts_ms not in points:
+                    added[index] = added.get(index, 0) + 1
+                points[ts_ms] = value
+
+        # the fetched range is covered, up to the settle horizon, even where a series has no points
+        for index in range(interval[0] // span_ms, min(interval[1], horizon_ms) // span_ms + 1):
+            lo = max(interval[0], index * span_ms)
+            hi = min(interval[1], horizon_ms, (index + 1) * span_ms - step_ms)
+            if lo > hi:
+                continue
+            block = blocks.get(index) or blocks.setdefault(index, self.cache.get_or_create((key, step_ms, index)))
+            covered = block.covered
+            block.covered = (lo, hi) if covered is None else (min(lo, covered[0]), max(hi, covered[1]))
+            self.cache.resize((key, step_ms, index), block, added.get(index, 0))
+
+    def _assemble(
+        self,
+        blocks: Dict[int, _Block],
+        wanted: Interval,
+        volatile: Dict[str, Tuple[Dict[str, str], Dict[int, str]]],
+    ) -> List[Dict[str, Any]]:
+        merged: Dict[str, Tuple[Dict[str, str], Dict[int, str]]] = {}
+        for _, block in sorted(blocks.items()):
+            for label_key, (labels, points) in block.series.items():
+                target = merged.setdefault(label_key, (labels, {}))[1]
+                target.update((ts, v) for ts, v in points.items() if wanted[0] <= ts <= wanted[1])
+        for label_key, (labels, points) in volatile.items():
+            target = merged.setdefault(label_key, (labels, {}))[1]
+            target.update((ts, v) for ts, v in points.items() if wanted[0] <= ts <= wanted[1])
+
+        result = []
+        for label_key in sorted(merged):
+            labels, points = merged[label_key]
+            if points:
+                result.append({"metric": labels, "values": [[_format_ts(ts), points[ts]] for ts in sorted(points)]})
+                self._stats["served_points"] += len(points)
+        return result
+
+
+def _gaps(need: Interval, covered: Interval | None, step_ms: int) -> List[Interval]:
+    # parts of need outside covered; bridging to covered keeps a block's coverage contiguous
+    if covered is None:
+        return [need]
+    gaps = []
+    if need[0] < covered[0]:
+        gaps.append((need[0], covered[0] - step_ms))
+    if need[1] > covered[1]:
+        gaps.append((covered[1] + step_ms, need[1]))
+    return gaps
+
+
+def _coalesce(intervals: List[Interval], step_ms: int) -> List[Interval]:
+    # join adjacent intervals, then cut them to what one request may return
+    merged: List[Interval] = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1] + step_ms:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    requests = []
+    limit = step_ms * (MAX_POINTS_PER_REQUEST - 1)
+    for lo, hi in merged:
+        while hi - lo > limit:
+            requests.append((lo, lo + limit))
+            lo += limit + step_ms
+        requests.append((lo, hi))
+    return requests
+
+
+class PrometheusQueryProxy:
+    """Local Prometheus HTTP API answering range queries through a :class:`PrometheusQueryPlanner`.
+
+    ``/api/v1/query_range`` (GET or POST) goes through the planner; every
+    other request is forwarded to the upstream Prometheus unchanged, with
+    its authorization headers.
+
+    Usage::
+
+        async with PrometheusQueryProxy(PrometheusQueryPlanner("http://prometheus:9090")) as proxy:
+            env["PROMETHEUS_URL"] = proxy.url
+    """
+
+    def __init__(self, planner: PrometheusQueryPlanner, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.planner = planner
+        self._host = host
+        self._port = port
+        self._runner: web.AppRunner | None = None
+        self.url: str | None = None
+
+    @classmethod
+    def from_env(cls) -> Optional["PrometheusQueryProxy"]:
+        """Create a proxy for PROMETHEUS_URL unless PROMETHEUS_QUERY_PLANNER is off.
+
+        PROMETHEUS_BLOCK_POINTS, PROMETHEUS_CACHE_MAX_POINTS and
+        PROMETHEUS_CACHE_SETTLE_SECONDS configure the planner.
+        """
+        if os.getenv("PROMETHEUS_QUERY_PLANNER", "on").lower() in ("off", "false", "0", "no"):
+            return None
+        planner = PrometheusQueryPlanner(
+            os.getenv("PROMETHEUS_URL", "http://localhost:9090"),
+            cache=RangeBlockCache(max_points=int(os.getenv("PROMETHEUS_CACHE_MAX_POINTS", "250000"))),
+            block_points=int(os.getenv("PROMETHEUS_BLOCK_POINTS", "240")),
+            settle_seconds=float(os.getenv("PROMETHEUS_CACHE_SETTLE_SECONDS", "60")),
+        )
+        return cls(planner)
+
+    async def __aenter__(self) -> "PrometheusQueryProxy":
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_route("*", "/api/v1/query_range", self._query_range)
+        app.router.add_route("*", "/{path:.*}", self._forward)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{self._host}:{port}"
+        logging.info("Prometheus query planner at %s in front of %s", self.url, self.planner.base_url)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        await self.planner.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.planner.get_stats()
+
+    async def _query_range(self, request: web.Request) -> web.StreamResponse:
+        params: Dict[str, str] = dict(request.query)
+        if request.method == "POST":
+            params.update({k: str(v) for k, v in (await request.post()).items()})
+        try:
+            query = params["query"]
+            start, end = parse_time(params["start"]), parse_time(params["end"])
+            step = parse_duration(params["step"])
+        except (KeyError, ValueError) as exc:
+            return web.json_response(
+                {"status": "error", "errorType": "bad_data", "error": f"invalid range query parameters: {exc}"},
+                status=400,
+            )
+        if step <= 0 or end < start:
+            return web.json_response(
+                {"status": "error", "errorType": "bad_data", "error": "step must be positive and end not before start"},
+                status=400,
+            )
+        try:
+            status, payload = await self.planner.query_range(query, start, end, step, _forwarded_headers(request))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            return _upstream_error(exc)
+        return web.json_response(payload, status=status)
+
+    async def _forward(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        try:
+            async with self.planner.session().request(
+                request.method,
+                f"{self.planner.base_url}{request.rel_url}",
+                data=body or None,
+                headers=_forwarded_headers(request),
+            ) as response:
+                content = await response.read()
+                headers = {k: v for k, v in response.headers.items() if k.lower() not in _SKIP_HEADERS}
+                return web.Response(body=content, status=response.status, headers=headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            return _upstream_error(exc)
+
+
+def _upstream_error(exc: BaseException) -> web.Response:
+    # the session's ClientTimeout raises a plain TimeoutError, not a ClientError
+    if isinstance(exc, asyncio.TimeoutError):
+        body = {"status": "error", "errorType": "timeout", "error": str(exc) or "upstream Prometheus timed out"}
+        return web.json_response(body, status=504)
+    return web.json_response({"status": "error", "errorType": "unavailable", "error": str(exc)}, status=502)
+
+
+def _forwarded_headers(request: web.Request) -> Dict[str, str]:
+    return {k: v for k, v in request.headers.items() if k.lower() not in _SKIP_HEADERS}
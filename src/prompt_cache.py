@@ -0,0 +1,78 @@
+"""
+Prompt Cache for Kubernetes Operations Agent.
+
+Provides helpers that keep the request prefix the model provider caches
+(tool definitions, then the system instructions, then the conversation)
+identical across turns and sessions: a fingerprint of the static part of
+the prefix and a prompt_cache_key derived from it, so requests sharing the
+prefix are routed to the same cache.
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+from typing import Any, Optional, Sequence
+
+from agents import FunctionTool, ModelSettings, Tool
+
+KEY_PREFIX = "k8s-ai-ops"
+
+
+def _tool_definition(tool: Tool) -> Any:
+    if isinstance(tool, FunctionTool):
+        return [tool.name, tool.description, tool.params_json_schema, tool.strict_json_schema]
+    return [type(tool).__name__, getattr(tool, "name", "")]
+
+
+def prefix_fingerprint(instructions: str, tools: Sequence[Tool]) -> str:
+    """
+    Hash the static prefix of every request: the instructions and the tool
+    definitions in the order they are sent.
+
+    Args:
+        instructions: The agent's system instructions
+        tools: All tools of the agent, in request order
+
+    Returns:
+        A short hex digest that changes whenever the cached prefix would
+    """
+    payload = json.dumps([instructions, [_tool_definition(tool) for tool in tools]], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def prompt_cache_key_from_env(fingerprint: str) -> Optional[str]:
+    """
+    The prompt_cache_key to send with every request, from PROMPT_CACHE_KEY:
+    "auto" (default) sends one for the OpenAI API only, "on" always (Azure
+    deployments that accept the parameter), "off" never.
+
+    Without it the agents SDK picks a new key per run on the OpenAI API,
+    which spreads sessions sharing the prefix over different cache shards.
+
+    Args:
+        fingerprint: The prefix fingerprint the key is derived from
+
+    Returns:
+        The key, or None when none should be sent
+    """
+    mode = os.getenv("PROMPT_CACHE_KEY", "auto").lower()
+    if mode == "off":
+        return None
+    if mode == "auto" and os.getenv("OPENAI_PROVIDER", "azure").lower() != "openai":
+        return None
+    return f"{KEY_PREFIX}:{fingerprint}"
+
+
+def with_prompt_cache_key(settings: ModelSettings, key: str) -> ModelSettings:
+    """
+    Copy model settings with the given prompt_cache_key sent as an extra argument.
+
+    Args:
+        settings: The agent's model settings
+        key: The key to send
+
+    Returns:
+        The new settings
+    """
+    return dataclasses.replace(settings, extra_args={**(settings.extra_args or {}), "prompt_cache_key": key})
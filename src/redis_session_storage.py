@@ -0,0 +1,314 @@
+"""
+Redis Session Storage Implementation.
+
+Provides a SessionStorage backed by any server speaking the Redis protocol
+(Redis, Valkey, KeyDB, ...), so every replica sees every session. Keys expire
+after the session TTL, refreshed on each use. The blocking client only ever
+runs on the store's I/O thread.
+"""
+
+import socket
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+from persistent_session_storage import DEFAULT_LOCAL_KEYS, PersistentSessionStorage, SessionStore
+
+
+class RedisError(Exception):
+    """Error reply from the Redis server."""
+
+
+class RedisConnection:
+    """
+    Minimal synchronous client for the Redis serialization protocol (RESP2).
+
+    Supports exactly what the session store needs: single commands and
+    pipelines, AUTH and SELECT, and one reconnect attempt per command. A
+    command whose reply is lost after it was sent is only resent when it is
+    idempotent, as the server may already have applied it. Not thread-safe;
+    RedisSessionStore uses it from its I/O thread only.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        """
+        Initialize the connection settings; the socket opens lazily.
+
+        Args:
+            url: redis://[user:password@]host[:port][/db]
+            timeout: Socket timeout in seconds
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", ""):
+            raise ValueError(f"Unsupported Redis URL scheme '{parsed.scheme}' (expected redis://)")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader: Any = None
+        self._written = 0
+
+    def execute(self, *args: Any, idempotent: bool = True) -> Any:
+        """
+        Run one command.
+
+        Args:
+            args: Command name and arguments
+            idempotent: Whether the command may be resent if its reply is lost
+
+        Returns:
+            The decoded reply
+        """
+        return self.pipeline([args], idempotent=idempotent)[0]
+
+    def pipeline(self, commands: Sequence[Sequence[Any]], idempotent: bool = False) -> List[Any]:
+        """
+        Send several commands in one round trip.
+
+        Args:
+            commands: Commands, each a sequence of name and arguments
+            idempotent: Whether the commands may be resent if their replies are
+                lost; otherwise only a failure before they were sent is retried
+
+        Returns:
+            The replies, in order
+
+        Raises:
+            RedisError: If any command failed
+            OSError: If the replies were lost and the commands are not idempotent
+        """
+        payload = b"".join(self._encode(command) for command in commands)
+        try:
+            self._send(payload)
+        except (OSError, ConnectionError):
+            if self._written and not idempotent:
+                raise
+            # stale connection (server restart, idle timeout): retry once on a new one
+            self._send(payload)
+        try:
+            replies = self._read_replies(len(commands))
+        except (OSError, ConnectionError):
+            # the server may already have applied the commands
+            if not idempotent:
+                raise
+            self._send(payload)
+            replies = self._read_replies(len(commands))
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def close(self) -> None:
+        """Close the socket."""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._reader = None
+
+    def _send(self, payload: bytes) -> None:
+        # _written tells a failure before anything reached the socket from one mid-payload
+        self._written = 0
+        if self._sock is None:
+            self._connect()
+        view = memoryview(payload)
+        try:
+            while self._written < len(view):
+                self._written += self._sock.send(view[self._written:])
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_replies(self, count: int) -> List[Any]:
+        try:
+            return [self._read_reply() for _ in range(count)]
+        except BaseException:
+            # replies left unread would be taken for those of the next command
+            self.close()
+            raise
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        setup: List[Tuple[Any, ...]] = []
+        if self.password is not None:
+            setup.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._sock.sendall(b"".join(self._encode(command) for command in setup))
+            for _ in setup:
+                reply = self._read_reply()
+                if isinstance(reply, RedisError):
+                    self.close()
+                    raise reply
+
+    @staticmethod
+    def _encode(command: Sequence[Any]) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            if isinstance(arg, bytes):
+                data = arg
+            elif isinstance(arg, str):
+                data = arg.encode("utf-8")
+            else:
+                data = str(arg).encode("ascii")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            return RedisError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected Redis reply {line!r}")
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions kept in a Redis-protocol server.
+
+    Each session key maps to one Redis key: a string for scalar values and a
+    list for list values, so appending a turn is a single RPUSH.
+    """
+
+    def __init__(self, url: str, ttl: float = 86400.0, prefix: str = "k8s-ai-ops:session:"):
+        """
+        Initialize the store.
+
+        Args:
+            url: redis://[user:password@]host[:port][/db]
+            ttl: Idle seconds after which a session's keys expire
+            prefix: Prefix of every key written
+        """
+        super().__init__()
+        self.ttl = max(1, int(ttl))
+        self.prefix = prefix
+        self._connection = RedisConnection(url)
+
+    @property
+    def connection(self) -> RedisConnection:
+        """The underlying connection."""
+        return self._connection
+
+    def storage(self, session_id: str) -> "RedisSessionStorage":
+        """
+        Get the storage of one session.
+
+        Args:
+            session_id: Identifier of the session
+
+        Returns:
+            A RedisSessionStorage bound to this store
+        """
+        return RedisSessionStorage(self, session_id)
+
+    def key(self, session_id: str, key: str, kind: str) -> str:
+        """
+        Build the Redis key for one session key.
+
+        Args:
+            session_id: Identifier of the session
+            key: Session key
+            kind: "v" for scalar values, "l" for lists
+
+        Returns:
+            The Redis key
+        """
+        return f"{self.prefix}{session_id}:{kind}:{key}"
+
+    def close(self) -> None:
+        """Finish queued writes and close the connection."""
+        self._shutdown_io()
+        self._connection.close()
+
+
+class RedisSessionStorage(PersistentSessionStorage):
+    """
+    Implementation of SessionStorage using a RedisSessionStore.
+    """
+
+    def __init__(self, store: RedisSessionStore, session_id: str, local_keys=DEFAULT_LOCAL_KEYS):
+        """
+        Initialize the storage of one session.
+
+        Args:
+            store: The store holding the session
+            session_id: Identifier of the session
+            local_keys: Keys kept in process memory only
+        """
+        super().__init__(store, session_id, local_keys)
+        self._store = store
+        self._redis = store.connection
+        # Redis keys written or read by this object, whose TTL _touch refreshes
+        self._keys: set = set()
+        self._last_touch = 0.0
+
+    def _load_value(self, key: str) -> Optional[bytes]:
+        redis_key = self._store.key(self.session_id, key, "v")
+        data = self._redis.execute("GET", redis_key)
+        if data is not None:
+            self._keys.add(redis_key)
+        return data
+
+    def _load_items(self, key: str) -> List[bytes]:
+        redis_key = self._store.key(self.session_id, key, "l")
+        items = self._redis.execute("LRANGE", redis_key, 0, -1) or []
+        if items:
+            self._keys.add(redis_key)
+        return items
+
+    def _write_value(self, key: str, data: bytes) -> None:
+        value_key = self._store.key(self.session_id, key, "v")
+        list_key = self._store.key(self.session_id, key, "l")
+        self._redis.pipeline([("DEL", list_key), ("SET", value_key, data, "EX", self._store.ttl)], idempotent=True)
+        self._keys.discard(list_key)
+        self._keys.add(value_key)
+
+    def _write_items(self, key: str, drop_front: int, items: List[bytes], replace: bool) -> None:
+        value_key = self._store.key(self.session_id, key, "v")
+        list_key = self._store.key(self.session_id, key, "l")
+        commands: List[Tuple[Any, ...]] = []
+        if replace:
+            commands.append(("DEL", value_key, list_key))
+            self._keys.discard(value_key)
+        elif drop_front:
+            commands.append(("LTRIM", list_key, drop_front, -1))
+        if items:
+            commands.append(("RPUSH", list_key, *items))
+            commands.append(("EXPIRE", list_key, self._store.ttl))
+            self._keys.add(list_key)
+        if commands:
+            # LTRIM and RPUSH of a delta apply twice if resent; a lost reply raises
+            # instead, and the storage then rewrites the whole list
+            self._redis.pipeline(commands, idempotent=replace)
+
+    def _touch(self) -> None:
+        # Refresh expiry at most ten times per TTL; writes refresh their own key
+        now = time.monotonic()
+        if not self._keys or now - self._last_touch < self._store.ttl / 10:
+            return
+        self._last_touch = now
+        self._redis.pipeline([("EXPIRE", key, self._store.ttl) for key in self._keys], idempotent=True)
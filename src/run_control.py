@@ -0,0 +1,97 @@
+"""
+Run Control for Kubernetes Operations Agent.
+
+Provides an ActiveRun handle around a streamed agent run so that it can be
+cancelled from outside the task consuming it: when the user disconnects,
+sends a new message, presses stop, or the run exceeds its deadline.
+"""
+
+import asyncio
+import os
+from typing import Any, Optional
+
+
+def run_timeout_from_env() -> Optional[float]:
+    """
+    Per-run wall-clock deadline from AGENT_RUN_TIMEOUT (seconds, 0 disables).
+
+    Returns:
+        The timeout in seconds, or None when disabled
+    """
+    timeout = float(os.getenv("AGENT_RUN_TIMEOUT", "300"))
+    return timeout if timeout > 0 else None
+
+
+def cancel_on_new_message_from_env() -> bool:
+    """
+    Whether a new message cancels the session's run in progress
+    (AGENT_CANCEL_ON_NEW_MESSAGE, default true).
+
+    Returns:
+        True if superseded runs should be cancelled
+    """
+    return os.getenv("AGENT_CANCEL_ON_NEW_MESSAGE", "true").lower() in ("1", "true", "yes", "on")
+
+
+class ActiveRun:
+    """
+    Cancellable handle for one streamed agent run.
+
+    Cancelling calls RunResultStreaming.cancel(), which cancels the run loop
+    task and with it any pending model request and MCP tool call; the
+    consumer's stream_events() loop then ends normally and can check
+    cancel_reason to report what happened.
+    """
+
+    def __init__(self, result: Any, timeout: Optional[float] = None):
+        """
+        Initialize the ActiveRun and arm its deadline.
+
+        Args:
+            result: The RunResultStreaming returned by Runner.run_streamed
+            timeout: Seconds after which the run is cancelled with reason
+                "deadline"; None for no deadline
+        """
+        self.result = result
+        self.timeout = timeout
+        self.cancel_reason: Optional[str] = None
+        self._deadline: Optional[asyncio.TimerHandle] = None
+        if timeout is not None:
+            self._deadline = asyncio.get_running_loop().call_later(timeout, self.cancel, "deadline")
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether the run has finished, successfully or not."""
+        return bool(self.result.is_complete)
+
+    def cancel(self, reason: str) -> bool:
+        """
+        Cancel the run if it is still in progress.
+
+        Args:
+            reason: Why the run is cancelled, e.g. "disconnect", "superseded",
+                "stopped" or "deadline"; only the first reason is kept
+
+        Returns:
+            True if this call cancelled the run
+        """
+        if self.cancel_reason is not None or self.is_complete:
+            return False
+        self.cancel_reason = reason
+        self._disarm()
+        self.result.cancel()
+        return True
+
+    def close(self) -> None:
+        """
+        Release the run: disarm the deadline and cancel the run if the
+        consumer stopped before it completed (e.g. its task was cancelled).
+        """
+        self._disarm()
+        if not self.is_complete:
+            self.cancel("abandoned")
+
+    def _disarm(self) -> None:
+        if self._deadline is not None:
+            self._deadline.cancel()
+            self._deadline = None
@@ -0,0 +1,494 @@
+"""
+Run Recorder for Kubernetes Operations Agent.
+
+Provides a RunRecorder that writes a compact, append-only trace of every
+agent run to disk: the user message, each model request (only the messages
+added since the previous request of the run) and its response with the
+arrival time of every streamed chunk, each MCP tool call with its arguments,
+output and latency, and the agent's own events (route, first token, tool
+steps). bench/replay.py drives the agent from these traces with stub model
+and MCP backends, to re-time real conversations offline and compare builds.
+Off unless RUN_TRACE_DIR is set.
+"""
+
+import base64
+import codecs
+import contextvars
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from mcp_server_wrapper import MCPServerWrapper
+from metrics import RUN_TRACE_BYTES
+
+# Strings at least this long are stored once per run and referenced by digest
+BLOB_MIN_CHARS = 512
+
+# Response headers kept in traces; replays need the content type and the quota headers
+_KEPT_HEADERS = ("content-type", "content-encoding", "retry-after", "retry-after-ms")
+
+_current: contextvars.ContextVar[Optional["RunTrace"]] = contextvars.ContextVar("run_trace", default=None)
+
+
+def _digest(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=8).hexdigest()
+
+
+def _compact(value: Any, blobs: Dict[str, str]) -> Any:
+    if isinstance(value, str):
+        if len(value) < BLOB_MIN_CHARS:
+            return value
+        ref = _digest(value)
+        blobs[ref] = value
+        return {"$blob": ref}
+    if isinstance(value, dict):
+        return {key: _compact(item, blobs) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item, blobs) for item in value]
+    return value
+
+
+def _expand(value: Any, blobs: Dict[str, str]) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 1 and "$blob" in value:
+            return blobs.get(value["$blob"], "")
+        return {key: _expand(item, blobs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item, blobs) for item in value]
+    return value
+
+
+class RunTrace:
+    """
+    Events of one agent run, with times in milliseconds since its start.
+
+    Created by RunRecorder.start(); while it is current, the recording
+    transport and MCP wrapper add the model requests and tool calls made
+    within the run's context.
+    """
+
+    def __init__(self, session: Optional[str], message: str, fields: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:16]
+        self.session = session
+        self.message = message
+        self.fields = fields
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._events: List[Dict[str, Any]] = []
+        self._marks: set = set()
+        self._model_requests = 0
+        self._sent: List[str] = []
+        self._token: Optional[contextvars.Token] = None
+
+    def elapsed_ms(self, since: Optional[float] = None) -> float:
+        """Milliseconds since the start of the run, or since a perf_counter() value."""
+        return round((time.perf_counter() - (self._t0 if since is None else since)) * 1000, 1)
+
+    def event(self, kind: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Add an event.
+
+        Args:
+            kind: Type of the event
+            **fields: Its JSON-serializable data
+
+        Returns:
+            The event, which may be completed later, e.g. with a duration
+        """
+        event = {"t": self.elapsed_ms(), "type": kind, **fields}
+        self._events.append(event)
+        return event
+
+    def mark(self, kind: str, **fields: Any) -> None:
+        """Add an event the first time it happens only, e.g. the first token."""
+        if kind not in self._marks:
+            self._marks.add(kind)
+            self.event(kind, **fields)
+
+    def model_request(self, request: httpx.Request) -> Dict[str, Any]:
+        """
+        Add a model API request; of its messages only those not sent in the
+        same place by the previous request are kept.
+
+        Args:
+            request: The request, already read
+
+        Returns:
+            The event, numbered by "n" within the run
+        """
+        fields: Dict[str, Any] = {
+            "n": self._model_requests, "method": request.method, "path": request.url.path, "bytes": len(request.content),
+        }
+        self._model_requests += 1
+        try:
+            body = json.loads(request.content or b"null")
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            for key in ("model", "stream", "parallel_tool_calls", "max_tokens", "temperature"):
+                if key in body:
+                    fields[key] = body[key]
+            fields["tools"] = [
+                (tool.get("function") or tool).get("name") for tool in body.get("tools") or [] if isinstance(tool, dict)
+            ]
+            items = body.get("messages", body.get("input"))
+            if isinstance(items, list):
+                hashes = [_digest(item) for item in items]
+                prefix = 0
+                while prefix < min(len(hashes), len(self._sent)) and hashes[prefix] == self._sent[prefix]:
+                    prefix += 1
+                self._sent = hashes
+                fields.update(prefix=prefix, messages=items[prefix:])
+        return self.event("llm_request", **fields)
+
+    def to_record(self, outcome: str) -> Dict[str, Any]:
+        """
+        The trace as written to disk, long strings stored once in "blobs".
+
+        Args:
+            outcome: How the run ended, e.g. "ok", "error" or "cancelled"
+
+        Returns:
+            A JSON-serializable dictionary
+        """
+        blobs: Dict[str, str] = {}
+        events = _compact(self._events, blobs)
+        return {
+            "type": "run",
+            "id": self.id,
+            "session": self.session,
+            "started": self.started,
+            "message": self.message,
+            **self.fields,
+            "outcome": outcome,
+            "ms": self.elapsed_ms(),
+            "events": events,
+            "blobs": blobs,
+        }
+
+
+class RunRecorder:
+    """
+    Write a trace of agent runs to RUN_TRACE_DIR.
+
+    Each finished run is appended as one JSON line (a gzip member when
+    compressed) to runs-<host>-<UTC date>.jsonl[.gz], by a background
+    thread so the event loop never waits for the disk. A file starts with
+    the tool definitions of the MCP servers, which replays serve again.
+    """
+
+    def __init__(self, directory: Optional[str] = None, sample_rate: float = 1.0, compress: bool = True):
+        """
+        Initialize the RunRecorder.
+
+        Args:
+            directory: Where traces are written; None disables recording
+            sample_rate: Fraction of runs recorded
+            compress: Whether to gzip the trace files
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.compress = compress
+        self._tools: Dict[str, List[Dict[str, Any]]] = {}
+        self._tools_version = 0
+        self._written_tools: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {"runs": 0, "bytes": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "RunRecorder":
+        """
+        Create a recorder configured from RUN_TRACE_DIR, RUN_TRACE_SAMPLE
+        (default 1.0) and RUN_TRACE_COMPRESS (default on).
+
+        Returns:
+            A new RunRecorder, disabled when RUN_TRACE_DIR is not set
+        """
+        return cls(
+            directory=os.getenv("RUN_TRACE_DIR") or None,
+            sample_rate=float(os.getenv("RUN_TRACE_SAMPLE", "1.0")),
+            compress=os.getenv("RUN_TRACE_COMPRESS", "on").lower() not in ("0", "false", "no", "off"),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether runs are recorded."""
+        return self.directory is not None
+
+    def start(self, session: Optional[str], message: str, **fields: Any) -> Optional[RunTrace]:
+        """
+        Start recording a run in the current context.
+
+        Args:
+            session: Conversation the run belongs to; runs of a session are
+                replayed in order
+            message: The user message
+            **fields: Further data stored with the run, e.g. earlier history
+
+        Returns:
+            The trace, or None when recording is off or the run is not sampled
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        trace = RunTrace(session, message, fields)
+        trace._token = _current.set(trace)
+        return trace
+
+    def event(self, kind: str, **fields: Any) -> None:
+        """Add an event to the run of the current context, if it is recorded."""
+        trace = _current.get()
+        if trace is not None:
+            trace.event(kind, **fields)
+
+    def mark(self, kind: str, **fields: Any) -> None:
+        """Add an event to the run of the current context the first time only."""
+        trace = _current.get()
+        if trace is not None:
+            trace.mark(kind, **fields)
+
+    def finish(self, trace: Optional[RunTrace], outcome: str) -> None:
+        """
+        Stop recording a run and queue its trace for writing.
+
+        Args:
+            trace: The trace returned by start()
+            outcome: How the run ended
+        """
+        if trace is None:
+            return
+        try:
+            _current.reset(trace._token)
+        except ValueError:
+            # finished from another context than it was started in
+            _current.set(None)
+        line = json.dumps(trace.to_record(outcome), separators=(",", ":"), default=str)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-recorder")
+        self._executor.submit(self._write, line)
+
+    def set_tools(self, server: str, tools: Iterable[Any]) -> None:
+        """
+        Keep the tool definitions of an MCP server for the trace files.
+
+        Args:
+            server: Logical server name
+            tools: Its tools, as listed
+        """
+        dumped = [tool.model_dump(mode="json", exclude_none=True) if hasattr(tool, "model_dump") else tool for tool in tools]
+        with self._lock:
+            if self._tools.get(server) != dumped:
+                self._tools[server] = dumped
+                self._tools_version += 1
+
+    def close(self) -> None:
+        """Wait for queued traces to be written."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report the runs and bytes written.
+
+        Returns:
+            A dictionary of counters, with the directory written to
+        """
+        return {"directory": self.directory, **self._stats}
+
+    def _path(self) -> str:
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        name = f"runs-{socket.gethostname()}-{time.strftime('%Y%m%d', time.gmtime())}{suffix}"
+        return os.path.join(self.directory, name)
+
+    def _write(self, line: str) -> None:
+        path = self._path()
+        with self._lock:
+            lines = []
+            if self._tools and self._written_tools.get(path) != self._tools_version:
+                lines.append(json.dumps({"type": "tools", "servers": self._tools}, separators=(",", ":")))
+            lines.append(line)
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                # appending to a gzip file adds a member; readers decompress them as one stream
+                with (gzip.open(path, "ab") if self.compress else open(path, "ab")) as trace_file:
+                    trace_file.write(data)
+            except OSError as e:
+                self._stats["errors"] += 1
+                logging.warning("Could not write run trace to %s: %s", path, e)
+                return
+            self._written_tools[path] = self._tools_version
+            self._stats["runs"] += 1
+            self._stats["bytes"] += len(data)
+            RUN_TRACE_BYTES.inc(len(data))
+
+
+def read_traces(paths: Iterable[str]) -> Tuple[Dict[str, List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    Read trace files, or directories of them, as written by RunRecorder.
+
+    Args:
+        paths: Files or directories
+
+    Returns:
+        The tool definitions per MCP server (the last ones listed) and the
+        runs with their long strings restored, in start order
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "runs-*.jsonl*"))))
+        else:
+            files.append(path)
+    tools: Dict[str, List[Dict[str, Any]]] = {}
+    runs: List[Dict[str, Any]] = []
+    for path in files:
+        with (gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, encoding="utf-8")) as trace_file:
+            for line in trace_file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("type") == "tools":
+                    tools.update(record["servers"])
+                elif record.get("type") == "run":
+                    blobs = record.pop("blobs", {})
+                    record["events"] = _expand(record["events"], blobs)
+                    runs.append(record)
+    runs.sort(key=lambda run: run["started"])
+    return tools, runs
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """Response body that adds every chunk, with its arrival time, to a trace event."""
+
+    def __init__(self, inner: httpx.AsyncByteStream, event: Dict[str, Any], trace: RunTrace, sent: float, binary: bool):
+        self._inner = inner
+        self._event = event
+        self._trace = trace
+        self._sent = sent
+        self._decoder = None if binary else codecs.getincrementaldecoder("utf-8")("replace")
+        event["chunks"] = []
+        if binary:
+            event["base64"] = True
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            text = base64.b64encode(chunk).decode("ascii") if self._decoder is None else self._decoder.decode(chunk)
+            if text:
+                self._event["chunks"].append([self._trace.elapsed_ms(self._sent), text])
+            yield chunk
+        self._event["ms"] = self._trace.elapsed_ms(self._sent)
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport adding the model requests of a recorded run to its trace.
+
+    Placed under the rate limiter, so every attempt is recorded with the
+    time the model API took, without client-side waits.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        """
+        Initialize the RecordingTransport.
+
+        Args:
+            inner: The transport sending the requests
+        """
+        self._inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        trace = _current.get()
+        if trace is None:
+            return await self._inner.handle_async_request(request)
+        await request.aread()
+        number = trace.model_request(request)["n"]
+        sent = time.perf_counter()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except Exception as e:
+            trace.event("llm_error", n=number, ms=trace.elapsed_ms(sent), error=f"{type(e).__name__}: {e}")
+            raise
+        event = trace.event(
+            "llm_response",
+            n=number,
+            status=response.status_code,
+            ttfb=trace.elapsed_ms(sent),
+            headers={
+                key: value for key, value in response.headers.items()
+                if key.lower() in _KEPT_HEADERS or key.lower().startswith("x-ratelimit-")
+            },
+        )
+        stream = _RecordingStream(
+            response.stream, event, trace, sent, binary="content-encoding" in response.headers
+        )
+        return httpx.Response(
+            response.status_code, headers=response.headers, stream=stream, extensions=response.extensions, request=request
+        )
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class RecordingMCPServer(MCPServerWrapper):
+    """
+    Add the tool calls of a recorded run to its trace, and the listed tools
+    to the recorder.
+
+    Wraps each worker of an MCP server pool, so traces hold the calls that
+    reached a server, with its output before any processing and the time
+    the server took.
+    """
+
+    def __init__(self, inner: Any, server_label: str, recorder: RunRecorder):
+        super().__init__(inner)
+        self._server_label = server_label
+        self._recorder = recorder
+
+    async def list_tools(self, run_context: Any = None, agent: Any = None) -> List[Any]:
+        tools = await super().list_tools(run_context, agent)
+        self._recorder.set_tools(self._server_label, tools)
+        return tools
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Optional[Dict[str, Any]],
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        trace = _current.get()
+        if trace is None:
+            return await super().call_tool(tool_name, arguments, meta)
+        started = time.perf_counter()
+        event = trace.event("tool", server=self._server_label, tool=tool_name, arguments=arguments or {})
+        try:
+            result = await super().call_tool(tool_name, arguments, meta)
+        except Exception as e:
+            event.update(ms=trace.elapsed_ms(started), error=f"{type(e).__name__}: {e}")
+            raise
+        event.update(
+            ms=trace.elapsed_ms(started),
+            result=result.model_dump(mode="json", exclude_none=True) if hasattr(result, "model_dump") else str(result),
+        )
+        return result
+
+
+# Created on first import; disabled unless RUN_TRACE_DIR is set
+run_recorder = RunRecorder.from_env()
@@ -0,0 +1,222 @@
+"""
+Run Scheduler for Kubernetes Operations Agent.
+
+Provides admission control for agent runs: a per-process cap on concurrent
+runs, a bounded wait queue served round-robin across users, and early load
+shedding when the queue is full.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from metrics import RUN_QUEUE_DEPTH, RUN_QUEUE_WAIT, RUNS_REJECTED
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class RunQueueFull(Exception):
+    """Raised when a run cannot even be queued; the caller should retry later."""
+
+
+class RunTicket:
+    """A caller's claim on a run slot, returned by RunScheduler.acquire."""
+
+    __slots__ = ("user", "granted", "_future")
+
+    def __init__(self, user: str, future: "asyncio.Future[None]"):
+        self.user = user
+        self.granted = False
+        self._future = future
+
+
+class RunScheduler:
+    """
+    Admission control for concurrent agent runs.
+
+    At most max_concurrent runs execute at once and each user holds at most
+    max_per_user of them. Further runs wait in per-user FIFO queues that are
+    served round-robin, so one busy user cannot starve the others. Once
+    max_queued runs are waiting (or a user has max_queued_per_user waiting)
+    new runs are rejected immediately with RunQueueFull.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        max_queued: int = 32,
+        max_per_user: int = 1,
+        max_queued_per_user: int = 2,
+    ):
+        """
+        Initialize the RunScheduler.
+
+        Args:
+            max_concurrent: Runs allowed to execute at the same time
+            max_queued: Runs allowed to wait for a slot
+            max_per_user: Concurrent runs allowed per user
+            max_queued_per_user: Waiting runs allowed per user
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self.max_queued_per_user = max_queued_per_user
+
+        self._running = 0
+        self._running_per_user: Dict[str, int] = {}
+        self._queues: "OrderedDict[str, Deque[RunTicket]]" = OrderedDict()
+        self._queued = 0
+        self._changed = asyncio.Event()
+
+    @classmethod
+    def from_env(cls) -> "RunScheduler":
+        """
+        Create a scheduler configured from AGENT_* environment variables.
+
+        Returns:
+            A new RunScheduler
+        """
+        return cls(
+            max_concurrent=int(os.getenv("AGENT_MAX_CONCURRENT_RUNS", "8")),
+            max_queued=int(os.getenv("AGENT_MAX_QUEUED_RUNS", "32")),
+            max_per_user=int(os.getenv("AGENT_MAX_RUNS_PER_USER", "1")),
+            max_queued_per_user=int(os.getenv("AGENT_MAX_QUEUED_RUNS_PER_USER", "2")),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of runs waiting for a slot."""
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        """Number of runs currently holding a slot."""
+        return self._running
+
+    async def acquire(self, user: str, on_position: Optional[PositionCallback] = None) -> RunTicket:
+        """
+        Wait for a run slot.
+
+        Args:
+            user: Key used for per-user limits and fairness
+            on_position: Awaited with the 1-based queue position whenever it
+                changes while waiting (not called if a slot is free at once)
+
+        Returns:
+            A granted ticket; pass it to release() when the run ends
+
+        Raises:
+            RunQueueFull: If the run cannot be queued
+        """
+        user_queue = self._queues.get(user)
+        if self._queued >= self.max_queued or (user_queue and len(user_queue) >= self.max_queued_per_user):
+            RUNS_REJECTED.inc()
+            raise RunQueueFull(
+                f"{self._running} runs in progress and {self._queued} waiting; please try again shortly."
+            )
+
+        ticket = RunTicket(user, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user, deque()).append(ticket)
+        self._queued += 1
+        started = time.perf_counter()
+        self._dispatch()
+
+        try:
+            position = 0
+            while not ticket.granted:
+                new_position = self._position(ticket)
+                if on_position is not None and new_position != position:
+                    position = new_position
+                    await on_position(position)
+                if ticket.granted:
+                    break
+                self._changed.clear()
+                changed = asyncio.ensure_future(self._changed.wait())
+                try:
+                    await asyncio.wait({ticket._future, changed}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    changed.cancel()
+        except BaseException:
+            # cancelled or the callback failed: give the slot (or queue place) back
+            self._abandon(ticket)
+            raise
+
+        RUN_QUEUE_WAIT.observe(time.perf_counter() - started)
+        return ticket
+
+    def release(self, ticket: RunTicket) -> None:
+        """
+        Return the slot held by a granted ticket and admit the next run.
+
+        Args:
+            ticket: The ticket returned by acquire()
+        """
+        if not ticket.granted:
+            return
+        ticket.granted = False
+        self._running -= 1
+        remaining = self._running_per_user.get(ticket.user, 1) - 1
+        if remaining > 0:
+            self._running_per_user[ticket.user] = remaining
+        else:
+            self._running_per_user.pop(ticket.user, None)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Grant slots round-robin over users whose head ticket is eligible
+        granted_any = False
+        while self._running < self.max_concurrent:
+            ticket = self._next_eligible()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._queued -= 1
+            self._running += 1
+            self._running_per_user[ticket.user] = self._running_per_user.get(ticket.user, 0) + 1
+            if not ticket._future.done():
+                ticket._future.set_result(None)
+            granted_any = True
+        RUN_QUEUE_DEPTH.set(self._queued)
+        if granted_any:
+            self._changed.set()
+
+    def _next_eligible(self) -> Optional[RunTicket]:
+        for user, queue in self._queues.items():
+            if self._running_per_user.get(user, 0) >= self.max_per_user:
+                continue
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            return ticket
+        return None
+
+    def _position(self, ticket: RunTicket) -> int:
+        # Simulate the round-robin order of the queues as they stand
+        queues: List[List[RunTicket]] = [list(q) for q in self._queues.values()]
+        position = 0
+        depth = 0
+        while any(depth < len(q) for q in queues):
+            for queue in queues:
+                if depth < len(queue):
+                    position += 1
+                    if queue[depth] is ticket:
+                        return position
+            depth += 1
+        return position
+
+    def _abandon(self, ticket: RunTicket) -> None:
+        if ticket.granted:
+            self.release(ticket)
+            return
+        queue = self._queues.get(ticket.user)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            self._queued -= 1
+            if not queue:
+                del self._queues[ticket.user]
+        RUN_QUEUE_DEPTH.set(self._queued)
+        self._changed.set()
@@ -0,0 +1,391 @@
+"""
+Session Registry for Kubernetes Operations Agent.
+
+Provides a SessionRegistry that tracks the approximate memory of every open
+chat session of the process and keeps it within a budget: sessions idle past
+a timeout, then the least recently used ones while the total is over the
+budget, are unloaded, with in-process conversations spilled to disk so they
+come back on the session's next message. Tool steps whose output never
+arrived are expired along the way.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from chainlit_session_manager import ChainlitSessionManager
+from metrics import SESSION_EVICTIONS, TOOL_STEPS_EXPIRED
+from persistent_session_storage import decode_value, encode_value
+
+SPILL_SUFFIX = ".session"
+
+
+class _Entry:
+    """A resident session: its manager, measured size and last use."""
+
+    __slots__ = ("manager", "bytes", "last_active")
+
+    def __init__(self, manager: ChainlitSessionManager):
+        self.manager = manager
+        self.bytes = 0
+        self.last_active = 0.0
+
+
+class SessionRegistry:
+    """
+    Memory accounting and eviction of the chat sessions of this process.
+
+    A message activates its session, which is then held until done() moves
+    it to the most recently used end and re-measures it with
+    ChainlitSessionManager.get_memory_bytes(). A sweep every sweep_interval
+    seconds, and one as soon as the total goes over memory_budget, unloads
+    sessions idle for idle_timeout seconds and then the least recently used
+    ones until the total fits, never one that is held or has a run in
+    progress. Conversations held in-process are written to spill_dir first
+    (dropped when it is None) and read back by activate(); spill files older
+    than spill_ttl seconds are deleted. Sessions backed by an external store
+    are simply released, as the store keeps them.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = 1800.0,
+        memory_budget: int = 256 * 1024 * 1024,
+        spill_dir: Optional[str] = None,
+        spill_ttl: float = 86400.0,
+        tool_step_ttl: float = 600.0,
+        sweep_interval: float = 30.0,
+    ):
+        """
+        Initialize the SessionRegistry.
+
+        Args:
+            idle_timeout: Seconds without a message before a session is unloaded; 0 never
+            memory_budget: Bytes all sessions may hold before the least recently used are unloaded; 0 unbounded
+            spill_dir: Directory for the conversations of unloaded in-process sessions; None drops them
+            spill_ttl: Seconds a spilled conversation is kept
+            tool_step_ttl: Seconds a tool step may wait for its output
+            sweep_interval: Seconds between sweeps
+        """
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_ttl = spill_ttl
+        self.tool_step_ttl = tool_step_ttl
+        self.sweep_interval = sweep_interval
+
+        # least recently used first
+        self._sessions: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._total = 0
+        # session ID -> messages it is handling
+        self._held: Dict[str, int] = {}
+        # session ID -> time.time() its conversation was spilled
+        self._spilled: Dict[str, float] = {}
+        # spills still being written, awaited by activate() of the same session
+        self._writing: Dict[str, "asyncio.Future[Any]"] = {}
+        self._evictions: Dict[str, int] = {}
+        self._lost = 0
+        self._sweeper: Optional["asyncio.Task[None]"] = None
+        self._sweep_requested = asyncio.Event()
+
+    @classmethod
+    def from_env(cls) -> "SessionRegistry":
+        """
+        Create a registry configured from SESSION_* environment variables.
+
+        Returns:
+            A new SessionRegistry
+        """
+        spill_dir = os.getenv("SESSION_SPILL_DIR", os.path.join(tempfile.gettempdir(), "kubernetes-ai-ops-sessions"))
+        return cls(
+            idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", "1800")),
+            memory_budget=int(float(os.getenv("SESSION_MEMORY_BUDGET_MB", "256")) * 1024 * 1024),
+            spill_dir=None if spill_dir.lower() in ("", "off", "none") else spill_dir,
+            spill_ttl=float(os.getenv("SESSION_TTL", "86400")),
+            tool_step_ttl=float(os.getenv("TOOL_STEP_TTL", "600")),
+            sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "30")),
+        )
+
+    @property
+    def total_bytes(self) -> int:
+        """Approximate memory of all resident sessions, as last measured."""
+        return self._total
+
+    def start(self) -> None:
+        """Start sweeping in the background."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop(), name="session-sweeper")
+
+    async def stop(self) -> None:
+        """Stop sweeping and wait for spills being written."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        await asyncio.gather(*self._writing.values(), return_exceptions=True)
+
+    async def activate(self, session_id: str, manager: ChainlitSessionManager) -> bool:
+        """
+        Make a session resident before handling its message, reloading its
+        conversation if it was unloaded, and hold it until done().
+
+        Args:
+            session_id: The Chainlit session ID
+            manager: The session's manager
+
+        Returns:
+            False if an unloaded conversation was lost (spilling is off or
+            failed) and the session starts afresh
+        """
+        recovered = True
+        self._held[session_id] = self._held.get(session_id, 0) + 1
+        try:
+            if manager.is_unloaded:
+                state = None
+                if session_id in self._writing:
+                    await asyncio.gather(self._writing[session_id], return_exceptions=True)
+                if session_id in self._spilled:
+                    del self._spilled[session_id]
+                    state = await asyncio.to_thread(self._read_spill, session_id)
+                # without state, an external store still has the conversation
+                recovered = state is not None or manager.is_persistent
+                if not recovered:
+                    self._lost += 1
+                if state is None:
+                    await manager.preload()
+                manager.reload(state)
+            self.touch(session_id, manager)
+        except BaseException:
+            # cancelled or failed: the caller will not call done()
+            self._release_hold(session_id)
+            raise
+        return recovered
+
+    def done(self, session_id: str, manager: ChainlitSessionManager) -> None:
+        """
+        Stop holding a session once its message is handled, re-measuring it.
+
+        Args:
+            session_id: The Chainlit session ID
+            manager: The session's manager
+        """
+        self._release_hold(session_id)
+        # unless the session ended meanwhile
+        if session_id in self._sessions:
+            self.touch(session_id, manager)
+
+    def touch(self, session_id: str, manager: ChainlitSessionManager) -> None:
+        """
+        Mark a session used now and re-measure it, e.g. when it starts.
+
+        Args:
+            session_id: The Chainlit session ID
+            manager: The session's manager
+        """
+        if manager.is_unloaded:
+            return
+        entry = self._sessions.pop(session_id, None) or _Entry(manager)
+        entry.manager = manager
+        entry.last_active = time.monotonic()
+        self._measure(entry)
+        self._sessions[session_id] = entry
+        if self.memory_budget and self._total > self.memory_budget:
+            self._sweep_requested.set()
+
+    def remove(self, session_id: str) -> None:
+        """
+        Forget a session that ended, with any spilled conversation.
+
+        Args:
+            session_id: The Chainlit session ID
+        """
+        self._held.pop(session_id, None)
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._total -= entry.bytes
+        if self._spilled.pop(session_id, None) is not None:
+            self._spill_path(session_id).unlink(missing_ok=True)
+        # a spill still being written is deleted by _unload() once done
+        self._writing.pop(session_id, None)
+
+    async def sweep(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Expire orphaned tool steps, then unload idle sessions and the least
+        recently used ones until the total fits the budget.
+
+        Args:
+            now: The current time.monotonic(), if already known
+
+        Returns:
+            Counts of expired tool steps and of sessions unloaded per reason
+        """
+        now = time.monotonic() if now is None else now
+        counts = {"tool_steps": 0, "idle": 0, "memory": 0}
+        for entry in self._sessions.values():
+            expired = entry.manager.expire_tool_steps(self.tool_step_ttl, now)
+            if expired:
+                counts["tool_steps"] += len(expired)
+                self._measure(entry)
+        TOOL_STEPS_EXPIRED.inc(counts["tool_steps"])
+
+        if self.idle_timeout:
+            for session_id, entry in list(self._sessions.items()):
+                # an earlier unload awaited its spill, so the session may have ended meanwhile
+                if session_id not in self._sessions:
+                    continue
+                if now - entry.last_active >= self.idle_timeout and not self._is_held(session_id, entry):
+                    await self._unload(session_id, "idle")
+                    counts["idle"] += 1
+        if self.memory_budget:
+            for session_id, entry in list(self._sessions.items()):
+                if self._total <= self.memory_budget:
+                    break
+                if session_id in self._sessions and not self._is_held(session_id, entry):
+                    await self._unload(session_id, "memory")
+                    counts["memory"] += 1
+
+        if self.spill_dir is not None:
+            cutoff = time.time() - self.spill_ttl
+            for session_id in [s for s, spilled in self._spilled.items() if spilled < cutoff]:
+                del self._spilled[session_id]
+            await asyncio.to_thread(self._purge_spills, cutoff)
+        return counts
+
+    def get_session_bytes(self) -> List[int]:
+        """Measured size of every resident session."""
+        return [entry.bytes for entry in self._sessions.values()]
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """
+        Report memory use and evictions, with the largest sessions.
+
+        Args:
+            top: How many of the largest sessions to list
+
+        Returns:
+            A JSON-serializable dictionary
+        """
+        now = time.monotonic()
+        largest = sorted(self._sessions.items(), key=lambda item: item[1].bytes, reverse=True)[:top]
+        return {
+            "resident": len(self._sessions),
+            "spilled": len(self._spilled),
+            "bytes": self._total,
+            "memory_budget": self.memory_budget,
+            "idle_timeout": self.idle_timeout,
+            "evictions": dict(self._evictions),
+            "lost": self._lost,
+            "largest": [
+                {
+                    # a prefix identifies the session in logs without exposing its ID
+                    "session": session_id[:8],
+                    "bytes": entry.bytes,
+                    "idle_seconds": round(now - entry.last_active, 1),
+                    "busy": self._is_held(session_id, entry),
+                }
+                for session_id, entry in largest
+            ],
+        }
+
+    def _release_hold(self, session_id: str) -> None:
+        held = self._held.pop(session_id, 0) - 1
+        if held > 0:
+            self._held[session_id] = held
+
+    def _is_held(self, session_id: str, entry: _Entry) -> bool:
+        return session_id in self._held or entry.manager.is_busy
+
+    def _measure(self, entry: _Entry) -> None:
+        size = entry.manager.get_memory_bytes()
+        self._total += size - entry.bytes
+        entry.bytes = size
+
+    async def _unload(self, session_id: str, reason: str) -> None:
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return
+        self._total -= entry.bytes
+        state = entry.manager.unload()
+        if state is None:
+            action = "released"
+        elif self.spill_dir is None:
+            action = "dropped"
+        else:
+            write = asyncio.ensure_future(asyncio.to_thread(self._write_spill, session_id, state))
+            self._writing[session_id] = write
+            try:
+                await write
+                action = "spilled"
+            except OSError as exc:
+                logging.warning("Could not spill session %s: %s", session_id[:8], exc)
+                action = "dropped"
+            if self._writing.pop(session_id, None) is not write:
+                # the session ended while its spill was written
+                action = "dropped"
+                self._spill_path(session_id).unlink(missing_ok=True)
+            elif action == "spilled":
+                self._spilled[session_id] = time.time()
+        key = f"{reason}/{action}"
+        self._evictions[key] = self._evictions.get(key, 0) + 1
+        SESSION_EVICTIONS.labels(reason, action).inc()
+
+    def _spill_path(self, session_id: str) -> Path:
+        assert self.spill_dir is not None
+        name = hashlib.sha256(session_id.encode()).hexdigest()[:32]
+        return self.spill_dir / f"{name}{SPILL_SUFFIX}"
+
+    def _write_spill(self, session_id: str, state: Dict[str, Any]) -> None:
+        assert self.spill_dir is not None
+        self.spill_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        path = self._spill_path(session_id)
+        partial = path.with_suffix(".tmp")
+        # conversations may contain cluster details; readable by this user only
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(encode_value(state))
+        os.replace(partial, path)
+
+    def _read_spill(self, session_id: str) -> Optional[Dict[str, Any]]:
+        path = self._spill_path(session_id)
+        try:
+            data = path.read_bytes()
+        except OSError as exc:
+            logging.warning("Could not read spilled session %s: %s", session_id[:8], exc)
+            return None
+        path.unlink(missing_ok=True)
+        try:
+            return decode_value(data)
+        except (ValueError, zlib.error) as exc:
+            logging.warning("Spilled session %s is unreadable: %s", session_id[:8], exc)
+            return None
+
+    def _purge_spills(self, cutoff: float) -> None:
+        # also removes files left behind by earlier processes
+        assert self.spill_dir is not None
+        if not self.spill_dir.is_dir():
+            return
+        for path in self.spill_dir.glob(f"*{SPILL_SUFFIX}"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                continue
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._sweep_requested.wait(), timeout=self.sweep_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._sweep_requested.clear()
+            try:
+                await self.sweep()
+            except Exception:
+                logging.exception("Session sweep failed")
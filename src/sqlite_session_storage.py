@@ -0,0 +1,247 @@
+"""
+SQLite Session Storage Implementation.
+
+Provides a SessionStorage backed by a SQLite file, for single-node
+deployments or a shared volume, with idle sessions evicted after a TTL.
+Queries run on the store's I/O thread, not the event loop.
+"""
+
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from persistent_session_storage import DEFAULT_LOCAL_KEYS, PersistentSessionStorage, SessionStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+CREATE TABLE IF NOT EXISTS session_values (
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (session_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_items (
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (session_id, key, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    A SQLite database holding the sessions of every user.
+
+    List values are stored one row per item so appending a turn inserts one
+    row instead of rewriting the whole history. touch() and evict_expired()
+    run on the I/O thread, as part of the sessions' writes.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400.0, eviction_interval: float = 60.0):
+        """
+        Open (and if needed create) the database.
+
+        Args:
+            path: Database file path, or ":memory:"
+            ttl: Idle seconds after which a session is evicted
+            eviction_interval: Minimum seconds between eviction sweeps
+        """
+        super().__init__()
+        self.ttl = ttl
+        self.eviction_interval = eviction_interval
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._last_eviction = 0.0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The underlying connection."""
+        return self._connection
+
+    def storage(self, session_id: str) -> "SQLiteSessionStorage":
+        """
+        Get the storage of one session.
+
+        Args:
+            session_id: Identifier of the session
+
+        Returns:
+            A SQLiteSessionStorage bound to this store
+        """
+        return SQLiteSessionStorage(self, session_id)
+
+    def touch(self, session_id: str) -> None:
+        """
+        Record activity on a session and evict expired ones if a sweep is due.
+
+        Args:
+            session_id: Identifier of the session
+        """
+        now = time.time()
+        self._connection.execute(
+            "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET last_access = excluded.last_access",
+            (session_id, now),
+        )
+        if now - self._last_eviction >= self.eviction_interval:
+            self.evict_expired(now)
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """
+        Delete every session idle for longer than the TTL.
+
+        Args:
+            now: Current time (defaults to time.time())
+
+        Returns:
+            The number of sessions evicted
+        """
+        now = time.time() if now is None else now
+        self._last_eviction = now
+        cutoff = now - self.ttl
+        with self._transaction():
+            expired = [row[0] for row in self._connection.execute(
+                "SELECT session_id FROM sessions WHERE last_access < ?", (cutoff,)
+            )]
+            for session_id in expired:
+                self._delete(session_id)
+        return len(expired)
+
+    def delete_session(self, session_id: str) -> None:
+        """
+        Delete one session and all its data.
+
+        Args:
+            session_id: Identifier of the session
+        """
+        self.call(self._delete_session, session_id)
+
+    def _delete_session(self, session_id: str) -> None:
+        with self._transaction():
+            self._delete(session_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Report the number of stored sessions and items.
+
+        Returns:
+            A dictionary of counters
+        """
+        return self.call(self._count)
+
+    def close(self) -> None:
+        """Finish queued writes and close the database connection."""
+        self._shutdown_io()
+        self._connection.close()
+
+    def _count(self) -> Dict[str, int]:
+        sessions = self._connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        items = self._connection.execute("SELECT COUNT(*) FROM session_items").fetchone()[0]
+        return {"sessions": sessions, "items": items}
+
+    def _delete(self, session_id: str) -> None:
+        for table in ("session_items", "session_values", "sessions"):
+            self._connection.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._connection)
+
+
+class _Transaction:
+    """BEGIN/COMMIT around a block on an autocommit connection."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._connection.execute("BEGIN")
+        return self._connection
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._connection.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class SQLiteSessionStorage(PersistentSessionStorage):
+    """
+    Implementation of SessionStorage using a SQLiteSessionStore.
+    """
+
+    def __init__(self, store: SQLiteSessionStore, session_id: str, local_keys=DEFAULT_LOCAL_KEYS):
+        """
+        Initialize the storage of one session.
+
+        Args:
+            store: The database holding the session
+            session_id: Identifier of the session
+            local_keys: Keys kept in process memory only
+        """
+        super().__init__(store, session_id, local_keys)
+        self._store = store
+        self._db = store.connection
+        self._next_seq: Dict[str, int] = {}
+        self._last_touch = 0.0
+
+    def _load_value(self, key: str) -> Optional[bytes]:
+        row = self._db.execute(
+            "SELECT data FROM session_values WHERE session_id = ? AND key = ?", (self.session_id, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _load_items(self, key: str) -> List[bytes]:
+        rows = self._db.execute(
+            "SELECT seq, data FROM session_items WHERE session_id = ? AND key = ? ORDER BY seq",
+            (self.session_id, key),
+        ).fetchall()
+        self._next_seq[key] = rows[-1][0] + 1 if rows else 0
+        return [row[1] for row in rows]
+
+    def _write_value(self, key: str, data: bytes) -> None:
+        with self._store._transaction():
+            self._db.execute(
+                "DELETE FROM session_items WHERE session_id = ? AND key = ?", (self.session_id, key)
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO session_values (session_id, key, data) VALUES (?, ?, ?)",
+                (self.session_id, key, data),
+            )
+
+    def _write_items(self, key: str, drop_front: int, items: List[bytes], replace: bool) -> None:
+        session_id = self.session_id
+        with self._store._transaction():
+            if replace:
+                self._db.execute("DELETE FROM session_values WHERE session_id = ? AND key = ?", (session_id, key))
+                self._db.execute("DELETE FROM session_items WHERE session_id = ? AND key = ?", (session_id, key))
+                self._next_seq[key] = 0
+            elif drop_front:
+                self._db.execute(
+                    "DELETE FROM session_items WHERE session_id = ? AND key = ? AND seq IN "
+                    "(SELECT seq FROM session_items WHERE session_id = ? AND key = ? ORDER BY seq LIMIT ?)",
+                    (session_id, key, session_id, key, drop_front),
+                )
+            if key not in self._next_seq:
+                row = self._db.execute(
+                    "SELECT MAX(seq) FROM session_items WHERE session_id = ? AND key = ?", (session_id, key)
+                ).fetchone()
+                self._next_seq[key] = 0 if row[0] is None else row[0] + 1
+            seq = self._next_seq[key]
+            self._db.executemany(
+                "INSERT INTO session_items (session_id, key, seq, data) VALUES (?, ?, ?, ?)",
+                [(session_id, key, seq + i, data) for i, data in enumerate(items)],
+            )
+            self._next_seq[key] = seq + len(items)
+
+    def _touch(self) -> None:
+        # last_access only needs to be as precise as a small fraction of the TTL
+        now = time.monotonic()
+        if now - self._last_touch < min(60.0, self._store.ttl / 10):
+            return
+        self._last_touch = now
+        self._store.touch(self.session_id)
@@ -0,0 +1,164 @@
+"""
+Startup Profile for Kubernetes Operations Agent.
+
+Provides a StartupProfiler that records how long the process spends on
+imports and on each phase of startup until the app is ready, logs the
+breakdown once and serves it at /startupz/profile, so cold-start regressions
+show up in every pod's log. Uses the standard library only, so it can be
+imported before anything heavy.
+"""
+
+import builtins
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def _seconds_since_process_start() -> Optional[float]:
+    # /proc/self/stat field 22 is the start time in clock ticks since boot
+    try:
+        with open("/proc/self/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupProfiler:
+    """
+    Time imports and startup phases up to readiness.
+
+    While the import hook is installed, every import of a module not loaded
+    yet is timed up to max_depth levels of nesting (inclusive of what it
+    imports in turn). Phases are timed with phase(); mark_ready() removes the
+    hook and logs the report.
+    """
+
+    def __init__(self, max_depth: int = 2, top: int = 15):
+        """
+        Initialize the StartupProfiler.
+
+        Args:
+            max_depth: Nesting levels of imports timed; 1 times only the
+                imports made outside any other timed import
+            top: Imports listed in the log, slowest first
+        """
+        self.max_depth = max_depth
+        self.top = top
+        self.before_profiler = _seconds_since_process_start()
+        self._origin = time.perf_counter()
+        self._imports: List[Dict[str, Any]] = []
+        self._phases: List[Dict[str, Any]] = []
+        self._ready: Optional[float] = None
+        self._local = threading.local()
+        self._original_import: Any = None
+
+    @classmethod
+    def from_env(cls) -> "StartupProfiler":
+        """
+        Create a profiler configured from STARTUP_PROFILE_IMPORT_DEPTH (default 2)
+        and STARTUP_PROFILE_TOP (default 15).
+
+        Returns:
+            A new StartupProfiler
+        """
+        return cls(
+            max_depth=int(os.getenv("STARTUP_PROFILE_IMPORT_DEPTH", "2")),
+            top=int(os.getenv("STARTUP_PROFILE_TOP", "15")),
+        )
+
+    def install_import_hook(self) -> None:
+        """Start timing imports."""
+        if self._original_import is not None:
+            return
+        self._original_import = original = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            depth = getattr(self._local, "depth", 0)
+            if level or depth >= self.max_depth or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            self._local.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._local.depth = depth
+                self._imports.append({
+                    "module": name,
+                    "depth": depth,
+                    "at": started - self._origin,
+                    "seconds": time.perf_counter() - started,
+                    "thread": threading.current_thread().name,
+                })
+
+        builtins.__import__ = timed_import
+
+    def remove_import_hook(self) -> None:
+        """Stop timing imports."""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time a startup phase; phases may overlap, e.g. when run concurrently.
+
+        Args:
+            name: Name of the phase in the report
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases.append({
+                "phase": name,
+                "at": started - self._origin,
+                "seconds": time.perf_counter() - started,
+            })
+
+    def mark_ready(self) -> None:
+        """Record readiness, stop timing imports and log the report."""
+        if self._ready is not None:
+            return
+        self._ready = time.perf_counter() - self._origin
+        self.remove_import_hook()
+        self.log()
+
+    def report(self) -> Dict[str, Any]:
+        """
+        The startup breakdown.
+
+        Returns:
+            Seconds from process start to the profiler and from the profiler
+            to readiness, the phases in start order and the timed imports
+            (nested ones indented by depth) in import order
+        """
+        return {
+            "seconds_before_profiler": self.before_profiler,
+            "seconds_to_ready": self._ready,
+            "phases": sorted(self._phases, key=lambda p: p["at"]),
+            "imports": sorted(self._imports, key=lambda i: i["at"]),
+        }
+
+    def log(self) -> None:
+        """Log the phases and the slowest imports."""
+        lines = []
+        total = self._ready if self._ready is not None else time.perf_counter() - self._origin
+        before = f" (+{self.before_profiler:.2f}s interpreter start)" if self.before_profiler is not None else ""
+        lines.append(f"Startup took {total:.2f}s{before}")
+        for phase in sorted(self._phases, key=lambda p: p["at"]):
+            lines.append(f"  phase  {phase['phase']:<28} {phase['seconds']:7.3f}s  at {phase['at']:6.2f}s")
+        for entry in sorted(self._imports, key=lambda i: i["seconds"], reverse=True)[: self.top]:
+            name = "  " * entry["depth"] + entry["module"]
+            lines.append(f"  import {name:<28} {entry['seconds']:7.3f}s  at {entry['at']:6.2f}s  [{entry['thread']}]")
+        logging.info("\n".join(lines))
+
+
+# Created on first import, i.e. as early as main.py imports it
+startup_profiler = StartupProfiler.from_env()
@@ -0,0 +1,131 @@
+"""
+Token Stream for Kubernetes Operations Agent.
+
+Provides a TokenStreamBuffer that coalesces the model's text deltas before
+they are sent to the UI: pending text is flushed once per time window or
+when it grows past a size limit, and immediately before a tool call is
+shown and at the end of the run, so one websocket message carries many
+deltas without the answer appearing to stall.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Set
+
+from metrics import STREAM_DELTAS, STREAM_FLUSHES
+
+SendCallback = Callable[[str], Awaitable[None]]
+
+
+class TokenStreamBuffer:
+    """
+    Batch text deltas into fewer, larger sends.
+
+    The first delta after a flush arms a timer of `interval` seconds; when it
+    fires, everything received meanwhile goes out in one send. Reaching
+    `max_chars` pending characters flushes at once. With an interval of 0
+    every delta is sent as it arrives, as without the buffer. Sends never
+    overlap and keep their order.
+    """
+
+    def __init__(self, send: SendCallback, interval: float = 0.04, max_chars: int = 1024):
+        """
+        Initialize the TokenStreamBuffer.
+
+        Args:
+            send: Coroutine function delivering text to the UI, e.g. msg.stream_token
+            interval: Seconds deltas are collected before a flush; 0 disables coalescing
+            max_chars: Pending characters that trigger an immediate flush
+        """
+        self._send = send
+        self.interval = interval
+        self.max_chars = max_chars
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_flushes: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+        self.deltas = 0
+        self.sends = 0
+
+    @classmethod
+    def from_env(cls, send: SendCallback) -> "TokenStreamBuffer":
+        """
+        Create a buffer configured from STREAM_FLUSH_INTERVAL_MS (default 40,
+        0 sends every delta) and STREAM_FLUSH_MAX_CHARS (default 1024).
+
+        Args:
+            send: Coroutine function delivering text to the UI
+
+        Returns:
+            A new TokenStreamBuffer
+        """
+        return cls(
+            send,
+            interval=float(os.getenv("STREAM_FLUSH_INTERVAL_MS", "40")) / 1000.0,
+            max_chars=int(os.getenv("STREAM_FLUSH_MAX_CHARS", "1024")),
+        )
+
+    async def add(self, delta: str) -> None:
+        """
+        Queue a text delta, flushing if the buffer is full or coalescing is off.
+
+        Args:
+            delta: Text received from the model
+        """
+        if not delta:
+            return
+        self.deltas += 1
+        STREAM_DELTAS.inc()
+        self._pending.append(delta)
+        self._pending_chars += len(delta)
+        if self.interval <= 0:
+            await self.flush("unbuffered")
+        elif self._pending_chars >= self.max_chars:
+            await self.flush("size")
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self._on_timer)
+
+    async def flush(self, reason: str = "explicit") -> None:
+        """
+        Send all pending text now.
+
+        Args:
+            reason: Why the flush happened, recorded in agent_stream_flushes_total
+                ("interval", "size", "tool_call", "end", ...)
+        """
+        self._disarm()
+        async with self._lock:
+            if not self._pending:
+                return
+            text = "".join(self._pending)
+            self._pending.clear()
+            self._pending_chars = 0
+            self.sends += 1
+            STREAM_FLUSHES.labels(reason).inc()
+            await self._send(text)
+
+    async def close(self) -> None:
+        """Flush what is left at the end of the run, after any flush the timer started."""
+        if self._timer_flushes:
+            await asyncio.gather(*self._timer_flushes, return_exceptions=True)
+        await self.flush("end")
+
+    def discard(self) -> None:
+        """Drop pending text and stop timer flushes, e.g. when the run failed or was cancelled."""
+        self._disarm()
+        self._pending.clear()
+        self._pending_chars = 0
+        for task in self._timer_flushes:
+            task.cancel()
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        task = asyncio.ensure_future(self.flush("interval"))
+        self._timer_flushes.add(task)
+        task.add_done_callback(self._timer_flushes.discard)
+
+    def _disarm(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,325 @@
+"""
+Tool Output Store for Kubernetes Operations Agent.
+
+Provides a ToolOutputStore that keeps the tool outputs of one session,
+content-addressed so identical outputs are kept and sent to the model once.
+Follow-up questions get a note of the results that are still fresh, so the
+model can answer from them instead of calling the same tools again, and a
+tool output identical to one already in the model input is replaced by a
+short reference to it.
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from agents.run_config import CallModelData, ModelInputData
+
+from mcp_tool_cache import is_mutating_tool, is_read_only_tool
+from metrics import TOOL_OUTPUT_REF_CHARS_SAVED, TOOL_OUTPUT_REFETCHES, TOOL_OUTPUT_REFS
+
+FRESH_RESULTS_HEADER = (
+    "Tool results from earlier in this conversation that are still current. Answer from them instead of "
+    "calling the same tool with the same arguments again, unless the user asks for up-to-date data:"
+)
+
+
+def content_ref(text: str) -> str:
+    """
+    Address a tool output by its content.
+
+    Args:
+        text: The tool output as sent to the model
+
+    Returns:
+        A short hex digest, the same for identical outputs
+    """
+    return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=6).hexdigest()
+
+
+def _call_key(tool_name: str, arguments: Any) -> str:
+    # equivalent argument strings ("{"a":1, "b":2}" and "{"b":2,"a":1}") share a key
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments or "{}")
+        except ValueError:
+            return f"{tool_name}({arguments})"
+    return f"{tool_name}({json.dumps(arguments or {}, sort_keys=True, separators=(',', ':'), default=str)})"
+
+
+def _output_text(output: Any) -> Optional[str]:
+    # MCP results reach the model as a list of input_text parts
+    if isinstance(output, str):
+        return output
+    if isinstance(output, list) and output and all(
+        isinstance(part, dict) and part.get("type") == "input_text" for part in output
+    ):
+        return "\n".join(str(part.get("text", "")) for part in output)
+    return None
+
+
+class ToolOutputStore:
+    """
+    Content-addressed tool outputs of one session.
+
+    Outputs are recorded from the model input of each run by the filter
+    returned by input_filter(), so what is stored is exactly what the model
+    saw. Results of read-only tools stay fresh for fresh_seconds and are
+    offered to the next question by get_context_message(); a mutating tool
+    call drops them, as the cluster may have changed.
+    """
+
+    def __init__(
+        self,
+        fresh_seconds: float = 120.0,
+        max_entries: int = 32,
+        max_bytes: int = 256 * 1024,
+        context_max_chars: int = 8000,
+        ref_min_chars: int = 200,
+        never_fresh: Sequence[str] = ("*time*",),
+    ):
+        """
+        Initialize the ToolOutputStore.
+
+        Args:
+            fresh_seconds: How long a result is offered to follow-up
+                questions; 0 offers none
+            max_entries: Maximum tool calls kept, oldest dropped first
+            max_bytes: Maximum characters of distinct outputs kept
+            context_max_chars: Maximum characters of outputs in the note of
+                fresh results
+            ref_min_chars: Shorter repeated outputs are sent as they are
+            never_fresh: Tool names or fnmatch patterns whose results are
+                never offered again, e.g. the current time
+        """
+        self.fresh_seconds = fresh_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.context_max_chars = context_max_chars
+        self.ref_min_chars = ref_min_chars
+        self.never_fresh = list(never_fresh)
+        self._clear()
+
+    def _clear(self) -> None:
+        # call key -> {"tool", "arguments", "ref", "at"}, least recently recorded first
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._contents: Dict[str, str] = {}
+        self._bytes = 0
+        self._noted: Dict[str, str] = {}
+        self._version = 0
+        self._refs = 0
+        self._chars_saved = 0
+
+    @classmethod
+    def from_env(cls) -> "ToolOutputStore":
+        """
+        Create a store configured from TOOL_OUTPUT_* environment variables.
+
+        Returns:
+            A new ToolOutputStore
+        """
+        return cls(
+            fresh_seconds=float(os.getenv("TOOL_OUTPUT_FRESH_SECONDS", "120")),
+            max_entries=int(os.getenv("TOOL_OUTPUT_STORE_MAX_ENTRIES", "32")),
+            max_bytes=int(os.getenv("TOOL_OUTPUT_STORE_MAX_BYTES", str(256 * 1024))),
+            context_max_chars=int(os.getenv("TOOL_OUTPUT_CONTEXT_MAX_CHARS", "8000")),
+            ref_min_chars=int(os.getenv("TOOL_OUTPUT_REF_MIN_CHARS", "200")),
+            never_fresh=[p.strip() for p in os.getenv("TOOL_OUTPUT_NEVER_FRESH", "*time*").split(",") if p.strip()],
+        )
+
+    @property
+    def version(self) -> int:
+        """Increases with every change, so callers know when to persist."""
+        return self._version
+
+    def record(self, tool_name: str, arguments: Any, output: str, at: Optional[float] = None) -> str:
+        """
+        Record the output of one tool call.
+
+        Args:
+            tool_name: Name of the tool
+            arguments: Its arguments, as a JSON string or a dictionary
+            output: The output as sent to the model
+            at: Wall-clock time of the call; now when omitted
+
+        Returns:
+            The content reference of the output
+        """
+        ref = content_ref(output)
+        if is_mutating_tool(tool_name):
+            if self._entries:
+                self._entries.clear()
+                self._drop_unreferenced()
+                self._version += 1
+            return ref
+        if not self._keeps(tool_name):
+            return ref
+
+        at = time.time() if at is None else at
+        key = _call_key(tool_name, arguments)
+        previous = self._entries.pop(key, None)
+        if previous is not None and self._is_fresh(previous, at):
+            TOOL_OUTPUT_REFETCHES.labels("same" if previous["ref"] == ref else "changed").inc()
+        self._entries[key] = {"tool": tool_name, "call": key, "ref": ref, "at": at}
+        if ref not in self._contents:
+            self._contents[ref] = output
+            self._bytes += len(output)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            del self._entries[next(iter(self._entries))]
+            self._drop_unreferenced()
+        self._version += 1
+        return ref
+
+    def get_fresh(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        The results still offered to follow-up questions.
+
+        Args:
+            now: Wall-clock time to judge freshness at; now when omitted
+
+        Returns:
+            Entries with "tool", "call", "ref" and "at", newest first
+        """
+        now = time.time() if now is None else now
+        return [entry for entry in reversed(self._entries.values()) if self._is_fresh(entry, now)]
+
+    def get_context_message(self) -> Optional[Dict[str, str]]:
+        """
+        Build the note of fresh results for the next run, each distinct
+        output included once and the newest first, within context_max_chars.
+
+        Returns:
+            A system message, or None when there is nothing fresh
+        """
+        now = time.time()
+        budget = self.context_max_chars
+        noted: Dict[str, str] = {}
+        lines = []
+        for entry in self.get_fresh(now):
+            ref = entry["ref"]
+            age = f"{now - entry['at']:.0f}s ago"
+            if ref in noted:
+                lines.append(f"[ref {ref}] {entry['call']} ({age}): same output as above")
+                continue
+            output = self._contents[ref]
+            if len(output) > budget:
+                continue
+            budget -= len(output)
+            noted[ref] = f"tool result ref {ref}"
+            lines.append(f"[ref {ref}] {entry['call']} ({age}):\n{output}")
+        self._noted = noted
+        if not lines:
+            return None
+        return {"role": "system", "content": "\n\n".join([FRESH_RESULTS_HEADER, *lines])}
+
+    def input_filter(self) -> Callable[[CallModelData[Any]], ModelInputData]:
+        """
+        Create the call_model_input_filter for one run.
+
+        Before each model call it records the tool outputs of the run and
+        replaces an output identical to one earlier in the input (or in the
+        note of the last get_context_message()) with a reference to it. The
+        same items are replaced on every call, so the request prefix stays
+        stable for prompt caching.
+
+        Returns:
+            The filter, to be set on the run's RunConfig
+        """
+        noted = dict(self._noted)
+        recorded: Set[str] = set()
+        referenced: Set[str] = set()
+
+        def filter_input(data: CallModelData[Any]) -> ModelInputData:
+            calls: Dict[str, Dict[str, Any]] = {}
+            shown = dict(noted)
+            items: List[Any] = []
+            for item in data.model_data.input:
+                if isinstance(item, dict) and item.get("type") == "function_call":
+                    calls[item.get("call_id")] = item
+                elif isinstance(item, dict) and item.get("type") == "function_call_output":
+                    output = _output_text(item.get("output"))
+                    if output is None:
+                        items.append(item)
+                        continue
+                    call_id = item.get("call_id")
+                    call = calls.get(call_id, {})
+                    ref = content_ref(output)
+                    if call_id not in recorded and call:
+                        recorded.add(call_id)
+                        self.record(call.get("name", ""), call.get("arguments"), output)
+                    if ref in shown and len(output) >= self.ref_min_chars:
+                        reference = f"[Same output as {shown[ref]} above; not repeated]"
+                        if call_id not in referenced:
+                            referenced.add(call_id)
+                            self._refs += 1
+                            self._chars_saved += len(output) - len(reference)
+                            TOOL_OUTPUT_REFS.inc()
+                            TOOL_OUTPUT_REF_CHARS_SAVED.inc(len(output) - len(reference))
+                        item = {**item, "output": reference}
+                    else:
+                        shown.setdefault(ref, f"the {call.get('name', 'tool')} result (call {call_id})")
+                items.append(item)
+            return ModelInputData(input=items, instructions=data.model_data.instructions)
+
+        return filter_input
+
+    def reset(self) -> None:
+        """Drop all outputs."""
+        self._clear()
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Export the entries and their outputs, to rebuild this store in
+        another process.
+
+        Returns:
+            A JSON-serializable dictionary
+        """
+        return {"entries": list(self._entries.values()), "contents": dict(self._contents)}
+
+    def restore(self, state: Optional[Dict[str, Any]]) -> None:
+        """
+        Rebuild the store from get_state() output.
+
+        Args:
+            state: The exported entries and outputs, if any
+        """
+        self._clear()
+        contents = (state or {}).get("contents", {})
+        for entry in (state or {}).get("entries", []):
+            if entry.get("ref") in contents:
+                self._entries[entry["call"]] = dict(entry)
+                self._contents[entry["ref"]] = contents[entry["ref"]]
+        self._bytes = sum(len(output) for output in self._contents.values())
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Report the store's size and the references sent instead of outputs.
+
+        Returns:
+            A dictionary of counters
+        """
+        return {
+            "entries": len(self._entries),
+            "fresh": len(self.get_fresh()),
+            "distinct_outputs": len(self._contents),
+            "bytes": self._bytes,
+            "refs": self._refs,
+            "ref_chars_saved": self._chars_saved,
+        }
+
+    def _keeps(self, tool_name: str) -> bool:
+        if any(fnmatch.fnmatchcase(tool_name, pattern) for pattern in self.never_fresh):
+            return False
+        return is_read_only_tool(tool_name)
+
+    def _is_fresh(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry["at"] <= self.fresh_seconds
+
+    def _drop_unreferenced(self) -> None:
+        referenced = {entry["ref"] for entry in self._entries.values()}
+        for ref in [ref for ref in self._contents if ref not in referenced]:
+            self._bytes -= len(self._contents.pop(ref))